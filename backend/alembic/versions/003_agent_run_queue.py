@@ -0,0 +1,39 @@
+"""Agent runs as durable job queue (payload, attempts, scheduling, lock)
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "003"
+down_revision: Union[str, None] = "002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        op.execute("ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS payload_json TEXT NOT NULL DEFAULT '{}'")
+        op.execute("ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0")
+        op.execute("ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS next_attempt_at TEXT")
+        op.execute("ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS locked_at TEXT")
+    else:
+        # SQLite (sem IF NOT EXISTS em ADD COLUMN)
+        op.execute("ALTER TABLE agent_runs ADD COLUMN payload_json TEXT NOT NULL DEFAULT '{}'")
+        op.execute("ALTER TABLE agent_runs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        op.execute("ALTER TABLE agent_runs ADD COLUMN next_attempt_at TEXT")
+        op.execute("ALTER TABLE agent_runs ADD COLUMN locked_at TEXT")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE agent_runs DROP COLUMN locked_at")
+    op.execute("ALTER TABLE agent_runs DROP COLUMN next_attempt_at")
+    op.execute("ALTER TABLE agent_runs DROP COLUMN attempts")
+    op.execute("ALTER TABLE agent_runs DROP COLUMN payload_json")
@@ -0,0 +1,43 @@
+"""Webhook deduplication: delivery ids, coalesced events, one queued run per issue
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "004"
+down_revision: Union[str, None] = "003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        op.execute("ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS coalesced_events INTEGER NOT NULL DEFAULT 0")
+    else:
+        # SQLite
+        op.execute("ALTER TABLE agent_runs ADD COLUMN coalesced_events INTEGER NOT NULL DEFAULT 0")
+
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_agent_runs_queued_issue
+            ON agent_runs (repo, issue_number) WHERE status = 'queued'
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS webhook_deliveries (
+            delivery_id TEXT PRIMARY KEY,
+            received_at TEXT NOT NULL
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS webhook_deliveries")
+    op.execute("DROP INDEX IF EXISTS idx_agent_runs_queued_issue")
+    op.execute("ALTER TABLE agent_runs DROP COLUMN coalesced_events")
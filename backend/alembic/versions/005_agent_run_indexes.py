@@ -0,0 +1,41 @@
+"""Indexes for agent_runs admin filters, keyset pagination and queue claims
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "005"
+down_revision: Union[str, None] = "004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS idx_agent_runs_status_id ON agent_runs (status, id)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_agent_runs_repo_issue_id"
+        " ON agent_runs (repo, issue_number, id)"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS idx_agent_runs_started_at ON agent_runs (started_at)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_agent_runs_category_status"
+        " ON agent_runs (category, status)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_agent_runs_queue"
+        " ON agent_runs (next_attempt_at, id) WHERE status = 'queued'"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_agent_runs_queue")
+    op.execute("DROP INDEX IF EXISTS idx_agent_runs_category_status")
+    op.execute("DROP INDEX IF EXISTS idx_agent_runs_started_at")
+    op.execute("DROP INDEX IF EXISTS idx_agent_runs_repo_issue_id")
+    op.execute("DROP INDEX IF EXISTS idx_agent_runs_status_id")
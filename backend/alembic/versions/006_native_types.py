@@ -0,0 +1,148 @@
+"""Native column types: TIMESTAMPTZ/JSONB on Postgres, epoch INTEGER on SQLite
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "006"
+down_revision: Union[str, None] = "005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TIMESTAMP_COLUMNS = {
+    "users": ("created_at", "updated_at"),
+    "agent_runs": ("started_at", "finished_at", "next_attempt_at", "locked_at"),
+    "webhook_deliveries": ("received_at",),
+}
+JSON_COLUMNS = {
+    "user_config": ("config_json",),
+    "global_config": ("config_json",),
+    "agent_runs": ("payload_json",),
+}
+
+# SQLite: epoch UTC em milissegundos
+_TO_EPOCH = "CAST(ROUND((julianday({col}) - 2440587.5) * 86400000) AS INTEGER)"
+_FROM_EPOCH = "strftime('%Y-%m-%dT%H:%M:%f+00:00', {col} / 1000.0, 'unixepoch')"
+
+_SQLITE_TABLES = {
+    "users": """
+        CREATE TABLE users_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            hashed_password TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            is_active INTEGER NOT NULL DEFAULT 1,
+            created_at {ts} NOT NULL,
+            updated_at {ts} NOT NULL
+        )
+    """,
+    "agent_runs": """
+        CREATE TABLE agent_runs_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            repo TEXT NOT NULL,
+            issue_number INTEGER NOT NULL,
+            issue_title TEXT NOT NULL,
+            action TEXT NOT NULL,
+            category TEXT,
+            status TEXT NOT NULL DEFAULT 'processing',
+            tool_steps INTEGER NOT NULL DEFAULT 0,
+            error_message TEXT,
+            started_at {ts} NOT NULL,
+            finished_at {ts},
+            payload_json TEXT NOT NULL DEFAULT '{{}}',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at {ts},
+            locked_at {ts},
+            coalesced_events INTEGER NOT NULL DEFAULT 0
+        )
+    """,
+    "webhook_deliveries": """
+        CREATE TABLE webhook_deliveries_new (
+            delivery_id TEXT PRIMARY KEY,
+            received_at {ts} NOT NULL
+        )
+    """,
+}
+
+# Indices de agent_runs (004-005), perdidos ao recriar a tabela no SQLite
+_SQLITE_AGENT_RUN_INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_agent_runs_queued_issue"
+    " ON agent_runs (repo, issue_number) WHERE status = 'queued'",
+    "CREATE INDEX IF NOT EXISTS idx_agent_runs_status_id ON agent_runs (status, id)",
+    "CREATE INDEX IF NOT EXISTS idx_agent_runs_repo_issue_id"
+    " ON agent_runs (repo, issue_number, id)",
+    "CREATE INDEX IF NOT EXISTS idx_agent_runs_started_at ON agent_runs (started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_agent_runs_category_status"
+    " ON agent_runs (category, status)",
+    "CREATE INDEX IF NOT EXISTS idx_agent_runs_queue"
+    " ON agent_runs (next_attempt_at, id) WHERE status = 'queued'",
+)
+
+
+def _rebuild_sqlite(column_type: str, convert: str) -> None:
+    """Recria as tabelas com datas no tipo dado (SQLite nao altera tipo)."""
+    bind = op.get_bind()
+    for table, ddl in _SQLITE_TABLES.items():
+        names = [row[1] for row in bind.exec_driver_sql(f"PRAGMA table_info({table})")]
+        select = ", ".join(
+            convert.format(col=name) if name in TIMESTAMP_COLUMNS[table] else name
+            for name in names
+        )
+        op.execute(ddl.format(ts=column_type))
+        op.execute(
+            f"INSERT INTO {table}_new ({', '.join(names)}) SELECT {select} FROM {table}"
+        )
+        op.execute(f"DROP TABLE {table}")
+        op.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    for index_sql in _SQLITE_AGENT_RUN_INDEXES:
+        op.execute(index_sql)
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        for table, columns in TIMESTAMP_COLUMNS.items():
+            for col in columns:
+                op.execute(
+                    f"ALTER TABLE {table} ALTER COLUMN {col} TYPE TIMESTAMPTZ"
+                    f" USING {col}::timestamptz"
+                )
+        for table, columns in JSON_COLUMNS.items():
+            for col in columns:
+                op.execute(f"ALTER TABLE {table} ALTER COLUMN {col} DROP DEFAULT")
+                op.execute(
+                    f"ALTER TABLE {table} ALTER COLUMN {col} TYPE JSONB USING {col}::jsonb"
+                )
+                op.execute(f"ALTER TABLE {table} ALTER COLUMN {col} SET DEFAULT '{{}}'::jsonb")
+    else:
+        # SQLite: datas viram epoch em milissegundos; sem JSONB nativo,
+        # config_json/payload_json continuam TEXT
+        _rebuild_sqlite("INTEGER", _TO_EPOCH)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        for table, columns in JSON_COLUMNS.items():
+            for col in columns:
+                op.execute(f"ALTER TABLE {table} ALTER COLUMN {col} DROP DEFAULT")
+                op.execute(f"ALTER TABLE {table} ALTER COLUMN {col} TYPE TEXT USING {col}::text")
+                op.execute(f"ALTER TABLE {table} ALTER COLUMN {col} SET DEFAULT '{{}}'")
+        for table, columns in TIMESTAMP_COLUMNS.items():
+            for col in columns:
+                op.execute(
+                    f"ALTER TABLE {table} ALTER COLUMN {col} TYPE TEXT"
+                    f" USING to_char({col} AT TIME ZONE 'UTC',"
+                    f" 'YYYY-MM-DD\"T\"HH24:MI:SS.US\"+00:00\"')"
+                )
+    else:
+        _rebuild_sqlite("TEXT", _FROM_EPOCH)
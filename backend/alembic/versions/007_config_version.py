@@ -0,0 +1,33 @@
+"""Config version counter used by SQLite to invalidate config caches
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "007"
+down_revision: Union[str, None] = "006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Postgres notifica mudancas via LISTEN/NOTIFY e nao usa a tabela
+    if op.get_bind().dialect.name == "postgresql":
+        return
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS config_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    op.execute("INSERT OR IGNORE INTO config_version (id, version) VALUES (1, 0)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS config_version")
@@ -0,0 +1,71 @@
+"""Token and latency accounting: chat_turns table and agent_runs usage columns
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "008"
+down_revision: Union[str, None] = "007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+AGENT_RUN_USAGE_COLUMNS = (
+    "model_calls", "input_tokens", "cached_input_tokens", "output_tokens",
+    "assistant_ms", "tools_ms",
+)
+
+_CHAT_TURNS_SQL = """
+    CREATE TABLE IF NOT EXISTS chat_turns (
+        id {pk},
+        thread_id TEXT NOT NULL,
+        user_id INTEGER,
+        channel TEXT NOT NULL,
+        status TEXT NOT NULL,
+        model_calls INTEGER NOT NULL DEFAULT 0,
+        tool_calls INTEGER NOT NULL DEFAULT 0,
+        cache_hits INTEGER NOT NULL DEFAULT 0,
+        input_tokens INTEGER NOT NULL DEFAULT 0,
+        cached_input_tokens INTEGER NOT NULL DEFAULT 0,
+        output_tokens INTEGER NOT NULL DEFAULT 0,
+        ttft_ms INTEGER,
+        assistant_ms INTEGER NOT NULL DEFAULT 0,
+        tools_ms INTEGER NOT NULL DEFAULT 0,
+        duration_ms INTEGER,
+        created_at {ts} NOT NULL
+    )
+"""
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        for column in AGENT_RUN_USAGE_COLUMNS:
+            op.execute(
+                f"ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS {column}"
+                " INTEGER NOT NULL DEFAULT 0"
+            )
+        op.execute(_CHAT_TURNS_SQL.format(pk="BIGSERIAL PRIMARY KEY", ts="TIMESTAMPTZ"))
+    else:
+        # SQLite (sem IF NOT EXISTS em ADD COLUMN); datas em epoch ms
+        for column in AGENT_RUN_USAGE_COLUMNS:
+            op.execute(
+                f"ALTER TABLE agent_runs ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+            )
+        op.execute(_CHAT_TURNS_SQL.format(pk="INTEGER PRIMARY KEY AUTOINCREMENT", ts="INTEGER"))
+
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_turns_created_at ON chat_turns (created_at)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_turns_thread_id ON chat_turns (thread_id, id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_turns_user_id ON chat_turns (user_id, id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS chat_turns")
+    for column in reversed(AGENT_RUN_USAGE_COLUMNS):
+        op.execute(f"ALTER TABLE agent_runs DROP COLUMN {column}")
@@ -0,0 +1,32 @@
+"""Agent run claim time: duration stats measured from the worker claim
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "009"
+down_revision: Union[str, None] = "008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        op.execute("ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ")
+    else:
+        # SQLite: datas em epoch ms
+        op.execute("ALTER TABLE agent_runs ADD COLUMN claimed_at INTEGER")
+    # Runs antigos ficam sem claimed_at (e sem duracao nas stats): started_at
+    # inclui debounce e fila, e o claim anterior nao foi registrado
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE agent_runs DROP COLUMN claimed_at")
@@ -0,0 +1,52 @@
+"""Benchmark do custo de setup por evento do agente GitHub.
+
+Compara o caminho antigo (``build_github_graph`` a cada webhook, criando
+dois ChatOpenAI, bind das tools e compilacao do grafo) com o grafo em
+cache (``graph_cache.get_github_graph``). Nao chama a API da OpenAI:
+mede apenas a construcao.
+
+Uso:
+    python benchmarks/github_graph_setup.py [eventos]
+"""
+
+import os
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from jarvis.graph import build_github_graph  # noqa: E402
+from jarvis.graph_cache import cache_clear, get_github_graph  # noqa: E402
+from jarvis.nodes.classifier import build_classifier_model  # noqa: E402
+from jarvis.prompts import GITHUB_AGENT_PROMPT  # noqa: E402
+
+
+def _per_event_before(events: int) -> float:
+    start = time.perf_counter()
+    for _ in range(events):
+        build_github_graph("gpt-4.1-mini", GITHUB_AGENT_PROMPT, 15)
+        # classify_issue criava mais um cliente a cada classificacao
+        build_classifier_model("gpt-4.1-mini")
+    return (time.perf_counter() - start) / events
+
+
+def _per_event_after(events: int) -> float:
+    cache_clear()
+    start = time.perf_counter()
+    for _ in range(events):
+        get_github_graph("gpt-4.1-mini", GITHUB_AGENT_PROMPT, 15)
+    return (time.perf_counter() - start) / events
+
+
+def main() -> None:
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    before = _per_event_before(events)
+    after = _per_event_after(events)
+    print(f"eventos: {events}")
+    print(f"antes  (grafo por evento): {before * 1000:8.3f} ms/evento")
+    print(f"depois (grafo em cache):   {after * 1000:8.3f} ms/evento")
+    print(f"reducao: {before / after:,.0f}x" if after else "reducao: n/a")
+
+
+if __name__ == "__main__":
+    main()
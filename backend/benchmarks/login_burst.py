@@ -0,0 +1,105 @@
+"""Load test: latencia de tokens do stream durante um burst de logins.
+
+Um stream de chat (``stream_chat`` com grafo fake emitindo um token a cada
+10ms) roda enquanto N logins com senha correta chegam ao mesmo tempo em
+``/auth/login``. Compara bcrypt no event loop (comportamento antigo) com
+bcrypt no pool de threads (``verify_password_async``) e reporta o maior
+intervalo entre tokens observado pelo cliente do stream.
+
+Uso:
+    python benchmarks/login_burst.py [logins]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import patch
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+from langchain_core.messages import AIMessageChunk  # noqa: E402
+
+from jarvis import auth, db  # noqa: E402
+from jarvis.api import app  # noqa: E402
+from jarvis.chat import stream_chat  # noqa: E402
+from jarvis.config import Settings  # noqa: E402
+
+TOKEN_INTERVAL = 0.01
+
+
+class TickingGraph:
+    """Grafo fake que emite um token a cada TOKEN_INTERVAL ate ser parado."""
+
+    def __init__(self, stop: asyncio.Event):
+        self.stop = stop
+
+    async def astream(self, state, config=None, stream_mode=None):
+        while not self.stop.is_set():
+            await asyncio.sleep(TOKEN_INTERVAL)
+            yield AIMessageChunk(content="x"), {"langgraph_node": "assistant"}
+
+
+async def _blocking_verify(plain: str, hashed: str) -> bool:
+    return auth.verify_password(plain, hashed)
+
+
+async def _measure(logins: int) -> tuple[float, float]:
+    stop = asyncio.Event()
+    gaps: list[float] = []
+
+    async def consume_stream():
+        last = time.perf_counter()
+        async for _ in stream_chat(TickingGraph(stop), "oi", 5, "bench"):
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    stream_task = asyncio.create_task(consume_stream())
+    await asyncio.sleep(0.1)
+
+    start = time.perf_counter()
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://bench"
+    ) as client:
+        responses = await asyncio.gather(*(
+            client.post("/auth/login", json={"username": "bench", "password": "senha"})
+            for _ in range(logins)
+        ))
+    elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+
+    stop.set()
+    await stream_task
+    return max(gaps), elapsed
+
+
+async def main() -> None:
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    conn = await db.init_db(":memory:")
+    await db.create_user(conn, "bench", "bench@local", "senha")
+    app.state.settings = Settings(
+        system_prompt="", model_name="bench", history_window=3,
+        max_tool_steps=5, db_path=":memory:", session_id="bench",
+        persist_memory=False,
+    )
+    app.state.auth_db = conn
+    app.state.db_module = db
+
+    with patch("jarvis.api.verify_password_async", _blocking_verify):
+        before_gap, before_total = await _measure(logins)
+    after_gap, after_total = await _measure(logins)
+    await conn.close()
+    auth.shutdown_hash_pool()
+
+    print(f"logins simultaneos: {logins} (token a cada {TOKEN_INTERVAL * 1000:.0f}ms)")
+    print(f"antes  (bcrypt no loop): maior gap entre tokens {before_gap * 1000:8.1f} ms"
+          f" | burst {before_total:.2f}s")
+    print(f"depois (pool de threads): maior gap entre tokens {after_gap * 1000:8.1f} ms"
+          f" | burst {after_total:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
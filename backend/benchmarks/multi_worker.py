@@ -0,0 +1,110 @@
+"""Load test: throughput da API com 1 e N workers uvicorn.
+
+Sobe ``uvicorn jarvis.api:app --workers N`` com auth DB e memoria em
+arquivo (compartilhados entre os processos), faz login uma vez e dispara
+``GET /auth/me`` (JWT + cache de usuario + JSON, CPU-bound em Python)
+com concorrencia fixa por alguns segundos. O gerador de carga roda na
+mesma maquina: o ganho esperado e proximo de min(N, nucleos - 1).
+
+Uso:
+    python benchmarks/multi_worker.py [workers] [segundos] [concorrencia]
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(workers: int, port: int, tmp: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark"),
+        "DATABASE_URL": "",
+        "JARVIS_AUTH_DB_PATH": os.path.join(tmp, "auth.db"),
+        "JARVIS_DB_PATH": os.path.join(tmp, "memory.db"),
+        "JARVIS_ADMIN_USERNAME": "bench",
+        "JARVIS_ADMIN_PASSWORD": "senha",
+        "JARVIS_WORKER_EMBEDDED": "false",
+        "JARVIS_LOGIN_RATE_LIMIT": "0",
+        "JARVIS_JWT_SECRET": "benchmark-secret-with-32-bytes-or-more",
+        "JARVIS_WORKERS": str(workers),
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "jarvis.api:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+
+
+async def _wait_ready(client: httpx.AsyncClient) -> str:
+    for _ in range(200):
+        try:
+            resp = await client.post(
+                "/auth/login", json={"username": "bench", "password": "senha"},
+            )
+            if resp.status_code == 200:
+                return resp.json()["access_token"]
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("servidor nao subiu")
+
+
+async def _load(base_url: str, seconds: float, concurrency: int) -> float:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        token = await _wait_ready(client)
+        headers = {"Authorization": f"Bearer {token}"}
+        done = 0
+        deadline = time.perf_counter() + seconds
+
+        async def user():
+            nonlocal done
+            while time.perf_counter() < deadline:
+                resp = await client.get("/auth/me", headers=headers)
+                assert resp.status_code == 200
+                done += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        return done / (time.perf_counter() - start)
+
+
+def _run(workers: int, seconds: float, concurrency: int) -> float:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        server = _start_server(workers, port, tmp)
+        try:
+            return asyncio.run(_load(f"http://127.0.0.1:{port}", seconds, concurrency))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def main() -> None:
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 2
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+
+    print(f"nucleos: {os.cpu_count()}, concorrencia: {concurrency}, {seconds:.0f}s por rodada")
+    baseline = _run(1, seconds, concurrency)
+    print(f"1 worker : {baseline:8,.0f} req/s")
+    if workers > 1:
+        scaled = _run(workers, seconds, concurrency)
+        print(f"{workers} workers: {scaled:8,.0f} req/s  ({scaled / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
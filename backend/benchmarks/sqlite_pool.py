@@ -0,0 +1,99 @@
+"""Benchmark de concorrencia do banco de auth SQLite.
+
+Simula carga de requests autenticados: ``get_user_by_id`` (deps / ws)
+e ``get_user_by_username`` (login) concorrentes, com um fluxo de escritas
+de agent runs ao fundo. Compara a conexao unica antiga (journal padrao,
+sem pragmas) com o ``SqlitePool`` (WAL, writer dedicado + readers).
+
+Uso:
+    python benchmarks/sqlite_pool.py [requests] [concorrencia]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import aiosqlite
+
+from jarvis import db
+from jarvis.sqlite_pool import SqlitePool
+
+
+async def _single_connection(path: str) -> SqlitePool:
+    """Comportamento antigo: uma aiosqlite.Connection para tudo."""
+    pool = SqlitePool(await aiosqlite.connect(path), [])
+    async with pool.write() as conn:
+        await conn.executescript(db.SCHEMA_SQL)
+        await conn.execute(db._QUEUED_ISSUE_INDEX_SQL)
+    return pool
+
+
+async def _seed(pool: SqlitePool, users: int) -> list[int]:
+    ids = []
+    for i in range(users):
+        user = await db.create_user(pool, f"user{i}", f"user{i}@bench", "senha")
+        ids.append(user["id"])
+    return ids
+
+
+async def _load(pool: SqlitePool, user_ids: list[int], requests: int, concurrency: int):
+    latencies: list[float] = []
+    slots = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    writes = 0
+
+    async def writer():
+        nonlocal writes
+        while not stop.is_set():
+            run = await db.create_agent_run(pool, "bench/repo", writes, "t", "opened")
+            await db.update_agent_run(pool, run["id"], status="completed")
+            writes += 2
+
+    async def request(i: int):
+        async with slots:
+            start = time.perf_counter()
+            user_id = user_ids[i % len(user_ids)]
+            if i % 10 == 0:
+                await db.get_user_by_username(pool, f"user{user_id - 1}")
+            else:
+                await db.get_user_by_id(pool, user_id)
+            latencies.append(time.perf_counter() - start)
+
+    writer_task = asyncio.create_task(writer())
+    start = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await writer_task
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    return requests / elapsed, p99, writes / elapsed
+
+
+async def _run(label: str, pool: SqlitePool, requests: int, concurrency: int):
+    user_ids = await _seed(pool, 50)
+    throughput, p99, writes = await _load(pool, user_ids, requests, concurrency)
+    await pool.close()
+    print(
+        f"{label:<24} {throughput:8,.0f} leituras/s  p99 {p99 * 1000:6.2f} ms"
+        f"  | {writes:6,.0f} escritas/s"
+    )
+
+
+async def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"requests: {requests}, concorrencia: {concurrency}")
+        before = await _single_connection(os.path.join(tmp, "single.db"))
+        await _run("antes  (conexao unica)", before, requests, concurrency)
+        after = await db.init_db(os.path.join(tmp, "pool.db"))
+        await _run("depois (WAL + pool)", after, requests, concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
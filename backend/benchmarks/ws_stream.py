@@ -0,0 +1,74 @@
+"""Benchmark: CPU do servidor por resposta streamada no WebSocket.
+
+Compara o envio antigo (``send_json`` por token) com ``stream_to_websocket``
+(tokens agrupados em frames, encoder rapido). O WebSocket fake reproduz o
+trabalho por frame do servidor: serializacao JSON (como o Starlette faz em
+``send_json``), encode UTF-8 e montagem do frame (``websockets``).
+
+Uso:
+    python benchmarks/ws_stream.py [respostas] [tokens_por_resposta]
+"""
+
+import asyncio
+import json
+import sys
+import time
+
+from websockets.frames import Frame, Opcode
+
+from jarvis.ws_stream import stream_to_websocket
+
+TOKENS = ["Ola", ",", " tudo", " bem", "?", " Aqui", " esta", " a", " resposta", "."]
+
+
+class FrameCountingWebSocket:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def send_text(self, text: str) -> None:
+        frame = Frame(Opcode.TEXT, text.encode()).serialize(mask=False, extensions=[])
+        self.frames += 1
+        self.bytes += len(frame)
+
+    async def send_json(self, data) -> None:
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+
+async def _events(tokens: int):
+    for i in range(tokens):
+        yield {"type": "token", "content": TOKENS[i % len(TOKENS)]}
+
+
+async def _before(ws, tokens: int) -> None:
+    async for event in _events(tokens):
+        await ws.send_json(event)
+    await ws.send_json({"type": "end"})
+
+
+async def _after(ws, tokens: int) -> None:
+    await stream_to_websocket(ws, _events(tokens))
+
+
+async def _measure(label: str, send, responses: int, tokens: int) -> None:
+    ws = FrameCountingWebSocket()
+    start = time.process_time()
+    for _ in range(responses):
+        await send(ws, tokens)
+    cpu = time.process_time() - start
+    print(
+        f"{label:<28} {cpu / responses * 1000:7.2f} ms CPU/resposta"
+        f"  {ws.frames / responses:7.1f} frames/resposta  {ws.bytes / responses:8,.0f} bytes"
+    )
+
+
+async def main() -> None:
+    responses = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    print(f"respostas: {responses}, tokens por resposta: {tokens}")
+    await _measure("antes  (frame por token)", _before, responses, tokens)
+    await _measure("depois (coalescing)", _after, responses, tokens)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,5 +7,11 @@ if [ -n "$DATABASE_URL" ]; then
   cd /app/backend && alembic upgrade head
 fi
 
+# `entrypoint.sh worker`: processo do worker da fila de agent runs
+if [ "$1" = "worker" ]; then
+  exec jarvis-worker
+fi
+
 # Sobe uvicorn
-exec uvicorn jarvis.api:app --host 0.0.0.0 --port "${JARVIS_PORT:-8000}"
+exec uvicorn jarvis.api:app --host 0.0.0.0 --port "${JARVIS_PORT:-8000}" \
+  --workers "${JARVIS_WORKERS:-1}"
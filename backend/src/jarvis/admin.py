@@ -1,15 +1,33 @@
-"""Router admin para CRUD de usuarios, config, logs e agent runs."""
+"""Router admin para CRUD de usuarios, config, logs, agent runs e metricas."""
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from datetime import datetime, timezone
 
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+
+from .config_cache import (
+    get_global_config_cached,
+    get_user_config_cached,
+    set_global_config_cached,
+    set_user_config_cached,
+)
 from .db_factory import get_integrity_error
 from .deps import get_admin_user
+from .graph_cache import build_chat_graph, chat_graph_key
 from .logs import get_thread_messages, list_threads
+from .model_router import route_stats
 from .schemas import (
     AgentRunListResponse,
     AgentRunResponse,
+    AgentRunStats,
+    AgentRunStatsResponse,
+    ChatTurnListResponse,
+    ChatTurnResponse,
+    ChatTurnStats,
+    ChatTurnStatsResponse,
     ConfigResponse,
     ConfigUpdate,
+    ModelRouteStats,
+    ModelRouteStatsResponse,
     PasswordUpdate,
     ThreadListResponse,
     ThreadSummary,
@@ -21,6 +39,7 @@ from .schemas import (
     UserUpdate,
 )
 from .tools import ALL_TOOLS
+from .user_cache import invalidate_user
 
 router = APIRouter(prefix="/admin", dependencies=[Depends(get_admin_user)])
 
@@ -97,6 +116,7 @@ async def admin_update_user(user_id: int, body: UserUpdate, request: Request):
         role=body.role,
         is_active=body.is_active,
     )
+    await invalidate_user(request.app.state, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -110,6 +130,7 @@ async def admin_delete_user(user_id: int, request: Request):
     """Remove um usuario."""
     db = _db(request)
     deleted = await db.delete_user(_conn(request), user_id)
+    await invalidate_user(request.app.state, user_id)
     if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -122,6 +143,7 @@ async def admin_update_password(user_id: int, body: PasswordUpdate, request: Req
     """Atualiza senha de um usuario."""
     db = _db(request)
     updated = await db.update_user_password(_conn(request), user_id, body.password)
+    await invalidate_user(request.app.state, user_id)
     if not updated:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -135,19 +157,18 @@ async def admin_update_password(user_id: int, body: PasswordUpdate, request: Req
 @router.get("/config", response_model=ConfigResponse)
 async def admin_get_global_config(request: Request):
     """Retorna config global."""
-    db = _db(request)
-    config = await db.get_global_config(_conn(request))
+    config = await get_global_config_cached(request.app.state)
     return ConfigResponse(**config)
 
 
 @router.put("/config", response_model=ConfigResponse)
 async def admin_set_global_config(body: ConfigUpdate, request: Request):
     """Atualiza config global (merge com existente)."""
-    db = _db(request)
     updates = body.model_dump(exclude_none=True)
     if updates:
-        await db.set_global_config(_conn(request), updates)
-    config = await db.get_global_config(_conn(request))
+        config = await set_global_config_cached(request.app.state, updates)
+    else:
+        config = await get_global_config_cached(request.app.state)
     return ConfigResponse(**config)
 
 
@@ -161,7 +182,7 @@ async def admin_get_user_config(user_id: int, request: Request):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuario nao encontrado.",
         )
-    config = await db.get_user_config(_conn(request), user_id)
+    config = await get_user_config_cached(request.app.state, user_id)
     return ConfigResponse(**config)
 
 
@@ -177,8 +198,9 @@ async def admin_set_user_config(user_id: int, body: ConfigUpdate, request: Reque
         )
     updates = body.model_dump(exclude_none=True)
     if updates:
-        await db.set_user_config(_conn(request), user_id, updates)
-    config = await db.get_user_config(_conn(request), user_id)
+        config = await set_user_config_cached(request.app.state, user_id, updates)
+    else:
+        config = await get_user_config_cached(request.app.state, user_id)
     return ConfigResponse(**config)
 
 
@@ -231,21 +253,57 @@ async def admin_get_thread_messages(thread_id: str, request: Request):
 @router.get("/agent-runs", response_model=AgentRunListResponse)
 async def admin_list_agent_runs(
     request: Request,
-    limit: int = 50,
-    offset: int = 0,
-    status_filter: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    status_filter: str | None = Query(None, alias="status"),
+    repo: str | None = None,
+    issue_number: int | None = None,
+    started_after: datetime | None = None,
+    started_before: datetime | None = None,
+    before_id: int | None = None,
 ):
-    """Lista execucoes do agente GitHub."""
+    """Lista execucoes do agente GitHub.
+
+    Para paginar tabelas grandes, passe ``before_id=next_before_id`` da
+    pagina anterior em vez de offset.
+    """
     db = _db(request)
     runs, total = await db.list_agent_runs(
-        _conn(request), limit=limit, offset=offset, status=status_filter,
+        _conn(request),
+        limit=limit,
+        offset=offset,
+        status=status_filter,
+        repo=repo,
+        issue_number=issue_number,
+        started_after=started_after,
+        started_before=started_before,
+        before_id=before_id,
     )
     return AgentRunListResponse(
         runs=[AgentRunResponse(**r) for r in runs],
         total=total,
+        next_before_id=runs[-1]["id"] if len(runs) == limit else None,
     )
 
 
+@router.get("/agent-runs/stats", response_model=AgentRunStatsResponse)
+async def admin_agent_run_stats(
+    request: Request,
+    repo: str | None = None,
+    started_after: datetime | None = None,
+    started_before: datetime | None = None,
+):
+    """Contagem e duracao (media, p50, p95) por categoria e status."""
+    db = _db(request)
+    stats = await db.agent_run_stats(
+        _conn(request),
+        repo=repo,
+        started_after=started_after,
+        started_before=started_before,
+    )
+    return AgentRunStatsResponse(stats=[AgentRunStats(**s) for s in stats])
+
+
 @router.get("/agent-runs/{run_id}", response_model=AgentRunResponse)
 async def admin_get_agent_run(run_id: int, request: Request):
     """Retorna detalhes de uma execucao do agente."""
@@ -259,14 +317,116 @@ async def admin_get_agent_run(run_id: int, request: Request):
     return AgentRunResponse(**run)
 
 
+@router.post("/agent-runs/{run_id}/retry", response_model=AgentRunResponse)
+async def admin_retry_agent_run(run_id: int, request: Request):
+    """Devolve um run com falha para a fila.
+
+    Com checkpointer ativo, o run retoma do ultimo passo concluido do grafo.
+    """
+    db = _db(request)
+    conn = _conn(request)
+    integrity_error = get_integrity_error(request.app.state.settings)
+
+    try:
+        run = await db.update_agent_run(
+            conn, run_id,
+            expected_status="failed",
+            status="queued",
+            attempts=0,
+            next_attempt_at=datetime.now(timezone.utc).isoformat(),
+            finished_at=None,
+            locked_at=None,
+        )
+    except integrity_error:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ja existe um run na fila para esta issue.",
+        )
+
+    if run is None:
+        if await db.get_agent_run(conn, run_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Agent run nao encontrado.",
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Apenas runs com falha podem ser reprocessados.",
+        )
+
+    worker = getattr(request.app.state, "agent_worker", None)
+    if worker is not None:
+        worker.notify()
+    return AgentRunResponse(**run)
+
+
+# --- Chat turns ---
+
+
+@router.get("/chat-turns", response_model=ChatTurnListResponse)
+async def admin_list_chat_turns(
+    request: Request,
+    limit: int = Query(default=50, ge=1, le=200),
+    offset: int = Query(default=0, ge=0),
+    user_id: int | None = None,
+    thread_id: str | None = None,
+    started_after: datetime | None = None,
+    started_before: datetime | None = None,
+    slowest: bool = False,
+):
+    """Turnos do chat com tokens e tempos (mais recentes ou mais lentos)."""
+    db = _db(request)
+    turns, total = await db.list_chat_turns(
+        _conn(request),
+        limit=limit,
+        offset=offset,
+        user_id=user_id,
+        thread_id=thread_id,
+        started_after=started_after,
+        started_before=started_before,
+        slowest=slowest,
+    )
+    return ChatTurnListResponse(
+        turns=[ChatTurnResponse(**t) for t in turns], total=total,
+    )
+
+
+@router.get("/chat-turns/stats", response_model=ChatTurnStatsResponse)
+async def admin_chat_turn_stats(
+    request: Request,
+    user_id: int | None = None,
+    started_after: datetime | None = None,
+    started_before: datetime | None = None,
+):
+    """Duracao, time-to-first-token e tokens por canal e status."""
+    db = _db(request)
+    stats = await db.chat_turn_stats(
+        _conn(request),
+        user_id=user_id,
+        started_after=started_after,
+        started_before=started_before,
+    )
+    return ChatTurnStatsResponse(stats=[ChatTurnStats(**s) for s in stats])
+
+
+# --- Model routing ---
+
+
+@router.get("/model-routes", response_model=ModelRouteStatsResponse)
+async def admin_model_route_stats():
+    """Chamadas, tokens e latencia por rota de modelo (deste worker)."""
+    return ModelRouteStatsResponse(
+        routes=[ModelRouteStats(**r) for r in route_stats.snapshot()],
+    )
+
+
 # --- Tools ---
 
 
 @router.get("/tools", response_model=ToolsResponse)
 async def admin_list_tools(request: Request):
     """Lista todas as ferramentas com status habilitado/desabilitado."""
-    db = _db(request)
-    config = await db.get_global_config(_conn(request))
+    config = await get_global_config_cached(request.app.state)
     disabled = config.get("disabled_tools", [])
 
     tools = [
@@ -283,9 +443,6 @@ async def admin_list_tools(request: Request):
 @router.put("/tools", response_model=ToolsResponse)
 async def admin_update_tools(body: ToolsUpdate, request: Request):
     """Atualiza lista de ferramentas desabilitadas."""
-    db = _db(request)
-    conn = _conn(request)
-
     # Validar que todos os nomes existem
     valid_names = {t.name for t in ALL_TOOLS}
     invalid = [n for n in body.disabled_tools if n not in valid_names]
@@ -295,23 +452,20 @@ async def admin_update_tools(body: ToolsUpdate, request: Request):
             detail=f"Ferramentas desconhecidas: {', '.join(invalid)}",
         )
 
-    await db.set_global_config(conn, {"disabled_tools": body.disabled_tools})
+    config = await set_global_config_cached(
+        request.app.state, {"disabled_tools": body.disabled_tools},
+    )
 
-    # Rebuild graph com tools atualizadas
-    from .graph import build_graph
+    # Rebuild graph com tools atualizadas (outros workers reconstroem ao
+    # receber a notificacao de mudanca de config)
     settings = request.app.state.settings
-    config = await db.get_global_config(conn)
     disabled = config.get("disabled_tools", [])
-    enabled_tools = [t for t in ALL_TOOLS if t.name not in disabled]
-
-    graph = build_graph(
-        model_name=config.get("model_name") or settings.model_name,
-        system_prompt=config.get("system_prompt") or settings.system_prompt,
-        history_window=config.get("history_window") or settings.history_window,
-        checkpointer=request.app.state.checkpointer,
-        tools=enabled_tools,
+    request.app.state.graph = build_chat_graph(
+        settings, config, request.app.state.checkpointer,
+        memory=getattr(request.app.state, "memory", None),
+        semantic_cache=getattr(request.app.state, "semantic_cache", None),
     )
-    request.app.state.graph = graph
+    request.app.state.graph_key = chat_graph_key(settings, config)
 
     tools = [
         ToolInfo(
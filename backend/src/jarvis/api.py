@@ -1,29 +1,66 @@
+import asyncio
+import hmac
+import logging
+import math
 import os
 from contextlib import asynccontextmanager
 
 import jwt as pyjwt
 import uvicorn
-from fastapi import Depends, FastAPI, Query, WebSocket, WebSocketDisconnect
+from fastapi import (
+    Depends, FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect,
+)
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 from .admin import router as admin_router
 from .webhook import router as webhook_router
 from .auth import (
+    configure_hash_pool,
     create_access_token,
     create_refresh_token,
     decode_token,
-    verify_password,
+    shutdown_hash_pool,
+    verify_password_async,
 )
 from .chat import invoke_chat, stream_chat
 from .checkpoint import create_checkpointer
 from .config import load_settings
+from .config_cache import GLOBAL_SCOPE, ConfigCache, get_global_config_cached
 from .db_factory import create_auth_db, get_db_module
 from .deps import get_current_active_user
-from .graph import build_graph
+from .graph_cache import build_chat_graph, chat_graph_key
 from .logs import get_thread_messages, list_threads
+from .memory import create_memory
+from .metrics import (
+    AGENT_RUNS,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    REGISTRY,
+    WS_CONNECTIONS,
+    MetricsMiddleware,
+    register_db_pool,
+)
+from .ratelimit import create_login_limiter
 from .schemas import LoginRequest, MeResponse, RefreshRequest, TokenResponse
-from .tools import ALL_TOOLS
+from .semantic_cache import create_semantic_cache
+from .sse import SSE_HEADERS, SseStreamRegistry, parse_last_event_id, sse_response_body
+from .thread_lock import ThreadBusy, create_thread_locks, hold_thread, locked_events
+from .tracing import configure_tracing, shutdown_tracing, start_trace, trace, traced_events
+from .turn_metrics import (
+    CHANNEL_CHAT,
+    CHANNEL_STREAM,
+    CHANNEL_WS,
+    STATUS_COMPLETED,
+    STATUS_ERROR,
+    TurnMetrics,
+    record_turn,
+    recorded_events,
+)
+from .user_cache import create_user_cache, get_user_cached
+from .worker import create_worker
+from .write_buffer import ChatTurnBuffer
+from .ws_stream import StreamMultiplexer
 
 
 class ChatRequest(BaseModel):
@@ -36,13 +73,95 @@ class ChatResponse(BaseModel):
     thread_id: str
 
 
+logger = logging.getLogger(__name__)
+
+
+def _warn_unshared_state(settings) -> None:
+    """Com varios workers, estado em memoria nao e visto pelos outros processos."""
+    if settings.workers <= 1:
+        return
+    if not settings.database_url and settings.auth_db_path == ":memory:":
+        logger.warning("JARVIS_WORKERS > 1 com auth DB em memoria: cada worker tera seus usuarios")
+    if not settings.database_url and not settings.persist_memory:
+        logger.warning(
+            "JARVIS_WORKERS > 1 sem JARVIS_PERSIST_MEMORY: conversas ficam presas ao worker"
+        )
+    if not settings.config_cache:
+        logger.warning(
+            "JARVIS_WORKERS > 1 sem JARVIS_CONFIG_CACHE: mudancas de tools nao"
+            " reconstroem o grafo dos outros workers"
+        )
+    if not settings.redis_url:
+        logger.warning(
+            "JARVIS_WORKERS > 1 sem REDIS_URL: limite de login e cache de usuarios"
+            " sao por worker (usuario desativado segue valido ate o TTL nos outros)"
+        )
+
+
+def _rebuild_graph_on_config_change(app: FastAPI) -> None:
+    """Reconstroi o grafo quando outro processo altera a config global."""
+    pending: set[asyncio.Task] = set()
+
+    async def refresh() -> None:
+        state = app.state
+        try:
+            config = await get_global_config_cached(state)
+            key = chat_graph_key(state.settings, config)
+            if key != getattr(state, "graph_key", None):
+                state.graph = build_chat_graph(
+                    state.settings, config, state.checkpointer,
+                    memory=getattr(state, "memory", None),
+                    semantic_cache=getattr(state, "semantic_cache", None),
+                )
+                state.graph_key = key
+        except Exception:
+            logger.exception("Erro ao reconstruir grafo apos mudanca de config")
+
+    def on_change(scope: str | None) -> None:
+        if scope is None or scope == GLOBAL_SCOPE:
+            task = asyncio.create_task(refresh())
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+    app.state.config_cache.add_listener(on_change)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     settings = load_settings()
+    _warn_unshared_state(settings)
+    configure_hash_pool(settings.password_hash_workers)
+    # Antes do banco e do checkpointer, que so se instrumentam com tracing ligado
+    configure_tracing(settings.trace_file, settings.trace_sample_rate)
+    # Com REDIS_URL, limite de login e cache de usuarios valem para todos os workers
+    app.state.login_limiter = create_login_limiter(settings)
+    app.state.user_cache = create_user_cache(settings)
+    app.state.sse_streams = SseStreamRegistry(
+        settings.sse_replay_events, settings.sse_replay_ttl_seconds,
+        max_streams_per_user=settings.sse_max_streams_per_user,
+    )
+    app.state.thread_locks = create_thread_locks(settings)
+    # Memoria de longo prazo (opcional); sobrevive a reconstrucoes do grafo
+    app.state.memory = await create_memory(settings)
+    # Cache semantico (opcional); tambem sobrevive a reconstrucoes do grafo
+    app.state.semantic_cache = (
+        create_semantic_cache(settings) if settings.semantic_cache else None
+    )
 
     # Auth DB (SQLite ou PostgreSQL)
     db_mod = get_db_module(settings)
     auth_conn = await create_auth_db(settings)
+    app.state.auth_db = auth_conn
+    app.state.db_module = db_mod
+    register_db_pool(auth_conn)
+
+    # Uso/latencia por turno, gravados em lote (ver turn_metrics)
+    app.state.turn_buffer = None
+    if settings.turn_metrics_flush_ms > 0:
+        app.state.turn_buffer = ChatTurnBuffer(
+            db_mod, auth_conn, flush_interval=settings.turn_metrics_flush_ms / 1000,
+        )
+        app.state.turn_buffer.start()
 
     await db_mod.seed_admin_if_needed(
         auth_conn,
@@ -56,29 +175,50 @@ async def lifespan(app: FastAPI):
         from .cache import get_redis
         get_redis(settings.redis_url)
 
+    # Cache de config invalidado por LISTEN/NOTIFY (Postgres) ou versao (SQLite)
+    if settings.config_cache:
+        app.state.config_cache = ConfigCache(db_mod, auth_conn)
+        await app.state.config_cache.start()
+
     # Checkpointer (SQLite ou PostgreSQL)
     async with create_checkpointer(settings) as checkpointer:
         # Filtrar tools desabilitadas via config global
-        global_config = await db_mod.get_global_config(auth_conn)
-        disabled = global_config.get("disabled_tools", [])
-        enabled_tools = [t for t in ALL_TOOLS if t.name not in disabled]
-
-        graph = build_graph(
-            model_name=settings.model_name,
-            system_prompt=settings.system_prompt,
-            history_window=settings.history_window,
-            checkpointer=checkpointer,
-            tools=enabled_tools,
+        global_config = await get_global_config_cached(app.state)
+        app.state.graph = build_chat_graph(
+            settings, global_config, checkpointer, memory=app.state.memory,
+            semantic_cache=app.state.semantic_cache,
         )
-        app.state.graph = graph
+        app.state.graph_key = chat_graph_key(settings, global_config)
         app.state.settings = settings
-        app.state.auth_db = auth_conn
-        app.state.db_module = db_mod
         app.state.checkpointer = checkpointer
+        if settings.config_cache:
+            _rebuild_graph_on_config_change(app)
+
+        # Worker da fila de agent runs (pode rodar a parte via jarvis-worker)
+        worker_task = None
+        if settings.worker_embedded:
+            worker = create_worker(settings, db_mod, auth_conn, checkpointer)
+            app.state.agent_worker = worker
+            worker_task = asyncio.create_task(worker.run())
         try:
             yield
         finally:
+            await app.state.sse_streams.close()
+            await app.state.thread_locks.close()
+            if app.state.user_cache is not None:
+                app.state.user_cache.close()
+            if app.state.memory is not None:
+                await app.state.memory.close()
+            if worker_task is not None:
+                app.state.agent_worker.stop()
+                await worker_task
+            if settings.config_cache:
+                await app.state.config_cache.close()
+            if app.state.turn_buffer is not None:
+                await app.state.turn_buffer.close()
             await auth_conn.close()
+            shutdown_hash_pool()
+            shutdown_tracing()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -92,19 +232,82 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+
+
+async def _authorize_metrics_scrape(settings, authorization: str) -> None:
+    """Libera o scrape com ``JARVIS_METRICS_TOKEN`` ou JWT de admin.
+
+    Sem ``JARVIS_METRICS_PUBLIC=true``, o endpoint nao e anonimo: as
+    metricas expoem rotas, volume de uso e profundidade da fila.
+    """
+    if settings.metrics_public:
+        return
+    if settings.metrics_token and hmac.compare_digest(
+        authorization.encode(), f"Bearer {settings.metrics_token}".encode(),
+    ):
+        return
+
+    scheme, _, token = authorization.partition(" ")
+    try:
+        payload = decode_token(token, settings.jwt_secret) if scheme == "Bearer" else None
+    except pyjwt.InvalidTokenError:
+        payload = None
+    if payload is None or payload.type != "access":
+        raise HTTPException(status_code=401, detail="Token de metricas invalido.")
+    user = await get_user_cached(app.state, payload.sub)
+    if not user or not user["is_active"] or user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Acesso restrito a administradores.")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(authorization: str = Header(default="")):
+    """Metricas do processo no formato texto do Prometheus."""
+    settings = app.state.settings
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    await _authorize_metrics_scrape(settings, authorization)
+
+    # Profundidade da fila vem do banco (compartilhado entre workers)
+    db_mod = getattr(app.state, "db_module", None)
+    conn = getattr(app.state, "auth_db", None)
+    if db_mod is not None and conn is not None:
+        try:
+            for run_status, total in (await db_mod.agent_run_queue_depth(conn)).items():
+                AGENT_RUNS.set(total, status=run_status)
+        except Exception:
+            logger.exception("Erro ao ler fila de agent runs para /metrics")
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
 
 
 # --- Auth endpoints ---
 
 @app.post("/auth/login", response_model=TokenResponse)
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, http_request: Request):
     """Autentica usuario e retorna access + refresh tokens."""
     conn = app.state.auth_db
     settings = app.state.settings
     db_mod = app.state.db_module
 
+    # Limite por IP antes do bcrypt para conter bursts de tentativas. Login
+    # com sucesso nao zera o contador: com uma conta valida, um atacante
+    # zeraria o IP e seguiria tentando senhas de outras contas
+    limiter = getattr(app.state, "login_limiter", None)
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    if limiter is not None:
+        retry_after = await limiter.hit(client_ip)
+        if retry_after:
+            from fastapi import HTTPException, status
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Muitas tentativas de login. Tente novamente mais tarde.",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
     user = await db_mod.get_user_by_username(conn, request.username)
-    if not user or not verify_password(request.password, user["hashed_password"]):
+    if not user or not await verify_password_async(
+        request.password, user["hashed_password"],
+    ):
         from fastapi import HTTPException, status
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -230,22 +433,114 @@ async def get_user_thread_messages(
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(
     request: ChatRequest,
+    http_response: Response,
     user: dict = Depends(get_current_active_user),
 ):
     settings = app.state.settings
     provided_thread = request.thread_id or settings.session_id
     thread_id = f"{user['id']}:{provided_thread}"
 
-    response = await invoke_chat(
-        graph=app.state.graph,
-        user_input=request.message,
-        max_tool_steps=settings.max_tool_steps,
-        thread_id=thread_id,
-    )
+    trace_id = start_trace()
+    try:
+        with trace("chat.turn", trace_id, channel=CHANNEL_CHAT, thread_id=thread_id):
+            async with hold_thread(app.state, thread_id):
+                metrics = TurnMetrics()
+                turn_status = STATUS_ERROR
+                try:
+                    response = await invoke_chat(
+                        graph=app.state.graph,
+                        user_input=request.message,
+                        max_tool_steps=settings.max_tool_steps,
+                        thread_id=thread_id,
+                        metrics=metrics,
+                    )
+                    turn_status = STATUS_COMPLETED
+                finally:
+                    record_turn(
+                        app.state, thread_id, user["id"], CHANNEL_CHAT, turn_status, metrics,
+                    )
+    except ThreadBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+    if trace_id:
+        http_response.headers["X-Trace-Id"] = trace_id
 
     return ChatResponse(response=response, thread_id=provided_thread)
 
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    user: dict = Depends(get_current_active_user),
+):
+    """Resposta do chat como Server-Sent Events (mesmos eventos do /ws).
+
+    O id de cada evento e ``<stream_id>:<seq>``; apos queda, retome em
+    ``GET /chat/stream/{stream_id}`` com o header ``Last-Event-ID``.
+    """
+    settings = app.state.settings
+    provided_thread = request.thread_id or settings.session_id
+    thread_id = f"{user['id']}:{provided_thread}"
+
+    metrics = TurnMetrics()
+    trace_id = start_trace()
+    stream = app.state.sse_streams.start(
+        user["id"],
+        traced_events("chat.turn", trace_id, locked_events(
+            app.state, thread_id, recorded_events(
+                app.state, thread_id, user["id"], CHANNEL_STREAM, metrics,
+                stream_chat(
+                    graph=app.state.graph,
+                    user_input=request.message,
+                    max_tool_steps=settings.max_tool_steps,
+                    thread_id=thread_id,
+                    metrics=metrics,
+                ),
+            ),
+        ), channel=CHANNEL_STREAM, thread_id=thread_id),
+    )
+    if stream is None:
+        raise HTTPException(
+            status_code=429,
+            detail=(
+                f"Limite de {app.state.sse_streams.max_streams_per_user} "
+                "streams em andamento por usuario atingido."
+            ),
+        )
+    headers = {**SSE_HEADERS, "X-Stream-Id": stream.stream_id}
+    if trace_id:
+        headers["X-Trace-Id"] = trace_id
+    return StreamingResponse(
+        sse_response_body(stream),
+        media_type="text/event-stream",
+        headers=headers,
+    )
+
+
+@app.get("/chat/stream/{stream_id}")
+async def resume_chat_stream(
+    stream_id: str,
+    last_event_id: str | None = Header(default=None),
+    user: dict = Depends(get_current_active_user),
+):
+    """Retoma um stream SSE a partir do ``Last-Event-ID``."""
+    stream = app.state.sse_streams.get(stream_id, user["id"])
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Stream nao encontrado ou expirado.")
+    return StreamingResponse(
+        sse_response_body(stream, parse_last_event_id(last_event_id)),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Stream-Id": stream.stream_id},
+    )
+
+
+def _ws_error(request_id: str | None, content: str) -> dict:
+    frame = {"type": "error", "content": content}
+    if request_id is not None:
+        frame["request_id"] = request_id
+    return frame
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(
     ws: WebSocket,
@@ -253,8 +548,6 @@ async def websocket_endpoint(
 ):
     """WebSocket com auth via query param ?token=<jwt>."""
     settings = app.state.settings
-    conn = app.state.auth_db
-    db_mod = app.state.db_module
 
     # Validar token antes de aceitar conexao
     if not token:
@@ -271,44 +564,88 @@ async def websocket_endpoint(
         await ws.close(code=4001, reason="Token invalido (tipo incorreto).")
         return
 
-    user = await db_mod.get_user_by_id(conn, payload.sub)
+    user = await get_user_cached(app.state, payload.sub)
     if not user or not user["is_active"]:
         await ws.close(code=4001, reason="Usuario invalido.")
         return
 
     await ws.accept()
 
+    # Cada mensagem roda numa task propria; frames levam o request_id da
+    # mensagem (se enviado) e {"type": "cancel"} aborta o run
+    streams = StreamMultiplexer(
+        ws,
+        max_streams=settings.ws_max_concurrent_streams,
+        flush_ms=settings.ws_flush_ms,
+        flush_chars=settings.ws_flush_chars,
+        max_pending=settings.ws_max_pending_events,
+    )
+    WS_CONNECTIONS.inc()
     try:
         while True:
             data = await ws.receive_json()
+            request_id = data.get("request_id")
+            if request_id is not None:
+                request_id = str(request_id)
+
+            if data.get("type") == "cancel":
+                if not streams.cancel(request_id):
+                    await streams.send(_ws_error(
+                        request_id, "Nenhuma requisicao em andamento com esse request_id.",
+                    ))
+                continue
 
             message = data.get("message")
             if not message:
-                await ws.send_json(
-                    {"type": "error", "content": "Campo 'message' e obrigatorio."}
-                )
+                await streams.send(_ws_error(request_id, "Campo 'message' e obrigatorio."))
+                continue
+
+            if request_id is None:
+                # Clientes sem request_id nao distinguem streams: mantem a
+                # ordem de uma mensagem por vez
+                await streams.wait(None)
+            elif streams.is_running(request_id):
+                await streams.send(_ws_error(request_id, "request_id ja em andamento."))
                 continue
 
             provided_thread = data.get("thread_id") or settings.session_id
             thread_id = f"{user['id']}:{provided_thread}"
 
-            try:
-                async for event in stream_chat(
-                    graph=app.state.graph,
-                    user_input=message,
-                    max_tool_steps=settings.max_tool_steps,
-                    thread_id=thread_id,
-                ):
-                    await ws.send_json(event)
-
-                await ws.send_json({"type": "end"})
-            except Exception as exc:
-                await ws.send_json({"type": "error", "content": str(exc)})
+            # Turnos no mesmo thread esperam (ou sao recusados) pelo lock
+            metrics = TurnMetrics()
+            trace_id = start_trace()
+            started = streams.start(
+                request_id,
+                traced_events("chat.turn", trace_id, locked_events(
+                    app.state, thread_id, recorded_events(
+                        app.state, thread_id, user["id"], CHANNEL_WS, metrics,
+                        stream_chat(
+                            graph=app.state.graph,
+                            user_input=message,
+                            max_tool_steps=settings.max_tool_steps,
+                            thread_id=thread_id,
+                            metrics=metrics,
+                        ),
+                    ),
+                ), channel=CHANNEL_WS, thread_id=thread_id),
+                final_fields={"trace_id": trace_id} if trace_id else None,
+            )
+            if not started:
+                await streams.send(_ws_error(
+                    request_id,
+                    f"Limite de {settings.ws_max_concurrent_streams} "
+                    "streams simultaneos por conexao atingido."
+                ))
 
     except WebSocketDisconnect:
         pass
+    finally:
+        WS_CONNECTIONS.dec()
+        await streams.close()
 
 
 def main():
     port = int(os.environ.get("JARVIS_PORT", "8000"))
-    uvicorn.run("jarvis.api:app", host="0.0.0.0", port=port)
+    # Cada worker e um processo com seus proprios pools (criados no lifespan)
+    workers = max(int(os.environ.get("JARVIS_WORKERS", "1")), 1)
+    uvicorn.run("jarvis.api:app", host="0.0.0.0", port=port, workers=workers)
@@ -1,5 +1,13 @@
-"""Hashing de senhas e geracao/validacao de JWT."""
+"""Hashing de senhas e geracao/validacao de JWT.
 
+bcrypt consome ~100-300ms de CPU por chamada. Nos handlers async use
+``hash_password_async``/``verify_password_async``, que rodam o hashing
+em um pool de threads limitado (bcrypt libera o GIL) sem bloquear o
+event loop e os streams WebSocket abertos.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 
@@ -7,6 +15,10 @@ import bcrypt
 import jwt
 
 ALGORITHM = "HS256"
+DEFAULT_HASH_WORKERS = 4
+
+_hash_executor: ThreadPoolExecutor | None = None
+_hash_workers = DEFAULT_HASH_WORKERS
 
 
 @dataclass(frozen=True)
@@ -27,6 +39,47 @@ def verify_password(plain: str, hashed: str) -> bool:
     return bcrypt.checkpw(plain.encode(), hashed.encode())
 
 
+def configure_hash_pool(max_workers: int) -> None:
+    """Define o numero maximo de hashes bcrypt simultaneos.
+
+    Recria o pool se ja existir; chamadas em andamento terminam no pool antigo.
+    """
+    global _hash_workers
+    _hash_workers = max(max_workers, 1)
+    shutdown_hash_pool()
+
+
+def shutdown_hash_pool() -> None:
+    """Encerra o pool de hashing (recriado sob demanda)."""
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False)
+        _hash_executor = None
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=_hash_workers, thread_name_prefix="jarvis-bcrypt",
+        )
+    return _hash_executor
+
+
+async def hash_password_async(plain: str) -> str:
+    """hash_password fora do event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), hash_password, plain)
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    """verify_password fora do event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_hash_executor(), verify_password, plain, hashed,
+    )
+
+
 def create_access_token(
     user_id: int,
     role: str,
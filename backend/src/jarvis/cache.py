@@ -8,9 +8,26 @@ from typing import Any, Callable
 
 import redis
 
+from .metrics import CACHE_REQUESTS
+from .tracing import span, traced
+
 _client: redis.Redis | None = None
 
 
+def _reset_after_fork() -> None:
+    """Descarta o cliente herdado do processo pai (gunicorn --preload).
+
+    Sockets do pool do Redis nao podem ser compartilhados entre processos;
+    cada worker cria o seu na primeira chamada a ``get_redis``.
+    """
+    global _client
+    _client = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
 def get_redis(redis_url: str = "") -> redis.Redis | None:
     """Retorna cliente Redis sync. None se nao configurado."""
     global _client
@@ -30,12 +47,17 @@ def cached_get(key: str, ttl: int, fetch_fn: Callable[[], Any]) -> Any:
     """
     r = get_redis()
     if r:
-        try:
-            cached = r.get(key)
-            if cached is not None:
-                return json.loads(cached)
-        except redis.RedisError:
-            pass
+        with span("cache.cached_get", key=key) as current:
+            try:
+                cached = r.get(key)
+                if cached is not None:
+                    CACHE_REQUESTS.inc(cache="cached_get", result="hit")
+                    if current is not None:
+                        current.set_attribute("hit", True)
+                    return json.loads(cached)
+                CACHE_REQUESTS.inc(cache="cached_get", result="miss")
+            except redis.RedisError:
+                CACHE_REQUESTS.inc(cache="cached_get", result="error")
 
     result = fetch_fn()
 
@@ -46,3 +68,33 @@ def cached_get(key: str, ttl: int, fetch_fn: Callable[[], Any]) -> Any:
             pass
 
     return result
+
+
+@traced("cache.get_json")
+def get_json(key: str) -> Any | None:
+    """Le valor JSON do Redis. None se ausente, sem Redis ou em erro."""
+    r = get_redis()
+    if not r:
+        return None
+    try:
+        cached = r.get(key)
+    except redis.RedisError:
+        CACHE_REQUESTS.inc(cache="get_json", result="error")
+        return None
+    if cached is None:
+        CACHE_REQUESTS.inc(cache="get_json", result="miss")
+        return None
+    CACHE_REQUESTS.inc(cache="get_json", result="hit")
+    return json.loads(cached)
+
+
+@traced("cache.set_json")
+def set_json(key: str, ttl: int, value: Any) -> None:
+    """Salva valor JSON no Redis com TTL. No-op sem Redis ou em erro."""
+    r = get_redis()
+    if not r:
+        return
+    try:
+        r.setex(key, ttl, json.dumps(value, ensure_ascii=False))
+    except (redis.RedisError, TypeError):
+        pass
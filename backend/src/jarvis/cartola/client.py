@@ -8,10 +8,17 @@ import urllib.error
 from typing import Any
 
 from ..cache import cached_get
+from ..tracing import span
 
 BASE_URL = "https://api.cartola.globo.com"
 _TIMEOUT = 15
 _USER_AGENT = "Jarvis/1.0"
+# Frescor (TTL de cache, em segundos) de cada dado da API. O status do
+# mercado e o mais volatil e serve de referencia para caches de respostas.
+MARKET_STATUS_TTL = 300
+PLAYERS_TTL = 600
+SCORED_TTL = 300
+MATCHES_TTL = 1800
 
 # Mapeamentos de posicao (id -> nome e sigla -> id)
 POSICAO_MAP: dict[int, str] = {
@@ -52,18 +59,21 @@ def _get_json(path: str) -> dict[str, Any]:
     """Faz GET na API do Cartola e retorna o JSON parseado."""
     url = f"{BASE_URL}{path}"
     req = urllib.request.Request(url, headers={"User-Agent": _USER_AGENT})
-    with urllib.request.urlopen(req, timeout=_TIMEOUT) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+    with span("cartola.http", path=path):
+        with urllib.request.urlopen(req, timeout=_TIMEOUT) as resp:
+            return json.loads(resp.read().decode("utf-8"))
 
 
 def fetch_market_status() -> dict[str, Any]:
     """Retorna status do mercado: rodada, status, fechamento."""
-    return cached_get("cartola:market_status", 300, lambda: _get_json("/mercado/status"))
+    return cached_get(
+        "cartola:market_status", MARKET_STATUS_TTL, lambda: _get_json("/mercado/status"),
+    )
 
 
 def fetch_players() -> dict[str, Any]:
     """Retorna lista de jogadores disponiveis no mercado."""
-    return cached_get("cartola:players", 600, lambda: _get_json("/atletas/mercado"))
+    return cached_get("cartola:players", PLAYERS_TTL, lambda: _get_json("/atletas/mercado"))
 
 
 def fetch_scored(round_number: int | None = None) -> dict[str, Any]:
@@ -72,7 +82,7 @@ def fetch_scored(round_number: int | None = None) -> dict[str, Any]:
     if round_number:
         path = f"{path}/{round_number}"
     key = f"cartola:scored:{round_number or 'current'}"
-    return cached_get(key, 300, lambda: _get_json(path))
+    return cached_get(key, SCORED_TTL, lambda: _get_json(path))
 
 
 def fetch_matches(round_number: int | None = None) -> dict[str, Any]:
@@ -81,4 +91,4 @@ def fetch_matches(round_number: int | None = None) -> dict[str, Any]:
     if round_number:
         path = f"{path}/{round_number}"
     key = f"cartola:matches:{round_number or 'current'}"
-    return cached_get(key, 1800, lambda: _get_json(path))
+    return cached_get(key, MATCHES_TTL, lambda: _get_json(path))
@@ -9,6 +9,8 @@ from langchain_core.messages import (
 )
 from langgraph.errors import GraphRecursionError
 
+from .turn_metrics import CONFIG_KEY, TurnMetrics
+
 TOOL_LIMIT_MESSAGE = (
     "Atingi o limite de chamadas de ferramenta nesta resposta. "
     "Tente simplificar a pergunta."
@@ -30,6 +32,16 @@ def _render_ai_content(content: Any) -> str:
     return str(content)
 
 
+def _run_config(
+    thread_id: str, recursion_limit: int, metrics: TurnMetrics | None,
+) -> dict:
+    configurable: dict[str, Any] = {"thread_id": thread_id}
+    if metrics is not None:
+        metrics.start()
+        configurable[CONFIG_KEY] = metrics
+    return {"recursion_limit": recursion_limit, "configurable": configurable}
+
+
 def _get_last_ai_message(messages: List[BaseMessage]) -> AIMessage | None:
     for message in reversed(messages):
         if isinstance(message, AIMessage):
@@ -42,6 +54,7 @@ async def invoke_chat(
     user_input: str,
     max_tool_steps: int,
     thread_id: str,
+    metrics: TurnMetrics | None = None,
 ) -> str:
     recursion_limit = max(6, 2 * max_tool_steps + 4)
 
@@ -52,10 +65,7 @@ async def invoke_chat(
                 "tool_steps": 0,
                 "max_tool_steps": max_tool_steps,
             },
-            config={
-                "recursion_limit": recursion_limit,
-                "configurable": {"thread_id": thread_id},
-            },
+            config=_run_config(thread_id, recursion_limit, metrics),
         )
     except GraphRecursionError:
         return TOOL_LIMIT_MESSAGE
@@ -79,8 +89,13 @@ async def stream_chat(
     user_input: str,
     max_tool_steps: int,
     thread_id: str,
+    metrics: TurnMetrics | None = None,
 ) -> AsyncGenerator[dict, None]:
-    """Stream eventos tipados do grafo (token, tool_start, tool_end)."""
+    """Stream eventos tipados do grafo (token, tool_start, tool_end).
+
+    Com ``metrics``, os nos do grafo acumulam tokens e tempos nele e o
+    primeiro token marca o time-to-first-token.
+    """
     recursion_limit = max(6, 2 * max_tool_steps + 4)
 
     emitted = False
@@ -94,16 +109,17 @@ async def stream_chat(
                 "tool_steps": 0,
                 "max_tool_steps": max_tool_steps,
             },
-            config={
-                "recursion_limit": recursion_limit,
-                "configurable": {"thread_id": thread_id},
-            },
+            config=_run_config(thread_id, recursion_limit, metrics),
             stream_mode="messages",
         ):
             node = metadata.get("langgraph_node")
 
-            if node == "assistant" and isinstance(chunk, AIMessageChunk):
-                tool_chunks = getattr(chunk, "tool_call_chunks", None)
+            if node == "assistant" and isinstance(chunk, AIMessage):
+                # AIMessage inteira (sem streaming) vem de respostas em cache
+                if isinstance(chunk, AIMessageChunk):
+                    tool_chunks = getattr(chunk, "tool_call_chunks", None)
+                else:
+                    tool_chunks = chunk.tool_calls
                 if tool_chunks:
                     for tc in tool_chunks:
                         name = tc.get("name")
@@ -123,6 +139,8 @@ async def stream_chat(
                     if text:
                         hit_tool_limit = False
                         emitted = True
+                        if metrics is not None:
+                            metrics.mark_first_token()
                         yield {"type": "token", "content": text}
 
             elif node == "tools" and isinstance(chunk, ToolMessage):
@@ -1,7 +1,69 @@
 """Factory de checkpointer (SQLite ou PostgreSQL)."""
 
 from contextlib import asynccontextmanager
-from typing import Any
+from typing import Any, AsyncIterator
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from .tracing import span, traced_iter, tracing_enabled
+
+
+class TracedCheckpointer(BaseCheckpointSaver):
+    """Delega ao checkpointer real e abre spans ``checkpoint.*`` nas
+    leituras e escritas assincronas (as usadas pelo grafo na API).
+    """
+
+    def __init__(self, inner: BaseCheckpointSaver) -> None:
+        super().__init__(serde=inner.serde)
+        self.inner = inner
+
+    @property
+    def config_specs(self) -> list:
+        return self.inner.config_specs
+
+    async def aget_tuple(self, config):
+        with span("checkpoint.get"):
+            return await self.inner.aget_tuple(config)
+
+    async def alist(self, config, **kwargs) -> AsyncIterator:
+        async for item in traced_iter("checkpoint.list", self.inner.alist(config, **kwargs)):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with span("checkpoint.put"):
+            return await self.inner.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        with span("checkpoint.put_writes", writes=len(writes)):
+            return await self.inner.aput_writes(config, writes, task_id, task_path)
+
+    def __getattr__(self, name: str) -> Any:
+        # Metodos especificos do saver (ex.: setup)
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+
+def _passthrough(name: str):
+    def method(self, *args, **kwargs):
+        return getattr(self.inner, name)(*args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+for _name in (
+    "get_tuple", "list", "put", "put_writes", "delete_thread", "copy_thread",
+    "delete_for_runs", "prune", "adelete_thread", "acopy_thread",
+    "adelete_for_runs", "aprune", "get_next_version",
+    "get_delta_channel_history", "aget_delta_channel_history",
+):
+    setattr(TracedCheckpointer, _name, _passthrough(_name))
+
+
+def traced_checkpointer(checkpointer: BaseCheckpointSaver) -> BaseCheckpointSaver:
+    """Envolve em ``TracedCheckpointer`` se o tracing estiver ligado."""
+    return TracedCheckpointer(checkpointer) if tracing_enabled() else checkpointer
 
 
 @asynccontextmanager
@@ -18,13 +80,10 @@ async def create_checkpointer(settings: Any):
 
         async with AsyncPostgresSaver.from_conn_string(settings.database_url) as checkpointer:
             await checkpointer.setup()
-            yield checkpointer
+            yield traced_checkpointer(checkpointer)
     else:
         from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 
         conn_string = settings.db_path if settings.persist_memory else ":memory:"
-        checkpointer = AsyncSqliteSaver.from_conn_string(conn_string)
-        try:
-            yield checkpointer
-        finally:
-            pass
+        async with AsyncSqliteSaver.from_conn_string(conn_string) as checkpointer:
+            yield traced_checkpointer(checkpointer)
@@ -130,6 +130,7 @@ async def _async_main() -> None:
             system_prompt=settings.system_prompt,
             history_window=settings.history_window,
             checkpointer=checkpointer,
+            history_block=settings.history_block,
         )
 
         if args.message:
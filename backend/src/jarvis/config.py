@@ -41,12 +41,58 @@ class Settings:
     jwt_access_expiry_minutes: int = 30
     jwt_refresh_expiry_days: int = 7
     auth_db_path: str = ".jarvis-auth.db"
+    sqlite_readers: int = 4
     admin_username: str = "admin"
     admin_email: str = "admin@jarvis.local"
     admin_password: str = "admin"
+    password_hash_workers: int = 4
+    login_rate_limit: int = 10
+    login_rate_window_seconds: int = 60
+    user_cache_ttl_seconds: int = 30
+    config_cache: bool = True
+    workers: int = 1
+    ws_flush_ms: int = 16
+    ws_flush_chars: int = 64
+    ws_max_pending_events: int = 1024
+    ws_max_concurrent_streams: int = 4
+    sse_replay_events: int = 1024
+    sse_replay_ttl_seconds: int = 60
+    sse_max_streams_per_user: int = 4
+    thread_lock_policy: str = "queue"
+    thread_lock_wait_seconds: int = 30
+    thread_lock_ttl_seconds: int = 300
+    response_cache: bool = False
+    response_cache_ttl_seconds: int = 300
+    semantic_cache: bool = False
+    semantic_cache_threshold: float = 0.9
+    semantic_cache_ttl_seconds: int = 3600
+    semantic_cache_max_entries: int = 1024
+    embeddings: str = "hashing"
+    embedding_model: str = "text-embedding-3-small"
+    embedding_dim: int = 512
+    long_term_memory: bool = False
+    memory_db_path: str = ".jarvis-memory.db"
+    memory_top_k: int = 3
+    memory_min_score: float = 0.35
+    memory_max_per_user: int = 2000
+    fast_model_name: str = ""
+    history_block: int = 4
+    turn_metrics_flush_ms: int = 1000
+    metrics_enabled: bool = True
+    metrics_token: str = ""
+    metrics_public: bool = False
+    trace_file: str = ""
+    trace_sample_rate: float = 1.0
     # GitHub Agent
     github_token: str = ""
     github_webhook_secret: str = ""
+    webhook_debounce_seconds: int = 10
+    # Worker da fila de agent runs
+    worker_embedded: bool = False
+    worker_concurrency: int = 2
+    worker_max_attempts: int = 3
+    worker_stale_seconds: int = 900
+    agent_run_flush_ms: int = 0
 
 
 def _read_non_negative_int(key: str, default: str) -> int:
@@ -74,6 +120,32 @@ def _read_bool(key: str, default: bool) -> bool:
     raise RuntimeError(f"{key} deve ser booleano (true/false).")
 
 
+def _read_unit_float(key: str, default: str) -> float:
+    raw_value = os.getenv(key, default)
+    try:
+        parsed_value = float(raw_value)
+    except ValueError as exc:
+        raise RuntimeError(f"{key} deve ser um numero.") from exc
+
+    if not 0 <= parsed_value <= 1:
+        raise RuntimeError(f"{key} deve estar entre 0 e 1.")
+    return parsed_value
+
+
+def _read_embeddings_provider() -> str:
+    provider = os.getenv("JARVIS_EMBEDDINGS", "hashing").strip().lower()
+    if provider not in {"hashing", "openai"}:
+        raise RuntimeError("JARVIS_EMBEDDINGS deve ser 'hashing' ou 'openai'.")
+    return provider
+
+
+def _read_thread_lock_policy() -> str:
+    policy = os.getenv("JARVIS_THREAD_LOCK_POLICY", "queue").strip().lower()
+    if policy not in {"queue", "reject"}:
+        raise RuntimeError("JARVIS_THREAD_LOCK_POLICY deve ser 'queue' ou 'reject'.")
+    return policy
+
+
 def load_settings() -> Settings:
     load_dotenv()
 
@@ -101,11 +173,86 @@ def load_settings() -> Settings:
             "JARVIS_JWT_REFRESH_EXPIRY_DAYS", "7"
         ),
         auth_db_path=os.getenv("JARVIS_AUTH_DB_PATH", ".jarvis-auth.db"),
+        sqlite_readers=_read_non_negative_int("JARVIS_SQLITE_READERS", "4"),
         admin_username=os.getenv("JARVIS_ADMIN_USERNAME", "admin"),
         admin_email=os.getenv("JARVIS_ADMIN_EMAIL", "admin@jarvis.local"),
         admin_password=os.getenv("JARVIS_ADMIN_PASSWORD", "admin"),
+        password_hash_workers=_read_non_negative_int(
+            "JARVIS_PASSWORD_HASH_WORKERS", "4"
+        ),
+        login_rate_limit=_read_non_negative_int("JARVIS_LOGIN_RATE_LIMIT", "10"),
+        login_rate_window_seconds=_read_non_negative_int(
+            "JARVIS_LOGIN_RATE_WINDOW_SECONDS", "60"
+        ),
+        user_cache_ttl_seconds=_read_non_negative_int(
+            "JARVIS_USER_CACHE_TTL_SECONDS", "30"
+        ),
+        config_cache=_read_bool("JARVIS_CONFIG_CACHE", True),
+        workers=max(_read_non_negative_int("JARVIS_WORKERS", "1"), 1),
+        ws_flush_ms=_read_non_negative_int("JARVIS_WS_FLUSH_MS", "16"),
+        ws_flush_chars=_read_non_negative_int("JARVIS_WS_FLUSH_CHARS", "64"),
+        ws_max_pending_events=max(
+            _read_non_negative_int("JARVIS_WS_MAX_PENDING_EVENTS", "1024"), 1
+        ),
+        ws_max_concurrent_streams=max(
+            _read_non_negative_int("JARVIS_WS_MAX_CONCURRENT_STREAMS", "4"), 1
+        ),
+        sse_replay_events=max(
+            _read_non_negative_int("JARVIS_SSE_REPLAY_EVENTS", "1024"), 1
+        ),
+        sse_replay_ttl_seconds=_read_non_negative_int(
+            "JARVIS_SSE_REPLAY_TTL_SECONDS", "60"
+        ),
+        sse_max_streams_per_user=max(
+            _read_non_negative_int("JARVIS_SSE_MAX_STREAMS_PER_USER", "4"), 1
+        ),
+        thread_lock_policy=_read_thread_lock_policy(),
+        thread_lock_wait_seconds=_read_non_negative_int(
+            "JARVIS_THREAD_LOCK_WAIT_SECONDS", "30"
+        ),
+        thread_lock_ttl_seconds=max(
+            _read_non_negative_int("JARVIS_THREAD_LOCK_TTL_SECONDS", "300"), 1
+        ),
+        response_cache=_read_bool("JARVIS_RESPONSE_CACHE", False),
+        response_cache_ttl_seconds=_read_non_negative_int(
+            "JARVIS_RESPONSE_CACHE_TTL_SECONDS", "300"
+        ),
+        semantic_cache=_read_bool("JARVIS_SEMANTIC_CACHE", False),
+        semantic_cache_threshold=_read_unit_float("JARVIS_SEMANTIC_CACHE_THRESHOLD", "0.9"),
+        semantic_cache_ttl_seconds=_read_non_negative_int(
+            "JARVIS_SEMANTIC_CACHE_TTL_SECONDS", "3600"
+        ),
+        semantic_cache_max_entries=max(
+            _read_non_negative_int("JARVIS_SEMANTIC_CACHE_MAX_ENTRIES", "1024"), 1
+        ),
+        embeddings=_read_embeddings_provider(),
+        embedding_model=os.getenv("JARVIS_EMBEDDING_MODEL", "text-embedding-3-small"),
+        embedding_dim=max(_read_non_negative_int("JARVIS_EMBEDDING_DIM", "512"), 1),
+        long_term_memory=_read_bool("JARVIS_LONG_TERM_MEMORY", False),
+        memory_db_path=os.getenv("JARVIS_MEMORY_DB_PATH", ".jarvis-memory.db"),
+        memory_top_k=_read_non_negative_int("JARVIS_MEMORY_TOP_K", "3"),
+        memory_min_score=_read_unit_float("JARVIS_MEMORY_MIN_SCORE", "0.35"),
+        memory_max_per_user=max(
+            _read_non_negative_int("JARVIS_MEMORY_MAX_PER_USER", "2000"), 1
+        ),
+        fast_model_name=os.getenv("JARVIS_FAST_MODEL", ""),
+        history_block=max(_read_non_negative_int("JARVIS_HISTORY_BLOCK", "4"), 1),
+        turn_metrics_flush_ms=_read_non_negative_int("JARVIS_TURN_METRICS_FLUSH_MS", "1000"),
+        metrics_enabled=_read_bool("JARVIS_METRICS", True),
+        metrics_token=os.getenv("JARVIS_METRICS_TOKEN", ""),
+        metrics_public=_read_bool("JARVIS_METRICS_PUBLIC", False),
+        trace_file=os.getenv("JARVIS_TRACE_FILE", ""),
+        trace_sample_rate=_read_unit_float("JARVIS_TRACE_SAMPLE_RATE", "1.0"),
         github_token=os.getenv("GITHUB_TOKEN", ""),
         github_webhook_secret=os.getenv("GITHUB_WEBHOOK_SECRET", ""),
+        webhook_debounce_seconds=_read_non_negative_int(
+            "JARVIS_WEBHOOK_DEBOUNCE_SECONDS", "10"
+        ),
+        worker_embedded=_read_bool("JARVIS_WORKER_EMBEDDED", False),
+        worker_concurrency=_read_non_negative_int("JARVIS_WORKER_CONCURRENCY", "2"),
+        worker_max_attempts=_read_non_negative_int("JARVIS_WORKER_MAX_ATTEMPTS", "3"),
+        worker_stale_seconds=_read_non_negative_int("JARVIS_WORKER_STALE_SECONDS", "900"),
+        agent_run_flush_ms=_read_non_negative_int("JARVIS_AGENT_RUN_FLUSH_MS", "0"),
     )
 
 
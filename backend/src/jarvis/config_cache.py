@@ -0,0 +1,143 @@
+"""Cache em processo das configs global e por usuario.
+
+``get_global_config``/``get_user_config`` iam ao banco e faziam parse do
+JSON a cada chamada. O cache guarda as configs ate serem invalidadas:
+escritas feitas por este processo atualizam a entrada na hora, e as de
+outros processos chegam por ``watch_config_changes`` do modulo de DB
+(LISTEN/NOTIFY no Postgres, contador de versao no SQLite).
+"""
+
+from __future__ import annotations
+
+import copy
+from typing import Any, Awaitable, Callable
+
+GLOBAL_SCOPE = "global"
+USER_SCOPE_PREFIX = "user:"
+
+
+class ConfigCache:
+    """Configs global e de usuarios em memoria, invalidadas por notificacao.
+
+    Args:
+        db_module: Modulo de DB ativo (db ou db_postgres).
+        conn: Conexao/pool do banco de auth.
+    """
+
+    def __init__(self, db_module: Any, conn: Any) -> None:
+        self.db_module = db_module
+        self.conn = conn
+        self._global: dict[str, Any] | None = None
+        self._users: dict[int, dict[str, Any]] = {}
+        # Incrementado a cada invalidacao: uma leitura do banco iniciada
+        # antes dela nao e guardada (poderia ser anterior a mudanca)
+        self._generation = 0
+        self._stop_watch: Callable[[], Awaitable[None]] | None = None
+        self._listeners: list[Callable[[str | None], None]] = []
+
+    def add_listener(self, callback: Callable[[str | None], None]) -> None:
+        """Registra ``callback(escopo)`` para mudancas vindas do banco.
+
+        Chamado depois da invalidacao, para mudancas feitas por outros
+        processos (ex.: outro worker HTTP alterou as tools habilitadas).
+        """
+        self._listeners.append(callback)
+
+    async def start(self) -> None:
+        """Passa a receber mudancas feitas por outros processos."""
+        if self._stop_watch is None:
+            self._stop_watch = await self.db_module.watch_config_changes(
+                self.conn, self._on_remote_change,
+            )
+
+    def _on_remote_change(self, scope: str | None) -> None:
+        self.invalidate(scope)
+        for callback in self._listeners:
+            callback(scope)
+
+    async def close(self) -> None:
+        if self._stop_watch is not None:
+            await self._stop_watch()
+            self._stop_watch = None
+
+    def invalidate(self, scope: str | None = None) -> None:
+        """Descarta ``"global"``, ``"user:<id>"`` ou tudo (None)."""
+        self._generation += 1
+        if scope == GLOBAL_SCOPE:
+            self._global = None
+        elif scope and scope.startswith(USER_SCOPE_PREFIX):
+            try:
+                self._users.pop(int(scope[len(USER_SCOPE_PREFIX):]), None)
+            except ValueError:
+                self._users.clear()
+        else:
+            self._global = None
+            self._users.clear()
+
+    async def get_global(self) -> dict[str, Any]:
+        if self._global is None:
+            generation = self._generation
+            config = await self.db_module.get_global_config(self.conn)
+            if generation == self._generation:
+                self._global = config
+            return copy.deepcopy(config)
+        return copy.deepcopy(self._global)
+
+    async def get_user(self, user_id: int) -> dict[str, Any]:
+        config = self._users.get(user_id)
+        if config is None:
+            generation = self._generation
+            config = await self.db_module.get_user_config(self.conn, user_id)
+            if generation == self._generation:
+                self._users[user_id] = config
+        return copy.deepcopy(config)
+
+    async def set_global(self, updates: dict[str, Any]) -> dict[str, Any]:
+        config = await self.db_module.set_global_config(self.conn, updates)
+        self.invalidate(GLOBAL_SCOPE)
+        self._global = config
+        return copy.deepcopy(config)
+
+    async def set_user(self, user_id: int, updates: dict[str, Any]) -> dict[str, Any]:
+        config = await self.db_module.set_user_config(self.conn, user_id, updates)
+        self.invalidate(f"{USER_SCOPE_PREFIX}{user_id}")
+        self._users[user_id] = config
+        return copy.deepcopy(config)
+
+
+def _cache(state: Any) -> ConfigCache | None:
+    return getattr(state, "config_cache", None)
+
+
+async def get_global_config_cached(state: Any) -> dict[str, Any]:
+    """Config global via cache de ``app.state``, se houver."""
+    cache = _cache(state)
+    if cache is not None:
+        return await cache.get_global()
+    return await state.db_module.get_global_config(state.auth_db)
+
+
+async def get_user_config_cached(state: Any, user_id: int) -> dict[str, Any]:
+    """Config do usuario via cache de ``app.state``, se houver."""
+    cache = _cache(state)
+    if cache is not None:
+        return await cache.get_user(user_id)
+    return await state.db_module.get_user_config(state.auth_db, user_id)
+
+
+async def set_global_config_cached(state: Any, updates: dict[str, Any]) -> dict[str, Any]:
+    """Grava (merge) a config global e atualiza o cache local."""
+    cache = _cache(state)
+    if cache is not None:
+        return await cache.set_global(updates)
+    return await state.db_module.set_global_config(state.auth_db, updates)
+
+
+async def set_user_config_cached(
+    state: Any, user_id: int, updates: dict[str, Any],
+) -> dict[str, Any]:
+    """Grava (merge) a config do usuario e atualiza o cache local."""
+    cache = _cache(state)
+    if cache is not None:
+        return await cache.set_user(user_id, updates)
+    return await state.db_module.set_user_config(state.auth_db, user_id, updates)
@@ -1,25 +1,77 @@
-"""Banco de dados de autenticacao e configuracao (SQLite via aiosqlite)."""
+"""Banco de dados de autenticacao e configuracao (SQLite via aiosqlite).
 
+As funcoes recebem o ``SqlitePool`` de ``init_db``: leituras usam
+``pool.read()`` e escritas ``pool.write()`` (writer dedicado, commit
+ao final do bloco).
+"""
+
+import asyncio
 import json
+import logging
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Awaitable, Callable
 
 import aiosqlite
 
-from .auth import hash_password
+from .auth import hash_password_async
+from .sqlite_pool import DEFAULT_READERS, SqlitePool, open_sqlite_pool
+
+logger = logging.getLogger(__name__)
 
-SCHEMA_SQL = """
-CREATE TABLE IF NOT EXISTS users (
+# Datas sao INTEGER com epoch UTC em milissegundos: comparacoes e
+# agregacoes por tempo ficam no SQLite sem parse de string. As funcoes
+# continuam recebendo/retornando ISO 8601.
+_USERS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {name} (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     username TEXT UNIQUE NOT NULL,
     email TEXT UNIQUE NOT NULL,
     hashed_password TEXT NOT NULL,
     role TEXT NOT NULL DEFAULT 'user',
     is_active INTEGER NOT NULL DEFAULT 1,
-    created_at TEXT NOT NULL,
-    updated_at TEXT NOT NULL
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
 );
+"""
+
+_AGENT_RUNS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo TEXT NOT NULL,
+    issue_number INTEGER NOT NULL,
+    issue_title TEXT NOT NULL,
+    action TEXT NOT NULL,
+    category TEXT,
+    status TEXT NOT NULL DEFAULT 'processing',
+    tool_steps INTEGER NOT NULL DEFAULT 0,
+    error_message TEXT,
+    started_at INTEGER NOT NULL,
+    finished_at INTEGER,
+    payload_json TEXT NOT NULL DEFAULT '{{}}',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at INTEGER,
+    locked_at INTEGER,
+    coalesced_events INTEGER NOT NULL DEFAULT 0,
+    model_calls INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    assistant_ms INTEGER NOT NULL DEFAULT 0,
+    tools_ms INTEGER NOT NULL DEFAULT 0,
+    claimed_at INTEGER
+);
+"""
+
+_WEBHOOK_DELIVERIES_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {name} (
+    delivery_id TEXT PRIMARY KEY,
+    received_at INTEGER NOT NULL
+);
+"""
 
+SCHEMA_SQL = (
+    _USERS_TABLE_SQL.format(name="users")
+    + """
 CREATE TABLE IF NOT EXISTS user_config (
     user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
     config_json TEXT NOT NULL DEFAULT '{}'
@@ -30,24 +82,128 @@ CREATE TABLE IF NOT EXISTS global_config (
     config_json TEXT NOT NULL DEFAULT '{}'
 );
 
-CREATE TABLE IF NOT EXISTS agent_runs (
+-- Incrementado a cada escrita de config; outros processos comparam a
+-- versao para invalidar caches (o SQLite nao tem LISTEN/NOTIFY).
+CREATE TABLE IF NOT EXISTS config_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL DEFAULT 0
+);
+"""
+    + _AGENT_RUNS_TABLE_SQL.format(name="agent_runs")
+    + _WEBHOOK_DELIVERIES_TABLE_SQL.format(name="webhook_deliveries")
+    + """
+-- Uso e latencia por turno do chat (ver turn_metrics). Tempos em ms.
+CREATE TABLE IF NOT EXISTS chat_turns (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    repo TEXT NOT NULL,
-    issue_number INTEGER NOT NULL,
-    issue_title TEXT NOT NULL,
-    action TEXT NOT NULL,
-    category TEXT,
-    status TEXT NOT NULL DEFAULT 'processing',
-    tool_steps INTEGER NOT NULL DEFAULT 0,
-    error_message TEXT,
-    started_at TEXT NOT NULL,
-    finished_at TEXT
+    thread_id TEXT NOT NULL,
+    user_id INTEGER,
+    channel TEXT NOT NULL,
+    status TEXT NOT NULL,
+    model_calls INTEGER NOT NULL DEFAULT 0,
+    tool_calls INTEGER NOT NULL DEFAULT 0,
+    cache_hits INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    ttft_ms INTEGER,
+    assistant_ms INTEGER NOT NULL DEFAULT 0,
+    tools_ms INTEGER NOT NULL DEFAULT 0,
+    duration_ms INTEGER,
+    created_at INTEGER NOT NULL
 );
+CREATE INDEX IF NOT EXISTS idx_chat_turns_created_at ON chat_turns (created_at);
+CREATE INDEX IF NOT EXISTS idx_chat_turns_thread_id ON chat_turns (thread_id, id);
+CREATE INDEX IF NOT EXISTS idx_chat_turns_user_id ON chat_turns (user_id, id);
 """
+)
+
+# Tabelas com datas que ja foram TEXT (ISO 8601) e as colunas convertidas
+# para epoch em _migrate_epoch_columns.
+_EPOCH_TABLES = {
+    "users": (_USERS_TABLE_SQL, ("created_at", "updated_at")),
+    "agent_runs": (
+        _AGENT_RUNS_TABLE_SQL,
+        ("started_at", "finished_at", "next_attempt_at", "locked_at"),
+    ),
+    "webhook_deliveries": (_WEBHOOK_DELIVERIES_TABLE_SQL, ("received_at",)),
+}
+
+# No maximo um run enfileirado por issue: eventos novos sao coalescidos nele.
+_QUEUED_ISSUE_INDEX_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_agent_runs_queued_issue
+    ON agent_runs (repo, issue_number) WHERE status = 'queued'
+"""
+
+# Indices das listagens/filtros do admin e do claim da fila. O id cresce com
+# started_at, entao (filtro, id) atende ORDER BY id DESC e a paginacao keyset.
+_AGENT_RUN_INDEXES_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_agent_runs_status_id ON agent_runs (status, id)",
+    "CREATE INDEX IF NOT EXISTS idx_agent_runs_repo_issue_id"
+    " ON agent_runs (repo, issue_number, id)",
+    "CREATE INDEX IF NOT EXISTS idx_agent_runs_started_at ON agent_runs (started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_agent_runs_category_status"
+    " ON agent_runs (category, status)",
+    "CREATE INDEX IF NOT EXISTS idx_agent_runs_queue"
+    " ON agent_runs (next_attempt_at, id) WHERE status = 'queued'",
+)
+
+# Colunas adicionadas depois da criacao inicial de agent_runs. Bancos SQLite
+# existentes nao passam pelo Alembic, entao init_db as adiciona se faltarem.
+_AGENT_RUN_EXTRA_COLUMNS = {
+    "payload_json": "TEXT NOT NULL DEFAULT '{}'",
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "next_attempt_at": "INTEGER",
+    "locked_at": "INTEGER",
+    "coalesced_events": "INTEGER NOT NULL DEFAULT 0",
+    "model_calls": "INTEGER NOT NULL DEFAULT 0",
+    "input_tokens": "INTEGER NOT NULL DEFAULT 0",
+    "cached_input_tokens": "INTEGER NOT NULL DEFAULT 0",
+    "output_tokens": "INTEGER NOT NULL DEFAULT 0",
+    "assistant_ms": "INTEGER NOT NULL DEFAULT 0",
+    "tools_ms": "INTEGER NOT NULL DEFAULT 0",
+    "claimed_at": "INTEGER",
+}
+
+
+def _to_epoch(value: str | datetime | None) -> int | None:
+    """Converte ISO 8601 / datetime para epoch UTC em milissegundos."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return round(value.timestamp() * 1000)
+
 
+def _from_epoch(value: int | None) -> str | None:
+    """Converte epoch em milissegundos para ISO 8601 (UTC)."""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).isoformat()
 
-def _now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
+
+_BUMP_CONFIG_VERSION_SQL = "UPDATE config_version SET version = version + 1 WHERE id = 1"
+
+CONFIG_VERSION_POLL_SECONDS = 1.0
+
+
+def _merge_config_sql(
+    column: str, patch_param: int, config: dict[str, Any]
+) -> tuple[str, list[str]]:
+    """Expressao de merge raso de config, igual ao ``||`` do jsonb no Postgres.
+
+    ``json_patch`` sozinho mescla objetos aninhados recursivamente; removendo
+    antes as chaves de primeiro nivel do patch, cada uma e substituida inteira.
+    Retorna a expressao e os paths, bindados a partir de ``patch_param + 1``.
+    """
+    paths = [f'$."{key}"' for key in config]
+    removed = "".join(f", ?{patch_param + 1 + i}" for i in range(len(paths)))
+    return f"json_patch(json_remove({column}{removed}), ?{patch_param})", paths
+
+
+def _now_epoch() -> int:
+    return _to_epoch(datetime.now(timezone.utc))
 
 
 def _row_to_user(row: aiosqlite.Row) -> dict[str, Any]:
@@ -58,40 +214,89 @@ def _row_to_user(row: aiosqlite.Row) -> dict[str, Any]:
         "hashed_password": row[3],
         "role": row[4],
         "is_active": bool(row[5]),
-        "created_at": row[6],
-        "updated_at": row[7],
+        "created_at": _from_epoch(row[6]),
+        "updated_at": _from_epoch(row[7]),
     }
 
 
-async def init_db(db_path: str) -> aiosqlite.Connection:
-    """Abre conexao e cria tabelas se necessario."""
-    conn = await aiosqlite.connect(db_path)
-    await conn.executescript(SCHEMA_SQL)
-    await conn.execute(
-        "INSERT OR IGNORE INTO global_config (id, config_json) VALUES (1, '{}')"
-    )
-    await conn.commit()
-    return conn
+async def init_db(db_path: str, readers: int = DEFAULT_READERS) -> SqlitePool:
+    """Abre o pool (WAL, writer + readers) e cria tabelas se necessario."""
+    pool = await open_sqlite_pool(db_path, readers)
+    async with pool.write() as conn:
+        await conn.executescript(SCHEMA_SQL)
+        await _ensure_agent_run_columns(conn)
+        await _migrate_epoch_columns(conn)
+        await conn.execute(_QUEUED_ISSUE_INDEX_SQL)
+        for index_sql in _AGENT_RUN_INDEXES_SQL:
+            await conn.execute(index_sql)
+        await conn.execute(
+            "INSERT OR IGNORE INTO global_config (id, config_json) VALUES (1, '{}')"
+        )
+        await conn.execute(
+            "INSERT OR IGNORE INTO config_version (id, version) VALUES (1, 0)"
+        )
+    return pool
+
+
+async def _ensure_agent_run_columns(conn: aiosqlite.Connection) -> None:
+    """Adiciona colunas novas de agent_runs em bancos criados antes delas."""
+    cursor = await conn.execute("PRAGMA table_info(agent_runs)")
+    existing = {row[1] for row in await cursor.fetchall()}
+    for column, definition in _AGENT_RUN_EXTRA_COLUMNS.items():
+        if column not in existing:
+            await conn.execute(
+                f"ALTER TABLE agent_runs ADD COLUMN {column} {definition}"
+            )
+
+
+async def _migrate_epoch_columns(conn: aiosqlite.Connection) -> None:
+    """Converte datas TEXT (ISO 8601) de bancos antigos para epoch INTEGER.
+
+    SQLite nao altera o tipo de uma coluna: a tabela e recriada com o
+    schema atual e os dados copiados convertendo as datas. Roda dentro da
+    transacao de init_db; indices sao recriados logo depois.
+    """
+    for table, (ddl, columns) in _EPOCH_TABLES.items():
+        cursor = await conn.execute(f"PRAGMA table_info({table})")
+        info = await cursor.fetchall()
+        types = {row[1]: row[2].upper() for row in info}
+        if all(types.get(col) == "INTEGER" for col in columns):
+            continue
+
+        names = [row[1] for row in info]
+        select = ", ".join(
+            f"CAST(ROUND((julianday({name}) - 2440587.5) * 86400000) AS INTEGER)"
+            if name in columns else name
+            for name in names
+        )
+        # execute (e nao executescript) para nao sair da transacao
+        await conn.execute(ddl.format(name=f"{table}_new"))
+        await conn.execute(
+            f"INSERT INTO {table}_new ({', '.join(names)}) "  # noqa: S608
+            f"SELECT {select} FROM {table}"
+        )
+        await conn.execute(f"DROP TABLE {table}")
+        await conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
 
 
 # --- Users CRUD ---
 
 async def create_user(
-    conn: aiosqlite.Connection,
+    pool: SqlitePool,
     username: str,
     email: str,
     plain_password: str,
     role: str = "user",
 ) -> dict[str, Any]:
     """Cria usuario e retorna dict com dados (sem senha em texto)."""
-    now = _now_iso()
-    hashed = hash_password(plain_password)
-    cursor = await conn.execute(
-        """INSERT INTO users (username, email, hashed_password, role, is_active, created_at, updated_at)
-           VALUES (?, ?, ?, ?, 1, ?, ?)""",
-        (username, email, hashed, role, now, now),
-    )
-    await conn.commit()
+    now = _now_epoch()
+    hashed = await hash_password_async(plain_password)
+    async with pool.write() as conn:
+        cursor = await conn.execute(
+            """INSERT INTO users (username, email, hashed_password, role, is_active, created_at, updated_at)
+               VALUES (?, ?, ?, ?, 1, ?, ?)""",
+            (username, email, hashed, role, now, now),
+        )
     return {
         "id": cursor.lastrowid,
         "username": username,
@@ -99,40 +304,43 @@ async def create_user(
         "hashed_password": hashed,
         "role": role,
         "is_active": True,
-        "created_at": now,
-        "updated_at": now,
+        "created_at": _from_epoch(now),
+        "updated_at": _from_epoch(now),
     }
 
 
 async def get_user_by_id(
-    conn: aiosqlite.Connection, user_id: int
+    pool: SqlitePool, user_id: int
 ) -> dict[str, Any] | None:
     """Busca usuario por ID."""
-    cursor = await conn.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-    row = await cursor.fetchone()
+    async with pool.read() as conn:
+        cursor = await conn.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+        row = await cursor.fetchone()
     return _row_to_user(row) if row else None
 
 
 async def get_user_by_username(
-    conn: aiosqlite.Connection, username: str
+    pool: SqlitePool, username: str
 ) -> dict[str, Any] | None:
     """Busca usuario por username."""
-    cursor = await conn.execute(
-        "SELECT * FROM users WHERE username = ?", (username,)
-    )
-    row = await cursor.fetchone()
+    async with pool.read() as conn:
+        cursor = await conn.execute(
+            "SELECT * FROM users WHERE username = ?", (username,)
+        )
+        row = await cursor.fetchone()
     return _row_to_user(row) if row else None
 
 
-async def list_users(conn: aiosqlite.Connection) -> list[dict[str, Any]]:
+async def list_users(pool: SqlitePool) -> list[dict[str, Any]]:
     """Lista todos os usuarios."""
-    cursor = await conn.execute("SELECT * FROM users ORDER BY id")
-    rows = await cursor.fetchall()
+    async with pool.read() as conn:
+        cursor = await conn.execute("SELECT * FROM users ORDER BY id")
+        rows = await cursor.fetchall()
     return [_row_to_user(r) for r in rows]
 
 
 async def update_user(
-    conn: aiosqlite.Connection,
+    pool: SqlitePool,
     user_id: int,
     **fields: Any,
 ) -> dict[str, Any] | None:
@@ -140,99 +348,155 @@ async def update_user(
     allowed = {"email", "role", "is_active"}
     updates = {k: v for k, v in fields.items() if k in allowed and v is not None}
     if not updates:
-        return await get_user_by_id(conn, user_id)
+        return await get_user_by_id(pool, user_id)
 
-    updates["updated_at"] = _now_iso()
+    updates["updated_at"] = _now_epoch()
     set_clause = ", ".join(f"{k} = ?" for k in updates)
     values = list(updates.values()) + [user_id]
 
-    await conn.execute(
-        f"UPDATE users SET {set_clause} WHERE id = ?",  # noqa: S608
-        values,
-    )
-    await conn.commit()
-    return await get_user_by_id(conn, user_id)
+    async with pool.write() as conn:
+        cursor = await conn.execute(
+            f"UPDATE users SET {set_clause} WHERE id = ? RETURNING *",  # noqa: S608
+            values,
+        )
+        row = await cursor.fetchone()
+    return _row_to_user(row) if row else None
 
 
 async def update_user_password(
-    conn: aiosqlite.Connection,
+    pool: SqlitePool,
     user_id: int,
     plain_password: str,
 ) -> bool:
     """Atualiza senha do usuario. Retorna True se encontrou o usuario."""
-    hashed = hash_password(plain_password)
-    now = _now_iso()
-    cursor = await conn.execute(
-        "UPDATE users SET hashed_password = ?, updated_at = ? WHERE id = ?",
-        (hashed, now, user_id),
-    )
-    await conn.commit()
+    hashed = await hash_password_async(plain_password)
+    now = _now_epoch()
+    async with pool.write() as conn:
+        cursor = await conn.execute(
+            "UPDATE users SET hashed_password = ?, updated_at = ? WHERE id = ?",
+            (hashed, now, user_id),
+        )
     return cursor.rowcount > 0
 
 
-async def delete_user(conn: aiosqlite.Connection, user_id: int) -> bool:
+async def delete_user(pool: SqlitePool, user_id: int) -> bool:
     """Remove usuario. Retorna True se existia."""
-    cursor = await conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
-    await conn.commit()
+    async with pool.write() as conn:
+        cursor = await conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
     return cursor.rowcount > 0
 
 
 # --- Config ---
 
 async def get_user_config(
-    conn: aiosqlite.Connection, user_id: int
+    pool: SqlitePool, user_id: int
 ) -> dict[str, Any]:
     """Retorna config do usuario (dict vazio se nao houver)."""
-    cursor = await conn.execute(
-        "SELECT config_json FROM user_config WHERE user_id = ?", (user_id,)
-    )
-    row = await cursor.fetchone()
+    async with pool.read() as conn:
+        cursor = await conn.execute(
+            "SELECT config_json FROM user_config WHERE user_id = ?", (user_id,)
+        )
+        row = await cursor.fetchone()
     if row:
         return json.loads(row[0])
     return {}
 
 
 async def set_user_config(
-    conn: aiosqlite.Connection, user_id: int, config: dict[str, Any]
-) -> None:
-    """Salva config do usuario (merge com existente)."""
-    existing = await get_user_config(conn, user_id)
-    merged = {**existing, **config}
-    config_json = json.dumps(merged)
-    await conn.execute(
-        """INSERT INTO user_config (user_id, config_json) VALUES (?, ?)
-           ON CONFLICT(user_id) DO UPDATE SET config_json = ?""",
-        (user_id, config_json, config_json),
-    )
-    await conn.commit()
+    pool: SqlitePool, user_id: int, config: dict[str, Any]
+) -> dict[str, Any]:
+    """Faz merge de config na do usuario e retorna a config resultante.
+
+    O merge (raso) acontece no proprio UPDATE, sem ler antes: escritas
+    concorrentes nao se sobrescrevem. Chaves com None sao removidas.
+    """
+    merged, paths = _merge_config_sql("config_json", 2, config)
+    async with pool.write() as conn:
+        cursor = await conn.execute(
+            f"""INSERT INTO user_config (user_id, config_json) VALUES (?1, json_patch('{{}}', ?2))
+               ON CONFLICT(user_id) DO UPDATE SET config_json = {merged}
+               RETURNING config_json""",
+            (user_id, json.dumps(config), *paths),
+        )
+        row = await cursor.fetchone()
+        await conn.execute(_BUMP_CONFIG_VERSION_SQL)
+    return json.loads(row[0])
 
 
-async def get_global_config(conn: aiosqlite.Connection) -> dict[str, Any]:
+async def get_global_config(pool: SqlitePool) -> dict[str, Any]:
     """Retorna config global."""
-    cursor = await conn.execute(
-        "SELECT config_json FROM global_config WHERE id = 1"
-    )
-    row = await cursor.fetchone()
+    async with pool.read() as conn:
+        cursor = await conn.execute(
+            "SELECT config_json FROM global_config WHERE id = 1"
+        )
+        row = await cursor.fetchone()
     if row:
         return json.loads(row[0])
     return {}
 
 
 async def set_global_config(
-    conn: aiosqlite.Connection, config: dict[str, Any]
-) -> None:
-    """Salva config global (merge com existente)."""
-    existing = await get_global_config(conn)
-    merged = {**existing, **config}
-    config_json = json.dumps(merged)
-    await conn.execute(
-        "UPDATE global_config SET config_json = ? WHERE id = 1",
-        (config_json,),
-    )
-    await conn.commit()
+    pool: SqlitePool, config: dict[str, Any]
+) -> dict[str, Any]:
+    """Faz merge (raso) de config na global e retorna a config resultante."""
+    merged, paths = _merge_config_sql("config_json", 1, config)
+    async with pool.write() as conn:
+        cursor = await conn.execute(
+            f"""UPDATE global_config SET config_json = {merged}
+               WHERE id = 1 RETURNING config_json""",
+            (json.dumps(config), *paths),
+        )
+        row = await cursor.fetchone()
+        await conn.execute(_BUMP_CONFIG_VERSION_SQL)
+    return json.loads(row[0])
 
 
-# --- Seed ---
+async def get_config_version(pool: SqlitePool) -> int:
+    """Versao atual das configs (muda a cada set_*_config)."""
+    async with pool.read() as conn:
+        cursor = await conn.execute("SELECT version FROM config_version WHERE id = 1")
+        row = await cursor.fetchone()
+    return row[0] if row else 0
+
+
+async def watch_config_changes(
+    pool: SqlitePool,
+    on_change: Callable[[str | None], None],
+    interval: float | None = None,
+) -> Callable[[], Awaitable[None]]:
+    """Chama ``on_change(None)`` quando a versao de config muda.
+
+    Sem LISTEN/NOTIFY no SQLite, uma task compara ``config_version`` a cada
+    ``interval`` segundos (padrao ``CONFIG_VERSION_POLL_SECONDS``), fora do
+    caminho dos requests. Retorna a funcao assincrona que para a observacao.
+    """
+    interval = interval or CONFIG_VERSION_POLL_SECONDS
+    version = await get_config_version(pool)
+
+    async def _poll() -> None:
+        nonlocal version
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                current = await get_config_version(pool)
+            except Exception:
+                logger.exception("Erro ao verificar versao de config")
+                continue
+            if current != version:
+                version = current
+                on_change(None)
+
+    task = asyncio.create_task(_poll())
+
+    async def stop() -> None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    return stop
+
 
 # --- Agent Runs ---
 
@@ -248,26 +512,39 @@ def _row_to_agent_run(row: aiosqlite.Row) -> dict[str, Any]:
         "status": row[6],
         "tool_steps": row[7],
         "error_message": row[8],
-        "started_at": row[9],
-        "finished_at": row[10],
+        "started_at": _from_epoch(row[9]),
+        "finished_at": _from_epoch(row[10]),
+        "payload": json.loads(row[11] or "{}"),
+        "attempts": row[12],
+        "next_attempt_at": _from_epoch(row[13]),
+        "locked_at": _from_epoch(row[14]),
+        "coalesced_events": row[15],
+        "model_calls": row[16],
+        "input_tokens": row[17],
+        "cached_input_tokens": row[18],
+        "output_tokens": row[19],
+        "assistant_ms": row[20],
+        "tools_ms": row[21],
+        "claimed_at": _from_epoch(row[22]),
     }
 
 
 async def create_agent_run(
-    conn: aiosqlite.Connection,
+    pool: SqlitePool,
     repo: str,
     issue_number: int,
     issue_title: str,
     action: str,
 ) -> dict[str, Any]:
     """Cria registro de execucao do agente GitHub."""
-    now = _now_iso()
-    cursor = await conn.execute(
-        """INSERT INTO agent_runs (repo, issue_number, issue_title, action, status, started_at)
-           VALUES (?, ?, ?, ?, 'processing', ?)""",
-        (repo, issue_number, issue_title, action, now),
-    )
-    await conn.commit()
+    now = _now_epoch()
+    async with pool.write() as conn:
+        cursor = await conn.execute(
+            """INSERT INTO agent_runs
+               (repo, issue_number, issue_title, action, status, started_at, claimed_at)
+               VALUES (?, ?, ?, ?, 'processing', ?, ?)""",
+            (repo, issue_number, issue_title, action, now, now),
+        )
     return {
         "id": cursor.lastrowid,
         "repo": repo,
@@ -278,82 +555,540 @@ async def create_agent_run(
         "status": "processing",
         "tool_steps": 0,
         "error_message": None,
-        "started_at": now,
+        "started_at": _from_epoch(now),
         "finished_at": None,
+        "payload": {},
+        "attempts": 0,
+        "next_attempt_at": None,
+        "locked_at": None,
+        "coalesced_events": 0,
+        **{field: 0 for field in AGENT_RUN_USAGE_FIELDS},
+        "claimed_at": _from_epoch(now),
     }
 
 
+# Contadores de uso gravados na conclusao do run (ver turn_metrics)
+AGENT_RUN_USAGE_FIELDS = (
+    "model_calls", "input_tokens", "cached_input_tokens", "output_tokens",
+    "assistant_ms", "tools_ms",
+)
+
+_AGENT_RUN_UPDATABLE = {
+    "category", "status", "tool_steps", "error_message", "finished_at",
+    "next_attempt_at", "locked_at", "attempts", *AGENT_RUN_USAGE_FIELDS,
+}
+_AGENT_RUN_TIME_FIELDS = {"finished_at", "next_attempt_at", "locked_at"}
+
+
+def _agent_run_update_sql(
+    run_id: int, expected_status: str | None, fields: dict[str, Any],
+) -> tuple[str, list[Any]] | None:
+    updates = {k: v for k, v in fields.items() if k in _AGENT_RUN_UPDATABLE}
+    if not updates:
+        return None
+    for key in updates.keys() & _AGENT_RUN_TIME_FIELDS:
+        updates[key] = _to_epoch(updates[key])
+
+    set_clause = ", ".join(f"{k} = ?" for k in updates)
+    values = list(updates.values()) + [run_id]
+    where = "id = ?"
+    if expected_status is not None:
+        where += " AND status = ?"
+        values.append(expected_status)
+    return f"UPDATE agent_runs SET {set_clause} WHERE {where}", values  # noqa: S608
+
+
 async def update_agent_run(
-    conn: aiosqlite.Connection,
+    pool: SqlitePool,
     run_id: int,
+    expected_status: str | None = None,
     **fields: Any,
 ) -> dict[str, Any] | None:
-    """Atualiza campos de um agent run."""
-    allowed = {"category", "status", "tool_steps", "error_message", "finished_at"}
-    updates = {k: v for k, v in fields.items() if k in allowed}
-    if not updates:
-        return await get_agent_run(conn, run_id)
+    """Atualiza campos de um agent run e retorna o registro atualizado.
 
-    set_clause = ", ".join(f"{k} = ?" for k in updates)
-    values = list(updates.values()) + [run_id]
+    Com expected_status, so atualiza se o run ainda estiver nesse status
+    (ex.: nao sobrescrever um run cancelado) e retorna None caso contrario.
+    """
+    statement = _agent_run_update_sql(run_id, expected_status, fields)
+    if statement is None:
+        return await get_agent_run(pool, run_id)
+
+    sql, values = statement
+    async with pool.write() as conn:
+        cursor = await conn.execute(f"{sql} RETURNING *", values)
+        row = await cursor.fetchone()
+    return _row_to_agent_run(row) if row else None
+
+
+async def update_agent_runs(
+    pool: SqlitePool,
+    updates: list[tuple[int, str | None, dict[str, Any]]],
+) -> int:
+    """Aplica varios updates de agent runs numa unica transacao.
+
+    Cada item e ``(run_id, expected_status, campos)``, com a mesma semantica
+    de ``update_agent_run``. Retorna quantos updates alteraram um run.
+    """
+    applied = 0
+    async with pool.write() as conn:
+        for run_id, expected_status, fields in updates:
+            statement = _agent_run_update_sql(run_id, expected_status, fields)
+            if statement is None:
+                continue
+            cursor = await conn.execute(*statement)
+            applied += cursor.rowcount
+    return applied
+
+
+async def enqueue_agent_run(
+    pool: SqlitePool,
+    repo: str,
+    issue_number: int,
+    issue_title: str,
+    action: str,
+    payload: dict[str, Any] | None = None,
+    debounce_seconds: int = 0,
+    delivery_id: str | None = None,
+) -> dict[str, Any] | None:
+    """Enfileira execucao do agente GitHub (status 'queued').
+
+    O payload guarda o que o worker precisa para processar a issue
+    (corpo, labels) sem depender do request original.
+
+    Eventos da mesma issue sao coalescidos: se ja existe um run enfileirado,
+    ele recebe o estado novo e tem a execucao adiada por debounce_seconds
+    (coalesced_events > 0 no retorno). Runs em execucao ou aguardando retry
+    para a issue ficam obsoletos e sao marcados como 'cancelled'.
+
+    Com ``delivery_id`` (X-GitHub-Delivery), a entrega e registrada na
+    mesma transacao: se o enqueue falhar, a reentrega do GitHub ainda e
+    aceita. Retorna None se a entrega ja foi vista.
+    """
+    now = _now_epoch()
+    run_at = now + debounce_seconds * 1000
+    payload_json = json.dumps(payload or {})
+
+    async with pool.write() as conn:
+        if delivery_id:
+            cursor = await conn.execute(
+                """INSERT INTO webhook_deliveries (delivery_id, received_at) VALUES (?, ?)
+                   ON CONFLICT (delivery_id) DO NOTHING""",
+                (delivery_id, now),
+            )
+            if cursor.rowcount == 0:
+                return None
+        await conn.execute(
+            """UPDATE agent_runs SET status = 'cancelled', finished_at = ?, locked_at = NULL
+               WHERE repo = ? AND issue_number = ?
+                 AND (status = 'processing' OR (status = 'queued' AND attempts > 0))""",
+            (now, repo, issue_number),
+        )
+        cursor = await conn.execute(
+            """INSERT INTO agent_runs
+               (repo, issue_number, issue_title, action, status, started_at,
+                payload_json, attempts, next_attempt_at)
+               VALUES (?, ?, ?, ?, 'queued', ?, ?, 0, ?)
+               ON CONFLICT (repo, issue_number) WHERE status = 'queued'
+               DO UPDATE SET
+                   issue_title = excluded.issue_title,
+                   action = excluded.action,
+                   payload_json = excluded.payload_json,
+                   next_attempt_at = excluded.next_attempt_at,
+                   coalesced_events = coalesced_events + 1
+               RETURNING *""",
+            (repo, issue_number, issue_title, action, now, payload_json, run_at),
+        )
+        row = await cursor.fetchone()
+    return _row_to_agent_run(row)
 
-    await conn.execute(
-        f"UPDATE agent_runs SET {set_clause} WHERE id = ?",  # noqa: S608
-        values,
-    )
-    await conn.commit()
-    return await get_agent_run(conn, run_id)
+
+async def claim_agent_run(pool: SqlitePool) -> dict[str, Any] | None:
+    """Reivindica o proximo run enfileirado e pronto para execucao.
+
+    Marca o run como 'processing', incrementa attempts e registra locked_at
+    e claimed_at (inicio da tentativa) num unico UPDATE, entao dois workers nunca pegam o mesmo run.
+    """
+    now = _now_epoch()
+    async with pool.write() as conn:
+        cursor = await conn.execute(
+            """UPDATE agent_runs
+               SET status = 'processing', attempts = attempts + 1,
+                   locked_at = ?, claimed_at = ?
+               WHERE id = (
+                   SELECT id FROM agent_runs
+                   WHERE status = 'queued' AND next_attempt_at <= ?
+                   ORDER BY next_attempt_at, id
+                   LIMIT 1
+               )
+               RETURNING *""",
+            (now, now, now),
+        )
+        row = await cursor.fetchone()
+    return _row_to_agent_run(row) if row else None
+
+
+async def recover_stale_agent_runs(
+    pool: SqlitePool, locked_before: str
+) -> int:
+    """Devolve para a fila runs 'processing' travados antes de locked_before.
+
+    Cobre workers que morreram no meio da execucao. Retorna quantos runs
+    foram recuperados.
+    """
+    async with pool.write() as conn:
+        cursor = await conn.execute(
+            """UPDATE agent_runs
+               SET status = 'queued', next_attempt_at = ?, locked_at = NULL
+               WHERE status = 'processing' AND locked_at IS NOT NULL AND locked_at < ?""",
+            (_now_epoch(), _to_epoch(locked_before)),
+        )
+    return cursor.rowcount
+
+
+async def prune_webhook_deliveries(
+    pool: SqlitePool, received_before: str
+) -> int:
+    """Remove registros de entregas antigas (fora da janela de reentrega)."""
+    async with pool.write() as conn:
+        cursor = await conn.execute(
+            "DELETE FROM webhook_deliveries WHERE received_at < ?", (_to_epoch(received_before),),
+        )
+    return cursor.rowcount
 
 
 async def get_agent_run(
-    conn: aiosqlite.Connection, run_id: int
+    pool: SqlitePool, run_id: int
 ) -> dict[str, Any] | None:
     """Busca agent run por ID."""
-    cursor = await conn.execute("SELECT * FROM agent_runs WHERE id = ?", (run_id,))
-    row = await cursor.fetchone()
+    async with pool.read() as conn:
+        cursor = await conn.execute("SELECT * FROM agent_runs WHERE id = ?", (run_id,))
+        row = await cursor.fetchone()
     return _row_to_agent_run(row) if row else None
 
 
+def _agent_run_filters(
+    status: str | None = None,
+    repo: str | None = None,
+    issue_number: int | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+) -> tuple[list[str], list[Any]]:
+    conditions: list[str] = []
+    params: list[Any] = []
+    if status:
+        conditions.append("status = ?")
+        params.append(status)
+    if repo:
+        conditions.append("repo = ?")
+        params.append(repo)
+    if issue_number is not None:
+        conditions.append("issue_number = ?")
+        params.append(issue_number)
+    if started_after:
+        conditions.append("started_at >= ?")
+        params.append(_to_epoch(started_after))
+    if started_before:
+        conditions.append("started_at < ?")
+        params.append(_to_epoch(started_before))
+    return conditions, params
+
+
+def _where(conditions: list[str]) -> str:
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
 async def list_agent_runs(
-    conn: aiosqlite.Connection,
+    pool: SqlitePool,
     limit: int = 50,
     offset: int = 0,
     status: str | None = None,
-) -> tuple[list[dict[str, Any]], int]:
-    """Lista agent runs com paginacao e filtro opcional por status."""
-    where = ""
+    repo: str | None = None,
+    issue_number: int | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+    before_id: int | None = None,
+) -> tuple[list[dict[str, Any]], int | None]:
+    """Lista agent runs (mais recentes primeiro) com filtros e paginacao.
+
+    Com before_id a paginacao e keyset (``id < before_id``) e offset e
+    ignorado: o custo por pagina nao cresce com a profundidade. O total
+    (apenas filtros) so e contado na primeira pagina (sem before_id e com
+    offset 0); nas seguintes vem None, para nao varrer a tabela a cada
+    pagina.
+    """
+    conditions, params = _agent_run_filters(
+        status, repo, issue_number, started_after, started_before,
+    )
+
+    async with pool.read() as conn:
+        total = None
+        if before_id is None and offset == 0:
+            cursor = await conn.execute(
+                f"SELECT COUNT(*) FROM agent_runs {_where(conditions)}", params,  # noqa: S608
+            )
+            row = await cursor.fetchone()
+            total = row[0] if row else 0
+
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+            offset = 0
+        cursor = await conn.execute(
+            f"SELECT * FROM agent_runs {_where(conditions)} "  # noqa: S608
+            "ORDER BY id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        )
+        rows = await cursor.fetchall()
+    return [_row_to_agent_run(r) for r in rows], total
+
+
+async def agent_run_queue_depth(pool: SqlitePool) -> dict[str, int]:
+    """Runs enfileirados e em execucao (``{status: total}``)."""
+    async with pool.read() as conn:
+        cursor = await conn.execute(
+            """SELECT status, COUNT(*) FROM agent_runs
+               WHERE status IN ('queued', 'processing') GROUP BY status""",
+        )
+        rows = await cursor.fetchall()
+    depth = {"queued": 0, "processing": 0}
+    depth.update({row[0]: row[1] for row in rows})
+    return depth
+
+
+async def agent_run_stats(
+    pool: SqlitePool,
+    repo: str | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+) -> list[dict[str, Any]]:
+    """Agrega runs por categoria e status, calculado no banco.
+
+    Retorna contagem e duracao de execucao (finished_at - claimed_at, em
+    segundos; sem debounce e espera na fila):
+    media, p50 e p95 (nearest-rank) dos runs finalizados; e a soma de
+    chamadas ao modelo e tokens.
+    """
+    conditions, params = _agent_run_filters(
+        repo=repo, started_after=started_after, started_before=started_before,
+    )
+    sql = f"""
+        WITH durations AS (
+            SELECT category, status, model_calls, input_tokens,
+                   cached_input_tokens, output_tokens,
+                   (finished_at - claimed_at) / 1000.0 AS duration
+            FROM agent_runs {_where(conditions)}
+        ), ranked AS (
+            SELECT *,
+                   ROW_NUMBER() OVER (w ORDER BY duration) AS rn,
+                   COUNT(*) OVER w AS n
+            FROM durations
+            WINDOW w AS (PARTITION BY category, status, duration IS NULL)
+        )
+        SELECT category, status, COUNT(*) AS runs,
+               AVG(duration),
+               MIN(CASE WHEN duration IS NOT NULL AND rn >= 0.50 * n THEN duration END),
+               MIN(CASE WHEN duration IS NOT NULL AND rn >= 0.95 * n THEN duration END),
+               SUM(model_calls), SUM(input_tokens), SUM(cached_input_tokens),
+               SUM(output_tokens)
+        FROM ranked
+        GROUP BY category, status
+        ORDER BY category, status
+    """  # noqa: S608
+    async with pool.read() as conn:
+        cursor = await conn.execute(sql, params)
+        rows = await cursor.fetchall()
+    return [
+        {
+            "category": r[0],
+            "status": r[1],
+            "count": r[2],
+            "avg_duration_seconds": r[3],
+            "p50_duration_seconds": r[4],
+            "p95_duration_seconds": r[5],
+            "model_calls": r[6],
+            "input_tokens": r[7],
+            "cached_input_tokens": r[8],
+            "output_tokens": r[9],
+        }
+        for r in rows
+    ]
+
+
+# --- Chat turns ---
+
+_CHAT_TURN_COLUMNS = (
+    "thread_id", "user_id", "channel", "status", "model_calls", "tool_calls",
+    "cache_hits", "input_tokens", "cached_input_tokens", "output_tokens",
+    "ttft_ms", "assistant_ms", "tools_ms", "duration_ms",
+)
+
+
+def _row_to_chat_turn(row: aiosqlite.Row) -> dict[str, Any]:
+    turn = {"id": row[0]}
+    turn.update(zip(_CHAT_TURN_COLUMNS, row[1:15]))
+    turn["created_at"] = _from_epoch(row[15])
+    return turn
+
+
+async def insert_chat_turns(
+    pool: SqlitePool, turns: list[dict[str, Any]],
+) -> int:
+    """Grava varios turnos numa unica transacao. Retorna quantos gravou."""
+    if not turns:
+        return 0
+    now = _now_epoch()
+    placeholders = ", ".join("?" * (len(_CHAT_TURN_COLUMNS) + 1))
+    async with pool.write() as conn:
+        await conn.executemany(
+            f"INSERT INTO chat_turns ({', '.join(_CHAT_TURN_COLUMNS)}, created_at) "  # noqa: S608
+            f"VALUES ({placeholders})",
+            [[turn.get(c) for c in _CHAT_TURN_COLUMNS] + [now] for turn in turns],
+        )
+    return len(turns)
+
+
+def _chat_turn_filters(
+    user_id: int | None = None,
+    thread_id: str | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+) -> tuple[list[str], list[Any]]:
+    conditions: list[str] = []
     params: list[Any] = []
-    if status:
-        where = "WHERE status = ?"
-        params.append(status)
+    if user_id is not None:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    if thread_id:
+        conditions.append("thread_id = ?")
+        params.append(thread_id)
+    if started_after:
+        conditions.append("created_at >= ?")
+        params.append(_to_epoch(started_after))
+    if started_before:
+        conditions.append("created_at < ?")
+        params.append(_to_epoch(started_before))
+    return conditions, params
+
+
+async def list_chat_turns(
+    pool: SqlitePool,
+    limit: int = 50,
+    offset: int = 0,
+    user_id: int | None = None,
+    thread_id: str | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+    slowest: bool = False,
+) -> tuple[list[dict[str, Any]], int | None]:
+    """Lista turnos (mais recentes, ou mais lentos com ``slowest``).
 
-    cursor = await conn.execute(
-        f"SELECT COUNT(*) FROM agent_runs {where}", params,  # noqa: S608
+    O total (COUNT na tabela toda) so e calculado na primeira pagina
+    (offset 0); nas demais vem None.
+    """
+    conditions, params = _chat_turn_filters(
+        user_id, thread_id, started_after, started_before,
     )
-    row = await cursor.fetchone()
-    total = row[0] if row else 0
+    order = "duration_ms DESC, id DESC" if slowest else "id DESC"
+    async with pool.read() as conn:
+        total = None
+        if offset == 0:
+            cursor = await conn.execute(
+                f"SELECT COUNT(*) FROM chat_turns {_where(conditions)}", params,  # noqa: S608
+            )
+            row = await cursor.fetchone()
+            total = row[0] if row else 0
+        cursor = await conn.execute(
+            f"SELECT * FROM chat_turns {_where(conditions)} "  # noqa: S608
+            f"ORDER BY {order} LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        )
+        rows = await cursor.fetchall()
+    return [_row_to_chat_turn(r) for r in rows], total
 
-    cursor = await conn.execute(
-        f"SELECT * FROM agent_runs {where} ORDER BY id DESC LIMIT ? OFFSET ?",  # noqa: S608
-        params + [limit, offset],
+
+async def chat_turn_stats(
+    pool: SqlitePool,
+    user_id: int | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+) -> list[dict[str, Any]]:
+    """Agrega turnos por canal e status, calculado no banco.
+
+    Duracao e time-to-first-token em ms (media, p50 e p95 nearest-rank),
+    media de chamadas ao modelo e de tools por turno e soma de tokens.
+    """
+    conditions, params = _chat_turn_filters(
+        user_id=user_id, started_after=started_after, started_before=started_before,
     )
-    rows = await cursor.fetchall()
-    return [_row_to_agent_run(r) for r in rows], total
+    sql = f"""
+        WITH ranked AS (
+            SELECT *,
+                   ROW_NUMBER() OVER (d ORDER BY duration_ms) AS d_rn,
+                   COUNT(*) OVER d AS d_n,
+                   ROW_NUMBER() OVER (t ORDER BY ttft_ms) AS t_rn,
+                   COUNT(*) OVER t AS t_n
+            FROM chat_turns {_where(conditions)}
+            WINDOW d AS (PARTITION BY channel, status, duration_ms IS NULL),
+                   t AS (PARTITION BY channel, status, ttft_ms IS NULL)
+        )
+        SELECT channel, status, COUNT(*),
+               AVG(duration_ms),
+               MIN(CASE WHEN duration_ms IS NOT NULL AND d_rn >= 0.50 * d_n
+                        THEN duration_ms END),
+               MIN(CASE WHEN duration_ms IS NOT NULL AND d_rn >= 0.95 * d_n
+                        THEN duration_ms END),
+               AVG(ttft_ms),
+               MIN(CASE WHEN ttft_ms IS NOT NULL AND t_rn >= 0.50 * t_n THEN ttft_ms END),
+               MIN(CASE WHEN ttft_ms IS NOT NULL AND t_rn >= 0.95 * t_n THEN ttft_ms END),
+               AVG(model_calls), AVG(tool_calls), SUM(cache_hits),
+               SUM(input_tokens), SUM(cached_input_tokens), SUM(output_tokens)
+        FROM ranked
+        GROUP BY channel, status
+        ORDER BY channel, status
+    """  # noqa: S608
+    async with pool.read() as conn:
+        cursor = await conn.execute(sql, params)
+        rows = await cursor.fetchall()
+    return [
+        {
+            "channel": r[0],
+            "status": r[1],
+            "count": r[2],
+            "avg_duration_ms": r[3],
+            "p50_duration_ms": r[4],
+            "p95_duration_ms": r[5],
+            "avg_ttft_ms": r[6],
+            "p50_ttft_ms": r[7],
+            "p95_ttft_ms": r[8],
+            "avg_model_calls": r[9],
+            "avg_tool_calls": r[10],
+            "cache_hits": r[11],
+            "input_tokens": r[12],
+            "cached_input_tokens": r[13],
+            "output_tokens": r[14],
+        }
+        for r in rows
+    ]
 
 
 # --- Seed ---
 
 async def seed_admin_if_needed(
-    conn: aiosqlite.Connection,
+    pool: SqlitePool,
     username: str,
     email: str,
     password: str,
 ) -> None:
     """Cria usuario admin se nao existir nenhum admin."""
-    cursor = await conn.execute(
-        "SELECT COUNT(*) FROM users WHERE role = 'admin'"
-    )
-    row = await cursor.fetchone()
+    async with pool.read() as conn:
+        cursor = await conn.execute(
+            "SELECT COUNT(*) FROM users WHERE role = 'admin'"
+        )
+        row = await cursor.fetchone()
     if row and row[0] > 0:
         return
-    await create_user(conn, username, email, password, role="admin")
+    try:
+        await create_user(pool, username, email, password, role="admin")
+    except aiosqlite.IntegrityError:
+        # Outro worker criou o admin entre a contagem e o insert
+        pass
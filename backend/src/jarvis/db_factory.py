@@ -7,14 +7,14 @@ async def create_auth_db(settings: Any):
     """Cria conexao/pool de auth DB baseado na configuracao.
 
     Se DATABASE_URL estiver definido, usa PostgreSQL (asyncpg pool).
-    Senao, usa SQLite (aiosqlite connection).
+    Senao, usa SQLite (SqlitePool em WAL: writer + readers).
     """
     if settings.database_url:
         from .db_postgres import init_db
         return await init_db(settings.database_url)
     else:
         from .db import init_db
-        return await init_db(settings.auth_db_path)
+        return await init_db(settings.auth_db_path, settings.sqlite_readers)
 
 
 def get_db_module(settings: Any):
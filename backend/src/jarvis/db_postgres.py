@@ -1,12 +1,30 @@
-"""Banco de dados de autenticacao e configuracao (PostgreSQL via asyncpg)."""
+"""Banco de dados de autenticacao e configuracao (PostgreSQL via asyncpg).
 
+Datas sao ``TIMESTAMPTZ`` e configs/payloads ``JSONB``; as funcoes
+continuam recebendo/retornando datas em ISO 8601 e JSON como dict (codec
+jsonb registrado em cada conexao do pool).
+"""
+
+import asyncio
 import json
-from datetime import datetime, timezone
-from typing import Any
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
 
 import asyncpg
 
-from .auth import hash_password
+from .auth import hash_password_async
+from .tracing import MAX_ATTRIBUTE_CHARS, record_span, tracing_enabled
+
+logger = logging.getLogger(__name__)
+
+# Canal de LISTEN/NOTIFY das mudancas de config. Payload: "global" ou
+# "user:<id>".
+CONFIG_CHANNEL = "jarvis_config"
+CONFIG_LISTEN_RETRY_SECONDS = 1.0
+
+# Chave do pg_advisory_xact_lock que serializa o init_db entre processos
+SCHEMA_LOCK_ID = 7_305_001
 
 SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS users (
@@ -16,18 +34,18 @@ CREATE TABLE IF NOT EXISTS users (
     hashed_password TEXT NOT NULL,
     role TEXT NOT NULL DEFAULT 'user',
     is_active BOOLEAN NOT NULL DEFAULT TRUE,
-    created_at TEXT NOT NULL,
-    updated_at TEXT NOT NULL
+    created_at TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL
 );
 
 CREATE TABLE IF NOT EXISTS user_config (
     user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
-    config_json TEXT NOT NULL DEFAULT '{}'
+    config_json JSONB NOT NULL DEFAULT '{}'::jsonb
 );
 
 CREATE TABLE IF NOT EXISTS global_config (
     id INTEGER PRIMARY KEY CHECK (id = 1),
-    config_json TEXT NOT NULL DEFAULT '{}'
+    config_json JSONB NOT NULL DEFAULT '{}'::jsonb
 );
 
 CREATE TABLE IF NOT EXISTS agent_runs (
@@ -40,14 +58,146 @@ CREATE TABLE IF NOT EXISTS agent_runs (
     status TEXT NOT NULL DEFAULT 'processing',
     tool_steps INTEGER NOT NULL DEFAULT 0,
     error_message TEXT,
-    started_at TEXT NOT NULL,
-    finished_at TEXT
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ,
+    payload_json JSONB NOT NULL DEFAULT '{}'::jsonb,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ,
+    locked_at TIMESTAMPTZ,
+    coalesced_events INTEGER NOT NULL DEFAULT 0,
+    model_calls INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    assistant_ms INTEGER NOT NULL DEFAULT 0,
+    tools_ms INTEGER NOT NULL DEFAULT 0,
+    claimed_at TIMESTAMPTZ
+);
+
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS payload_json JSONB NOT NULL DEFAULT '{}'::jsonb;
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ;
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS locked_at TIMESTAMPTZ;
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS coalesced_events INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS model_calls INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS input_tokens INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS cached_input_tokens INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS output_tokens INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS assistant_ms INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS tools_ms INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ;
+
+-- No maximo um run enfileirado por issue: eventos novos sao coalescidos nele.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_agent_runs_queued_issue
+    ON agent_runs (repo, issue_number) WHERE status = 'queued';
+
+CREATE TABLE IF NOT EXISTS webhook_deliveries (
+    delivery_id TEXT PRIMARY KEY,
+    received_at TIMESTAMPTZ NOT NULL
 );
+
+-- Listagens/filtros do admin e claim da fila. O id cresce com started_at,
+-- entao (filtro, id) atende ORDER BY id DESC e a paginacao keyset.
+CREATE INDEX IF NOT EXISTS idx_agent_runs_status_id ON agent_runs (status, id);
+CREATE INDEX IF NOT EXISTS idx_agent_runs_repo_issue_id ON agent_runs (repo, issue_number, id);
+CREATE INDEX IF NOT EXISTS idx_agent_runs_started_at ON agent_runs (started_at);
+CREATE INDEX IF NOT EXISTS idx_agent_runs_category_status ON agent_runs (category, status);
+CREATE INDEX IF NOT EXISTS idx_agent_runs_queue
+    ON agent_runs (next_attempt_at, id) WHERE status = 'queued';
+
+-- Uso e latencia por turno do chat (ver turn_metrics). Tempos em ms.
+CREATE TABLE IF NOT EXISTS chat_turns (
+    id BIGSERIAL PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    user_id INTEGER,
+    channel TEXT NOT NULL,
+    status TEXT NOT NULL,
+    model_calls INTEGER NOT NULL DEFAULT 0,
+    tool_calls INTEGER NOT NULL DEFAULT 0,
+    cache_hits INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    ttft_ms INTEGER,
+    assistant_ms INTEGER NOT NULL DEFAULT 0,
+    tools_ms INTEGER NOT NULL DEFAULT 0,
+    duration_ms INTEGER,
+    created_at TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chat_turns_created_at ON chat_turns (created_at);
+CREATE INDEX IF NOT EXISTS idx_chat_turns_thread_id ON chat_turns (thread_id, id);
+CREATE INDEX IF NOT EXISTS idx_chat_turns_user_id ON chat_turns (user_id, id);
+
+-- Bancos criados com datas/JSON em TEXT: converte para os tipos nativos.
+DO $$
+DECLARE
+    col RECORD;
+BEGIN
+    FOR col IN
+        SELECT table_name, column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND data_type = 'text'
+          AND (table_name, column_name) IN (
+              ('users', 'created_at'), ('users', 'updated_at'),
+              ('agent_runs', 'started_at'), ('agent_runs', 'finished_at'),
+              ('agent_runs', 'next_attempt_at'), ('agent_runs', 'locked_at'),
+              ('webhook_deliveries', 'received_at'))
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE %I ALTER COLUMN %I TYPE TIMESTAMPTZ USING %I::timestamptz',
+            col.table_name, col.column_name, col.column_name);
+    END LOOP;
+
+    FOR col IN
+        SELECT table_name, column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND data_type = 'text'
+          AND (table_name, column_name) IN (
+              ('user_config', 'config_json'), ('global_config', 'config_json'),
+              ('agent_runs', 'payload_json'))
+    LOOP
+        EXECUTE format('ALTER TABLE %I ALTER COLUMN %I DROP DEFAULT',
+                       col.table_name, col.column_name);
+        EXECUTE format('ALTER TABLE %I ALTER COLUMN %I TYPE JSONB USING %I::jsonb',
+                       col.table_name, col.column_name, col.column_name);
+        EXECUTE format('ALTER TABLE %I ALTER COLUMN %I SET DEFAULT ''{}''::jsonb',
+                       col.table_name, col.column_name);
+    END LOOP;
+END $$;
 """
 
 
-def _now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _ts(value: str | datetime | None) -> datetime | None:
+    """Converte ISO 8601 para datetime (asyncpg exige datetime em TIMESTAMPTZ)."""
+    if value is None or isinstance(value, datetime):
+        return value
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() if value is not None else None
+
+
+def _trace_query(record: Any) -> None:
+    # Chamado pelo asyncpg (call_soon) no contexto da query: pai = span atual
+    record_span(
+        "db.query",
+        record.elapsed,
+        error=str(record.exception) if record.exception else None,
+        statement=" ".join(record.query.split())[:MAX_ATTRIBUTE_CHARS],
+    )
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    await conn.set_type_codec(
+        "jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog",
+    )
+    # O logger mede cada query; so e registrado com tracing ligado
+    if tracing_enabled():
+        conn.add_query_logger(_trace_query)
 
 
 def _record_to_user(record: asyncpg.Record) -> dict[str, Any]:
@@ -58,18 +208,24 @@ def _record_to_user(record: asyncpg.Record) -> dict[str, Any]:
         "hashed_password": record["hashed_password"],
         "role": record["role"],
         "is_active": bool(record["is_active"]),
-        "created_at": record["created_at"],
-        "updated_at": record["updated_at"],
+        "created_at": _iso(record["created_at"]),
+        "updated_at": _iso(record["updated_at"]),
     }
 
 
 async def init_db(database_url: str) -> asyncpg.Pool:
     """Cria pool de conexoes e tabelas se necessario."""
-    pool = await asyncpg.create_pool(database_url, min_size=2, max_size=10)
+    pool = await asyncpg.create_pool(
+        database_url, min_size=2, max_size=10, init=_init_connection,
+    )
     async with pool.acquire() as conn:
-        await conn.execute(SCHEMA_SQL)
+        # Workers sobem juntos: CREATE ... IF NOT EXISTS concorrentes podem
+        # colidir no catalogo, entao o schema e aplicado sob advisory lock
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK_ID)
+            await conn.execute(SCHEMA_SQL)
         await conn.execute(
-            "INSERT INTO global_config (id, config_json) VALUES (1, '{}') "
+            "INSERT INTO global_config (id, config_json) VALUES (1, '{}'::jsonb) "
             "ON CONFLICT (id) DO NOTHING"
         )
     return pool
@@ -85,8 +241,8 @@ async def create_user(
     role: str = "user",
 ) -> dict[str, Any]:
     """Cria usuario e retorna dict com dados (sem senha em texto)."""
-    now = _now_iso()
-    hashed = hash_password(plain_password)
+    now = _now()
+    hashed = await hash_password_async(plain_password)
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
             """INSERT INTO users (username, email, hashed_password, role, is_active, created_at, updated_at)
@@ -101,8 +257,8 @@ async def create_user(
         "hashed_password": hashed,
         "role": role,
         "is_active": True,
-        "created_at": now,
-        "updated_at": now,
+        "created_at": now.isoformat(),
+        "updated_at": now.isoformat(),
     }
 
 
@@ -144,7 +300,7 @@ async def update_user(
     if not updates:
         return await get_user_by_id(pool, user_id)
 
-    updates["updated_at"] = _now_iso()
+    updates["updated_at"] = _now()
     set_parts = []
     values = []
     for i, (k, v) in enumerate(updates.items(), 1):
@@ -155,11 +311,11 @@ async def update_user(
     set_clause = ", ".join(set_parts)
 
     async with pool.acquire() as conn:
-        await conn.execute(
-            f"UPDATE users SET {set_clause} WHERE id = ${len(values)}",  # noqa: S608
+        row = await conn.fetchrow(
+            f"UPDATE users SET {set_clause} WHERE id = ${len(values)} RETURNING *",  # noqa: S608
             *values,
         )
-    return await get_user_by_id(pool, user_id)
+    return _record_to_user(row) if row else None
 
 
 async def update_user_password(
@@ -168,8 +324,8 @@ async def update_user_password(
     plain_password: str,
 ) -> bool:
     """Atualiza senha do usuario. Retorna True se encontrou o usuario."""
-    hashed = hash_password(plain_password)
-    now = _now_iso()
+    hashed = await hash_password_async(plain_password)
+    now = _now()
     async with pool.acquire() as conn:
         result = await conn.execute(
             "UPDATE users SET hashed_password = $1, updated_at = $2 WHERE id = $3",
@@ -196,23 +352,33 @@ async def get_user_config(
             "SELECT config_json FROM user_config WHERE user_id = $1", user_id
         )
     if row:
-        return json.loads(row["config_json"])
+        return row["config_json"]
     return {}
 
 
 async def set_user_config(
     pool: asyncpg.Pool, user_id: int, config: dict[str, Any]
-) -> None:
-    """Salva config do usuario (merge com existente)."""
-    existing = await get_user_config(pool, user_id)
-    merged = {**existing, **config}
-    config_json = json.dumps(merged)
+) -> dict[str, Any]:
+    """Faz merge de config na do usuario e retorna a config resultante.
+
+    O merge (raso, ``||`` do jsonb) acontece no proprio UPDATE, sem ler antes:
+    escritas concorrentes nao se sobrescrevem. Chaves com None sao removidas.
+    O NOTIFY e entregue aos listeners no commit.
+    """
     async with pool.acquire() as conn:
-        await conn.execute(
-            """INSERT INTO user_config (user_id, config_json) VALUES ($1, $2)
-               ON CONFLICT (user_id) DO UPDATE SET config_json = $2""",
-            user_id, config_json,
-        )
+        async with conn.transaction():
+            row = await conn.fetchrow(
+                """INSERT INTO user_config (user_id, config_json)
+                   VALUES ($1, jsonb_strip_nulls($2::jsonb))
+                   ON CONFLICT (user_id) DO UPDATE
+                   SET config_json = jsonb_strip_nulls(user_config.config_json || $2::jsonb)
+                   RETURNING config_json""",
+                user_id, config,
+            )
+            await conn.execute(
+                "SELECT pg_notify($1, $2)", CONFIG_CHANNEL, f"user:{user_id}",
+            )
+    return row["config_json"]
 
 
 async def get_global_config(pool: asyncpg.Pool) -> dict[str, Any]:
@@ -222,22 +388,69 @@ async def get_global_config(pool: asyncpg.Pool) -> dict[str, Any]:
             "SELECT config_json FROM global_config WHERE id = 1"
         )
     if row:
-        return json.loads(row["config_json"])
+        return row["config_json"]
     return {}
 
 
 async def set_global_config(
     pool: asyncpg.Pool, config: dict[str, Any]
-) -> None:
-    """Salva config global (merge com existente)."""
-    existing = await get_global_config(pool)
-    merged = {**existing, **config}
-    config_json = json.dumps(merged)
+) -> dict[str, Any]:
+    """Faz merge (raso) de config na global e retorna a config resultante."""
     async with pool.acquire() as conn:
-        await conn.execute(
-            "UPDATE global_config SET config_json = $1 WHERE id = 1",
-            config_json,
-        )
+        async with conn.transaction():
+            row = await conn.fetchrow(
+                """UPDATE global_config
+                   SET config_json = jsonb_strip_nulls(config_json || $1::jsonb)
+                   WHERE id = 1 RETURNING config_json""",
+                config,
+            )
+            await conn.execute("SELECT pg_notify($1, 'global')", CONFIG_CHANNEL)
+    return row["config_json"]
+
+
+async def watch_config_changes(
+    pool: asyncpg.Pool,
+    on_change: Callable[[str | None], None],
+) -> Callable[[], Awaitable[None]]:
+    """Chama ``on_change(escopo)`` a cada NOTIFY de mudanca de config.
+
+    Uma task mantem uma conexao do pool em LISTEN. Ao (re)conectar chama
+    ``on_change(None)``: notificacoes anteriores ao LISTEN podem ter se
+    perdido. Retorna a funcao assincrona que para a observacao.
+    """
+    def _on_notify(_conn: Any, _pid: int, _channel: str, payload: str) -> None:
+        on_change(payload or None)
+
+    async def _listen() -> None:
+        while True:
+            try:
+                async with pool.acquire() as conn:
+                    closed = asyncio.Event()
+                    conn.add_termination_listener(lambda _conn: closed.set())
+                    await conn.add_listener(CONFIG_CHANNEL, _on_notify)
+                    on_change(None)
+                    try:
+                        await closed.wait()
+                    finally:
+                        if not conn.is_closed():
+                            await conn.remove_listener(CONFIG_CHANNEL, _on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Erro no LISTEN de config")
+            logger.warning("Conexao de LISTEN de config encerrada; reconectando")
+            await asyncio.sleep(CONFIG_LISTEN_RETRY_SECONDS)
+
+    task = asyncio.create_task(_listen())
+
+    async def stop() -> None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    return stop
 
 
 # --- Agent Runs ---
@@ -254,8 +467,15 @@ def _record_to_agent_run(record: asyncpg.Record) -> dict[str, Any]:
         "status": record["status"],
         "tool_steps": record["tool_steps"],
         "error_message": record["error_message"],
-        "started_at": record["started_at"],
-        "finished_at": record["finished_at"],
+        "started_at": _iso(record["started_at"]),
+        "finished_at": _iso(record["finished_at"]),
+        "payload": record["payload_json"] or {},
+        "attempts": record["attempts"],
+        "next_attempt_at": _iso(record["next_attempt_at"]),
+        "locked_at": _iso(record["locked_at"]),
+        "coalesced_events": record["coalesced_events"],
+        **{field: record[field] for field in AGENT_RUN_USAGE_FIELDS},
+        "claimed_at": _iso(record["claimed_at"]),
     }
 
 
@@ -267,11 +487,12 @@ async def create_agent_run(
     action: str,
 ) -> dict[str, Any]:
     """Cria registro de execucao do agente GitHub."""
-    now = _now_iso()
+    now = _now()
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
-            """INSERT INTO agent_runs (repo, issue_number, issue_title, action, status, started_at)
-               VALUES ($1, $2, $3, $4, 'processing', $5)
+            """INSERT INTO agent_runs
+               (repo, issue_number, issue_title, action, status, started_at, claimed_at)
+               VALUES ($1, $2, $3, $4, 'processing', $5, $5)
                RETURNING id""",
             repo, issue_number, issue_title, action, now,
         )
@@ -285,21 +506,39 @@ async def create_agent_run(
         "status": "processing",
         "tool_steps": 0,
         "error_message": None,
-        "started_at": now,
+        "started_at": now.isoformat(),
         "finished_at": None,
+        "payload": {},
+        "attempts": 0,
+        "next_attempt_at": None,
+        "locked_at": None,
+        "coalesced_events": 0,
+        **{field: 0 for field in AGENT_RUN_USAGE_FIELDS},
+        "claimed_at": now.isoformat(),
     }
 
 
-async def update_agent_run(
-    pool: asyncpg.Pool,
-    run_id: int,
-    **fields: Any,
-) -> dict[str, Any] | None:
-    """Atualiza campos de um agent run."""
-    allowed = {"category", "status", "tool_steps", "error_message", "finished_at"}
-    updates = {k: v for k, v in fields.items() if k in allowed}
+# Contadores de uso gravados na conclusao do run (ver turn_metrics)
+AGENT_RUN_USAGE_FIELDS = (
+    "model_calls", "input_tokens", "cached_input_tokens", "output_tokens",
+    "assistant_ms", "tools_ms",
+)
+
+_AGENT_RUN_UPDATABLE = {
+    "category", "status", "tool_steps", "error_message", "finished_at",
+    "next_attempt_at", "locked_at", "attempts", *AGENT_RUN_USAGE_FIELDS,
+}
+_AGENT_RUN_TIME_FIELDS = {"finished_at", "next_attempt_at", "locked_at"}
+
+
+def _agent_run_update_sql(
+    run_id: int, expected_status: str | None, fields: dict[str, Any],
+) -> tuple[str, list[Any]] | None:
+    updates = {k: v for k, v in fields.items() if k in _AGENT_RUN_UPDATABLE}
     if not updates:
-        return await get_agent_run(pool, run_id)
+        return None
+    for key in updates.keys() & _AGENT_RUN_TIME_FIELDS:
+        updates[key] = _ts(updates[key])
 
     set_parts = []
     values = []
@@ -309,13 +548,165 @@ async def update_agent_run(
 
     values.append(run_id)
     set_clause = ", ".join(set_parts)
+    where = f"id = ${len(values)}"
+    if expected_status is not None:
+        values.append(expected_status)
+        where += f" AND status = ${len(values)}"
+    return f"UPDATE agent_runs SET {set_clause} WHERE {where}", values  # noqa: S608
+
+
+async def update_agent_run(
+    pool: asyncpg.Pool,
+    run_id: int,
+    expected_status: str | None = None,
+    **fields: Any,
+) -> dict[str, Any] | None:
+    """Atualiza campos de um agent run e retorna o registro atualizado.
+
+    Com expected_status, so atualiza se o run ainda estiver nesse status
+    (ex.: nao sobrescrever um run cancelado) e retorna None caso contrario.
+    """
+    statement = _agent_run_update_sql(run_id, expected_status, fields)
+    if statement is None:
+        return await get_agent_run(pool, run_id)
 
+    sql, values = statement
     async with pool.acquire() as conn:
-        await conn.execute(
-            f"UPDATE agent_runs SET {set_clause} WHERE id = ${len(values)}",  # noqa: S608
-            *values,
+        row = await conn.fetchrow(f"{sql} RETURNING *", *values)
+    return _record_to_agent_run(row) if row else None
+
+
+async def update_agent_runs(
+    pool: asyncpg.Pool,
+    updates: list[tuple[int, str | None, dict[str, Any]]],
+) -> int:
+    """Aplica varios updates de agent runs numa unica transacao.
+
+    Cada item e ``(run_id, expected_status, campos)``, com a mesma semantica
+    de ``update_agent_run``. Retorna quantos updates alteraram um run.
+    """
+    applied = 0
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            for run_id, expected_status, fields in updates:
+                statement = _agent_run_update_sql(run_id, expected_status, fields)
+                if statement is None:
+                    continue
+                sql, values = statement
+                result = await conn.execute(sql, *values)
+                applied += int(result.split()[-1])
+    return applied
+
+
+async def enqueue_agent_run(
+    pool: asyncpg.Pool,
+    repo: str,
+    issue_number: int,
+    issue_title: str,
+    action: str,
+    payload: dict[str, Any] | None = None,
+    debounce_seconds: int = 0,
+    delivery_id: str | None = None,
+) -> dict[str, Any] | None:
+    """Enfileira execucao do agente GitHub (status 'queued').
+
+    O payload guarda o que o worker precisa para processar a issue
+    (corpo, labels) sem depender do request original.
+
+    Eventos da mesma issue sao coalescidos: se ja existe um run enfileirado,
+    ele recebe o estado novo e tem a execucao adiada por debounce_seconds
+    (coalesced_events > 0 no retorno). Runs em execucao ou aguardando retry
+    para a issue ficam obsoletos e sao marcados como 'cancelled'.
+
+    Com ``delivery_id`` (X-GitHub-Delivery), a entrega e registrada na
+    mesma transacao: se o enqueue falhar, a reentrega do GitHub ainda e
+    aceita. Retorna None se a entrega ja foi vista.
+    """
+    now = _now()
+    run_at = now + timedelta(seconds=debounce_seconds)
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            if delivery_id:
+                result = await conn.execute(
+                    """INSERT INTO webhook_deliveries (delivery_id, received_at) VALUES ($1, $2)
+                       ON CONFLICT (delivery_id) DO NOTHING""",
+                    delivery_id, now,
+                )
+                if not result.endswith(" 1"):
+                    return None
+            await conn.execute(
+                """UPDATE agent_runs SET status = 'cancelled', finished_at = $1, locked_at = NULL
+                   WHERE repo = $2 AND issue_number = $3
+                     AND (status = 'processing' OR (status = 'queued' AND attempts > 0))""",
+                now, repo, issue_number,
+            )
+            record = await conn.fetchrow(
+                """INSERT INTO agent_runs
+                   (repo, issue_number, issue_title, action, status, started_at,
+                    payload_json, attempts, next_attempt_at)
+                   VALUES ($1, $2, $3, $4, 'queued', $5, $6, 0, $7)
+                   ON CONFLICT (repo, issue_number) WHERE status = 'queued'
+                   DO UPDATE SET
+                       issue_title = EXCLUDED.issue_title,
+                       action = EXCLUDED.action,
+                       payload_json = EXCLUDED.payload_json,
+                       next_attempt_at = EXCLUDED.next_attempt_at,
+                       coalesced_events = agent_runs.coalesced_events + 1
+                   RETURNING *""",
+                repo, issue_number, issue_title, action, now,
+                payload or {}, run_at,
+            )
+    return _record_to_agent_run(record)
+
+
+async def claim_agent_run(pool: asyncpg.Pool) -> dict[str, Any] | None:
+    """Reivindica o proximo run enfileirado e pronto para execucao.
+
+    Usa FOR UPDATE SKIP LOCKED para que varios workers consumam a fila
+    em paralelo sem bloquear uns aos outros nem pegar o mesmo run.
+    """
+    now = _now()
+    async with pool.acquire() as conn:
+        record = await conn.fetchrow(
+            """UPDATE agent_runs
+               SET status = 'processing', attempts = attempts + 1,
+                   locked_at = $1, claimed_at = $1
+               WHERE id = (
+                   SELECT id FROM agent_runs
+                   WHERE status = 'queued' AND next_attempt_at <= $1
+                   ORDER BY next_attempt_at, id
+                   LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+               )
+               RETURNING *""",
+            now,
+        )
+    return _record_to_agent_run(record) if record else None
+
+
+async def recover_stale_agent_runs(pool: asyncpg.Pool, locked_before: str) -> int:
+    """Devolve para a fila runs 'processing' travados antes de locked_before.
+
+    Cobre workers que morreram no meio da execucao. Retorna quantos runs
+    foram recuperados.
+    """
+    async with pool.acquire() as conn:
+        result = await conn.execute(
+            """UPDATE agent_runs
+               SET status = 'queued', next_attempt_at = $1, locked_at = NULL
+               WHERE status = 'processing' AND locked_at IS NOT NULL AND locked_at < $2""",
+            _now(), _ts(locked_before),
         )
-    return await get_agent_run(pool, run_id)
+    return int(result.split()[-1])
+
+
+async def prune_webhook_deliveries(pool: asyncpg.Pool, received_before: str) -> int:
+    """Remove registros de entregas antigas (fora da janela de reentrega)."""
+    async with pool.acquire() as conn:
+        result = await conn.execute(
+            "DELETE FROM webhook_deliveries WHERE received_at < $1", _ts(received_before),
+        )
+    return int(result.split()[-1])
 
 
 async def get_agent_run(
@@ -327,31 +718,286 @@ async def get_agent_run(
     return _record_to_agent_run(record) if record else None
 
 
+def _agent_run_filters(
+    status: str | None = None,
+    repo: str | None = None,
+    issue_number: int | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+) -> tuple[list[str], list[Any]]:
+    conditions: list[str] = []
+    params: list[Any] = []
+    for column, op, value in (
+        ("status", "=", status or None),
+        ("repo", "=", repo or None),
+        ("issue_number", "=", issue_number),
+        ("started_at", ">=", _ts(started_after or None)),
+        ("started_at", "<", _ts(started_before or None)),
+    ):
+        if value is not None:
+            params.append(value)
+            conditions.append(f"{column} {op} ${len(params)}")
+    return conditions, params
+
+
+def _where(conditions: list[str]) -> str:
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
 async def list_agent_runs(
     pool: asyncpg.Pool,
     limit: int = 50,
     offset: int = 0,
     status: str | None = None,
-) -> tuple[list[dict[str, Any]], int]:
-    """Lista agent runs com paginacao e filtro opcional por status."""
+    repo: str | None = None,
+    issue_number: int | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+    before_id: int | None = None,
+) -> tuple[list[dict[str, Any]], int | None]:
+    """Lista agent runs (mais recentes primeiro) com filtros e paginacao.
+
+    Com before_id a paginacao e keyset (``id < before_id``) e offset e
+    ignorado: o custo por pagina nao cresce com a profundidade. O total
+    (apenas filtros) so e contado na primeira pagina (sem before_id e com
+    offset 0); nas seguintes vem None, para nao varrer a tabela a cada
+    pagina.
+    """
+    conditions, params = _agent_run_filters(
+        status, repo, issue_number, started_after, started_before,
+    )
+
     async with pool.acquire() as conn:
-        if status:
+        total = None
+        if before_id is None and offset == 0:
             row = await conn.fetchrow(
-                "SELECT COUNT(*) AS cnt FROM agent_runs WHERE status = $1", status,
+                f"SELECT COUNT(*) AS cnt FROM agent_runs {_where(conditions)}",  # noqa: S608
+                *params,
             )
             total = row["cnt"] if row else 0
-            records = await conn.fetch(
-                "SELECT * FROM agent_runs WHERE status = $1 ORDER BY id DESC LIMIT $2 OFFSET $3",
-                status, limit, offset,
+
+        if before_id is not None:
+            params.append(before_id)
+            conditions.append(f"id < ${len(params)}")
+            offset = 0
+        params.extend([limit, offset])
+        records = await conn.fetch(
+            f"SELECT * FROM agent_runs {_where(conditions)} "  # noqa: S608
+            f"ORDER BY id DESC LIMIT ${len(params) - 1} OFFSET ${len(params)}",
+            *params,
+        )
+    return [_record_to_agent_run(r) for r in records], total
+
+
+async def agent_run_queue_depth(pool: asyncpg.Pool) -> dict[str, int]:
+    """Runs enfileirados e em execucao (``{status: total}``)."""
+    async with pool.acquire() as conn:
+        records = await conn.fetch(
+            """SELECT status, COUNT(*) AS total FROM agent_runs
+               WHERE status IN ('queued', 'processing') GROUP BY status""",
+        )
+    depth = {"queued": 0, "processing": 0}
+    depth.update({r["status"]: r["total"] for r in records})
+    return depth
+
+
+async def agent_run_stats(
+    pool: asyncpg.Pool,
+    repo: str | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+) -> list[dict[str, Any]]:
+    """Agrega runs por categoria e status, calculado no banco.
+
+    Retorna contagem e duracao de execucao (finished_at - claimed_at, em
+    segundos; sem debounce e espera na fila):
+    media, p50 e p95 (percentile_disc) dos runs finalizados; e a soma de
+    chamadas ao modelo e tokens.
+    """
+    conditions, params = _agent_run_filters(
+        repo=repo, started_after=started_after, started_before=started_before,
+    )
+    sql = f"""
+        WITH durations AS (
+            SELECT category, status, model_calls, input_tokens,
+                   cached_input_tokens, output_tokens,
+                   EXTRACT(EPOCH FROM finished_at - claimed_at)::float8 AS duration
+            FROM agent_runs {_where(conditions)}
+        )
+        SELECT category, status, COUNT(*) AS runs,
+               AVG(duration) AS avg_duration,
+               percentile_disc(0.5) WITHIN GROUP (ORDER BY duration) AS p50,
+               percentile_disc(0.95) WITHIN GROUP (ORDER BY duration) AS p95,
+               SUM(model_calls)::bigint AS model_calls,
+               SUM(input_tokens)::bigint AS input_tokens,
+               SUM(cached_input_tokens)::bigint AS cached_input_tokens,
+               SUM(output_tokens)::bigint AS output_tokens
+        FROM durations
+        GROUP BY category, status
+        ORDER BY category, status
+    """  # noqa: S608
+    async with pool.acquire() as conn:
+        records = await conn.fetch(sql, *params)
+    return [
+        {
+            "category": r["category"],
+            "status": r["status"],
+            "count": r["runs"],
+            "avg_duration_seconds": r["avg_duration"],
+            "p50_duration_seconds": r["p50"],
+            "p95_duration_seconds": r["p95"],
+            "model_calls": r["model_calls"],
+            "input_tokens": r["input_tokens"],
+            "cached_input_tokens": r["cached_input_tokens"],
+            "output_tokens": r["output_tokens"],
+        }
+        for r in records
+    ]
+
+
+# --- Chat turns ---
+
+_CHAT_TURN_COLUMNS = (
+    "thread_id", "user_id", "channel", "status", "model_calls", "tool_calls",
+    "cache_hits", "input_tokens", "cached_input_tokens", "output_tokens",
+    "ttft_ms", "assistant_ms", "tools_ms", "duration_ms",
+)
+
+
+def _record_to_chat_turn(record: asyncpg.Record) -> dict[str, Any]:
+    turn = {"id": record["id"]}
+    turn.update((c, record[c]) for c in _CHAT_TURN_COLUMNS)
+    turn["created_at"] = _iso(record["created_at"])
+    return turn
+
+
+async def insert_chat_turns(
+    pool: asyncpg.Pool, turns: list[dict[str, Any]],
+) -> int:
+    """Grava varios turnos numa unica transacao. Retorna quantos gravou."""
+    if not turns:
+        return 0
+    now = _now()
+    placeholders = ", ".join(f"${i}" for i in range(1, len(_CHAT_TURN_COLUMNS) + 2))
+    async with pool.acquire() as conn:
+        await conn.executemany(
+            f"INSERT INTO chat_turns ({', '.join(_CHAT_TURN_COLUMNS)}, created_at) "  # noqa: S608
+            f"VALUES ({placeholders})",
+            [[turn.get(c) for c in _CHAT_TURN_COLUMNS] + [now] for turn in turns],
+        )
+    return len(turns)
+
+
+def _chat_turn_filters(
+    user_id: int | None = None,
+    thread_id: str | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+) -> tuple[list[str], list[Any]]:
+    conditions: list[str] = []
+    params: list[Any] = []
+    for column, op, value in (
+        ("user_id", "=", user_id),
+        ("thread_id", "=", thread_id or None),
+        ("created_at", ">=", _ts(started_after or None)),
+        ("created_at", "<", _ts(started_before or None)),
+    ):
+        if value is not None:
+            params.append(value)
+            conditions.append(f"{column} {op} ${len(params)}")
+    return conditions, params
+
+
+async def list_chat_turns(
+    pool: asyncpg.Pool,
+    limit: int = 50,
+    offset: int = 0,
+    user_id: int | None = None,
+    thread_id: str | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+    slowest: bool = False,
+) -> tuple[list[dict[str, Any]], int | None]:
+    """Lista turnos (mais recentes, ou mais lentos com ``slowest``).
+
+    O total (COUNT na tabela toda) so e calculado na primeira pagina
+    (offset 0); nas demais vem None.
+    """
+    conditions, params = _chat_turn_filters(
+        user_id, thread_id, started_after, started_before,
+    )
+    order = "duration_ms DESC NULLS LAST, id DESC" if slowest else "id DESC"
+    async with pool.acquire() as conn:
+        total = None
+        if offset == 0:
+            row = await conn.fetchrow(
+                f"SELECT COUNT(*) AS cnt FROM chat_turns {_where(conditions)}",  # noqa: S608
+                *params,
             )
-        else:
-            row = await conn.fetchrow("SELECT COUNT(*) AS cnt FROM agent_runs")
             total = row["cnt"] if row else 0
-            records = await conn.fetch(
-                "SELECT * FROM agent_runs ORDER BY id DESC LIMIT $1 OFFSET $2",
-                limit, offset,
-            )
-    return [_record_to_agent_run(r) for r in records], total
+        params.extend([limit, offset])
+        records = await conn.fetch(
+            f"SELECT * FROM chat_turns {_where(conditions)} "  # noqa: S608
+            f"ORDER BY {order} LIMIT ${len(params) - 1} OFFSET ${len(params)}",
+            *params,
+        )
+    return [_record_to_chat_turn(r) for r in records], total
+
+
+async def chat_turn_stats(
+    pool: asyncpg.Pool,
+    user_id: int | None = None,
+    started_after: str | None = None,
+    started_before: str | None = None,
+) -> list[dict[str, Any]]:
+    """Agrega turnos por canal e status, calculado no banco.
+
+    Duracao e time-to-first-token em ms (media, p50 e p95 percentile_disc),
+    media de chamadas ao modelo e de tools por turno e soma de tokens.
+    """
+    conditions, params = _chat_turn_filters(
+        user_id=user_id, started_after=started_after, started_before=started_before,
+    )
+    sql = f"""
+        SELECT channel, status, COUNT(*) AS turns,
+               AVG(duration_ms)::float8 AS avg_duration,
+               percentile_disc(0.5) WITHIN GROUP (ORDER BY duration_ms) AS p50_duration,
+               percentile_disc(0.95) WITHIN GROUP (ORDER BY duration_ms) AS p95_duration,
+               AVG(ttft_ms)::float8 AS avg_ttft,
+               percentile_disc(0.5) WITHIN GROUP (ORDER BY ttft_ms) AS p50_ttft,
+               percentile_disc(0.95) WITHIN GROUP (ORDER BY ttft_ms) AS p95_ttft,
+               AVG(model_calls)::float8 AS avg_model_calls,
+               AVG(tool_calls)::float8 AS avg_tool_calls,
+               SUM(cache_hits)::bigint AS cache_hits,
+               SUM(input_tokens)::bigint AS input_tokens,
+               SUM(cached_input_tokens)::bigint AS cached_input_tokens,
+               SUM(output_tokens)::bigint AS output_tokens
+        FROM chat_turns {_where(conditions)}
+        GROUP BY channel, status
+        ORDER BY channel, status
+    """  # noqa: S608
+    async with pool.acquire() as conn:
+        records = await conn.fetch(sql, *params)
+    return [
+        {
+            "channel": r["channel"],
+            "status": r["status"],
+            "count": r["turns"],
+            "avg_duration_ms": r["avg_duration"],
+            "p50_duration_ms": r["p50_duration"],
+            "p95_duration_ms": r["p95_duration"],
+            "avg_ttft_ms": r["avg_ttft"],
+            "p50_ttft_ms": r["p50_ttft"],
+            "p95_ttft_ms": r["p95_ttft"],
+            "avg_model_calls": r["avg_model_calls"],
+            "avg_tool_calls": r["avg_tool_calls"],
+            "cache_hits": r["cache_hits"],
+            "input_tokens": r["input_tokens"],
+            "cached_input_tokens": r["cached_input_tokens"],
+            "output_tokens": r["output_tokens"],
+        }
+        for r in records
+    ]
 
 
 # --- Seed ---
@@ -369,4 +1015,8 @@ async def seed_admin_if_needed(
         )
     if row and row["cnt"] > 0:
         return
-    await create_user(pool, username, email, password, role="admin")
+    try:
+        await create_user(pool, username, email, password, role="admin")
+    except asyncpg.UniqueViolationError:
+        # Outro worker criou o admin entre a contagem e o insert
+        pass
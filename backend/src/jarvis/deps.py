@@ -6,6 +6,7 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 import jwt as pyjwt
 
 from .auth import decode_token
+from .user_cache import get_user_cached
 
 security = HTTPBearer()
 
@@ -32,9 +33,7 @@ async def get_current_user(
             detail="Token invalido (tipo incorreto).",
         )
 
-    conn = request.app.state.auth_db
-    db_mod = request.app.state.db_module
-    user = await db_mod.get_user_by_id(conn, payload.sub)
+    user = await get_user_cached(request.app.state, payload.sub)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
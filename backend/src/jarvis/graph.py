@@ -1,4 +1,6 @@
-from typing import Annotated, List, Optional, TypedDict
+import logging
+import time
+from typing import Annotated, List, NotRequired, Optional, TypedDict
 
 from langchain_core.messages import (
     AIMessage,
@@ -7,20 +9,31 @@ from langchain_core.messages import (
     SystemMessage,
     ToolMessage,
 )
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
 
-from .nodes.classifier import IssueCategory, classify_issue
+from .memory import memory_user
+from .metrics import TOOL_CALLS, TOOL_DURATION
+from .model_router import ROUTE_FAST, ROUTE_STRONG, ModelRouter
+from .nodes.classifier import IssueCategory, build_classifier_model, classify_issue
+from .response_cache import ResponseCache
 from .tools import ALL_TOOLS
 from .tools.github import GITHUB_TOOLS
+from .tracing import span, traced_node
+from .turn_metrics import metrics_from_config
+
+logger = logging.getLogger(__name__)
 
 
 class GraphState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]
     tool_steps: int
     max_tool_steps: int
+    # Memorias recuperadas no primeiro passo do turno (reusadas apos tools)
+    memories: NotRequired[List[str]]
 
 
 def _sanitize_tool_sequences(messages: List[BaseMessage]) -> List[BaseMessage]:
@@ -70,10 +83,18 @@ def _sanitize_tool_sequences(messages: List[BaseMessage]) -> List[BaseMessage]:
     return result
 
 
+MEMORY_HEADER = (
+    "Trechos de conversas anteriores com este usuario que podem ser "
+    "relevantes (use apenas se ajudarem a responder):"
+)
+
+
 def _trim_and_prepend_system(
     messages: List[BaseMessage],
     system_prompt: str,
     history_window: int,
+    memories: Optional[List[str]] = None,
+    history_block: int = 1,
 ) -> List[BaseMessage]:
     """Aplica janela de historico e prepende SystemMessage.
 
@@ -81,6 +102,15 @@ def _trim_and_prepend_system(
     em history_window (pares human/ai), e coloca o system prompt
     no inicio. Isso e feito antes de chamar o modelo, sem alterar
     o state persistido.
+
+    Com ``history_block`` > 1, o inicio da janela so avanca de
+    ``history_block`` em ``history_block`` turnos (mantendo entre
+    ``history_window`` e ``history_window + history_block - 1`` turnos
+    anteriores): o prefixo do prompt fica identico por varios turnos e
+    o cache de prompt do provedor volta a acertar.
+
+    ``memories`` (memoria de longo prazo) entram numa SystemMessage logo
+    antes da ultima mensagem do usuario, depois do historico da janela.
     """
     non_system = [m for m in messages if not isinstance(m, SystemMessage)]
 
@@ -91,11 +121,14 @@ def _trim_and_prepend_system(
             i for i, m in enumerate(non_system) if isinstance(m, HumanMessage)
         ]
 
-        if len(human_indices) > history_window + 1:
-            # Manter os ultimos (history_window + 1) turnos humanos
-            # +1 porque o ultimo e a mensagem atual do usuario
-            cut_index = human_indices[-(history_window + 1)]
-            non_system = non_system[cut_index:]
+        # Manter os ultimos (history_window + 1) turnos humanos
+        # +1 porque o ultimo e a mensagem atual do usuario
+        excess = len(human_indices) - (history_window + 1)
+        if excess > 0:
+            # Descarta turnos antigos em blocos inteiros
+            dropped = excess - excess % max(history_block, 1)
+            if dropped > 0:
+                non_system = non_system[human_indices[dropped]:]
     elif history_window == 0:
         # Apenas a mensagem atual
         if non_system:
@@ -103,29 +136,165 @@ def _trim_and_prepend_system(
 
     non_system = _sanitize_tool_sequences(non_system)
 
+    if memories:
+        block = SystemMessage(
+            content="\n\n".join([MEMORY_HEADER, *(f"- {m}" for m in memories)]),
+        )
+        last_human = max(
+            (i for i, m in enumerate(non_system) if isinstance(m, HumanMessage)),
+            default=len(non_system),
+        )
+        non_system = [*non_system[:last_human], block, *non_system[last_human:]]
+
     return [SystemMessage(content=system_prompt), *non_system]
 
 
+def _last_human_text(messages: List[BaseMessage]) -> str:
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return message.content if isinstance(message.content, str) else ""
+    return ""
+
+
+async def _observed_tool_call(request, execute):
+    """``awrap_tool_call`` dos ToolNodes: duracao e status de cada tool."""
+    # Nome inventado pelo modelo nao vira rotulo
+    name = request.tool.name if request.tool is not None else "unknown"
+    started = time.perf_counter()
+    status = "error"
+    try:
+        with span(f"tool.{name}") as current:
+            result = await execute(request)
+            if getattr(result, "status", "success") != "error":
+                status = "success"
+            if current is not None:
+                current.set_attribute("status", status)
+        return result
+    finally:
+        TOOL_CALLS.inc(tool=name, status=status)
+        TOOL_DURATION.observe(time.perf_counter() - started, tool=name)
+
+
 def build_graph(
     model_name: str,
     system_prompt: str,
     history_window: int,
     checkpointer=None,
     tools=None,
+    response_cache_ttl: int = 0,
+    semantic_cache=None,
+    memory=None,
+    fast_model_name: Optional[str] = None,
+    history_block: int = 1,
 ):
-    active_tools = tools if tools is not None else ALL_TOOLS
-    model = ChatOpenAI(model=model_name, temperature=0, streaming=True).bind_tools(active_tools)
-    tool_node = ToolNode(active_tools)
+    """Constroi o grafo de chat.
+
+    Com ``response_cache_ttl`` > 0, respostas do modelo para prompts
+    identicos sao reutilizadas via Redis (ver ``response_cache``). Com
+    ``semantic_cache`` (``SemanticCache``), perguntas parecidas com uma ja
+    respondida encerram o turno sem chamar o modelo. Com ``memory``
+    (``LongTermMemory``), turnos antigos relevantes entram no prompt e cada
+    turno concluido e guardado. Com ``fast_model_name`` (diferente de
+    ``model_name``), passos simples usam o modelo rapido (ver
+    ``model_router``). ``history_block`` controla o corte da janela em
+    blocos (ver ``_trim_and_prepend_system``).
+    """
+    # Ordem fixa das tools: o schema enviado ao provedor faz parte do
+    # prefixo cacheavel do prompt
+    active_tools = sorted(
+        tools if tools is not None else ALL_TOOLS, key=lambda t: t.name,
+    )
+
+    def chat_model(name: str):
+        return ChatOpenAI(
+            model=name, temperature=0, streaming=True, stream_usage=True,
+        ).bind_tools(active_tools)
+
+    routes = {ROUTE_STRONG: (model_name, chat_model(model_name))}
+    cache_scope = model_name
+    if fast_model_name and fast_model_name != model_name:
+        routes[ROUTE_FAST] = (fast_model_name, chat_model(fast_model_name))
+        cache_scope = f"{fast_model_name}|{model_name}"
+    router = ModelRouter(routes)
+    tool_node = ToolNode(active_tools, awrap_tool_call=_observed_tool_call)
+    response_cache = None
+    if response_cache_ttl > 0:
+        response_cache = ResponseCache(
+            cache_scope, [t.name for t in active_tools], response_cache_ttl,
+        )
 
-    async def assistant_node(state: GraphState) -> dict:
+    async def assistant_node(state: GraphState, config: RunnableConfig) -> dict:
+        started = time.perf_counter()
+        metrics = metrics_from_config(config)
         trimmed = _trim_and_prepend_system(
             state["messages"], system_prompt, history_window,
+            history_block=history_block,
         )
-        response = await model.ainvoke(trimmed)
-        return {"messages": [response]}
-
-    async def tools_node(state: GraphState) -> dict:
+        thread_id = config.get("configurable", {}).get("thread_id")
+        user = memory_user(thread_id) if memory is not None else None
+        question = _last_human_text(trimmed)
+        # O cache semantico e compartilhado entre usuarios: prompts com
+        # memorias (privadas) do usuario nao o consultam nem o alimentam
+        shared_cache = semantic_cache
+        memories = state.get("memories") or []
+        if user is not None:
+            # Recall uma vez por turno: passos apos tool calls reusam o resultado
+            if isinstance(state["messages"][-1], HumanMessage):
+                window = [m.content for m in trimmed if isinstance(m, HumanMessage)]
+                try:
+                    memories = await memory.recall(user, question, exclude_questions=window)
+                except Exception:
+                    logger.warning("Memoria de longo prazo indisponivel; seguindo sem ela", exc_info=True)
+                    memories = []
+            if memories:
+                trimmed = _trim_and_prepend_system(
+                    state["messages"], system_prompt, history_window, memories,
+                    history_block,
+                )
+                shared_cache = None
+
+        response = None
+        if shared_cache is not None:
+            # Falha do cache (ex.: API de embeddings fora) nao derruba o turno
+            try:
+                response = await shared_cache.answer_for(trimmed)
+            except Exception:
+                logger.warning("Cache semantico indisponivel; consultando o modelo", exc_info=True)
+        if response is None and response_cache is not None:
+            response = await response_cache.get(trimmed)
+        if response is None:
+            response = await router.ainvoke(trimmed, state.get("tool_steps", 0))
+            if metrics is not None:
+                metrics.add_model_call(response)
+            if response_cache is not None:
+                await response_cache.put(trimmed, response)
+            if shared_cache is not None:
+                try:
+                    await shared_cache.remember(trimmed, response)
+                except Exception:
+                    logger.warning("Erro ao gravar no cache semantico", exc_info=True)
+        elif metrics is not None:
+            metrics.add_cache_hit()
+
+        if user is not None and not response.tool_calls:
+            content = response.content if isinstance(response.content, str) else ""
+            try:
+                await memory.remember(user, thread_id, question, content)
+            except Exception:
+                logger.warning("Erro ao gravar turno na memoria de longo prazo", exc_info=True)
+        if metrics is not None:
+            metrics.add_assistant_time(time.perf_counter() - started)
+        update: dict = {"messages": [response]}
+        if user is not None:
+            update["memories"] = memories
+        return update
+
+    async def tools_node(state: GraphState, config: RunnableConfig) -> dict:
+        started = time.perf_counter()
         result = await tool_node.ainvoke({"messages": state["messages"]})
+        metrics = metrics_from_config(config)
+        if metrics is not None:
+            metrics.add_tools(len(result["messages"]), time.perf_counter() - started)
         return {
             "messages": result["messages"],
             "tool_steps": state.get("tool_steps", 0) + 1,
@@ -147,8 +316,8 @@ def build_graph(
         return END
 
     graph_builder = StateGraph(GraphState)
-    graph_builder.add_node("assistant", assistant_node)
-    graph_builder.add_node("tools", tools_node)
+    graph_builder.add_node("assistant", traced_node("assistant", assistant_node))
+    graph_builder.add_node("tools", traced_node("tools", tools_node))
     graph_builder.add_edge(START, "assistant")
     graph_builder.add_conditional_edges("assistant", route_after_assistant)
     graph_builder.add_edge("tools", "assistant")
@@ -167,6 +336,7 @@ class GitHubGraphState(TypedDict):
     issue_body: str
     issue_number: int
     repo: str
+    issue_labels: NotRequired[List[str]]
     issue_category: Optional[IssueCategory]
 
 
@@ -179,11 +349,16 @@ def build_github_graph(
     """Constroi grafo do agente GitHub com classificador como entry point.
 
     Fluxo: START -> classifier -> assistant -> [tools -> assistant]* -> END
+
+    Os clientes LLM (agente e classificador) sao criados aqui uma unica vez;
+    o grafo compilado e reentrante e deve ser reusado entre eventos
+    (ver ``graph_cache.get_github_graph``).
     """
     model = ChatOpenAI(
-        model=model_name, temperature=0, streaming=True,
+        model=model_name, temperature=0, streaming=True, stream_usage=True,
     ).bind_tools(GITHUB_TOOLS)
-    tool_node = ToolNode(GITHUB_TOOLS)
+    classifier_model = build_classifier_model(model_name)
+    tool_node = ToolNode(GITHUB_TOOLS, awrap_tool_call=_observed_tool_call)
 
     async def classifier_node(state: GitHubGraphState) -> dict:
         """Classifica a issue e injeta contexto no historico."""
@@ -191,6 +366,8 @@ def build_github_graph(
             title=state["issue_title"],
             body=state.get("issue_body", ""),
             model_name=model_name,
+            model=classifier_model,
+            labels=state.get("issue_labels"),
         )
 
         # Montar mensagem inicial para o agente com contexto da issue
@@ -206,16 +383,25 @@ def build_github_graph(
             "messages": [HumanMessage(content=issue_context)],
         }
 
-    async def assistant_node(state: GitHubGraphState) -> dict:
+    async def assistant_node(state: GitHubGraphState, config: RunnableConfig) -> dict:
+        started = time.perf_counter()
         trimmed = [SystemMessage(content=system_prompt)] + [
             m for m in state["messages"] if not isinstance(m, SystemMessage)
         ]
         trimmed = _sanitize_tool_sequences(trimmed)
         response = await model.ainvoke(trimmed)
+        metrics = metrics_from_config(config)
+        if metrics is not None:
+            metrics.add_model_call(response)
+            metrics.add_assistant_time(time.perf_counter() - started)
         return {"messages": [response]}
 
-    async def tools_node(state: GitHubGraphState) -> dict:
+    async def tools_node(state: GitHubGraphState, config: RunnableConfig) -> dict:
+        started = time.perf_counter()
         result = await tool_node.ainvoke({"messages": state["messages"]})
+        metrics = metrics_from_config(config)
+        if metrics is not None:
+            metrics.add_tools(len(result["messages"]), time.perf_counter() - started)
         return {
             "messages": result["messages"],
             "tool_steps": state.get("tool_steps", 0) + 1,
@@ -237,9 +423,9 @@ def build_github_graph(
         return END
 
     graph_builder = StateGraph(GitHubGraphState)
-    graph_builder.add_node("classifier", classifier_node)
-    graph_builder.add_node("assistant", assistant_node)
-    graph_builder.add_node("tools", tools_node)
+    graph_builder.add_node("classifier", traced_node("classifier", classifier_node))
+    graph_builder.add_node("assistant", traced_node("assistant", assistant_node))
+    graph_builder.add_node("tools", traced_node("tools", tools_node))
     graph_builder.add_edge(START, "classifier")
     graph_builder.add_edge("classifier", "assistant")
     graph_builder.add_conditional_edges("assistant", route_after_assistant)
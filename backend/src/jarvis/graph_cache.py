@@ -1,8 +1,11 @@
 """Cache LRU de grafos compilados por configuracao."""
 
 from functools import lru_cache
+from typing import Any
 
-from .graph import build_graph
+from .graph import build_github_graph, build_graph
+from .metrics import REGISTRY, Collected
+from .tools import ALL_TOOLS
 
 
 @lru_cache(maxsize=16)
@@ -42,6 +45,60 @@ def get_or_build_graph(
     return _cached_build(model_name, system_prompt, history_window)
 
 
+@lru_cache(maxsize=4)
+def get_github_graph(
+    model_name: str,
+    system_prompt: str,
+    max_tool_steps: int = 15,
+) -> object:
+    """Retorna grafo GitHub compilado, construido uma vez por configuracao.
+
+    Evita recriar os clientes LLM, o bind das tools e a compilacao do
+    grafo a cada evento de webhook.
+    """
+    return build_github_graph(
+        model_name=model_name,
+        system_prompt=system_prompt,
+        max_tool_steps=max_tool_steps,
+    )
+
+
+def chat_graph_key(settings: Any, config: dict[str, Any]) -> tuple:
+    """Parametros do grafo de chat que vem da config global."""
+    return (
+        config.get("model_name") or settings.model_name,
+        config.get("system_prompt") or settings.system_prompt,
+        config.get("history_window") or settings.history_window,
+        tuple(sorted(config.get("disabled_tools", []))),
+    )
+
+
+def build_chat_graph(
+    settings: Any, config: dict[str, Any], checkpointer=None, memory=None,
+    semantic_cache=None,
+):
+    """Constroi o grafo de chat com overrides e tools desabilitadas da config global.
+
+    ``memory`` (``LongTermMemory``) e ``semantic_cache`` (``SemanticCache``)
+    sao criados uma vez no startup e reusados entre reconstrucoes do grafo.
+    """
+    model_name, system_prompt, history_window, disabled = chat_graph_key(settings, config)
+    return build_graph(
+        model_name=model_name,
+        system_prompt=system_prompt,
+        history_window=history_window,
+        checkpointer=checkpointer,
+        tools=[t for t in ALL_TOOLS if t.name not in disabled],
+        response_cache_ttl=(
+            settings.response_cache_ttl_seconds if settings.response_cache else 0
+        ),
+        semantic_cache=semantic_cache,
+        memory=memory,
+        fast_model_name=settings.fast_model_name or None,
+        history_block=settings.history_block,
+    )
+
+
 def cache_info():
     """Retorna stats do cache."""
     return _cached_build.cache_info()
@@ -50,3 +107,22 @@ def cache_info():
 def cache_clear():
     """Limpa cache de grafos."""
     _cached_build.cache_clear()
+    get_github_graph.cache_clear()
+
+
+def _collect_cache_requests() -> dict[tuple[str, ...], float]:
+    values: dict[tuple[str, ...], float] = {}
+    for graph, cached in (("chat", _cached_build), ("github", get_github_graph)):
+        info = cached.cache_info()
+        values[(graph, "hit")] = info.hits
+        values[(graph, "miss")] = info.misses
+    return values
+
+
+REGISTRY.register(Collected(
+    "jarvis_graph_cache_requests_total",
+    "Buscas no cache LRU de grafos compilados.",
+    ("graph", "result"),
+    _collect_cache_requests,
+    type="counter",
+))
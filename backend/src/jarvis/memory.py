@@ -0,0 +1,152 @@
+"""Memoria de longo prazo do chat por usuario (busca vetorial).
+
+O modelo so ve ``history_window`` turnos; o resto do historico (e os outros
+threads do usuario) ficava invisivel. Aqui cada turno concluido (pergunta
+e resposta) vira um embedding guardado num ``SqliteVectorStore`` local, no
+namespace do usuario. A cada turno, os ``top_k`` trechos mais parecidos
+com a pergunta atual (acima de ``min_score``) entram no prompt como uma
+mensagem de sistema antes da pergunta (ver ``graph._trim_and_prepend_system``);
+trechos de perguntas que ja estao na janela ficam de fora.
+
+O usuario vem do prefixo ``<user_id>:`` do ``thread_id`` (API); threads
+sem prefixo (CLI) nao usam memoria.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Iterable
+
+from .tracing import traced
+from .vector import Embedder, SqliteVectorStore, VectorIndex, create_embedder
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = 3
+DEFAULT_MIN_SCORE = 0.35
+DEFAULT_MAX_PER_USER = 2000
+# Usuarios com indice carregado em memoria (LRU)
+MAX_LOADED_USERS = 256
+MAX_ANSWER_CHARS = 600
+
+_NEVER = float("inf")
+
+
+def memory_user(thread_id: str | None) -> str | None:
+    """Usuario dono do thread (prefixo ``<user_id>:``); None sem prefixo."""
+    if not thread_id or ":" not in thread_id:
+        return None
+    return thread_id.split(":", 1)[0]
+
+
+class _UserIndex:
+    __slots__ = ("index", "last_id", "lock")
+
+    def __init__(self, index: VectorIndex) -> None:
+        self.index = index
+        self.last_id = 0
+        # Por usuario: a carga de um usuario lento nao segura o recall dos outros
+        self.lock = asyncio.Lock()
+
+
+class LongTermMemory:
+    """Turnos passados por usuario, recuperados por similaridade.
+
+    Args:
+        store: Persistencia dos vetores.
+        embedder: Mesmo embedder para gravar e buscar.
+        top_k: Trechos injetados por turno.
+        min_score: Similaridade minima de um trecho.
+        max_per_user: Turnos mais recentes considerados por usuario.
+    """
+
+    def __init__(
+        self,
+        store: SqliteVectorStore,
+        embedder: Embedder,
+        top_k: int = DEFAULT_TOP_K,
+        min_score: float = DEFAULT_MIN_SCORE,
+        max_per_user: int = DEFAULT_MAX_PER_USER,
+    ) -> None:
+        self.store = store
+        self.embedder = embedder
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_per_user = max_per_user
+        self._users: OrderedDict[str, _UserIndex] = OrderedDict()
+
+    @traced("memory.remember")
+    async def remember(self, user: str, thread_id: str, question: str, answer: str) -> None:
+        """Guarda um turno concluido."""
+        question = question.strip()
+        answer = answer.strip()
+        if not question or not answer:
+            return
+        if len(answer) > MAX_ANSWER_CHARS:
+            answer = answer[:MAX_ANSWER_CHARS].rstrip() + "..."
+        text = f"Usuario: {question}\nAssistente: {answer}"
+        vector = await self.embedder.embed(text)
+        await self.store.add(
+            user, vector, {"thread_id": thread_id, "question": question, "text": text},
+        )
+
+    async def _sync_user(self, user: str) -> VectorIndex:
+        # Carrega o usuario (ou so as linhas novas, inclusive de outros
+        # workers) no indice em memoria. O indice cresce conforme as linhas
+        # carregadas, ate ``max_per_user``
+        entry = self._users.get(user)
+        if entry is None:
+            entry = _UserIndex(VectorIndex(self.embedder.dim, self.max_per_user))
+            self._users[user] = entry
+            if len(self._users) > MAX_LOADED_USERS:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user)
+        async with entry.lock:
+            rows = await self.store.load(user, entry.last_id, self.max_per_user)
+            for row_id, vector, payload in rows:
+                if len(vector) == self.embedder.dim:
+                    entry.index.add(vector, payload, _NEVER)
+                entry.last_id = row_id
+        return entry.index
+
+    @traced("memory.recall")
+    async def recall(
+        self, user: str, query: str, exclude_questions: Iterable[str] = (),
+    ) -> list[str]:
+        """Trechos relevantes para ``query`` (melhor primeiro)."""
+        if not query.strip():
+            return []
+        index = await self._sync_user(user)
+        if len(index) == 0:
+            return []
+        excluded = {q.strip() for q in exclude_questions}
+        matches = index.search(
+            await self.embedder.embed(query),
+            k=self.top_k + len(excluded),
+            min_score=self.min_score,
+        )
+        snippets = [
+            payload["text"] for _, payload in matches
+            if payload["question"] not in excluded
+        ]
+        return snippets[:self.top_k]
+
+    async def close(self) -> None:
+        await self.store.close()
+
+
+async def create_memory(settings: Any) -> LongTermMemory | None:
+    """Memoria configurada (``JARVIS_LONG_TERM_MEMORY``) ou None."""
+    if not settings.long_term_memory:
+        return None
+    store = await SqliteVectorStore.open(settings.memory_db_path)
+    return LongTermMemory(
+        store,
+        create_embedder(settings),
+        top_k=settings.memory_top_k,
+        min_score=settings.memory_min_score,
+        max_per_user=settings.memory_max_per_user,
+    )
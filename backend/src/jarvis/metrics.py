@@ -0,0 +1,361 @@
+"""Metricas do processo no formato texto do Prometheus (``GET /metrics``).
+
+Registro minimo em memoria, sem dependencia externa: contadores,
+gauges e histogramas com rotulos, alem de metricas ``Collected`` lidas
+na hora do scrape (tamanho do pool do banco, hits do cache de grafos).
+Os modulos instrumentados importam as metricas daqui:
+
+- api: ``jarvis_http_*`` (``MetricsMiddleware``) e ``jarvis_ws_connections``;
+- chat: ``jarvis_chat_*`` (em ``turn_metrics.record_turn``) e
+  ``jarvis_model_*`` (``ModelRouter``);
+- cache: ``jarvis_cache_requests_total`` (``cached_get``/``get_json``) e
+  ``jarvis_graph_cache_requests_total``;
+- tools: ``jarvis_tool_*`` (cada tool call dos ``ToolNode``);
+- db: ``jarvis_db_pool_*``;
+- webhook: ``jarvis_webhook_events_total`` e ``jarvis_agent_runs``
+  (profundidade da fila, lida do banco no scrape).
+
+Valores sao por processo (como ``route_stats``): com ``JARVIS_WORKERS``
+> 1, cada scrape ve um worker.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Iterable
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latencias de requests e turnos (segundos)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Esperas curtas (pool do banco, cache)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name}: rotulos esperados {self.labelnames}, recebidos {tuple(labels)}"
+            )
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> list[tuple[str, str, float]]:
+        """``(sufixo, rotulos formatados, valor)`` de cada serie."""
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(
+            f"{self.name}{suffix}{labels} {_format_value(value)}"
+            for suffix, labels, value in self.samples()
+        )
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", _format_labels(self.labelnames, k), v) for k, v in items]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # rotulos -> [contagem por bucket..., soma, total]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: Any) -> float:
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return series[-1] if series else 0.0
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        names = self.labelnames + ("le",)
+        samples = []
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(names, key + (_format_value(bound),))
+                samples.append(("_bucket", labels, count))
+            samples.append(("_bucket", _format_labels(names, key + ("+Inf",)), series[-1]))
+            samples.append(("_sum", _format_labels(self.labelnames, key), series[-2]))
+            samples.append(("_count", _format_labels(self.labelnames, key), series[-1]))
+        return samples
+
+
+class Collected(_Metric):
+    """Metrica lida na hora do scrape.
+
+    ``collect`` devolve ``{valores dos rotulos: valor}``; erros (ex.: pool
+    ja fechado) omitem a metrica do scrape.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...],
+        collect: Callable[[], dict[tuple[str, ...], float]],
+        type: str = "gauge",
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.type = type
+        self.collect = collect
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        values = self.collect()
+        return [("", _format_labels(self.labelnames, k), v) for k, v in sorted(values.items())]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Registra (ou substitui, para ``Collected`` recriadas) a metrica."""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        blocks = []
+        for metric in metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception:
+                continue
+        return "\n".join(blocks) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: tuple[str, ...] = (),
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- api ---
+
+HTTP_REQUESTS = counter(
+    "jarvis_http_requests_total", "Requests HTTP por rota e status.",
+    ("method", "route", "status"),
+)
+HTTP_DURATION = histogram(
+    "jarvis_http_request_duration_seconds",
+    "Duracao de requests HTTP ate o fim do corpo (streams inclusive).",
+    ("method", "route"),
+)
+WS_CONNECTIONS = gauge("jarvis_ws_connections", "Conexoes WebSocket abertas.")
+
+# --- chat ---
+
+CHAT_TURNS = counter(
+    "jarvis_chat_turns_total", "Turnos do chat por canal e status.", ("channel", "status"),
+)
+CHAT_TURN_DURATION = histogram(
+    "jarvis_chat_turn_duration_seconds", "Duracao do turno do chat.", ("channel",),
+)
+CHAT_TTFT = histogram(
+    "jarvis_chat_time_to_first_token_seconds",
+    "Tempo ate o primeiro token nos streams do chat.", ("channel",),
+)
+MODEL_CALLS = counter(
+    "jarvis_model_calls_total", "Chamadas ao modelo do chat por rota.",
+    ("route", "model", "status"),
+)
+MODEL_DURATION = histogram(
+    "jarvis_model_call_duration_seconds", "Latencia das chamadas ao modelo do chat.",
+    ("route",),
+)
+MODEL_TOKENS = counter(
+    "jarvis_model_tokens_total",
+    "Tokens do modelo do chat (input, cached_input, output).", ("route", "kind"),
+)
+
+# --- cache ---
+
+CACHE_REQUESTS = counter(
+    "jarvis_cache_requests_total", "Leituras do cache Redis por resultado.",
+    ("cache", "result"),
+)
+
+# --- tools ---
+
+TOOL_CALLS = counter(
+    "jarvis_tool_calls_total", "Execucoes de tools por status.", ("tool", "status"),
+)
+TOOL_DURATION = histogram(
+    "jarvis_tool_duration_seconds", "Duracao de cada execucao de tool.", ("tool",),
+)
+
+# --- db ---
+
+DB_POOL_WAIT = histogram(
+    "jarvis_db_pool_wait_seconds",
+    "Espera por uma conexao do pool SQLite (read) ou pelo writer (write).",
+    ("mode",), FAST_BUCKETS,
+)
+
+# --- webhook ---
+
+WEBHOOK_EVENTS = counter(
+    "jarvis_webhook_events_total", "Eventos do webhook do GitHub por resultado.",
+    ("event", "result"),
+)
+AGENT_RUNS = gauge(
+    "jarvis_agent_runs", "Agent runs na fila (queued) e em execucao (processing).",
+    ("status",),
+)
+AGENT_RUNS_FINISHED = counter(
+    "jarvis_agent_runs_finished_total",
+    "Tentativas de agent run encerradas pelo worker.", ("status",),
+)
+
+
+def register_db_pool(pool: Any) -> None:
+    """Expoe uso do pool do banco de auth (SqlitePool ou asyncpg.Pool)."""
+
+    def collect() -> dict[tuple[str, ...], float]:
+        size = pool.get_size()
+        idle = pool.get_idle_size()
+        return {("idle",): idle, ("in_use",): size - idle}
+
+    REGISTRY.register(Collected(
+        "jarvis_db_pool_connections", "Conexoes do pool do banco de auth.",
+        ("state",), collect,
+    ))
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: conta requests HTTP e mede ate o fim do corpo.
+
+    A rota e o template do FastAPI (``/admin/users/{user_id}``), nao o
+    path, para nao explodir a cardinalidade.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method=method, route=route, status=status)
+            HTTP_DURATION.observe(time.perf_counter() - started, method=method, route=route)
@@ -0,0 +1,236 @@
+"""Roteamento do no ``assistant`` entre um modelo rapido e o modelo principal.
+
+Com ``JARVIS_FAST_MODEL`` configurado, cada chamada ao modelo no grafo de
+chat escolhe uma rota por heuristica local (sem chamada extra ao LLM):
+
+- ``fast``: perguntas curtas e diretas, tanto no passo que escolhe a tool
+  quanto no que formata o resultado ("qual a rodada atual?", "quanto e
+  2+2?");
+- ``strong`` (modelo principal): perguntas longas, com codigo, varias
+  perguntas juntas ou pedidos de raciocinio (escalacao, comparacao,
+  analise), turnos que ja encadearam varias tools e resultados de tool
+  grandes demais para resumir bem com o modelo pequeno.
+
+A rota depende so das mensagens enviadas, entao prompts identicos caem
+sempre na mesma rota (o cache de respostas continua valido). Sem modelo
+rapido, toda chamada vai para ``strong``. Latencia e tokens por rota
+(inclusive os de entrada servidos pelo cache de prompt do provedor) ficam
+em ``route_stats`` (por processo), expostos em ``GET /admin/model-routes``.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from typing import Any, List
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from .metrics import MODEL_CALLS, MODEL_DURATION, MODEL_TOKENS
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+ROUTE_FAST = "fast"
+ROUTE_STRONG = "strong"
+
+# Acima disso a pergunta deixa de ser "simples"
+MAX_FAST_QUESTION_CHARS = 280
+# Turnos que ja chamaram tools tantas vezes estao planejando: modelo principal
+MAX_FAST_TOOL_STEPS = 2
+# Resultados de tool maiores que isso vao para o modelo principal
+MAX_FAST_TOOL_OUTPUT_CHARS = 6000
+
+COMPLEX_KEYWORDS = (
+    "escalacao", "escale", "escalar", "monte", "montar", "time ideal",
+    "compare", "comparar", "comparacao", "analise", "analisar", "explique",
+    "por que", "estrategia", "planeje", "plano", "resuma", "codigo",
+    "pull request", "refatore", "corrija", "implemente",
+)
+
+_COMPLEX_RE = re.compile(r"\b(?:" + "|".join(re.escape(k) for k in COMPLEX_KEYWORDS) + r")\b")
+
+# Latencias guardadas por rota para p50/p95
+_LATENCY_SAMPLES = 1024
+
+
+def _normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _text(content: Any) -> str:
+    return content if isinstance(content, str) else ""
+
+
+def choose_route(messages: List[BaseMessage], tool_steps: int = 0) -> tuple[str, str]:
+    """Rota e motivo para o prompt ``messages``.
+
+    ``tool_steps`` e o numero de rodadas de tools ja executadas no turno.
+    """
+    question = ""
+    turn: List[BaseMessage] = []
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            question = _text(message.content)
+            break
+        turn.append(message)
+
+    if len(question) > MAX_FAST_QUESTION_CHARS:
+        return ROUTE_STRONG, "long_question"
+    if "```" in question or question.count("?") > 1:
+        return ROUTE_STRONG, "compound_question"
+    if _COMPLEX_RE.search(_normalize(question)):
+        return ROUTE_STRONG, "complex_request"
+    if tool_steps >= MAX_FAST_TOOL_STEPS:
+        return ROUTE_STRONG, "tool_chain"
+    tool_output = sum(
+        len(_text(m.content)) for m in turn if isinstance(m, ToolMessage)
+    )
+    if tool_output > MAX_FAST_TOOL_OUTPUT_CHARS:
+        return ROUTE_STRONG, "large_tool_output"
+    return ROUTE_FAST, "simple"
+
+
+def cached_tokens(usage: dict | None) -> int:
+    """Tokens de entrada servidos pelo cache de prompt do provedor."""
+    if not usage:
+        return 0
+    return (usage.get("input_token_details") or {}).get("cache_read", 0)
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class _RouteCounters:
+    __slots__ = (
+        "calls", "errors", "input_tokens", "cached_input_tokens", "output_tokens",
+        "latencies",
+    )
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self.output_tokens = 0
+        self.latencies: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+
+
+class RouteStats:
+    """Contadores por (rota, modelo) do processo."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._routes: dict[tuple[str, str], _RouteCounters] = {}
+
+    def record(
+        self,
+        route: str,
+        model_name: str,
+        seconds: float,
+        usage: dict | None = None,
+        error: bool = False,
+    ) -> None:
+        with self._lock:
+            counters = self._routes.get((route, model_name))
+            if counters is None:
+                counters = self._routes[(route, model_name)] = _RouteCounters()
+            counters.calls += 1
+            counters.errors += int(error)
+            counters.latencies.append(seconds)
+            if usage:
+                counters.input_tokens += usage.get("input_tokens", 0)
+                counters.cached_input_tokens += cached_tokens(usage)
+                counters.output_tokens += usage.get("output_tokens", 0)
+
+    def snapshot(self) -> list[dict]:
+        """Uma entrada por rota; latencias das ultimas chamadas."""
+        with self._lock:
+            items = [
+                (route, model_name, c.calls, c.errors, c.input_tokens,
+                 c.cached_input_tokens, c.output_tokens, sorted(c.latencies))
+                for (route, model_name), c in sorted(self._routes.items())
+            ]
+        return [
+            {
+                "route": route,
+                "model_name": model_name,
+                "calls": calls,
+                "errors": errors,
+                "input_tokens": input_tokens,
+                "cached_input_tokens": cached_input_tokens,
+                "output_tokens": output_tokens,
+                "avg_latency_seconds": sum(latencies) / len(latencies) if latencies else None,
+                "p50_latency_seconds": _percentile(latencies, 0.5) if latencies else None,
+                "p95_latency_seconds": _percentile(latencies, 0.95) if latencies else None,
+            }
+            for (
+                route, model_name, calls, errors, input_tokens, cached_input_tokens,
+                output_tokens, latencies,
+            ) in items
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+route_stats = RouteStats()
+
+
+class ModelRouter:
+    """Escolhe e chama o modelo da rota, registrando latencia e tokens.
+
+    Args:
+        models: ``{rota: (nome do modelo, modelo com tools)}``; ``strong``
+            e obrigatoria, ``fast`` opcional.
+        stats: Destino dos contadores (padrao: ``route_stats``).
+    """
+
+    def __init__(self, models: dict[str, tuple[str, Any]], stats: RouteStats | None = None) -> None:
+        self.models = models
+        self.stats = stats if stats is not None else route_stats
+
+    async def ainvoke(self, messages: List[BaseMessage], tool_steps: int = 0) -> AIMessage:
+        route, reason = choose_route(messages, tool_steps)
+        if route not in self.models:
+            route, reason = ROUTE_STRONG, "single_model"
+        model_name, model = self.models[route]
+        started = time.perf_counter()
+        try:
+            with span("model.invoke", route=route, model=model_name) as current:
+                response = await model.ainvoke(messages)
+                usage = getattr(response, "usage_metadata", None)
+                if current is not None and usage:
+                    current.set_attribute("input_tokens", usage.get("input_tokens", 0))
+                    current.set_attribute("cached_input_tokens", cached_tokens(usage))
+                    current.set_attribute("output_tokens", usage.get("output_tokens", 0))
+        except Exception:
+            seconds = time.perf_counter() - started
+            self.stats.record(route, model_name, seconds, error=True)
+            MODEL_CALLS.inc(route=route, model=model_name, status="error")
+            MODEL_DURATION.observe(seconds, route=route)
+            raise
+        seconds = time.perf_counter() - started
+        self.stats.record(route, model_name, seconds, usage)
+        MODEL_CALLS.inc(route=route, model=model_name, status="success")
+        MODEL_DURATION.observe(seconds, route=route)
+        if usage:
+            MODEL_TOKENS.inc(usage.get("input_tokens", 0), route=route, kind="input")
+            MODEL_TOKENS.inc(cached_tokens(usage), route=route, kind="cached_input")
+            MODEL_TOKENS.inc(usage.get("output_tokens", 0), route=route, kind="output")
+            logger.debug(
+                "Modelo %s (%s): %d tokens de entrada, %d do cache de prompt",
+                model_name, route, usage.get("input_tokens", 0), cached_tokens(usage),
+            )
+        response.response_metadata = {
+            **response.response_metadata, "model_route": route, "route_reason": reason,
+        }
+        return response
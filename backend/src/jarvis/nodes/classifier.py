@@ -2,15 +2,29 @@
 
 Analisa titulo e corpo da issue e classifica em uma categoria
 antes do agente decidir como agir.
+
+A classificacao e feita em camadas, da mais barata para a mais cara:
+
+1. Labels da issue (``bug``, ``documentation``, ``security``...).
+2. Cache por hash de titulo+corpo (re-edicoes sem mudanca de texto).
+3. Regras locais: IDs de CVE, prefixos de titulo (``bug:``, ``docs:``)
+   e palavras-chave.
+4. LLM, apenas quando as regras nao atingem a confianca minima.
 """
 
 from __future__ import annotations
 
-from typing import Literal
+import asyncio
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, Literal
 
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 
+from .. import cache
+
 ISSUE_CATEGORIES = ("BUG", "FEATURE", "DOCS", "QUESTION", "SECURITY")
 
 IssueCategory = Literal["BUG", "FEATURE", "DOCS", "QUESTION", "SECURITY"]
@@ -29,10 +43,169 @@ CLASSIFIER_PROMPT = (
 )
 
 
+# Confianca minima das regras locais para dispensar o LLM
+RULE_CONFIDENCE_THRESHOLD = 0.8
+
+_CACHE_MAX_ENTRIES = 1024
+_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+LABEL_CATEGORIES: dict[str, IssueCategory] = {
+    "bug": "BUG",
+    "regression": "BUG",
+    "enhancement": "FEATURE",
+    "feature": "FEATURE",
+    "documentation": "DOCS",
+    "docs": "DOCS",
+    "question": "QUESTION",
+    "help wanted": "QUESTION",
+    "security": "SECURITY",
+    "vulnerability": "SECURITY",
+}
+
+TITLE_PREFIXES: dict[str, IssueCategory] = {
+    "bug": "BUG",
+    "fix": "BUG",
+    "feat": "FEATURE",
+    "feature": "FEATURE",
+    "docs": "DOCS",
+    "doc": "DOCS",
+    "question": "QUESTION",
+    "duvida": "QUESTION",
+    "security": "SECURITY",
+    "sec": "SECURITY",
+}
+
+KEYWORDS: dict[IssueCategory, tuple[str, ...]] = {
+    "BUG": (
+        "bug", "erro", "error", "quebrado", "falha", "crash",
+        "exception", "traceback", "regressao", "nao funciona",
+    ),
+    "FEATURE": (
+        "feature", "adicionar", "suporte a", "suporte ao", "implementar", "melhoria",
+        "enhancement", "permitir", "nova funcionalidade",
+    ),
+    "DOCS": (
+        "docs", "documentacao", "readme", "typo", "digitacao", "exemplo",
+        "docstring",
+    ),
+    "QUESTION": (
+        "como faco", "como configurar", "como usar", "duvida", "pergunta",
+        "e possivel",
+    ),
+    "SECURITY": (
+        "cve", "vulnerabilidade", "vulnerability", "xss", "injection",
+        "exposicao", "vazamento", "credencial", "token exposto",
+    ),
+}
+
+# Palavras inteiras (com plural em -s): "bug" nao casa "debug" nem "erro"
+# casa "error"/"terror"
+_KEYWORD_RES: dict[IssueCategory, tuple[re.Pattern[str], ...]] = {
+    category: tuple(re.compile(rf"\b{re.escape(k)}s?\b") for k in keywords)
+    for category, keywords in KEYWORDS.items()
+}
+
+_CVE_RE = re.compile(r"\bCVE-\d{4}-\d{4,}\b", re.IGNORECASE)
+# "bug: ...", "fix(auth): ..." ou "[docs] ..."
+_PREFIX_RE = re.compile(
+    r"^\s*(?:\[([a-z]+)\]|([a-z]+)(?:\([^)]*\))?\s*:)", re.IGNORECASE,
+)
+
+_local_cache: OrderedDict[str, IssueCategory] = OrderedDict()
+
+
+def _content_hash(title: str, body: str) -> str:
+    return hashlib.sha256(f"{title}\0{body}".encode("utf-8")).hexdigest()
+
+
+# O cliente Redis e sincrono: as chamadas vao para uma thread para nao
+# travar o event loop (como em ``response_cache``)
+async def _cache_lookup(key: str) -> IssueCategory | None:
+    if key in _local_cache:
+        _local_cache.move_to_end(key)
+        return _local_cache[key]
+    cached = await asyncio.to_thread(cache.get_json, f"classifier:{key}")
+    if cached in ISSUE_CATEGORIES:
+        await _cache_store(key, cached, remote=False)
+        return cached
+    return None
+
+
+async def _cache_store(key: str, category: IssueCategory, remote: bool = True) -> None:
+    _local_cache[key] = category
+    _local_cache.move_to_end(key)
+    while len(_local_cache) > _CACHE_MAX_ENTRIES:
+        _local_cache.popitem(last=False)
+    if remote:
+        await asyncio.to_thread(
+            cache.set_json, f"classifier:{key}", _CACHE_TTL_SECONDS, category,
+        )
+
+
+def clear_classification_cache() -> None:
+    """Limpa o cache local de classificacoes."""
+    _local_cache.clear()
+
+
+def classify_by_labels(labels: list[str] | None) -> IssueCategory | None:
+    """Categoria a partir das labels da issue, se alguma for conhecida."""
+    for label in labels or []:
+        category = LABEL_CATEGORIES.get(label.strip().lower())
+        if category:
+            return category
+    return None
+
+
+def classify_by_rules(title: str, body: str) -> tuple[IssueCategory, float] | None:
+    """Classifica por regras locais.
+
+    Returns:
+        (categoria, confianca entre 0 e 1) ou None se nenhuma regra casar.
+    """
+    if _CVE_RE.search(title) or _CVE_RE.search(body or ""):
+        return "SECURITY", 0.95
+
+    prefix = _PREFIX_RE.match(title)
+    if prefix:
+        word = prefix.group(1) or prefix.group(2)
+        category = TITLE_PREFIXES.get(word.lower())
+        if category:
+            return category, 0.9
+
+    title_lower = title.lower()
+    body_lower = (body or "").lower()
+    scores: dict[IssueCategory, int] = {}
+    for category, patterns in _KEYWORD_RES.items():
+        score = 0
+        for pattern in patterns:
+            if pattern.search(title_lower):
+                score += 2
+            if pattern.search(body_lower):
+                score += 1
+        if score:
+            scores[category] = score
+
+    if not scores:
+        return None
+
+    best = max(scores, key=scores.get)
+    # Penaliza empate entre categorias e evidencia fraca
+    confidence = scores[best] / (sum(scores.values()) + 1)
+    return best, round(confidence, 2)
+
+
+def build_classifier_model(model_name: str) -> ChatOpenAI:
+    """Cria o cliente LLM do classificador (deterministico, sem streaming)."""
+    return ChatOpenAI(model=model_name, temperature=0)
+
+
 async def classify_issue(
     title: str,
     body: str,
     model_name: str = "gpt-4.1-mini",
+    model: Any | None = None,
+    labels: list[str] | None = None,
+    min_confidence: float = RULE_CONFIDENCE_THRESHOLD,
 ) -> IssueCategory:
     """Classifica uma issue do GitHub em uma categoria.
 
@@ -40,11 +213,42 @@ async def classify_issue(
         title: Titulo da issue.
         body: Corpo da issue.
         model_name: Modelo LLM a usar.
+        model: Cliente ja construido (reusado entre chamadas). Se None,
+            cria um ChatOpenAI para model_name.
+        labels: Labels atuais da issue.
+        min_confidence: Confianca minima das regras locais para nao
+            consultar o LLM.
 
     Returns:
         Categoria da issue (BUG, FEATURE, DOCS, QUESTION ou SECURITY).
     """
-    model = ChatOpenAI(model=model_name, temperature=0)
+    by_label = classify_by_labels(labels)
+    if by_label:
+        return by_label
+
+    key = _content_hash(title, body or "")
+    cached = await _cache_lookup(key)
+    if cached:
+        return cached
+
+    by_rules = classify_by_rules(title, body)
+    if by_rules and by_rules[1] >= min_confidence:
+        await _cache_store(key, by_rules[0])
+        return by_rules[0]
+
+    category = await _classify_with_llm(title, body, model_name, model)
+    await _cache_store(key, category)
+    return category
+
+
+async def _classify_with_llm(
+    title: str,
+    body: str,
+    model_name: str,
+    model: Any | None,
+) -> IssueCategory:
+    if model is None:
+        model = build_classifier_model(model_name)
 
     user_content = f"Titulo: {title}\n\nCorpo:\n{body or '(sem descricao)'}"
 
@@ -0,0 +1,128 @@
+"""Rate limiting por chave (ex.: IP do cliente no login).
+
+Limita o custo de bcrypt que um unico cliente consegue impor ao servidor.
+
+- ``LoginRateLimiter``: em memoria, janela deslizante (cada chave guarda
+  os instantes das tentativas nos ultimos ``window_seconds``);
+- ``RedisLoginRateLimiter``: com ``REDIS_URL``, contador por janela fixa
+  compartilhado entre workers, para que o limite nao vire N vezes o
+  configurado com ``JARVIS_WORKERS`` > 1.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_KEYS = 10_000
+REDIS_KEY_PREFIX = "jarvis:login-rate:"
+
+
+class LoginRateLimiter:
+    """Limita tentativas por chave em uma janela deslizante.
+
+    Args:
+        max_attempts: Tentativas permitidas por janela (0 desativa o limite).
+        window_seconds: Tamanho da janela em segundos.
+        clock: Funcao de tempo monotonic (injetavel em testes).
+    """
+
+    def __init__(
+        self,
+        max_attempts: int,
+        window_seconds: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._attempts: dict[str, deque[float]] = {}
+
+    async def hit(self, key: str) -> float:
+        """Registra uma tentativa.
+
+        Returns:
+            0 se a tentativa e permitida, ou os segundos ate a proxima
+            tentativa ser aceita.
+        """
+        if self.max_attempts <= 0:
+            return 0.0
+
+        now = self._clock()
+        attempts = self._attempts.get(key)
+        if attempts is None:
+            if len(self._attempts) >= MAX_TRACKED_KEYS:
+                self._prune(now)
+            attempts = self._attempts[key] = deque()
+
+        self._expire(attempts, now)
+        if len(attempts) >= self.max_attempts:
+            return max(attempts[0] + self.window_seconds - now, 0.0)
+
+        attempts.append(now)
+        return 0.0
+
+    def _expire(self, attempts: deque[float], now: float) -> None:
+        cutoff = now - self.window_seconds
+        while attempts and attempts[0] <= cutoff:
+            attempts.popleft()
+
+    def _prune(self, now: float) -> None:
+        for key, attempts in list(self._attempts.items()):
+            self._expire(attempts, now)
+            if not attempts:
+                del self._attempts[key]
+
+
+class RedisLoginRateLimiter:
+    """Limite por chave no Redis, comum a todos os workers.
+
+    Janela fixa: a primeira tentativa cria o contador com TTL de
+    ``window_seconds`` e as seguintes o incrementam (``MULTI``), entao o
+    Retry-After e o TTL restante. Se o Redis falhar, vale o limite em
+    memoria de ``fallback``.
+    """
+
+    def __init__(self, client: Any, fallback: LoginRateLimiter) -> None:
+        self.client = client
+        self.fallback = fallback
+        self.max_attempts = fallback.max_attempts
+        self.window_seconds = fallback.window_seconds
+
+    def _count(self, key: str) -> tuple[int, int]:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(key, 0, px=self.window_seconds * 1000, nx=True)
+        pipe.incr(key)
+        pipe.pttl(key)
+        _, attempts, ttl_ms = pipe.execute()
+        return attempts, ttl_ms
+
+    async def hit(self, key: str) -> float:
+        """Registra uma tentativa (mesmo retorno de ``LoginRateLimiter.hit``)."""
+        import redis
+
+        if self.max_attempts <= 0:
+            return 0.0
+        try:
+            attempts, ttl_ms = await asyncio.to_thread(self._count, REDIS_KEY_PREFIX + key)
+        except redis.RedisError:
+            logger.warning("Redis indisponivel; limite de login apenas local")
+            return await self.fallback.hit(key)
+        if attempts <= self.max_attempts:
+            return 0.0
+        return ttl_ms / 1000 if ttl_ms > 0 else float(self.window_seconds)
+
+
+def create_login_limiter(settings: Any) -> LoginRateLimiter | RedisLoginRateLimiter:
+    """Limiter de login: no Redis se ``REDIS_URL`` estiver definido."""
+    local = LoginRateLimiter(settings.login_rate_limit, settings.login_rate_window_seconds)
+    if settings.redis_url and settings.login_rate_limit > 0:
+        from .cache import get_redis
+
+        return RedisLoginRateLimiter(get_redis(settings.redis_url), local)
+    return local
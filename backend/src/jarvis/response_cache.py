@@ -0,0 +1,141 @@
+"""Cache de respostas do modelo no no ``assistant`` (opt-in, via Redis).
+
+Perguntas repetidas ("qual a rodada atual?") custam duas chamadas ao modelo:
+uma que pede a tool e outra que responde com o resultado. Aqui cada chamada
+e guardada pela chave do prompt efetivamente enviado (ja com janela de
+historico aplicada):
+
+- hash do modelo, do system prompt e das tools disponiveis;
+- mensagens normalizadas: texto do usuario com espacos colapsados e sem
+  diferenca de caixa, tool calls por nome/argumentos e resultados de tool
+  por hash do conteudo (ids de tool call nao entram).
+
+Num hit, a resposta e reproduzida com ids de tool call novos; a tool roda
+de novo (com o cache proprio do Cartola) e a segunda chamada so e hit se o
+resultado for identico. Respostas que chamam tools com efeitos colaterais
+(ex.: criar PR) nunca sao guardadas. O TTL padrao acompanha o dado mais
+volatil do Cartola (status do mercado). Sem Redis, nao ha cache.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from typing import Any, Iterable, List
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+from . import cache
+from .cartola.client import MARKET_STATUS_TTL
+from .tools import READ_ONLY_TOOLS
+from .tracing import traced
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = MARKET_STATUS_TTL
+KEY_PREFIX = "jarvis:response:"
+READ_ONLY_TOOL_NAMES = frozenset(t.name for t in READ_ONLY_TOOLS)
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _normalize_text(content: Any) -> str:
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return " ".join(content.split())
+
+
+def _normalize_message(message: BaseMessage) -> list:
+    if isinstance(message, HumanMessage):
+        return ["h", _normalize_text(message.content).casefold()]
+    if isinstance(message, AIMessage):
+        calls = [
+            [call["name"], json.dumps(call["args"], sort_keys=True, ensure_ascii=False)]
+            for call in message.tool_calls
+        ]
+        return ["a", _normalize_text(message.content), calls]
+    if isinstance(message, ToolMessage):
+        return ["t", message.name or "", _sha256(_normalize_text(message.content))]
+    if isinstance(message, SystemMessage):
+        return ["s", _sha256(_normalize_text(message.content))]
+    return [message.type, _normalize_text(message.content)]
+
+
+class ResponseCache:
+    """Respostas do modelo por prompt normalizado, com TTL.
+
+    Args:
+        model_name: Modelo do grafo (faz parte da chave).
+        tool_names: Tools ligadas ao modelo (fazem parte da chave).
+        ttl_seconds: Validade das entradas.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        tool_names: Iterable[str],
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._scope = _sha256(json.dumps([model_name, sorted(tool_names)]))
+
+    def key(self, messages: List[BaseMessage]) -> str:
+        payload = json.dumps(
+            [self._scope, [_normalize_message(m) for m in messages]],
+            ensure_ascii=False,
+        )
+        return KEY_PREFIX + _sha256(payload)
+
+    @staticmethod
+    def cacheable(response: AIMessage) -> bool:
+        """Resposta final com texto ou pedido de tools somente leitura."""
+        if getattr(response, "invalid_tool_calls", None):
+            return False
+        if response.tool_calls:
+            return all(call["name"] in READ_ONLY_TOOL_NAMES for call in response.tool_calls)
+        return bool(_normalize_text(response.content))
+
+    @traced("cache.response.get")
+    async def get(self, messages: List[BaseMessage]) -> AIMessage | None:
+        data = await asyncio.to_thread(cache.get_json, self.key(messages))
+        if data is None:
+            return None
+        logger.debug("Cache de respostas: hit")
+        return AIMessage(
+            content=data["content"],
+            tool_calls=[
+                {
+                    "name": call["name"],
+                    "args": call["args"],
+                    # Ids novos: a mesma resposta pode reaparecer no thread
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "tool_call",
+                }
+                for call in data["tool_calls"]
+            ],
+            response_metadata={"response_cache": "hit"},
+        )
+
+    @traced("cache.response.put")
+    async def put(self, messages: List[BaseMessage], response: AIMessage) -> None:
+        if not self.cacheable(response):
+            return
+        data = {
+            "content": response.content,
+            "tool_calls": [
+                {"name": call["name"], "args": call["args"]}
+                for call in response.tool_calls
+            ],
+        }
+        await asyncio.to_thread(cache.set_json, self.key(messages), self.ttl_seconds, data)
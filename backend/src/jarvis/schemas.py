@@ -99,14 +99,109 @@ class AgentRunResponse(BaseModel):
     category: str | None = None
     status: str
     tool_steps: int
+    attempts: int = 0
     error_message: str | None = None
     started_at: str
+    claimed_at: str | None = None
     finished_at: str | None = None
+    model_calls: int = 0
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+    assistant_ms: int = 0
+    tools_ms: int = 0
 
 
 class AgentRunListResponse(BaseModel):
     runs: list[AgentRunResponse]
-    total: int
+    # So na primeira pagina (ver db.list_agent_runs)
+    total: int | None = None
+    next_before_id: int | None = None
+
+
+class AgentRunStats(BaseModel):
+    category: str | None = None
+    status: str
+    count: int
+    avg_duration_seconds: float | None = None
+    p50_duration_seconds: float | None = None
+    p95_duration_seconds: float | None = None
+    model_calls: int = 0
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+
+
+class AgentRunStatsResponse(BaseModel):
+    stats: list[AgentRunStats]
+
+
+# --- Chat turns ---
+
+class ChatTurnResponse(BaseModel):
+    id: int
+    thread_id: str
+    user_id: int | None = None
+    channel: str
+    status: str
+    model_calls: int
+    tool_calls: int
+    cache_hits: int
+    input_tokens: int
+    cached_input_tokens: int
+    output_tokens: int
+    ttft_ms: int | None = None
+    assistant_ms: int
+    tools_ms: int
+    duration_ms: int | None = None
+    created_at: str
+
+
+class ChatTurnListResponse(BaseModel):
+    turns: list[ChatTurnResponse]
+    # So na primeira pagina (ver db.list_chat_turns)
+    total: int | None = None
+
+
+class ChatTurnStats(BaseModel):
+    channel: str
+    status: str
+    count: int
+    avg_duration_ms: float | None = None
+    p50_duration_ms: int | None = None
+    p95_duration_ms: int | None = None
+    avg_ttft_ms: float | None = None
+    p50_ttft_ms: int | None = None
+    p95_ttft_ms: int | None = None
+    avg_model_calls: float | None = None
+    avg_tool_calls: float | None = None
+    cache_hits: int = 0
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+
+
+class ChatTurnStatsResponse(BaseModel):
+    stats: list[ChatTurnStats]
+
+
+# --- Model routing ---
+
+class ModelRouteStats(BaseModel):
+    route: str
+    model_name: str
+    calls: int
+    errors: int
+    input_tokens: int
+    cached_input_tokens: int
+    output_tokens: int
+    avg_latency_seconds: float | None = None
+    p50_latency_seconds: float | None = None
+    p95_latency_seconds: float | None = None
+
+
+class ModelRouteStatsResponse(BaseModel):
+    routes: list[ModelRouteStats]
 
 
 # --- Tools ---
@@ -0,0 +1,179 @@
+"""Cache semantico de respostas do chat (opt-in).
+
+O cache exato (``response_cache``) nao pega parafrases. Aqui a pergunta do
+usuario vira um embedding (``vector.create_embedder``) e e buscada num
+indice em memoria de pares pergunta/resposta recentes; acima de
+``threshold`` de similaridade a resposta guardada volta sem chamar o modelo.
+
+So entram perguntas autocontidas: a unica mensagem do usuario no prompt
+enviado ao modelo (primeiro turno do thread ou ``history_window=0``), para
+que "e o dele?" nunca case com a resposta de outra conversa. Numeros da
+pergunta precisam bater exatamente (rodada 10 != rodada 11).
+
+A validade de cada par segue o frescor das tools usadas para responde-lo
+(``TOOL_FRESHNESS_SECONDS``): o mais curto entre elas, limitado por
+``ttl_seconds``. Tools fora do mapa (ex.: GitHub de escrita) ou sem cache
+possivel (hora atual) impedem o armazenamento.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from collections import OrderedDict
+from typing import Any, Iterable, List
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from .cartola import client as cartola_client
+from .tracing import traced
+from .vector import Embedder, VectorIndex, create_embedder
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_TTL_SECONDS = 3600
+
+# Por quanto tempo uma resposta baseada na tool continua valida.
+# None = sem limite proprio (so ``ttl_seconds``); 0 = nunca cachear.
+TOOL_FRESHNESS_SECONDS: dict[str, int | None] = {
+    "calculator": None,
+    "current_time": 0,
+    "cartola_market_status": cartola_client.MARKET_STATUS_TTL,
+    "cartola_players": cartola_client.PLAYERS_TTL,
+    "cartola_round_scores": cartola_client.SCORED_TTL,
+    "cartola_matches": cartola_client.MATCHES_TTL,
+    "cartola_expert_tips": cartola_client.MARKET_STATUS_TTL,
+    "github_read_issue": 60,
+    "github_read_file": 60,
+    "github_list_files": 60,
+}
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+_EMBED_MEMO_SIZE = 256
+
+
+def _text(content: Any) -> str:
+    return content if isinstance(content, str) else ""
+
+
+def standalone_question(messages: List[BaseMessage]) -> str | None:
+    """Texto da unica mensagem do usuario no prompt; None se houver historico."""
+    human = [m for m in messages if isinstance(m, HumanMessage)]
+    if len(human) != 1:
+        return None
+    return _text(human[0].content).strip() or None
+
+
+def turn_tool_names(messages: List[BaseMessage]) -> list[str]:
+    """Tools executadas depois da ultima mensagem do usuario."""
+    names: list[str] = []
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, ToolMessage):
+            names.append(message.name or "")
+    return names
+
+
+class SemanticCache:
+    """Pares pergunta/resposta buscados por similaridade de embedding.
+
+    Args:
+        embedder: Embedder (hashing local ou OpenAI).
+        threshold: Similaridade minima (cosseno) para um hit.
+        ttl_seconds: Validade maxima de um par.
+        max_entries: Pares guardados (os mais antigos saem primeiro).
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        threshold: float = DEFAULT_THRESHOLD,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        max_entries: int = 1024,
+    ) -> None:
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.index = VectorIndex(embedder.dim, max_entries)
+        # A mesma pergunta e embutida no lookup e no store do turno
+        self._memo: OrderedDict[str, list[float]] = OrderedDict()
+
+    async def _embed(self, text: str) -> list[float]:
+        vector = self._memo.get(text)
+        if vector is None:
+            vector = await self.embedder.embed(text)
+            self._memo[text] = vector
+            if len(self._memo) > _EMBED_MEMO_SIZE:
+                self._memo.popitem(last=False)
+        else:
+            self._memo.move_to_end(text)
+        return vector
+
+    def ttl_for(self, tool_names: Iterable[str]) -> int:
+        """Validade de uma resposta que usou ``tool_names``; 0 = nao cachear."""
+        ttl = self.ttl_seconds
+        for name in tool_names:
+            if name not in TOOL_FRESHNESS_SECONDS:
+                return 0
+            freshness = TOOL_FRESHNESS_SECONDS[name]
+            if freshness is not None:
+                ttl = min(ttl, freshness)
+        return ttl
+
+    async def lookup(self, question: str) -> str | None:
+        """Resposta de uma pergunta similar, se houver."""
+        matches = self.index.search(
+            await self._embed(question), k=3, min_score=self.threshold,
+        )
+        numbers = _NUMBER_RE.findall(question)
+        for score, payload in matches:
+            if payload["numbers"] == numbers:
+                logger.debug("Cache semantico: hit (%.3f)", score)
+                return payload["answer"]
+        return None
+
+    async def store(self, question: str, answer: str, tool_names: Iterable[str]) -> bool:
+        """Guarda o par; False se as tools usadas impedem o cache."""
+        ttl = self.ttl_for(tool_names)
+        if ttl <= 0 or not answer.strip():
+            return False
+        self.index.add(
+            await self._embed(question),
+            {"answer": answer, "numbers": _NUMBER_RE.findall(question)},
+            ttl,
+        )
+        return True
+
+    @traced("cache.semantic.get")
+    async def answer_for(self, messages: List[BaseMessage]) -> AIMessage | None:
+        """Resposta em cache para o prompt do inicio de um turno."""
+        if not messages or not isinstance(messages[-1], HumanMessage):
+            return None
+        question = standalone_question(messages)
+        if question is None:
+            return None
+        answer = await self.lookup(question)
+        if answer is None:
+            return None
+        return AIMessage(content=answer, response_metadata={"semantic_cache": "hit"})
+
+    @traced("cache.semantic.put")
+    async def remember(self, messages: List[BaseMessage], response: AIMessage) -> None:
+        """Guarda a resposta final do turno, se a pergunta for autocontida."""
+        if response.tool_calls:
+            return
+        question = standalone_question(messages)
+        if question is None:
+            return
+        await self.store(question, _text(response.content), turn_tool_names(messages))
+
+
+def create_semantic_cache(settings: Any) -> SemanticCache:
+    return SemanticCache(
+        create_embedder(settings),
+        threshold=settings.semantic_cache_threshold,
+        ttl_seconds=settings.semantic_cache_ttl_seconds,
+        max_entries=settings.semantic_cache_max_entries,
+    )
@@ -0,0 +1,151 @@
+"""Pool de conexoes SQLite para o banco de auth.
+
+Uma unica ``aiosqlite.Connection`` serializa todas as queries em uma
+thread. Em modo WAL leitores nao bloqueiam o escritor, entao o pool abre
+um writer dedicado (writes serializados por lock, um commit por bloco
+``write()``) e alguns readers ``query_only`` que atendem leituras em
+paralelo, cada um na sua thread do aiosqlite.
+
+Cada conexao mantem o cache de prepared statements do sqlite3
+(``cached_statements``); as queries do db.py usam SQL fixo com
+parametros, entao sao preparadas uma vez por conexao.
+
+Com ``:memory:`` o banco existe apenas na conexao que o criou: o pool
+usa o writer tambem para leituras.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import aiosqlite
+
+from .metrics import DB_POOL_WAIT
+from .tracing import span
+
+DEFAULT_READERS = 4
+CACHED_STATEMENTS = 256
+
+# Pragmas por conexao. journal_mode=WAL e persistente no arquivo e so e
+# aplicado pelo writer.
+CONNECTION_PRAGMAS = (
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+def _is_memory(db_path: str) -> bool:
+    return db_path == ":memory:" or "mode=memory" in db_path
+
+
+async def _connect(db_path: str, readonly: bool = False) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(
+        db_path,
+        cached_statements=CACHED_STATEMENTS,
+        uri=db_path.startswith("file:"),
+    )
+    try:
+        # execute_fetchall finaliza o statement; um PRAGMA com resultado
+        # pendente manteria o lock do arquivo
+        for pragma in CONNECTION_PRAGMAS:
+            await conn.execute_fetchall(pragma)
+        if readonly:
+            await conn.execute_fetchall("PRAGMA query_only = ON")
+    except BaseException:
+        await conn.close()
+        raise
+    return conn
+
+
+class SqlitePool:
+    """Writer dedicado + readers para um banco SQLite em WAL.
+
+    Use ``open_sqlite_pool`` para criar.
+    """
+
+    def __init__(
+        self,
+        writer: aiosqlite.Connection,
+        readers: list[aiosqlite.Connection],
+    ) -> None:
+        self._writer = writer
+        self._readers = readers
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        for reader in readers or [writer]:
+            self._idle.put_nowait(reader)
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def size(self) -> int:
+        """Numero de conexoes de leitura."""
+        return len(self._readers) or 1
+
+    # Mesmos nomes do asyncpg.Pool (metricas do pool)
+    def get_size(self) -> int:
+        return self.size
+
+    def get_idle_size(self) -> int:
+        return self._idle.qsize()
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Empresta uma conexao de leitura."""
+        with span("db.read") as current:
+            started = time.perf_counter()
+            conn = await self._idle.get()
+            waited = time.perf_counter() - started
+            DB_POOL_WAIT.observe(waited, mode="read")
+            if current is not None:
+                current.set_attribute("pool_wait_ms", round(waited * 1000, 3))
+            try:
+                yield conn
+            finally:
+                self._idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Executa um bloco de escrita no writer e faz commit ao final.
+
+        Em caso de excecao faz rollback de tudo que foi executado no bloco.
+        """
+        with span("db.write") as current:
+            started = time.perf_counter()
+            async with self._write_lock:
+                waited = time.perf_counter() - started
+                DB_POOL_WAIT.observe(waited, mode="write")
+                if current is not None:
+                    current.set_attribute("pool_wait_ms", round(waited * 1000, 3))
+                try:
+                    yield self._writer
+                except BaseException:
+                    await self._writer.rollback()
+                    raise
+                await self._writer.commit()
+
+    async def close(self) -> None:
+        for reader in self._readers:
+            await reader.close()
+        await self._writer.close()
+
+
+async def open_sqlite_pool(db_path: str, readers: int = DEFAULT_READERS) -> SqlitePool:
+    """Abre writer em WAL e ``readers`` conexoes de leitura."""
+    writer = await _connect(db_path)
+    if _is_memory(db_path):
+        return SqlitePool(writer, [])
+
+    reader_conns: list[aiosqlite.Connection] = []
+    try:
+        await writer.execute_fetchall("PRAGMA journal_mode = WAL")
+        for _ in range(readers):
+            reader_conns.append(await _connect(db_path, readonly=True))
+    except BaseException:
+        await SqlitePool(writer, reader_conns).close()
+        raise
+    return SqlitePool(writer, reader_conns)
@@ -0,0 +1,293 @@
+"""Streaming do chat via Server-Sent Events com replay por ``Last-Event-ID``.
+
+Cada ``POST /chat/stream`` inicia um run do grafo numa task propria, que
+publica os eventos de ``stream_chat`` (``token``, ``tool_start``,
+``tool_end``, ``end`` ou ``error``) num buffer curto em memoria. A resposta
+HTTP apenas le desse buffer: se a conexao cair, o run continua e o cliente
+retoma em ``GET /chat/stream/{stream_id}`` com ``Last-Event-ID``, recebendo
+o que perdeu e seguindo ao vivo.
+
+O id de cada evento e ``<stream_id>:<seq>``. Streams encerrados ficam
+disponiveis por ``ttl_seconds``; o buffer guarda os ultimos ``max_events``
+eventos. Com um cliente conectado, o run nao descarta eventos que ele ainda
+nao leu: espera ate ``slow_subscriber_seconds`` e, se o cliente nao
+acompanhar, o desconecta. Cada usuario tem no maximo
+``max_streams_per_user`` runs em andamento. O registro e por processo: com
+varios workers, a retomada precisa cair no mesmo worker (sticky session).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator
+
+from .ws_stream import dumps
+
+DEFAULT_REPLAY_EVENTS = 1024
+DEFAULT_REPLAY_TTL_SECONDS = 60
+DEFAULT_MAX_STREAMS_PER_USER = 4
+DEFAULT_SLOW_SUBSCRIBER_SECONDS = 30
+HEARTBEAT_SECONDS = 15
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    # Nginx bufferiza respostas de proxy por padrao
+    "X-Accel-Buffering": "no",
+}
+
+
+class ReplayUnavailable(Exception):
+    """Os eventos pedidos ja sairam do buffer de replay."""
+
+
+class SubscriberTooSlow(Exception):
+    """O cliente nao acompanhou o run e foi desconectado."""
+
+
+class ChatStream:
+    """Eventos de um run, numerados a partir de 0."""
+
+    def __init__(self, stream_id: str, user_id: int, max_events: int) -> None:
+        self.stream_id = stream_id
+        self.user_id = user_id
+        self.events: deque[tuple[int, dict]] = deque(maxlen=max_events)
+        self.next_seq = 0
+        self.done = False
+        self.finished_at: float | None = None
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+        # Subscribers conectados -> maior seq ja lido do buffer
+        self._cursors: dict[object, int] = {}
+        self._dropped: set[object] = set()
+        self._consumed = asyncio.Event()
+
+    def publish(self, event: dict) -> None:
+        self.events.append((self.next_seq, event))
+        self.next_seq += 1
+        self._wake()
+
+    def finish(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._wake()
+
+    def _wake(self) -> None:
+        # Um Event por "geracao": quem ja esperava acorda, quem chegar
+        # depois espera pela proxima mudanca
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _advance(self, token: object, seq: int) -> None:
+        self._cursors[token] = seq
+        self._notify_consumed()
+
+    def _notify_consumed(self) -> None:
+        consumed, self._consumed = self._consumed, asyncio.Event()
+        consumed.set()
+
+    def _lagging(self) -> list[object]:
+        """Subscribers que ainda nao leram o evento que o proximo publish descarta."""
+        if len(self.events) < self.events.maxlen:
+            return []
+        oldest = self.events[0][0]
+        return [token for token, seq in self._cursors.items() if seq < oldest]
+
+    async def wait_for_room(self, timeout: float) -> None:
+        """Backpressure do run sobre os subscribers conectados.
+
+        Espera quem ainda nao leu o evento mais antigo do buffer; quem nao
+        acompanhar em ``timeout`` segundos e desconectado e o run segue.
+        """
+        deadline = time.monotonic() + timeout
+        while lagging := self._lagging():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                for token in lagging:
+                    del self._cursors[token]
+                    self._dropped.add(token)
+                return
+            consumed = self._consumed
+            try:
+                await asyncio.wait_for(consumed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def since(self, last_seq: int) -> list[tuple[int, dict]]:
+        """Eventos com seq > ``last_seq``.
+
+        Raises:
+            ReplayUnavailable: Se algum deles ja foi descartado do buffer.
+        """
+        if self.events and self.events[0][0] > last_seq + 1:
+            raise ReplayUnavailable(self.stream_id)
+        if not self.events and self.next_seq > last_seq + 1:
+            raise ReplayUnavailable(self.stream_id)
+        return [item for item in self.events if item[0] > last_seq]
+
+    async def subscribe(
+        self, last_seq: int = -1, heartbeat: float = HEARTBEAT_SECONDS,
+    ) -> AsyncIterator[tuple[int, dict] | None]:
+        """Eventos apos ``last_seq`` ate o fim do run.
+
+        Produz None a cada ``heartbeat`` segundos sem eventos, para manter
+        a conexao viva atras de proxies.
+
+        Raises:
+            ReplayUnavailable: Se os eventos apos ``last_seq`` ja sairam do buffer.
+            SubscriberTooSlow: Se o run desconectou este subscriber (ver
+                ``wait_for_room``).
+        """
+        token = object()
+        self._cursors[token] = last_seq
+        try:
+            while True:
+                if token in self._dropped:
+                    raise SubscriberTooSlow(self.stream_id)
+                changed = self._changed
+                pending = self.since(last_seq)
+                if pending:
+                    self._advance(token, pending[-1][0])
+                for seq, event in pending:
+                    last_seq = seq
+                    yield seq, event
+                if self.done and last_seq >= self.next_seq - 1:
+                    return
+                if pending:
+                    continue
+                try:
+                    await asyncio.wait_for(changed.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._cursors.pop(token, None)
+            self._dropped.discard(token)
+            self._notify_consumed()
+
+
+class SseStreamRegistry:
+    """Runs em andamento (e recem-encerrados) disponiveis para replay.
+
+    Args:
+        max_events: Eventos guardados por stream.
+        ttl_seconds: Tempo que um stream encerrado fica disponivel.
+        max_streams_per_user: Runs em andamento por usuario.
+        slow_subscriber_seconds: Quanto o run espera um cliente conectado
+            atrasado antes de desconecta-lo.
+    """
+
+    def __init__(
+        self,
+        max_events: int = DEFAULT_REPLAY_EVENTS,
+        ttl_seconds: float = DEFAULT_REPLAY_TTL_SECONDS,
+        max_streams_per_user: int = DEFAULT_MAX_STREAMS_PER_USER,
+        slow_subscriber_seconds: float = DEFAULT_SLOW_SUBSCRIBER_SECONDS,
+    ) -> None:
+        self.max_events = max_events
+        self.ttl_seconds = ttl_seconds
+        self.max_streams_per_user = max_streams_per_user
+        self.slow_subscriber_seconds = slow_subscriber_seconds
+        self._streams: dict[str, ChatStream] = {}
+
+    def start(self, user_id: int, events: AsyncIterator[dict]) -> ChatStream | None:
+        """Consome ``events`` numa task, publicando no buffer do stream.
+
+        Retorna None (sem iniciar ``events``) se ``user_id`` ja tem
+        ``max_streams_per_user`` runs em andamento.
+        """
+        self._prune()
+        running = sum(
+            1 for s in self._streams.values() if s.user_id == user_id and not s.done
+        )
+        if running >= self.max_streams_per_user:
+            return None
+        stream = ChatStream(uuid.uuid4().hex, user_id, self.max_events)
+        stream.task = asyncio.create_task(self._run(stream, events))
+        self._streams[stream.stream_id] = stream
+        return stream
+
+    def get(self, stream_id: str, user_id: int) -> ChatStream | None:
+        """Stream de ``user_id``; None se nao existe, expirou ou e de outro."""
+        self._prune()
+        stream = self._streams.get(stream_id)
+        if stream is None or stream.user_id != user_id:
+            return None
+        return stream
+
+    async def close(self) -> None:
+        """Cancela os runs em andamento (shutdown)."""
+        tasks = [s.task for s in self._streams.values() if s.task and not s.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+        self._streams.clear()
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        expired = [
+            stream_id for stream_id, stream in self._streams.items()
+            if stream.done and now - stream.finished_at >= self.ttl_seconds
+        ]
+        for stream_id in expired:
+            del self._streams[stream_id]
+
+    async def _run(self, stream: ChatStream, events: AsyncIterator[dict]) -> None:
+        try:
+            async for event in events:
+                await self._publish(stream, event)
+            await self._publish(stream, {"type": "end"})
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            await self._publish(stream, {"type": "error", "content": str(exc)})
+        finally:
+            stream.finish()
+
+    async def _publish(self, stream: ChatStream, event: dict) -> None:
+        await stream.wait_for_room(self.slow_subscriber_seconds)
+        stream.publish(event)
+
+
+def parse_last_event_id(value: str | None) -> int:
+    """Seq do ``Last-Event-ID`` (``<stream_id>:<seq>`` ou ``<seq>``); -1 se ausente."""
+    if not value:
+        return -1
+    try:
+        return int(value.rsplit(":", 1)[-1])
+    except ValueError:
+        return -1
+
+
+def format_event(stream_id: str, seq: int, event: dict) -> str:
+    """Evento SSE: ``event`` e o tipo, ``data`` o JSON do evento."""
+    return f"id: {stream_id}:{seq}\nevent: {event['type']}\ndata: {dumps(event)}\n\n"
+
+
+async def sse_response_body(
+    stream: ChatStream, last_seq: int = -1, heartbeat: float = HEARTBEAT_SECONDS,
+) -> AsyncIterator[str]:
+    """Corpo da resposta ``text/event-stream`` de ``stream`` apos ``last_seq``."""
+    try:
+        async for item in stream.subscribe(last_seq, heartbeat):
+            if item is None:
+                yield ": keepalive\n\n"
+                continue
+            seq, event = item
+            yield format_event(stream.stream_id, seq, event)
+    except ReplayUnavailable:
+        # Sem id: o cliente nao deve tentar retomar deste ponto
+        error = {
+            "type": "error",
+            "content": "Eventos anteriores nao estao mais disponiveis para replay.",
+        }
+        yield f"event: error\ndata: {dumps(error)}\n\n"
+    except SubscriberTooSlow:
+        error = {
+            "type": "error",
+            "content": "Conexao lenta demais: o stream seguiu sem este cliente.",
+        }
+        yield f"event: error\ndata: {dumps(error)}\n\n"
@@ -0,0 +1,314 @@
+"""Serializacao de turnos de chat por thread.
+
+Dois ``/chat``/``/ws``/``/chat/stream`` simultaneos no mesmo ``thread_id``
+rodariam o grafo contra o mesmo checkpoint: estado corrompido e chamada de
+modelo em dobro. ``ThreadLockManager`` garante um turno por vez por thread:
+
+- em processo, com um ``asyncio.Lock`` por thread ativo;
+- entre workers, com um lock distribuido: Redis (``SET NX`` com TTL
+  renovado) se ``REDIS_URL`` estiver configurado, senao advisory lock do
+  Postgres (conexao dedicada por processo). Com SQLite so ha o lock local.
+
+A politica ``queue`` espera ate ``wait_seconds`` pelo turno anterior;
+``reject`` falha na hora. Nos dois casos a falha e ``ThreadBusy``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Protocol
+
+logger = logging.getLogger(__name__)
+
+POLICY_QUEUE = "queue"
+POLICY_REJECT = "reject"
+POLICIES = (POLICY_QUEUE, POLICY_REJECT)
+
+DEFAULT_WAIT_SECONDS = 30
+DEFAULT_TTL_SECONDS = 300
+# Espaco de chaves dos advisory locks de thread (pg_advisory_lock(int, int))
+THREAD_LOCK_CLASS = 7_305_002
+REDIS_KEY_PREFIX = "jarvis:thread-lock:"
+
+_POLL_INITIAL_SECONDS = 0.05
+_POLL_MAX_SECONDS = 0.5
+
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+_RENEW_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class ThreadBusy(Exception):
+    """O thread ja tem um turno em andamento."""
+
+    def __init__(self, thread_id: str) -> None:
+        super().__init__("Este thread ja tem uma resposta em andamento.")
+        self.thread_id = thread_id
+
+
+class DistributedThreadLock(Protocol):
+    async def try_acquire(self, thread_id: str) -> bool: ...
+
+    async def release(self, thread_id: str) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class RedisThreadLock:
+    """Lock por thread no Redis: ``SET NX PX`` com token, renovado em background.
+
+    O TTL so importa se o processo morrer segurando o lock; enquanto o turno
+    roda, o lock e renovado a cada ``ttl_seconds / 3``. Se o Redis falhar,
+    o turno segue apenas com o lock local (idem no Postgres).
+    """
+
+    def __init__(self, client: Any, ttl_seconds: int = DEFAULT_TTL_SECONDS) -> None:
+        self.client = client
+        self.ttl_ms = max(ttl_seconds, 1) * 1000
+        self._held: dict[str, tuple[str, asyncio.Task]] = {}
+
+    async def try_acquire(self, thread_id: str) -> bool:
+        import redis
+
+        key = REDIS_KEY_PREFIX + thread_id
+        token = uuid.uuid4().hex
+        try:
+            acquired = await asyncio.to_thread(
+                self.client.set, key, token, nx=True, px=self.ttl_ms,
+            )
+        except redis.RedisError:
+            logger.warning("Redis indisponivel; lock do thread %s apenas local", thread_id)
+            return True
+        if not acquired:
+            return False
+        renewer = asyncio.create_task(self._renew(key, token))
+        self._held[thread_id] = (token, renewer)
+        return True
+
+    async def _renew(self, key: str, token: str) -> None:
+        import redis
+
+        while True:
+            await asyncio.sleep(self.ttl_ms / 3000)
+            try:
+                await asyncio.to_thread(
+                    self.client.eval, _RENEW_LUA, 1, key, token, self.ttl_ms,
+                )
+            except redis.RedisError:
+                pass
+
+    async def release(self, thread_id: str) -> None:
+        import redis
+
+        held = self._held.pop(thread_id, None)
+        if held is None:
+            return
+        token, renewer = held
+        renewer.cancel()
+        try:
+            await asyncio.to_thread(
+                self.client.eval, _RELEASE_LUA, 1, REDIS_KEY_PREFIX + thread_id, token,
+            )
+        except redis.RedisError:
+            pass
+
+    async def close(self) -> None:
+        for thread_id in list(self._held):
+            await self.release(thread_id)
+
+
+class PostgresThreadLock:
+    """Advisory lock de sessao por thread, numa conexao dedicada do processo.
+
+    Uma so conexao basta: o lock local ja impede dois turnos do mesmo thread
+    neste processo, e o advisory lock exclui os outros processos. Se a
+    conexao cair, o Postgres libera os locks dela.
+    """
+
+    def __init__(self, database_url: str) -> None:
+        self.database_url = database_url
+        self._conn = None
+        self._io = asyncio.Lock()
+
+    async def _connection(self):
+        if self._conn is None or self._conn.is_closed():
+            import asyncpg
+
+            self._conn = await asyncpg.connect(self.database_url)
+        return self._conn
+
+    async def try_acquire(self, thread_id: str) -> bool:
+        import asyncpg
+
+        async with self._io:
+            try:
+                conn = await self._connection()
+                return await conn.fetchval(
+                    "SELECT pg_try_advisory_lock($1, hashtext($2))",
+                    THREAD_LOCK_CLASS, thread_id,
+                )
+            except (OSError, asyncpg.PostgresError):
+                logger.warning(
+                    "Postgres indisponivel; lock do thread %s apenas local", thread_id,
+                )
+                return True
+
+    async def release(self, thread_id: str) -> None:
+        async with self._io:
+            if self._conn is None or self._conn.is_closed():
+                return
+            await self._conn.execute(
+                "SELECT pg_advisory_unlock($1, hashtext($2))",
+                THREAD_LOCK_CLASS, thread_id,
+            )
+
+    async def close(self) -> None:
+        async with self._io:
+            if self._conn is not None and not self._conn.is_closed():
+                await self._conn.close()
+            self._conn = None
+
+
+class _Entry:
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ThreadLockManager:
+    """Um turno por vez por thread.
+
+    Args:
+        policy: ``queue`` (espera o turno anterior) ou ``reject``.
+        wait_seconds: Espera maxima na politica ``queue``.
+        distributed: Lock entre processos (Redis/Postgres) ou None.
+    """
+
+    def __init__(
+        self,
+        policy: str = POLICY_QUEUE,
+        wait_seconds: float = DEFAULT_WAIT_SECONDS,
+        distributed: DistributedThreadLock | None = None,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Politica de lock invalida: {policy}")
+        self.policy = policy
+        self.wait_seconds = wait_seconds
+        self.distributed = distributed
+        self._entries: dict[str, _Entry] = {}
+
+    def is_busy(self, thread_id: str) -> bool:
+        """True se ha turno (ou fila) local para o thread."""
+        return thread_id in self._entries
+
+    @asynccontextmanager
+    async def hold(self, thread_id: str) -> AsyncIterator[None]:
+        """Executa o bloco com o thread travado.
+
+        Raises:
+            ThreadBusy: Thread ocupado (``reject``) ou espera esgotada (``queue``).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_seconds
+        entry = self._entries.get(thread_id)
+        if entry is None:
+            entry = self._entries[thread_id] = _Entry()
+        entry.users += 1
+        try:
+            if self.policy == POLICY_REJECT and entry.lock.locked():
+                raise ThreadBusy(thread_id)
+            try:
+                async with asyncio.timeout_at(deadline):
+                    await entry.lock.acquire()
+            except TimeoutError:
+                raise ThreadBusy(thread_id) from None
+            try:
+                if self.distributed is not None:
+                    await self._acquire_distributed(thread_id, deadline)
+                try:
+                    yield
+                finally:
+                    if self.distributed is not None:
+                        await self.distributed.release(thread_id)
+            finally:
+                entry.lock.release()
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                del self._entries[thread_id]
+
+    async def _acquire_distributed(self, thread_id: str, deadline: float) -> None:
+        loop = asyncio.get_running_loop()
+        delay = _POLL_INITIAL_SECONDS
+        while not await self.distributed.try_acquire(thread_id):
+            remaining = deadline - loop.time()
+            if self.policy == POLICY_REJECT or remaining <= 0:
+                raise ThreadBusy(thread_id)
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, _POLL_MAX_SECONDS)
+
+    async def close(self) -> None:
+        if self.distributed is not None:
+            await self.distributed.close()
+
+
+def create_thread_locks(settings: Any) -> ThreadLockManager:
+    """Gerenciador com o lock distribuido disponivel na configuracao."""
+    distributed: DistributedThreadLock | None = None
+    if settings.redis_url:
+        from .cache import get_redis
+
+        distributed = RedisThreadLock(
+            get_redis(settings.redis_url), settings.thread_lock_ttl_seconds,
+        )
+    elif settings.database_url:
+        distributed = PostgresThreadLock(settings.database_url)
+    return ThreadLockManager(
+        settings.thread_lock_policy, settings.thread_lock_wait_seconds, distributed,
+    )
+
+
+def _manager(state: Any) -> ThreadLockManager | None:
+    return getattr(state, "thread_locks", None)
+
+
+@asynccontextmanager
+async def hold_thread(state: Any, thread_id: str) -> AsyncIterator[None]:
+    """``hold`` do gerenciador de ``app.state``, se houver."""
+    manager = _manager(state)
+    if manager is None:
+        yield
+        return
+    async with manager.hold(thread_id):
+        yield
+
+
+async def locked_events(
+    state: Any, thread_id: str, events: AsyncIterator[dict],
+) -> AsyncIterator[dict]:
+    """Repassa ``events`` segurando o lock do thread durante todo o stream.
+
+    ``ThreadBusy`` sobe no primeiro ``__anext__``, antes de o grafo rodar.
+    """
+    async with hold_thread(state, thread_id):
+        try:
+            async for event in events:
+                yield event
+        finally:
+            aclose = getattr(events, "aclose", None)
+            if aclose is not None:
+                await aclose()
@@ -1,14 +1,18 @@
 from .base import BASE_TOOLS, calculator, current_time, evaluate_expression
 from ..cartola import CARTOLA_TOOLS
-from .github import GITHUB_TOOLS
+from .github import GITHUB_READ_TOOLS, GITHUB_TOOLS
 
 ALL_TOOLS = [*BASE_TOOLS, *CARTOLA_TOOLS, *GITHUB_TOOLS]
+# Tools somente leitura
+READ_ONLY_TOOLS = [*BASE_TOOLS, *CARTOLA_TOOLS, *GITHUB_READ_TOOLS]
 
 __all__ = [
     "ALL_TOOLS",
     "BASE_TOOLS",
     "CARTOLA_TOOLS",
+    "GITHUB_READ_TOOLS",
     "GITHUB_TOOLS",
+    "READ_ONLY_TOOLS",
     "calculator",
     "current_time",
     "evaluate_expression",
@@ -312,6 +312,9 @@ def github_add_label(repo: str, issue_number: int, label: str) -> str:
     return f"Label '{label}' adicionada na issue #{issue_number}."
 
 
+# Sem efeitos colaterais: podem ser repetidas (ex.: cache de respostas)
+GITHUB_READ_TOOLS = [github_read_issue, github_read_file, github_list_files]
+
 GITHUB_TOOLS = [
     github_read_issue,
     github_read_file,
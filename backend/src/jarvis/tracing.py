@@ -0,0 +1,341 @@
+"""Spans no estilo OpenTelemetry, exportados em JSONL.
+
+Um turno lento pode ter gasto o tempo no modelo, numa tool (ex.: a API
+do Cartola), no Redis, no checkpointer ou no banco. Com
+``JARVIS_TRACE_FILE`` configurado, cada turno do chat (e cada agent run)
+vira um trace: o span raiz e aberto por ``trace`` e os modulos
+instrumentados abrem spans filhos com ``span``/``traced``:
+
+- ``graph.<no>``: cada no do grafo (``traced_node``);
+- ``model.invoke``: chamada ao modelo (``ModelRouter``);
+- ``tool.<nome>``: cada tool call; ``cartola.http`` dentro das tools;
+- ``cache.*``: leituras do Redis, cache de respostas e semantico;
+- ``checkpoint.*``: leitura/escrita do checkpointer (``TracedCheckpointer``);
+- ``db.*``: blocos do ``SqlitePool`` e queries do asyncpg.
+
+O span atual vive num ``ContextVar``; tasks e threads do executor herdam
+o contexto, entao o pai e resolvido sozinho. Spans sem trace aberto
+(ex.: flush dos buffers) nao sao registrados. Cada span terminado vira
+uma linha JSON (campos do modelo de dados do OTel: ``trace_id``,
+``span_id``, ``parent_span_id``, tempos em ns, ``status``,
+``attributes``) gravada por uma thread, fora do event loop. O arquivo
+faz o papel do coletor OTLP: da para ler direto ou converter.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = "OK"
+STATUS_ERROR = "ERROR"
+
+# Limite de texto em atributos (ex.: SQL)
+MAX_ATTRIBUTE_CHARS = 300
+
+
+class Span:
+    """Um span em andamento; ``set_attribute`` enriquece antes do fim."""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_span_id", "start_ns", "end_ns",
+        "attributes", "status", "error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: str | None,
+        attributes: dict[str, Any],
+        start_ns: int | None = None,
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = attributes
+        self.status = STATUS_OK
+        self.error: str | None = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, exc: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.error = f"{type(exc).__name__}: {exc}"[:MAX_ATTRIBUTE_CHARS]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class JsonlSpanExporter:
+    """Grava spans terminados em JSONL numa thread propria.
+
+    ``export`` so enfileira; a thread escreve em lote e faz flush quando a
+    fila esvazia.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._file = open(path, "a", encoding="utf-8")  # noqa: SIM115
+        self._thread = threading.Thread(target=self._run, name="jarvis-trace", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            while item is not None:
+                try:
+                    self._file.write(json.dumps(item.to_dict(), default=str) + "\n")
+                except Exception:
+                    logger.exception("Erro ao exportar span %s", item.name)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._file.flush()
+            if item is None:
+                return
+
+    def close(self) -> None:
+        """Grava o que estiver na fila e fecha o arquivo."""
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+
+_exporter: JsonlSpanExporter | None = None
+_sample_rate = 1.0
+_current: ContextVar[Span | None] = ContextVar("jarvis_span", default=None)
+
+
+def configure_tracing(path: str, sample_rate: float = 1.0) -> None:
+    """Liga a exportacao para ``path`` (vazio desliga)."""
+    global _exporter, _sample_rate
+    shutdown_tracing()
+    _sample_rate = sample_rate
+    if path:
+        _exporter = JsonlSpanExporter(path)
+
+
+def shutdown_tracing() -> None:
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+
+
+def tracing_enabled() -> bool:
+    return _exporter is not None
+
+
+def start_trace() -> str | None:
+    """Novo trace_id, ou None se tracing desligado ou turno fora da amostra."""
+    if _exporter is None or random.random() >= _sample_rate:
+        return None
+    return os.urandom(16).hex()
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def current_trace_id() -> str | None:
+    current = _current.get()
+    return current.trace_id if current is not None else None
+
+
+@contextmanager
+def _finish(new: Span) -> Iterator[Span]:
+    """Registra status, fim e exporta ``new`` ao sair (sem ativa-lo)."""
+    try:
+        yield new
+    except (GeneratorExit, asyncio.CancelledError):
+        new.set_attribute("cancelled", True)
+        raise
+    except BaseException as exc:
+        new.record_error(exc)
+        raise
+    finally:
+        new.end_ns = time.time_ns()
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(new)
+
+
+@contextmanager
+def _activate(new: Span) -> Iterator[Span]:
+    token = _current.set(new)
+    try:
+        with _finish(new):
+            yield new
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Gerador fechado em outro contexto (ex.: aclose tardio)
+            pass
+
+
+@contextmanager
+def trace(name: str, trace_id: str | None, **attributes: Any) -> Iterator[Span | None]:
+    """Span raiz de ``trace_id`` (de ``start_trace``); None nao registra nada."""
+    if trace_id is None or _exporter is None:
+        yield None
+        return
+    with _activate(Span(name, trace_id, None, attributes)) as root:
+        yield root
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """Span filho do span atual; sem trace aberto nao registra nada."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    with _activate(Span(name, parent.trace_id, parent.span_id, attributes)) as child:
+        yield child
+
+
+def record_span(name: str, seconds: float, error: str | None = None, **attributes: Any) -> None:
+    """Registra um span ja terminado (duracao medida por outra biblioteca)."""
+    parent = _current.get()
+    exporter = _exporter
+    if parent is None or exporter is None:
+        return
+    end_ns = time.time_ns()
+    done = Span(
+        name, parent.trace_id, parent.span_id, attributes,
+        start_ns=end_ns - int(seconds * 1e9),
+    )
+    done.end_ns = end_ns
+    if error:
+        done.status = STATUS_ERROR
+        done.error = error[:MAX_ATTRIBUTE_CHARS]
+    exporter.export(done)
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Decorador: executa a funcao (sync ou async) dentro de ``span(name)``."""
+
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def traced_node(name: str, fn: Callable) -> Callable:
+    """No do grafo dentro de ``span("graph.<name>")``.
+
+    ``functools.wraps`` preserva a assinatura: o LangGraph continua
+    passando ``config`` para nos que o recebem.
+    """
+    return traced(f"graph.{name}")(fn)
+
+
+async def _iterate_within(active: Span, items: AsyncIterator) -> AsyncIterator:
+    """Repassa ``items`` com ``active`` como span atual so durante cada ``__anext__``.
+
+    Um ``with span(...)`` em volta do ``yield`` deixaria o ContextVar no
+    span enquanto o consumidor roda entre um item e outro, e os spans do
+    consumidor virariam filhos do stream.
+    """
+    iterator = aiter(items)
+    try:
+        while True:
+            token = _current.set(active)
+            try:
+                item = await anext(iterator)
+            except StopAsyncIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield item
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+async def traced_iter(name: str, items: AsyncIterator, **attributes: Any) -> AsyncIterator:
+    """Repassa ``items`` dentro do span filho ``name`` (iteracao inteira).
+
+    O span cobre do primeiro ao ultimo item, mas so e o span atual
+    enquanto ``items`` produz o proximo (ver ``_iterate_within``).
+    """
+    parent = _current.get()
+    if parent is None:
+        async for item in items:
+            yield item
+        return
+    with _finish(Span(name, parent.trace_id, parent.span_id, attributes)) as child:
+        async for item in _iterate_within(child, items):
+            yield item
+
+
+async def traced_events(
+    name: str,
+    trace_id: str | None,
+    events: AsyncIterator[dict],
+    **attributes: Any,
+) -> AsyncIterator[dict]:
+    """Repassa ``events`` dentro do span raiz ``name`` (streams do chat).
+
+    Como em ``traced_iter``, o span so fica ativo enquanto ``events``
+    produz o proximo evento.
+    """
+    try:
+        if trace_id is None or _exporter is None:
+            async for event in events:
+                yield event
+            return
+        with _finish(Span(name, trace_id, None, attributes)) as root:
+            async for event in _iterate_within(root, events):
+                yield event
+    finally:
+        aclose = getattr(events, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,168 @@
+"""Contabilidade de tokens e latencia por turno do chat e por agent run.
+
+Um ``TurnMetrics`` acompanha uma execucao do grafo pelo ``configurable``
+(chave ``turn_metrics``): o no ``assistant`` soma chamadas ao modelo, hits
+de cache e tokens (``usage_metadata``), os nos medem o proprio tempo de
+parede e ``stream_chat`` marca o primeiro token (time-to-first-token).
+
+No fim do turno, ``record_turn`` (ou ``recorded_events``, para streams)
+entrega a linha ao ``ChatTurnBuffer`` de ``app.state``, que grava em lote
+na tabela ``chat_turns``. Agent runs guardam os mesmos contadores nas
+colunas do proprio run.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, AsyncIterator
+
+from .metrics import CHAT_TTFT, CHAT_TURN_DURATION, CHAT_TURNS
+from .model_router import cached_tokens
+
+CONFIG_KEY = "turn_metrics"
+
+CHANNEL_CHAT = "chat"
+CHANNEL_STREAM = "sse"
+CHANNEL_WS = "ws"
+
+STATUS_COMPLETED = "completed"
+STATUS_ERROR = "error"
+STATUS_CANCELLED = "cancelled"
+
+
+def _ms(seconds: float) -> int:
+    return round(seconds * 1000)
+
+
+class TurnMetrics:
+    """Contadores de uma execucao do grafo."""
+
+    __slots__ = (
+        "started", "model_calls", "tool_calls", "cache_hits", "input_tokens",
+        "cached_input_tokens", "output_tokens", "assistant_ms", "tools_ms",
+        "ttft_ms", "duration_ms",
+    )
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.model_calls = 0
+        self.tool_calls = 0
+        self.cache_hits = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self.output_tokens = 0
+        self.assistant_ms = 0
+        self.tools_ms = 0
+        self.ttft_ms: int | None = None
+        self.duration_ms: int | None = None
+
+    def start(self) -> None:
+        """Reinicia o relogio (ex.: depois de esperar o lock do thread)."""
+        self.started = time.perf_counter()
+
+    def add_model_call(self, response: Any) -> None:
+        self.model_calls += 1
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            self.input_tokens += usage.get("input_tokens", 0)
+            self.cached_input_tokens += cached_tokens(usage)
+            self.output_tokens += usage.get("output_tokens", 0)
+
+    def add_cache_hit(self) -> None:
+        self.cache_hits += 1
+
+    def add_assistant_time(self, seconds: float) -> None:
+        self.assistant_ms += _ms(seconds)
+
+    def add_tools(self, calls: int, seconds: float) -> None:
+        self.tool_calls += calls
+        self.tools_ms += _ms(seconds)
+
+    def mark_first_token(self) -> None:
+        if self.ttft_ms is None:
+            self.ttft_ms = _ms(time.perf_counter() - self.started)
+
+    def finish(self) -> None:
+        if self.duration_ms is None:
+            self.duration_ms = _ms(time.perf_counter() - self.started)
+
+    def usage_fields(self) -> dict[str, int]:
+        """Contadores comuns a turnos de chat e agent runs."""
+        return {
+            "model_calls": self.model_calls,
+            "input_tokens": self.input_tokens,
+            "cached_input_tokens": self.cached_input_tokens,
+            "output_tokens": self.output_tokens,
+            "assistant_ms": self.assistant_ms,
+            "tools_ms": self.tools_ms,
+        }
+
+    def as_fields(self) -> dict[str, int | None]:
+        return {
+            **self.usage_fields(),
+            "tool_calls": self.tool_calls,
+            "cache_hits": self.cache_hits,
+            "ttft_ms": self.ttft_ms,
+            "duration_ms": self.duration_ms,
+        }
+
+
+def metrics_from_config(config: Any) -> TurnMetrics | None:
+    """``TurnMetrics`` da execucao, se quem chamou o grafo pediu."""
+    if not config:
+        return None
+    return config.get("configurable", {}).get(CONFIG_KEY)
+
+
+def record_turn(
+    state: Any,
+    thread_id: str,
+    user_id: int,
+    channel: str,
+    status: str,
+    metrics: TurnMetrics,
+) -> None:
+    """Observa o turno em ``/metrics`` e entrega ao buffer de ``state``.
+
+    Sem buffer (``JARVIS_TURN_METRICS_FLUSH_MS=0``) a linha nao e gravada.
+    """
+    metrics.finish()
+    CHAT_TURNS.inc(channel=channel, status=status)
+    CHAT_TURN_DURATION.observe(metrics.duration_ms / 1000, channel=channel)
+    if metrics.ttft_ms is not None:
+        CHAT_TTFT.observe(metrics.ttft_ms / 1000, channel=channel)
+    buffer = getattr(state, "turn_buffer", None)
+    if buffer is None:
+        return
+    buffer.submit({
+        "thread_id": thread_id,
+        "user_id": user_id,
+        "channel": channel,
+        "status": status,
+        **metrics.as_fields(),
+    })
+
+
+async def recorded_events(
+    state: Any,
+    thread_id: str,
+    user_id: int,
+    channel: str,
+    metrics: TurnMetrics,
+    events: AsyncIterator[dict],
+) -> AsyncIterator[dict]:
+    """Repassa ``events`` e registra o turno ao fim (ou no cancelamento)."""
+    status = STATUS_ERROR
+    try:
+        async for event in events:
+            yield event
+        status = STATUS_COMPLETED
+    except (asyncio.CancelledError, GeneratorExit):
+        status = STATUS_CANCELLED
+        raise
+    finally:
+        aclose = getattr(events, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        record_turn(state, thread_id, user_id, channel, status, metrics)
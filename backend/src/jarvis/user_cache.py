@@ -0,0 +1,230 @@
+"""Cache dos usuarios autenticados.
+
+Cada request autenticado (HTTP e ``/ws``) resolvia o ``sub`` do JWT com
+``get_user_by_id``, um round-trip ao banco por chamada. O cache guarda o
+usuario por um TTL curto e as rotas admin que alteram usuario invalidam a
+entrada na hora:
+
+- sem Redis, ``UserCache`` e por processo e o TTL limita a defasagem
+  entre workers;
+- com ``REDIS_URL``, ``RedisUserCache`` poe um ``UserCache`` de TTL curto
+  (L1, sem round-trip) na frente do Redis (compartilhado entre workers).
+  A invalidacao apaga a chave e e publicada num canal pub/sub que limpa o
+  L1 de todos os workers, entao desativar/remover/rebaixar um usuario vale
+  para todos na hora; se a assinatura cair, o TTL do L1 limita a defasagem.
+
+O hash da senha nunca entra no cache (nem no usuario devolvido).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_LOCAL_TTL_SECONDS = 5
+REDIS_KEY_PREFIX = "jarvis:user:"
+INVALIDATION_CHANNEL = "jarvis:user-invalidate"
+
+# Campos que nao saem do banco junto com o usuario autenticado
+_PRIVATE_FIELDS = ("hashed_password",)
+
+
+def _public_user(user: dict[str, Any]) -> dict[str, Any]:
+    return {k: v for k, v in user.items() if k not in _PRIVATE_FIELDS}
+
+
+class UserCache:
+    """LRU com TTL de usuarios por id, em memoria do processo.
+
+    Args:
+        ttl_seconds: Tempo de vida de cada entrada.
+        max_entries: Maximo de usuarios em memoria.
+        clock: Funcao de tempo monotonic (injetavel em testes).
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: OrderedDict[int, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    async def get(self, user_id: int) -> dict[str, Any] | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= self._clock():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return dict(user)
+
+    async def set(self, user_id: int, user: dict[str, Any]) -> None:
+        self._entries[user_id] = (self._clock() + self.ttl_seconds, _public_user(user))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, user_id: int) -> None:
+        self.discard(user_id)
+
+    def discard(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def close(self) -> None:
+        self.clear()
+
+
+class RedisUserCache:
+    """L1 em memoria na frente do Redis (JSON com TTL, visivel para todos).
+
+    Hits do L1 nao tocam o Redis. Erros do Redis viram miss (o request vai
+    ao banco); numa invalidacao com erro, a entrada antiga vive no maximo
+    ``ttl_seconds``.
+
+    Args:
+        client: Cliente Redis sincrono (``cache.get_redis``).
+        ttl_seconds: TTL das entradas no Redis.
+        local_ttl_seconds: TTL do L1 (limitado a ``ttl_seconds``).
+        clock: Relogio do L1 (injetavel em testes).
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        ttl_seconds: int,
+        local_ttl_seconds: float = DEFAULT_LOCAL_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.local = UserCache(min(local_ttl_seconds, ttl_seconds), clock=clock)
+        self._listener: Any = None
+
+    def listen(self) -> None:
+        """Assina as invalidacoes dos outros workers (thread do pub/sub).
+
+        Chamar com o event loop rodando: a thread limpa o L1 via
+        ``call_soon_threadsafe``.
+        """
+        import redis
+
+        loop = asyncio.get_running_loop()
+
+        def on_message(message: dict[str, Any]) -> None:
+            try:
+                user_id = int(message["data"])
+            except (TypeError, ValueError):
+                return
+            loop.call_soon_threadsafe(self.local.discard, user_id)
+
+        try:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: on_message})
+            self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+        except redis.RedisError:
+            logger.warning(
+                "Sem assinatura de invalidacao de usuarios; o L1 expira em %ss",
+                self.local.ttl_seconds,
+            )
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        self.local.clear()
+
+    async def get(self, user_id: int) -> dict[str, Any] | None:
+        import redis
+
+        user = await self.local.get(user_id)
+        if user is not None:
+            return user
+        try:
+            cached = await asyncio.to_thread(self.client.get, REDIS_KEY_PREFIX + str(user_id))
+        except redis.RedisError:
+            return None
+        if cached is None:
+            return None
+        user = json.loads(cached)
+        await self.local.set(user_id, user)
+        return user
+
+    async def set(self, user_id: int, user: dict[str, Any]) -> None:
+        import redis
+
+        await self.local.set(user_id, user)
+        try:
+            await asyncio.to_thread(
+                self.client.setex, REDIS_KEY_PREFIX + str(user_id), self.ttl_seconds,
+                json.dumps(_public_user(user)),
+            )
+        except redis.RedisError:
+            pass
+
+    async def invalidate(self, user_id: int) -> None:
+        import redis
+
+        self.local.discard(user_id)
+        try:
+            await asyncio.to_thread(self._delete_and_publish, user_id)
+        except redis.RedisError:
+            logger.warning(
+                "Redis indisponivel; usuario %d pode seguir em cache por ate %ds",
+                user_id, self.ttl_seconds,
+            )
+
+    def _delete_and_publish(self, user_id: int) -> None:
+        self.client.delete(REDIS_KEY_PREFIX + str(user_id))
+        self.client.publish(INVALIDATION_CHANNEL, str(user_id))
+
+
+def create_user_cache(settings: Any) -> UserCache | RedisUserCache | None:
+    """Cache configurado (``JARVIS_USER_CACHE_TTL_SECONDS``); None se desligado."""
+    if settings.user_cache_ttl_seconds <= 0:
+        return None
+    if settings.redis_url:
+        from .cache import get_redis
+
+        user_cache = RedisUserCache(get_redis(settings.redis_url), settings.user_cache_ttl_seconds)
+        user_cache.listen()
+        return user_cache
+    return UserCache(settings.user_cache_ttl_seconds)
+
+
+async def get_user_cached(state: Any, user_id: int) -> dict[str, Any] | None:
+    """Busca usuario pelo id passando pelo cache de ``app.state``, se houver."""
+    cache: UserCache | RedisUserCache | None = getattr(state, "user_cache", None)
+    if cache is not None:
+        user = await cache.get(user_id)
+        if user is not None:
+            return user
+
+    user = await state.db_module.get_user_by_id(state.auth_db, user_id)
+    if user is None:
+        return None
+    if cache is not None:
+        await cache.set(user_id, user)
+    return _public_user(user)
+
+
+async def invalidate_user(state: Any, user_id: int) -> None:
+    """Remove usuario do cache apos update/delete/troca de senha."""
+    cache: UserCache | RedisUserCache | None = getattr(state, "user_cache", None)
+    if cache is not None:
+        await cache.invalidate(user_id)
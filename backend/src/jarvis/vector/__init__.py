@@ -0,0 +1,14 @@
+"""Embeddings e indice vetorial locais (cache semantico, memoria)."""
+
+from .embeddings import Embedder, HashingEmbedder, OpenAIEmbedder, create_embedder
+from .index import VectorIndex
+from .store import SqliteVectorStore
+
+__all__ = [
+    "Embedder",
+    "HashingEmbedder",
+    "OpenAIEmbedder",
+    "SqliteVectorStore",
+    "VectorIndex",
+    "create_embedder",
+]
@@ -0,0 +1,97 @@
+"""Embedders de texto para busca por similaridade.
+
+``HashingEmbedder`` roda local, sem dependencias: palavras e trigramas de
+caracteres (sem acento, sem caixa) vao para ``dim`` posicoes via hash, e o
+vetor e normalizado (cosseno = produto escalar). Pega parafrases com
+vocabulario parecido ("qual a rodada atual" / "qual e a rodada de agora").
+
+``OpenAIEmbedder`` usa a API de embeddings (extra ``vector``) para
+parafrases com vocabulario diferente, ao custo de uma chamada de rede.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+import unicodedata
+from typing import Any, Protocol
+
+DEFAULT_DIM = 512
+DEFAULT_OPENAI_MODEL = "text-embedding-3-small"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class Embedder(Protocol):
+    dim: int
+
+    async def embed(self, text: str) -> list[float]: ...
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(v * v for v in vector))
+    if norm == 0:
+        return vector
+    return [v / norm for v in vector]
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class HashingEmbedder:
+    """Embedding local por hashing de palavras e trigramas."""
+
+    def __init__(self, dim: int = DEFAULT_DIM) -> None:
+        self.dim = dim
+
+    def _features(self, text: str) -> list[tuple[str, float]]:
+        features: list[tuple[str, float]] = []
+        for word in _WORD_RE.findall(_fold(text)):
+            features.append((f"w:{word}", 1.0))
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                features.append((f"c:{padded[i:i + 3]}", 0.5))
+        return features
+
+    def embed_sync(self, text: str) -> list[float]:
+        vector = [0.0] * self.dim
+        for feature, weight in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest, "little")
+            sign = 1.0 if bucket & 1 else -1.0
+            vector[(bucket >> 1) % self.dim] += sign * weight
+        return _normalize(vector)
+
+    async def embed(self, text: str) -> list[float]:
+        return self.embed_sync(text)
+
+
+class OpenAIEmbedder:
+    """Embeddings da API da OpenAI (``pip install jarvis[vector]``)."""
+
+    def __init__(self, model: str = DEFAULT_OPENAI_MODEL, dim: int = DEFAULT_DIM) -> None:
+        try:
+            from openai import AsyncOpenAI
+        except ImportError as exc:  # pragma: no cover - depende do ambiente
+            raise RuntimeError(
+                "Embeddings da OpenAI exigem o extra 'vector' (pip install jarvis[vector])."
+            ) from exc
+        self.model = model
+        self.dim = dim
+        self._client = AsyncOpenAI()
+
+    async def embed(self, text: str) -> list[float]:
+        response = await self._client.embeddings.create(
+            model=self.model, input=text, dimensions=self.dim,
+        )
+        return _normalize(list(response.data[0].embedding))
+
+
+def create_embedder(settings: Any) -> Embedder:
+    """Embedder configurado em ``JARVIS_EMBEDDINGS`` (hashing ou openai)."""
+    if settings.embeddings == "openai":
+        return OpenAIEmbedder(settings.embedding_model, settings.embedding_dim)
+    return HashingEmbedder(settings.embedding_dim)
@@ -0,0 +1,100 @@
+"""Indice vetorial em memoria com expiracao por entrada.
+
+Guarda ate ``max_entries`` vetores normalizados num buffer circular (o mais
+antigo e sobrescrito) e busca por produto escalar. O buffer cresce sob
+demanda (dobrando) ate ``max_entries``, entao indices pequenos ocupam pouco. Usa NumPy se instalado
+(extra ``vector``): uma multiplicacao matriz-vetor por busca. Sem NumPy, o
+produto e feito em Python puro, suficiente para alguns milhares de
+entradas.
+"""
+
+from __future__ import annotations
+
+import time
+from operator import mul
+from typing import Any
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depende do ambiente
+    np = None
+
+DEFAULT_MAX_ENTRIES = 1024
+# Linhas alocadas na criacao; dobra a cada vez que enche
+INITIAL_CAPACITY = 64
+
+
+class VectorIndex:
+    """Vetores com payload e validade (``time.monotonic``)."""
+
+    def __init__(self, dim: int, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.dim = dim
+        self.max_entries = max_entries
+        self._payloads: list[Any] = []
+        self._expires: list[float] = []
+        self._next = 0
+        self._np = np
+        if self._np is not None:
+            capacity = min(max_entries, INITIAL_CAPACITY)
+            self._matrix = self._np.zeros((capacity, dim), dtype=self._np.float32)
+            self._expires_arr = self._np.zeros(capacity, dtype=self._np.float64)
+        else:
+            self._rows: list[list[float]] = []
+
+    def __len__(self) -> int:
+        return min(self._next, self.max_entries)
+
+    def add(self, vector: list[float], payload: Any, ttl_seconds: float) -> None:
+        """Insere (sobrescrevendo a entrada mais antiga se cheio)."""
+        slot = self._next % self.max_entries
+        self._next += 1
+        expires = time.monotonic() + ttl_seconds
+        if slot == len(self._payloads):
+            self._payloads.append(payload)
+            self._expires.append(expires)
+            if self._np is None:
+                self._rows.append(list(vector))
+        else:
+            self._payloads[slot] = payload
+            self._expires[slot] = expires
+            if self._np is None:
+                self._rows[slot] = list(vector)
+        if self._np is not None:
+            if slot >= len(self._matrix):
+                self._grow()
+            self._matrix[slot] = vector
+            self._expires_arr[slot] = expires
+
+    def _grow(self) -> None:
+        capacity = min(len(self._matrix) * 2, self.max_entries)
+        matrix = self._np.zeros((capacity, self.dim), dtype=self._np.float32)
+        matrix[:len(self._matrix)] = self._matrix
+        expires = self._np.zeros(capacity, dtype=self._np.float64)
+        expires[:len(self._expires_arr)] = self._expires_arr
+        self._matrix, self._expires_arr = matrix, expires
+
+    def search(
+        self, vector: list[float], k: int = 1, min_score: float = -1.0,
+    ) -> list[tuple[float, Any]]:
+        """Ate ``k`` entradas validas com score >= ``min_score``, melhor primeiro."""
+        size = len(self)
+        if size == 0:
+            return []
+        now = time.monotonic()
+        if self._np is not None:
+            scores = self._matrix[:size] @ self._np.asarray(vector, dtype=self._np.float32)
+            scores[self._expires_arr[:size] <= now] = -2.0
+            order = self._np.argsort(-scores)[:k]
+            candidates = [(float(scores[i]), int(i)) for i in order]
+        else:
+            candidates = sorted(
+                (
+                    (sum(map(mul, self._rows[i], vector)), i)
+                    for i in range(size) if self._expires[i] > now
+                ),
+                reverse=True,
+            )[:k]
+        return [
+            (score, self._payloads[i]) for score, i in candidates
+            if score >= min_score and self._expires[i] > now
+        ]
@@ -0,0 +1,87 @@
+"""Vetores persistidos em SQLite, agrupados por namespace.
+
+Cada linha guarda o vetor (``float32`` em BLOB) e um payload JSON. Nao ha
+busca no banco: quem consulta carrega as linhas de um namespace (indice
+``(namespace, id)``) num ``VectorIndex`` e depois so as novas (``id``
+maior que o ultimo carregado), o que tambem traz o que outros workers
+gravaram no mesmo arquivo.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from array import array
+from typing import Any
+
+import aiosqlite
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS vectors (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    payload TEXT NOT NULL,
+    created_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_vectors_namespace ON vectors (namespace, id);
+"""
+
+
+def _pack(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> list[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class SqliteVectorStore:
+    """Persistencia de vetores (use ``open`` para criar)."""
+
+    def __init__(self, conn: aiosqlite.Connection) -> None:
+        self.conn = conn
+
+    @classmethod
+    async def open(cls, path: str) -> "SqliteVectorStore":
+        conn = await aiosqlite.connect(path)
+        if path != ":memory:":
+            await conn.execute("PRAGMA journal_mode = WAL")
+        await conn.execute("PRAGMA busy_timeout = 5000")
+        await conn.executescript(SCHEMA_SQL)
+        await conn.commit()
+        return cls(conn)
+
+    async def add(self, namespace: str, vector: list[float], payload: dict[str, Any]) -> int:
+        cursor = await self.conn.execute(
+            "INSERT INTO vectors (namespace, embedding, payload, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                namespace,
+                _pack(vector),
+                json.dumps(payload, ensure_ascii=False),
+                int(time.time() * 1000),
+            ),
+        )
+        await self.conn.commit()
+        return cursor.lastrowid
+
+    async def load(
+        self, namespace: str, after_id: int = 0, limit: int = 1000,
+    ) -> list[tuple[int, list[float], dict[str, Any]]]:
+        """Ate ``limit`` linhas mais recentes com ``id > after_id``, em ordem."""
+        cursor = await self.conn.execute(
+            "SELECT id, embedding, payload FROM vectors "
+            "WHERE namespace = ? AND id > ? ORDER BY id DESC LIMIT ?",
+            (namespace, after_id, limit),
+        )
+        rows = await cursor.fetchall()
+        return [
+            (row[0], _unpack(row[1]), json.loads(row[2]))
+            for row in reversed(rows)
+        ]
+
+    async def close(self) -> None:
+        await self.conn.close()
@@ -1,7 +1,8 @@
 """Webhook endpoint para eventos do GitHub.
 
-Recebe eventos de issues (opened/edited) e dispara o agente GitHub
-em background para classificar, analisar e responder.
+Recebe eventos de issues (opened/edited) e enfileira execucoes do agente
+GitHub na tabela agent_runs; o worker (``jarvis.worker``) as consome para
+classificar, analisar e responder.
 """
 
 from __future__ import annotations
@@ -13,11 +14,16 @@ import logging
 from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, status
 
 from .config import Settings
-from .graph import build_github_graph
+from .graph_cache import get_github_graph
+from .metrics import WEBHOOK_EVENTS
 from .prompts import GITHUB_AGENT_PROMPT
+from .tracing import start_trace, trace
+from .turn_metrics import CONFIG_KEY as TURN_METRICS_KEY, TurnMetrics
 
 logger = logging.getLogger(__name__)
 
+GITHUB_MAX_TOOL_STEPS = 15
+
 router = APIRouter(prefix="/webhook", tags=["webhook"])
 
 
@@ -47,107 +53,145 @@ def verify_signature(payload: bytes, signature: str, secret: str) -> bool:
     return hmac.compare_digest(f"sha256={expected}", signature)
 
 
+def agent_run_thread_id(run_id: int) -> str:
+    """Thread do checkpointer usado por um agent run."""
+    return f"agent-run:{run_id}"
+
+
+async def run_issue_agent(
+    issue_number: int,
+    title: str,
+    body: str,
+    repo_full_name: str,
+    settings: Settings,
+    labels: list[str] | None = None,
+    graph=None,
+    run_id: int | None = None,
+) -> dict:
+    """Executa o grafo GitHub para uma issue.
+
+    Sem ``graph``, usa o grafo do cache (construido uma vez por modelo),
+    entao o custo por evento e apenas a execucao.
+
+    Com ``run_id`` e um grafo compilado com checkpointer, a execucao usa o
+    thread ``agent-run:<run_id>``: se uma tentativa anterior parou no meio,
+    o grafo continua do ultimo passo concluido em vez de recomecar.
+
+    Returns:
+        Dict com a categoria atribuida, o numero de tool steps executados e
+        os contadores de uso desta tentativa (``TurnMetrics.usage_fields``).
+        Excecoes do grafo sao propagadas para quem chamou decidir o retry.
+    """
+    if graph is None:
+        graph = get_github_graph(
+            settings.model_name, GITHUB_AGENT_PROMPT, GITHUB_MAX_TOOL_STEPS,
+        )
+
+    metrics = TurnMetrics()
+    config: dict = {
+        "recursion_limit": 2 * GITHUB_MAX_TOOL_STEPS + 4,
+        "configurable": {TURN_METRICS_KEY: metrics},
+    }
+    graph_input: dict | None = {
+        "messages": [],
+        "tool_steps": 0,
+        "max_tool_steps": GITHUB_MAX_TOOL_STEPS,
+        "issue_title": title,
+        "issue_body": body,
+        "issue_number": issue_number,
+        "repo": repo_full_name,
+        "issue_labels": labels or [],
+        "issue_category": None,
+    }
+
+    result = None
+    with trace(
+        "agent_run", start_trace(),
+        run_id=run_id, repo=repo_full_name, issue_number=issue_number,
+    ):
+        if run_id is not None and getattr(graph, "checkpointer", None) is not None:
+            config["configurable"]["thread_id"] = agent_run_thread_id(run_id)
+            snapshot = await graph.aget_state(config)
+            if snapshot.next:
+                logger.info(
+                    "Retomando agent run #%d a partir de %s", run_id, ", ".join(snapshot.next),
+                )
+                graph_input = None
+            elif snapshot.values.get("issue_category"):
+                # Grafo ja terminou; so o registro do resultado falhou
+                result = snapshot.values
+
+        if result is None:
+            result = await graph.ainvoke(graph_input, config=config)
+
+    category = result.get("issue_category", "QUESTION")
+    tool_steps = result.get("tool_steps", 0)
+    logger.info(
+        "Issue #%d classificada como %s — %d tool steps executados",
+        issue_number, category, tool_steps,
+    )
+    return {"category": category, "tool_steps": tool_steps, **metrics.usage_fields()}
+
+
+async def process_agent_run(run: dict, settings: Settings, graph=None) -> dict:
+    """Handler do worker: processa um agent run reivindicado da fila."""
+    payload = run.get("payload") or {}
+    logger.info(
+        "Processando issue #%d (%s) em %s — acao: %s (tentativa %d)",
+        run["issue_number"], run["issue_title"], run["repo"],
+        run["action"], run.get("attempts", 1),
+    )
+    return await run_issue_agent(
+        issue_number=run["issue_number"],
+        title=run["issue_title"],
+        body=payload.get("body") or "",
+        repo_full_name=run["repo"],
+        settings=settings,
+        labels=payload.get("labels"),
+        graph=graph,
+        run_id=run["id"],
+    )
+
+
 async def _handle_issue_event(
     action: str,
     issue: dict,
     repo_full_name: str,
     settings: Settings,
-    db_module: object | None = None,
-    auth_db: object | None = None,
 ) -> None:
-    """Processa evento de issue em background.
+    """Processa evento de issue em background, sem fila.
 
-    Constroi o grafo GitHub, executa classificacao e resposta autonoma.
-    Registra execucao na tabela agent_runs quando db_module e auth_db disponiveis.
+    Caminho usado apenas quando nao ha banco de auth disponivel para
+    enfileirar o run (ex.: testes ou deploy minimo).
     """
-    from datetime import datetime, timezone
-
     issue_number = issue.get("number", 0)
     title = issue.get("title", "")
     body = issue.get("body") or ""
+    labels = [lbl.get("name", "") for lbl in issue.get("labels", [])]
 
     logger.info(
         "Processando issue #%d (%s) em %s — acao: %s",
         issue_number, title, repo_full_name, action,
     )
 
-    # Registrar inicio da execucao
-    run_id = None
-    if db_module and auth_db:
-        try:
-            run = await db_module.create_agent_run(
-                auth_db, repo_full_name, issue_number, title, action,
-            )
-            run_id = run["id"]
-        except Exception:
-            logger.exception("Erro ao registrar agent run")
-
     try:
-        graph = build_github_graph(
-            model_name=settings.model_name,
-            system_prompt=GITHUB_AGENT_PROMPT,
-            max_tool_steps=15,
-        )
-
-        initial_state = {
-            "messages": [],
-            "tool_steps": 0,
-            "max_tool_steps": 15,
-            "issue_title": title,
-            "issue_body": body,
-            "issue_number": issue_number,
-            "repo": repo_full_name,
-            "issue_category": None,
-        }
-
-        result = await graph.ainvoke(initial_state)
-
-        category = result.get("issue_category", "QUESTION")
-        tool_steps = result.get("tool_steps", 0)
-        logger.info(
-            "Issue #%d classificada como %s — %d tool steps executados",
-            issue_number, category, tool_steps,
+        await run_issue_agent(
+            issue_number, title, body, repo_full_name, settings, labels=labels,
         )
-
-        # Registrar conclusao
-        if run_id and db_module and auth_db:
-            try:
-                await db_module.update_agent_run(
-                    auth_db, run_id,
-                    category=category,
-                    status="completed",
-                    tool_steps=tool_steps,
-                    finished_at=datetime.now(timezone.utc).isoformat(),
-                )
-            except Exception:
-                logger.exception("Erro ao atualizar agent run #%d", run_id)
-
     except Exception:
         logger.exception("Erro ao processar issue #%d em %s", issue_number, repo_full_name)
 
-        # Registrar falha
-        if run_id and db_module and auth_db:
-            try:
-                import traceback
-                await db_module.update_agent_run(
-                    auth_db, run_id,
-                    status="failed",
-                    error_message=traceback.format_exc()[-500:],
-                    finished_at=datetime.now(timezone.utc).isoformat(),
-                )
-            except Exception:
-                logger.exception("Erro ao atualizar agent run #%d", run_id)
-
 
 @router.post("/github")
 async def github_webhook(
     request: Request,
     background_tasks: BackgroundTasks,
 ):
-    """Recebe webhooks do GitHub e dispara processamento em background.
+    """Recebe webhooks do GitHub e enfileira processamento.
 
     Valida assinatura HMAC-SHA256, filtra eventos de issues (opened/edited)
-    e agenda execucao do agente GitHub.
+    e enfileira execucao do agente GitHub na tabela agent_runs, consumida
+    pelo worker (embutido ou ``jarvis-worker``).
     """
     settings: Settings = request.app.state.settings
 
@@ -157,6 +201,8 @@ async def github_webhook(
 
     if settings.github_webhook_secret:
         if not verify_signature(body, signature, settings.github_webhook_secret):
+            # Cabecalho nao confiavel: nao vira rotulo
+            WEBHOOK_EVENTS.inc(event="unverified", result="invalid_signature")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Assinatura invalida.",
@@ -168,14 +214,17 @@ async def github_webhook(
 
     # Ping event (GitHub envia ao configurar webhook)
     if event_type == "ping":
+        WEBHOOK_EVENTS.inc(event=event_type, result="pong")
         return {"status": "pong"}
 
     # Filtrar apenas eventos de issues
     if event_type != "issues":
+        WEBHOOK_EVENTS.inc(event="other", result="ignored")
         return {"status": "ignored", "reason": f"evento '{event_type}' nao processado"}
 
     action = payload.get("action", "")
     if action not in ("opened", "edited", "labeled"):
+        WEBHOOK_EVENTS.inc(event=event_type, result="ignored")
         return {"status": "ignored", "reason": f"acao '{action}' nao processada"}
 
     issue = payload.get("issue", {})
@@ -183,6 +232,7 @@ async def github_webhook(
     repo_full_name = repo.get("full_name", "")
 
     if not issue or not repo_full_name:
+        WEBHOOK_EVENTS.inc(event=event_type, result="invalid_payload")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Payload incompleto: issue ou repository ausente.",
@@ -191,25 +241,58 @@ async def github_webhook(
     # Filtrar por label jarvis-agent
     labels = [lbl.get("name", "") for lbl in issue.get("labels", [])]
     if "jarvis-agent" not in labels:
+        WEBHOOK_EVENTS.inc(event=event_type, result="ignored")
         return {"status": "ignored", "reason": "issue sem label 'jarvis-agent'"}
 
-    # Obter modulo de DB e conexao para registrar agent run
+    # Obter modulo de DB e conexao para enfileirar o agent run
     db_module = getattr(request.app.state, "db_module", None)
     auth_db = getattr(request.app.state, "auth_db", None)
 
-    # Disparar processamento em background
-    background_tasks.add_task(
-        _handle_issue_event,
-        action=action,
-        issue=issue,
-        repo_full_name=repo_full_name,
-        settings=settings,
-        db_module=db_module,
-        auth_db=auth_db,
+    if db_module is None or auth_db is None:
+        # Sem banco: processa em background no proprio processo
+        background_tasks.add_task(
+            _handle_issue_event,
+            action=action,
+            issue=issue,
+            repo_full_name=repo_full_name,
+            settings=settings,
+        )
+        WEBHOOK_EVENTS.inc(event=event_type, result="accepted")
+        return {
+            "status": "accepted",
+            "issue_number": issue.get("number"),
+            "action": action,
+        }
+
+    # Rajadas de edicoes/labels na mesma issue viram um unico run.
+    # Reentregas do GitHub reusam o mesmo X-GitHub-Delivery, registrado na
+    # mesma transacao do enqueue
+    run = await db_module.enqueue_agent_run(
+        auth_db,
+        repo_full_name,
+        issue.get("number", 0),
+        issue.get("title", ""),
+        action,
+        payload={"body": issue.get("body") or "", "labels": labels},
+        debounce_seconds=settings.webhook_debounce_seconds,
+        delivery_id=request.headers.get("X-GitHub-Delivery") or None,
     )
+    if run is None:
+        WEBHOOK_EVENTS.inc(event=event_type, result="duplicate")
+        return {"status": "ignored", "reason": "entrega duplicada"}
+
+    # Acorda o worker embutido, se houver, sem esperar o proximo poll
+    worker = getattr(request.app.state, "agent_worker", None)
+    if worker is not None:
+        worker.notify()
 
+    WEBHOOK_EVENTS.inc(
+        event=event_type, result="coalesced" if run["coalesced_events"] > 0 else "accepted",
+    )
     return {
         "status": "accepted",
         "issue_number": issue.get("number"),
         "action": action,
+        "run_id": run["id"],
+        "coalesced": run["coalesced_events"] > 0,
     }
@@ -0,0 +1,344 @@
+"""Worker da fila duravel de execucoes do agente GitHub.
+
+A fila e a propria tabela agent_runs: o webhook insere runs com status
+'queued' e o worker os reivindica (``claim_agent_run``), executa com
+concorrencia limitada, reagenda falhas com backoff exponencial e devolve
+para a fila runs 'processing' abandonados por um worker que morreu.
+Runs cancelados por um evento mais novo da mesma issue (ver
+``enqueue_agent_run``) tem a task em execucao interrompida.
+
+Roda isolado via ``jarvis-worker`` (padrao), tirando o agente do event
+loop do chat, ou embutido no processo da API com
+``JARVIS_WORKER_EMBEDDED=true`` (usado por ``run.py``/``dev.sh``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+import traceback
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from .metrics import AGENT_RUNS_FINISHED
+from .write_buffer import AgentRunUpdateBuffer
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = 1.0
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 1800
+DELIVERY_RETENTION_DAYS = 7
+
+RunHandler = Callable[[dict], Awaitable[dict]]
+
+# Contadores de uso que o handler pode devolver (ver ``turn_metrics``)
+USAGE_FIELDS = (
+    "model_calls", "input_tokens", "cached_input_tokens", "output_tokens",
+    "assistant_ms", "tools_ms",
+)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def backoff_delay(attempts: int) -> int:
+    """Segundos ate a proxima tentativa (30s, 60s, 120s, ... ate 30min)."""
+    delay = BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0)
+    return min(delay, BACKOFF_MAX_SECONDS)
+
+
+class AgentRunWorker:
+    """Consome agent runs enfileirados com concorrencia limitada.
+
+    Args:
+        db_module: Modulo de DB ativo (db ou db_postgres).
+        conn: Conexao/pool do banco de auth.
+        handler: Coroutine que processa um run e retorna
+            ``{"category": ..., "tool_steps": ...}`` e, opcionalmente,
+            os contadores de ``USAGE_FIELDS``.
+        concurrency: Maximo de runs executando ao mesmo tempo.
+        max_attempts: Tentativas antes de marcar o run como 'failed'.
+        stale_seconds: Tempo em 'processing' apos o qual o run e
+            considerado abandonado e volta para a fila.
+        update_buffer: ``AgentRunUpdateBuffer`` opcional; com ele, os
+            updates de conclusao/falha sao gravados em lote.
+    """
+
+    def __init__(
+        self,
+        db_module: Any,
+        conn: Any,
+        handler: RunHandler,
+        concurrency: int = 2,
+        max_attempts: int = 3,
+        stale_seconds: int = 900,
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+        update_buffer: Any = None,
+    ) -> None:
+        self.db_module = db_module
+        self.conn = conn
+        self.handler = handler
+        self.concurrency = max(concurrency, 1)
+        self.max_attempts = max(max_attempts, 1)
+        self.stale_seconds = stale_seconds
+        self.poll_interval = poll_interval
+        self.update_buffer = update_buffer
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def notify(self) -> None:
+        """Acorda o loop imediatamente (ex.: apos enfileirar um run)."""
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        """Sinaliza o loop para encerrar apos o ciclo atual."""
+        self._stopping.set()
+        self._wakeup.set()
+
+    async def recover_stale(self) -> int:
+        """Devolve para a fila runs 'processing' abandonados."""
+        locked_before = (_now() - timedelta(seconds=self.stale_seconds)).isoformat()
+        recovered = await self.db_module.recover_stale_agent_runs(
+            self.conn, locked_before,
+        )
+        if recovered:
+            logger.warning("%d agent run(s) abandonado(s) devolvido(s) a fila", recovered)
+
+        received_before = (_now() - timedelta(days=DELIVERY_RETENTION_DAYS)).isoformat()
+        await self.db_module.prune_webhook_deliveries(self.conn, received_before)
+        return recovered
+
+    async def cancel_superseded(self) -> int:
+        """Interrompe runs em execucao que foram cancelados no banco."""
+        cancelled = 0
+        for run_id, task in list(self._tasks.items()):
+            run = await self.db_module.get_agent_run(self.conn, run_id)
+            if run is not None and run["status"] == "cancelled" and not task.done():
+                logger.info("Agent run #%d substituido por evento mais novo", run_id)
+                task.cancel()
+                cancelled += 1
+        return cancelled
+
+    async def run_once(self) -> bool:
+        """Reivindica e dispara um run se houver slot livre.
+
+        Nao espera por slot: com todos ocupados, retorna False e o loop
+        segue verificando cancelamentos, runs abandonados e ``stop()``
+        (``_execute`` acorda o loop quando um slot libera).
+
+        Returns:
+            True se um run foi reivindicado, False se a fila esta vazia ou
+            nao ha slot livre.
+        """
+        if self._slots.locked():
+            return False
+        await self._slots.acquire()
+        try:
+            run = await self.db_module.claim_agent_run(self.conn)
+        except Exception:
+            self._slots.release()
+            raise
+        if run is None:
+            self._slots.release()
+            return False
+
+        task = asyncio.create_task(self._execute(run))
+        self._tasks[run["id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(run["id"], None))
+        return True
+
+    async def run(self) -> None:
+        """Loop principal: recupera runs abandonados e consome a fila."""
+        logger.info(
+            "Worker de agent runs iniciado (concorrencia=%d, tentativas=%d)",
+            self.concurrency, self.max_attempts,
+        )
+        await self.recover_stale()
+        last_recovery = _now()
+        if self.update_buffer is not None:
+            self.update_buffer.start()
+
+        while not self._stopping.is_set():
+            try:
+                await self.cancel_superseded()
+                while not self._stopping.is_set() and await self.run_once():
+                    pass
+                if (_now() - last_recovery).total_seconds() >= self.stale_seconds:
+                    await self.recover_stale()
+                    last_recovery = _now()
+            except Exception:
+                logger.exception("Erro ao consumir fila de agent runs")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+        await self.drain()
+
+    async def drain(self) -> None:
+        """Aguarda os runs em execucao terminarem e grava updates pendentes."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if self.update_buffer is not None:
+            await self.update_buffer.close()
+
+    async def _finish(self, run_id: int, **fields: Any) -> None:
+        """Grava o desfecho de um run ainda em 'processing'."""
+        status = fields.get("status")
+        AGENT_RUNS_FINISHED.inc(status="retry" if status == "queued" else status)
+        if self.update_buffer is not None:
+            self.update_buffer.submit(run_id, expected_status="processing", **fields)
+            return
+        await self.db_module.update_agent_run(
+            self.conn, run_id, expected_status="processing", **fields,
+        )
+
+    async def _execute(self, run: dict) -> None:
+        run_id = run["id"]
+        try:
+            if run.get("attempts", 1) > self.max_attempts:
+                await self._finish(
+                    run_id,
+                    status="failed",
+                    error_message="Numero maximo de tentativas excedido.",
+                    finished_at=_now().isoformat(),
+                    locked_at=None,
+                )
+                return
+
+            try:
+                result = await self.handler(run)
+            except Exception:
+                logger.exception("Erro ao processar agent run #%d", run_id)
+                await self._record_failure(run, traceback.format_exc()[-500:])
+                return
+
+            await self._finish(
+                run_id,
+                category=result.get("category"),
+                status="completed",
+                tool_steps=result.get("tool_steps", 0),
+                **{k: result[k] for k in USAGE_FIELDS if k in result},
+                finished_at=_now().isoformat(),
+                locked_at=None,
+            )
+        except Exception:
+            logger.exception("Erro ao atualizar agent run #%d", run_id)
+        finally:
+            self._slots.release()
+            self._wakeup.set()
+
+    async def _record_failure(self, run: dict, error_message: str) -> None:
+        attempts = run.get("attempts", 1)
+        if attempts >= self.max_attempts:
+            await self._finish(
+                run["id"],
+                status="failed",
+                error_message=error_message,
+                finished_at=_now().isoformat(),
+                locked_at=None,
+            )
+            return
+
+        next_attempt = _now() + timedelta(seconds=backoff_delay(attempts))
+        logger.info(
+            "Agent run #%d reagendado para %s (tentativa %d/%d)",
+            run["id"], next_attempt.isoformat(), attempts, self.max_attempts,
+        )
+        await self._finish(
+            run["id"],
+            status="queued",
+            error_message=error_message,
+            next_attempt_at=next_attempt.isoformat(),
+            locked_at=None,
+        )
+
+
+def create_worker(
+    settings: Any,
+    db_module: Any,
+    conn: Any,
+    checkpointer: Any = None,
+) -> AgentRunWorker:
+    """Cria worker configurado para processar issues do GitHub.
+
+    O grafo GitHub e construido aqui, na inicializacao, e reusado por
+    todos os runs. Com checkpointer, cada run grava seu progresso no
+    thread ``agent-run:<id>`` e retries retomam do ultimo passo concluido.
+    """
+    from .graph import build_github_graph
+    from .graph_cache import get_github_graph
+    from .prompts import GITHUB_AGENT_PROMPT
+    from .webhook import GITHUB_MAX_TOOL_STEPS, process_agent_run
+
+    if checkpointer is not None:
+        graph = build_github_graph(
+            model_name=settings.model_name,
+            system_prompt=GITHUB_AGENT_PROMPT,
+            max_tool_steps=GITHUB_MAX_TOOL_STEPS,
+            checkpointer=checkpointer,
+        )
+    else:
+        graph = get_github_graph(
+            settings.model_name, GITHUB_AGENT_PROMPT, GITHUB_MAX_TOOL_STEPS,
+        )
+
+    async def handler(run: dict) -> dict:
+        return await process_agent_run(run, settings, graph=graph)
+
+    update_buffer = None
+    if settings.agent_run_flush_ms > 0:
+        update_buffer = AgentRunUpdateBuffer(
+            db_module, conn, flush_interval=settings.agent_run_flush_ms / 1000,
+        )
+
+    return AgentRunWorker(
+        db_module,
+        conn,
+        handler,
+        concurrency=settings.worker_concurrency,
+        max_attempts=settings.worker_max_attempts,
+        stale_seconds=settings.worker_stale_seconds,
+        update_buffer=update_buffer,
+    )
+
+
+async def _async_main() -> None:
+    from .checkpoint import create_checkpointer
+    from .config import load_settings
+    from .db_factory import create_auth_db, get_db_module
+    from .tracing import configure_tracing, shutdown_tracing
+
+    settings = load_settings()
+    configure_tracing(settings.trace_file, settings.trace_sample_rate)
+    db_mod = get_db_module(settings)
+    auth_conn = await create_auth_db(settings)
+
+    try:
+        async with create_checkpointer(settings) as checkpointer:
+            worker = create_worker(settings, db_mod, auth_conn, checkpointer)
+
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, worker.stop)
+
+            await worker.run()
+    finally:
+        await auth_conn.close()
+        shutdown_tracing()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_async_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Write-behind para updates de status de agent runs e turnos do chat.
+
+Cada ``update_agent_run`` e uma transacao propria (um fsync no SQLite).
+Em bursts de webhook o worker conclui/reagenda muitos runs em sequencia;
+o buffer acumula esses updates e grava todos com ``update_agent_runs``
+numa unica transacao a cada ``flush_interval`` segundos (ou ao atingir
+``max_batch``). ``ChatTurnBuffer`` faz o mesmo com as linhas de
+``chat_turns`` (``insert_chat_turns``), fora do caminho da resposta.
+
+So vale para escritas cujo retorno ninguem le (ex.: conclusao de um run
+pelo worker). Escritas pendentes sao gravadas em ``flush``/``close``. Se o
+lote falha, os itens sao regravados um a um: um item ruim (ex.: violacao
+de constraint) nao segura os outros e e descartado (com log) apos
+``max_attempts`` falhas. Com o banco fora por muito tempo, a fila fica
+limitada a ``max_pending`` itens (os mais antigos saem primeiro).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH = 100
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_MAX_PENDING = 10_000
+
+
+class _WriteBehindBuffer(ABC):
+    """Acumula itens e grava em lote com ``_write``.
+
+    Args:
+        db_module: Modulo de DB ativo (db ou db_postgres).
+        conn: Conexao/pool do banco de auth.
+        flush_interval: Segundos entre gravacoes.
+        max_batch: Itens pendentes que disparam gravacao imediata.
+        max_attempts: Falhas de um item antes de descarta-lo.
+        max_pending: Itens na fila; acima disso os mais antigos sao descartados.
+    """
+
+    def __init__(
+        self,
+        db_module: Any,
+        conn: Any,
+        flush_interval: float,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ) -> None:
+        self.db_module = db_module
+        self.conn = conn
+        self.flush_interval = flush_interval
+        self.max_batch = max(max_batch, 1)
+        self.max_attempts = max(max_attempts, 1)
+        self.max_pending = max(max_pending, 1)
+        # Descartados por fila cheia desde o ultimo log
+        self._dropped = 0
+        # (item, falhas ate agora)
+        self._pending: list[tuple[Any, int]] = []
+        self._flush_lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _add(self, item: Any) -> None:
+        if len(self._pending) >= self.max_pending:
+            self._pending.pop(0)
+            self._dropped += 1
+        self._pending.append((item, 0))
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+
+    @abstractmethod
+    async def _write(self, batch: list[Any]) -> int:
+        """Grava ``batch`` numa transacao; retorna quantos itens aplicou."""
+
+    async def flush(self) -> int:
+        """Grava os itens pendentes numa transacao. Retorna quantos aplicou.
+
+        Se o lote falha, grava item a item; os que falharem voltam para a
+        fila (ou sao descartados apos ``max_attempts``). Se nenhum item foi
+        gravado, o erro e relancado (ex.: banco fora).
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            self._full.clear()
+            if len(batch) > 1:
+                try:
+                    return await self._write([item for item, _ in batch])
+                except Exception:
+                    logger.warning(
+                        "Lote de %d itens falhou (%s); gravando um a um",
+                        len(batch), type(self).__name__,
+                    )
+
+            written = 0
+            error: Exception | None = None
+            retry: list[tuple[Any, int]] = []
+            for item, failures in batch:
+                try:
+                    written += await self._write([item])
+                except Exception as exc:
+                    error = exc
+                    if failures + 1 >= self.max_attempts:
+                        logger.error(
+                            "Descartando item apos %d falhas (%s): %r (%s)",
+                            failures + 1, type(self).__name__, item, exc,
+                        )
+                    else:
+                        retry.append((item, failures + 1))
+            # Itens com falha voltam para a frente da fila, na ordem original
+            self._pending[:0] = retry
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self._dropped += overflow
+            if error is not None and written == 0:
+                raise error
+            return written
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Para o loop periodico e grava o que estiver pendente."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Erro ao gravar lote (%s)", type(self).__name__)
+            if self._dropped:
+                logger.error(
+                    "Fila cheia (%s): %d itens descartados", type(self).__name__, self._dropped,
+                )
+                self._dropped = 0
+
+
+class AgentRunUpdateBuffer(_WriteBehindBuffer):
+    """Acumula updates de agent runs e grava em lote."""
+
+    def submit(
+        self, run_id: int, expected_status: str | None = None, **fields: Any,
+    ) -> None:
+        """Enfileira um update (mesma semantica de ``update_agent_run``)."""
+        self._add((run_id, expected_status, fields))
+
+    async def _write(self, batch: list[Any]) -> int:
+        return await self.db_module.update_agent_runs(self.conn, batch)
+
+
+class ChatTurnBuffer(_WriteBehindBuffer):
+    """Acumula turnos do chat (``turn_metrics``) e grava em lote."""
+
+    def submit(self, turn: dict[str, Any]) -> None:
+        self._add(turn)
+
+    async def _write(self, batch: list[Any]) -> int:
+        return await self.db_module.insert_chat_turns(self.conn, batch)
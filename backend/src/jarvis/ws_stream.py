@@ -0,0 +1,281 @@
+"""Envio de eventos de ``stream_chat`` pelo WebSocket com coalescing.
+
+Enviar um frame JSON por token custa um encode e um frame WebSocket por
+token. Aqui tokens consecutivos sao agrupados num unico frame
+``{"type": "token"}`` ate ``flush_chars`` caracteres ou ``flush_ms`` desde
+o primeiro token pendente; demais eventos (tool_start, tool_end) saem na
+ordem, depois dos tokens anteriores a eles.
+
+O grafo produz numa task e o envio acontece em outra, ligadas por uma fila
+limitada a ``max_pending`` eventos. Se o cliente nao consome rapido o
+bastante e a fila enche, o stream do grafo e encerrado (liberando o run) e
+``stream_to_websocket`` retorna False para a conexao ser fechada.
+
+Varios streams podem dividir a mesma conexao (``StreamMultiplexer``): cada
+mensagem do cliente traz um ``request_id``, roda numa task propria e todos
+os frames enviados levam o mesmo ``request_id``. Um frame ``cancel`` aborta
+o run correspondente (modelo e tools) na hora.
+
+Usa ``orjson`` se instalado (extra ``speedups``), senao ``json``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Callable
+
+from fastapi import WebSocket
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+DEFAULT_FLUSH_MS = 16
+DEFAULT_FLUSH_CHARS = 64
+DEFAULT_MAX_PENDING = 1024
+DEFAULT_MAX_STREAMS = 4
+
+_DONE = object()
+
+
+def dumps(payload: Any) -> str:
+    """Serializa um frame (mesmo formato compacto de ``send_json``)."""
+    if orjson is not None:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+async def stream_to_websocket(
+    ws: WebSocket,
+    events: AsyncIterator[dict],
+    flush_ms: int = DEFAULT_FLUSH_MS,
+    flush_chars: int = DEFAULT_FLUSH_CHARS,
+    max_pending: int = DEFAULT_MAX_PENDING,
+    request_id: str | None = None,
+    final_fields: dict | None = None,
+) -> bool:
+    """Envia ``events`` e o frame final (``end`` ou ``error``).
+
+    Com ``request_id``, todo frame enviado leva o campo ``request_id``;
+    ``final_fields`` (ex.: ``trace_id``) vao so no frame final.
+
+    Returns:
+        False se o cliente ficou para tras (fila cheia) e o stream foi
+        interrompido; True caso contrario.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    overflow = False
+    final_fields = final_fields or {}
+
+    async def produce() -> None:
+        nonlocal overflow
+        try:
+            async for event in events:
+                if queue.qsize() >= max_pending:
+                    overflow = True
+                    break
+                queue.put_nowait(event)
+            else:
+                queue.put_nowait({"type": "end", **final_fields})
+        except Exception as exc:
+            queue.put_nowait({"type": "error", "content": str(exc), **final_fields})
+        finally:
+            aclose = getattr(events, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            queue.put_nowait(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        await _send_loop(
+            ws, queue, flush_ms / 1000, flush_chars, lambda: overflow, request_id,
+        )
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+    return not overflow
+
+
+async def _send_loop(
+    ws: WebSocket,
+    queue: asyncio.Queue,
+    flush_s: float,
+    flush_chars: int,
+    stopped: Callable[[], bool],
+    request_id: str | None = None,
+) -> None:
+    loop = asyncio.get_running_loop()
+
+    async def send(event: dict) -> None:
+        if request_id is not None:
+            event = {**event, "request_id": request_id}
+        await ws.send_text(dumps(event))
+
+    while not stopped():
+        event = await queue.get()
+        if event is _DONE:
+            return
+        if event.get("type") != "token":
+            await send(event)
+            continue
+
+        parts = [event["content"]]
+        size = len(parts[0])
+        deadline = loop.time() + flush_s
+        following = None
+        while size < flush_chars:
+            try:
+                following = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    following = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if following is not _DONE and following.get("type") == "token":
+                parts.append(following["content"])
+                size += len(following["content"])
+                following = None
+                continue
+            break
+
+        await send({"type": "token", "content": "".join(parts)})
+        if following is _DONE:
+            return
+        if following is not None:
+            await send(following)
+
+
+class _SerializedSocket:
+    """Envio exclusivo: frames de streams concorrentes nao se intercalam."""
+
+    def __init__(self, ws: WebSocket) -> None:
+        self._ws = ws
+        self._lock = asyncio.Lock()
+
+    async def send_text(self, text: str) -> None:
+        async with self._lock:
+            await self._ws.send_text(text)
+
+
+class StreamMultiplexer:
+    """Streams concorrentes de uma conexao WebSocket, um por ``request_id``.
+
+    Args:
+        ws: WebSocket ja aceito.
+        max_streams: Limite de streams simultaneos na conexao.
+        **stream_options: Repassados a ``stream_to_websocket`` (flush_ms,
+            flush_chars, max_pending).
+    """
+
+    def __init__(
+        self,
+        ws: WebSocket,
+        max_streams: int = DEFAULT_MAX_STREAMS,
+        **stream_options: Any,
+    ) -> None:
+        self.ws = ws
+        self.max_streams = max_streams
+        self._socket = _SerializedSocket(ws)
+        self._options = stream_options
+        self._tasks: dict[str | None, asyncio.Task] = {}
+        self._cancel_requested: set[str | None] = set()
+        self._closing = False
+
+    @property
+    def active(self) -> int:
+        return len(self._tasks)
+
+    def is_running(self, request_id: str | None) -> bool:
+        return request_id in self._tasks
+
+    async def send(self, payload: dict) -> None:
+        """Envia um frame avulso (erros de protocolo, ``cancelled``)."""
+        await self._socket.send_text(dumps(payload))
+
+    def start(
+        self,
+        request_id: str | None,
+        events: AsyncIterator[dict],
+        final_fields: dict | None = None,
+    ) -> bool:
+        """Inicia o envio de ``events`` numa task.
+
+        ``final_fields`` sao repassados a ``stream_to_websocket``.
+
+        Returns:
+            False se o limite de streams da conexao foi atingido (``events``
+            nao e consumido).
+        """
+        if self._closing or len(self._tasks) >= self.max_streams:
+            return False
+        self._tasks[request_id] = asyncio.create_task(
+            self._run(request_id, events, final_fields),
+        )
+        return True
+
+    def cancel(self, request_id: str | None) -> bool:
+        """Aborta o stream de ``request_id``; False se nao ha nenhum em andamento."""
+        task = self._tasks.get(request_id)
+        if task is None or task.done():
+            return False
+        self._cancel_requested.add(request_id)
+        task.cancel()
+        return True
+
+    async def wait(self, request_id: str | None) -> None:
+        """Espera o stream de ``request_id`` terminar, se houver."""
+        task = self._tasks.get(request_id)
+        if task is not None:
+            await asyncio.wait([task])
+
+    async def close(self) -> None:
+        """Cancela todos os streams (conexao encerrada)."""
+        self._closing = True
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def _run(
+        self,
+        request_id: str | None,
+        events: AsyncIterator[dict],
+        final_fields: dict | None = None,
+    ) -> None:
+        try:
+            kept_up = await stream_to_websocket(
+                self._socket, events, request_id=request_id,
+                final_fields=final_fields, **self._options,
+            )
+        except asyncio.CancelledError:
+            # Cancelar a task fecha o gerador do grafo (stream_to_websocket
+            # encerra o produtor), o que interrompe modelo e tools em curso
+            if request_id in self._cancel_requested and not self._closing:
+                try:
+                    await self.send({"type": "cancelled", "request_id": request_id})
+                except Exception:
+                    pass
+            return
+        except Exception:
+            # Conexao caiu durante o envio: o loop de recepcao trata
+            return
+        finally:
+            self._tasks.pop(request_id, None)
+            self._cancel_requested.discard(request_id)
+        if not kept_up and not self._closing:
+            self._closing = True
+            try:
+                await self.ws.close(code=1013, reason="Cliente nao acompanhou o stream.")
+            except Exception:
+                pass
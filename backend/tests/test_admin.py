@@ -184,6 +184,29 @@ class TestAdminUsersEndpoints:
 
         assert resp.status_code == 204
 
+    @pytest.mark.asyncio
+    async def test_deactivation_invalidates_user_cache(self, setup_admin):
+        from jarvis.user_cache import UserCache
+
+        app.state.user_cache = UserCache(ttl_seconds=300)
+        user_id = setup_admin["user"]["id"]
+        try:
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                before = await client.get("/auth/me", headers=_user_headers(setup_admin))
+                await client.put(
+                    f"/admin/users/{user_id}",
+                    json={"is_active": False},
+                    headers=_admin_headers(setup_admin),
+                )
+                after = await client.get("/auth/me", headers=_user_headers(setup_admin))
+        finally:
+            del app.state.user_cache
+
+        assert before.status_code == 200
+        assert after.status_code == 403
+
     @pytest.mark.asyncio
     async def test_delete_nonexistent_user(self, setup_admin):
         async with AsyncClient(
@@ -270,6 +293,29 @@ class TestAdminConfigEndpoints:
         assert body["system_prompt"] == "custom prompt"
         assert body["max_tool_steps"] == 3
 
+    @pytest.mark.asyncio
+    async def test_set_global_config_updates_cache(self, setup_admin):
+        from jarvis.config_cache import ConfigCache
+
+        cache = ConfigCache(db, setup_admin["conn"])
+        app.state.config_cache = cache
+        try:
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                await client.get("/admin/config", headers=_admin_headers(setup_admin))
+                await client.put(
+                    "/admin/config",
+                    json={"model_name": "gpt-4o"},
+                    headers=_admin_headers(setup_admin),
+                )
+                resp = await client.get("/admin/config", headers=_admin_headers(setup_admin))
+        finally:
+            del app.state.config_cache
+
+        assert resp.json()["model_name"] == "gpt-4o"
+        assert (await cache.get_global())["model_name"] == "gpt-4o"
+
     @pytest.mark.asyncio
     async def test_user_config_nonexistent_user(self, setup_admin):
         async with AsyncClient(
@@ -281,3 +327,181 @@ class TestAdminConfigEndpoints:
             )
 
         assert resp.status_code == 404
+
+
+class TestAdminAgentRunsEndpoints:
+    @pytest.mark.asyncio
+    async def test_list_filters_and_cursor(self, setup_admin):
+        from jarvis.db import create_agent_run
+
+        for i in range(3):
+            await create_agent_run(setup_admin["conn"], "repo/a", i, f"Issue {i}", "opened")
+        await create_agent_run(setup_admin["conn"], "repo/b", 9, "Outra", "opened")
+
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            first = await client.get(
+                "/admin/agent-runs",
+                params={"repo": "repo/a", "status": "processing", "limit": 2},
+                headers=_admin_headers(setup_admin),
+            )
+            cursor = first.json()["next_before_id"]
+            second = await client.get(
+                "/admin/agent-runs",
+                params={"repo": "repo/a", "limit": 2, "before_id": cursor},
+                headers=_admin_headers(setup_admin),
+            )
+
+        assert first.status_code == 200
+        assert first.json()["total"] == 3
+        assert [r["issue_number"] for r in first.json()["runs"]] == [2, 1]
+        assert [r["issue_number"] for r in second.json()["runs"]] == [0]
+        assert second.json()["next_before_id"] is None
+
+    @pytest.mark.asyncio
+    async def test_stats(self, setup_admin):
+        from jarvis.db import create_agent_run
+
+        await create_agent_run(setup_admin["conn"], "repo/a", 1, "T", "opened")
+
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            resp = await client.get(
+                "/admin/agent-runs/stats",
+                headers=_admin_headers(setup_admin),
+            )
+
+        assert resp.status_code == 200
+        assert resp.json()["stats"] == [{
+            "category": None,
+            "status": "processing",
+            "count": 1,
+            "avg_duration_seconds": None,
+            "p50_duration_seconds": None,
+            "p95_duration_seconds": None,
+            "model_calls": 0,
+            "input_tokens": 0,
+            "cached_input_tokens": 0,
+            "output_tokens": 0,
+        }]
+
+
+    @pytest.mark.asyncio
+    async def test_malformed_date_is_rejected(self, setup_admin):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            runs = await client.get(
+                "/admin/agent-runs", params={"started_after": "garbage"},
+                headers=_admin_headers(setup_admin),
+            )
+            stats = await client.get(
+                "/admin/agent-runs/stats", params={"started_before": "2026-13-40"},
+                headers=_admin_headers(setup_admin),
+            )
+            valid = await client.get(
+                "/admin/agent-runs", params={"started_after": "2026-01-01T00:00:00Z"},
+                headers=_admin_headers(setup_admin),
+            )
+
+        assert runs.status_code == 422
+        assert stats.status_code == 422
+        assert valid.status_code == 200
+
+
+class TestAdminChatTurns:
+    @pytest.mark.asyncio
+    async def test_list_and_stats(self, setup_admin):
+        from jarvis.db import insert_chat_turns
+        from jarvis.turn_metrics import TurnMetrics
+
+        user_id = setup_admin["user"]["id"]
+        await insert_chat_turns(setup_admin["conn"], [
+            {
+                "thread_id": f"{user_id}:a", "user_id": user_id, "channel": "sse",
+                "status": "completed", **TurnMetrics().as_fields(),
+                "duration_ms": ms, "output_tokens": 7,
+            }
+            for ms in (120, 480)
+        ])
+
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            turns = await client.get(
+                "/admin/chat-turns",
+                params={"user_id": user_id, "slowest": True},
+                headers=_admin_headers(setup_admin),
+            )
+            stats = await client.get(
+                "/admin/chat-turns/stats", headers=_admin_headers(setup_admin),
+            )
+            forbidden = await client.get(
+                "/admin/chat-turns", headers=_user_headers(setup_admin),
+            )
+
+        assert turns.status_code == 200
+        assert turns.json()["total"] == 2
+        assert [t["duration_ms"] for t in turns.json()["turns"]] == [480, 120]
+        [row] = stats.json()["stats"]
+        assert row["channel"] == "sse"
+        assert row["count"] == 2
+        assert row["p95_duration_ms"] == 480
+        assert row["output_tokens"] == 14
+        assert forbidden.status_code == 403
+
+
+    @pytest.mark.asyncio
+    async def test_malformed_date_is_rejected(self, setup_admin):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            turns = await client.get(
+                "/admin/chat-turns", params={"started_after": "garbage"},
+                headers=_admin_headers(setup_admin),
+            )
+            stats = await client.get(
+                "/admin/chat-turns/stats", params={"started_before": "ontem"},
+                headers=_admin_headers(setup_admin),
+            )
+
+        assert turns.status_code == 422
+        assert stats.status_code == 422
+
+
+class TestAdminModelRoutes:
+    @pytest.mark.asyncio
+    async def test_route_stats(self, setup_admin):
+        from jarvis.model_router import route_stats
+
+        route_stats.clear()
+        route_stats.record("fast", "gpt-nano", 0.5, {"input_tokens": 10, "output_tokens": 2})
+        try:
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                resp = await client.get(
+                    "/admin/model-routes", headers=_admin_headers(setup_admin),
+                )
+                forbidden = await client.get(
+                    "/admin/model-routes", headers=_user_headers(setup_admin),
+                )
+        finally:
+            route_stats.clear()
+
+        assert resp.status_code == 200
+        assert resp.json()["routes"] == [{
+            "route": "fast",
+            "model_name": "gpt-nano",
+            "calls": 1,
+            "errors": 0,
+            "input_tokens": 10,
+            "cached_input_tokens": 0,
+            "output_tokens": 2,
+            "avg_latency_seconds": 0.5,
+            "p50_latency_seconds": 0.5,
+            "p95_latency_seconds": 0.5,
+        }]
+        assert forbidden.status_code == 403
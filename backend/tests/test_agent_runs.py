@@ -4,11 +4,17 @@ import pytest
 import pytest_asyncio
 
 from jarvis.db import (
+    agent_run_stats,
+    claim_agent_run,
     create_agent_run,
+    enqueue_agent_run,
     get_agent_run,
     init_db,
     list_agent_runs,
+    prune_webhook_deliveries,
+    recover_stale_agent_runs,
     update_agent_run,
+    update_agent_runs,
 )
 
 
@@ -117,10 +123,47 @@ class TestAgentRunsCrud:
         assert total == 5
         assert len(runs) == 2
 
+        # Total so na primeira pagina
         runs, total = await list_agent_runs(db, limit=2, offset=4)
-        assert total == 5
+        assert total is None
         assert len(runs) == 1
 
+    @pytest.mark.asyncio
+    async def test_list_agent_runs_filter_by_repo_and_issue(self, db):
+        await create_agent_run(db, "repo/a", 1, "A1", "opened")
+        await create_agent_run(db, "repo/a", 2, "A2", "opened")
+        await create_agent_run(db, "repo/b", 1, "B1", "opened")
+
+        runs, total = await list_agent_runs(db, repo="repo/a")
+        assert total == 2
+        runs, total = await list_agent_runs(db, repo="repo/a", issue_number=1)
+        assert total == 1
+        assert runs[0]["issue_title"] == "A1"
+
+    @pytest.mark.asyncio
+    async def test_list_agent_runs_filter_by_started_at(self, db):
+        run = await create_agent_run(db, "repo/a", 1, "A", "opened")
+
+        runs, _ = await list_agent_runs(db, started_after=run["started_at"])
+        assert len(runs) == 1
+        runs, _ = await list_agent_runs(db, started_before=run["started_at"])
+        assert runs == []
+
+    @pytest.mark.asyncio
+    async def test_list_agent_runs_keyset_pagination(self, db):
+        for i in range(5):
+            await create_agent_run(db, "repo/test", i, f"Issue {i}", "opened")
+
+        first, total = await list_agent_runs(db, limit=2)
+        second, _ = await list_agent_runs(db, limit=2, before_id=first[-1]["id"])
+        third, third_total = await list_agent_runs(
+            db, limit=2, offset=99, before_id=second[-1]["id"],
+        )
+
+        assert total == 5
+        assert third_total is None
+        assert [r["issue_number"] for r in first + second + third] == [4, 3, 2, 1, 0]
+
     @pytest.mark.asyncio
     async def test_update_ignores_disallowed_fields(self, db):
         run = await create_agent_run(db, "repo/test", 1, "Title", "opened")
@@ -129,3 +172,250 @@ class TestAgentRunsCrud:
         )
         assert updated["repo"] == "repo/test"
         assert updated["issue_number"] == 1
+
+
+class TestAgentRunQueue:
+    @pytest.mark.asyncio
+    async def test_enqueue_creates_queued_run(self, db):
+        run = await enqueue_agent_run(
+            db, "viaiv/jarvis", 42, "Bug", "opened", payload={"body": "corpo"},
+        )
+        assert run["status"] == "queued"
+        assert run["attempts"] == 0
+
+        fetched = await get_agent_run(db, run["id"])
+        assert fetched["status"] == "queued"
+        assert fetched["payload"] == {"body": "corpo"}
+        assert fetched["next_attempt_at"] is not None
+
+    @pytest.mark.asyncio
+    async def test_claim_marks_processing_and_counts_attempt(self, db):
+        run = await enqueue_agent_run(db, "repo/test", 1, "Title", "opened")
+
+        claimed = await claim_agent_run(db)
+        assert claimed["id"] == run["id"]
+        assert claimed["status"] == "processing"
+        assert claimed["attempts"] == 1
+        assert claimed["locked_at"] is not None
+
+    @pytest.mark.asyncio
+    async def test_claim_empty_queue_returns_none(self, db):
+        await create_agent_run(db, "repo/test", 1, "Title", "opened")
+        assert await claim_agent_run(db) is None
+
+    @pytest.mark.asyncio
+    async def test_claim_is_fifo_and_exclusive(self, db):
+        first = await enqueue_agent_run(db, "repo/test", 1, "First", "opened")
+        second = await enqueue_agent_run(db, "repo/test", 2, "Second", "opened")
+
+        assert (await claim_agent_run(db))["id"] == first["id"]
+        assert (await claim_agent_run(db))["id"] == second["id"]
+        assert await claim_agent_run(db) is None
+
+    @pytest.mark.asyncio
+    async def test_claim_skips_runs_scheduled_in_future(self, db):
+        run = await enqueue_agent_run(db, "repo/test", 1, "Title", "opened")
+        await update_agent_run(
+            db, run["id"], next_attempt_at="2999-01-01T00:00:00+00:00",
+        )
+        assert await claim_agent_run(db) is None
+
+    @pytest.mark.asyncio
+    async def test_recover_stale_requeues_processing_runs(self, db):
+        await enqueue_agent_run(db, "repo/test", 1, "Title", "opened")
+        claimed = await claim_agent_run(db)
+
+        recovered = await recover_stale_agent_runs(db, "2999-01-01T00:00:00+00:00")
+        assert recovered == 1
+
+        run = await get_agent_run(db, claimed["id"])
+        assert run["status"] == "queued"
+        assert run["locked_at"] is None
+        assert run["attempts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_recover_ignores_recent_locks(self, db):
+        await enqueue_agent_run(db, "repo/test", 1, "Title", "opened")
+        await claim_agent_run(db)
+
+        recovered = await recover_stale_agent_runs(db, "2000-01-01T00:00:00+00:00")
+        assert recovered == 0
+
+
+class TestAgentRunDeduplication:
+    @pytest.mark.asyncio
+    async def test_events_for_queued_issue_are_coalesced(self, db):
+        first = await enqueue_agent_run(
+            db, "repo/test", 7, "Titulo", "opened", payload={"body": "v1"},
+        )
+        second = await enqueue_agent_run(
+            db, "repo/test", 7, "Titulo editado", "edited", payload={"body": "v2"},
+        )
+
+        assert second["id"] == first["id"]
+        assert first["coalesced_events"] == 0
+        assert second["coalesced_events"] == 1
+        assert second["issue_title"] == "Titulo editado"
+        assert second["payload"] == {"body": "v2"}
+
+        runs, total = await list_agent_runs(db)
+        assert total == 1
+
+    @pytest.mark.asyncio
+    async def test_different_issues_are_not_coalesced(self, db):
+        a = await enqueue_agent_run(db, "repo/test", 1, "A", "opened")
+        b = await enqueue_agent_run(db, "repo/test", 2, "B", "opened")
+        assert a["id"] != b["id"]
+
+    @pytest.mark.asyncio
+    async def test_debounce_postpones_execution(self, db):
+        await enqueue_agent_run(db, "repo/test", 1, "A", "opened", debounce_seconds=60)
+        assert await claim_agent_run(db) is None
+
+    @pytest.mark.asyncio
+    async def test_new_event_cancels_processing_run(self, db):
+        await enqueue_agent_run(db, "repo/test", 1, "A", "opened")
+        running = await claim_agent_run(db)
+
+        newer = await enqueue_agent_run(db, "repo/test", 1, "A", "edited")
+
+        assert newer["id"] != running["id"]
+        assert newer["status"] == "queued"
+        old = await get_agent_run(db, running["id"])
+        assert old["status"] == "cancelled"
+        assert old["finished_at"] is not None
+
+    @pytest.mark.asyncio
+    async def test_conditional_update_skips_cancelled_run(self, db):
+        await enqueue_agent_run(db, "repo/test", 1, "A", "opened")
+        running = await claim_agent_run(db)
+        await enqueue_agent_run(db, "repo/test", 1, "A", "edited")
+
+        result = await update_agent_run(
+            db, running["id"], expected_status="processing", status="completed",
+        )
+        assert result is None
+        assert (await get_agent_run(db, running["id"]))["status"] == "cancelled"
+
+    @pytest.mark.asyncio
+    async def test_enqueue_records_delivery_once(self, db):
+        run = await enqueue_agent_run(db, "repo/test", 1, "A", "opened", delivery_id="d-1")
+        assert run is not None
+        assert await enqueue_agent_run(
+            db, "repo/test", 1, "A", "opened", delivery_id="d-1",
+        ) is None
+        assert (await get_agent_run(db, run["id"]))["coalesced_events"] == 0
+        # Entrega repetida e ignorada mesmo para outra issue; entrega nova passa
+        assert await enqueue_agent_run(
+            db, "repo/test", 2, "B", "opened", delivery_id="d-1",
+        ) is None
+        assert await enqueue_agent_run(
+            db, "repo/test", 2, "B", "opened", delivery_id="d-2",
+        ) is not None
+
+    @pytest.mark.asyncio
+    async def test_prune_webhook_deliveries(self, db):
+        await enqueue_agent_run(db, "repo/test", 1, "A", "opened", delivery_id="d-1")
+        removed = await prune_webhook_deliveries(db, "2999-01-01T00:00:00+00:00")
+        assert removed == 1
+        assert await enqueue_agent_run(
+            db, "repo/test", 1, "A", "edited", delivery_id="d-1",
+        ) is not None
+
+
+class TestAgentRunBatchUpdates:
+    @pytest.mark.asyncio
+    async def test_batch_applies_all_updates_in_one_transaction(self, db):
+        run1 = await create_agent_run(db, "repo/test", 1, "A", "opened")
+        run2 = await create_agent_run(db, "repo/test", 2, "B", "opened")
+
+        applied = await update_agent_runs(db, [
+            (run1["id"], "processing", {"status": "completed", "tool_steps": 2}),
+            (run2["id"], None, {"status": "failed", "error_message": "erro"}),
+        ])
+
+        assert applied == 2
+        assert (await get_agent_run(db, run1["id"]))["tool_steps"] == 2
+        assert (await get_agent_run(db, run2["id"]))["status"] == "failed"
+
+    @pytest.mark.asyncio
+    async def test_batch_respects_expected_status(self, db):
+        run = await create_agent_run(db, "repo/test", 1, "A", "opened")
+        await update_agent_run(db, run["id"], status="cancelled")
+
+        applied = await update_agent_runs(db, [
+            (run["id"], "processing", {"status": "completed"}),
+        ])
+
+        assert applied == 0
+        assert (await get_agent_run(db, run["id"]))["status"] == "cancelled"
+
+    @pytest.mark.asyncio
+    async def test_batch_is_atomic(self, db):
+        await enqueue_agent_run(db, "repo/test", 1, "A", "opened")
+        run = await create_agent_run(db, "repo/test", 1, "A", "opened")
+
+        # Segundo update viola o indice de um run enfileirado por issue
+        with pytest.raises(Exception):
+            await update_agent_runs(db, [
+                (run["id"], None, {"tool_steps": 5}),
+                (run["id"], None, {"status": "queued"}),
+            ])
+
+        assert (await get_agent_run(db, run["id"]))["tool_steps"] == 0
+
+
+class TestAgentRunStats:
+    @pytest.mark.asyncio
+    async def test_counts_and_duration_percentiles(self, db):
+        for seconds in (10, 20, 30, 40):
+            run = await create_agent_run(db, "repo/a", seconds, "T", "opened")
+            await update_agent_run(
+                db, run["id"],
+                category="BUG",
+                status="completed",
+                finished_at=_shift(run["started_at"], seconds),
+            )
+        await create_agent_run(db, "repo/a", 99, "T", "opened")
+
+        stats = {(s["category"], s["status"]): s for s in await agent_run_stats(db)}
+
+        completed = stats[("BUG", "completed")]
+        assert completed["count"] == 4
+        assert completed["avg_duration_seconds"] == pytest.approx(25, abs=0.01)
+        assert completed["p50_duration_seconds"] == pytest.approx(20, abs=0.01)
+        assert completed["p95_duration_seconds"] == pytest.approx(40, abs=0.01)
+
+        processing = stats[(None, "processing")]
+        assert processing["count"] == 1
+        assert processing["p50_duration_seconds"] is None
+
+    @pytest.mark.asyncio
+    async def test_duration_excludes_queue_wait(self, db):
+        await enqueue_agent_run(db, "repo/a", 1, "T", "opened")
+        # Simula 100s de debounce/fila antes do worker pegar o run
+        async with db.write() as conn:
+            await conn.execute("UPDATE agent_runs SET started_at = started_at - 100000")
+        claimed = await claim_agent_run(db)
+        await update_agent_run(
+            db, claimed["id"],
+            status="completed",
+            finished_at=_shift(claimed["claimed_at"], 5),
+        )
+
+        [stats] = await agent_run_stats(db)
+        assert stats["p50_duration_seconds"] == pytest.approx(5, abs=0.01)
+
+    @pytest.mark.asyncio
+    async def test_filters_by_repo(self, db):
+        await create_agent_run(db, "repo/a", 1, "T", "opened")
+        await create_agent_run(db, "repo/b", 1, "T", "opened")
+
+        stats = await agent_run_stats(db, repo="repo/b")
+        assert [s["count"] for s in stats] == [1]
+
+
+def _shift(iso: str, seconds: int) -> str:
+    from datetime import datetime, timedelta
+
+    return (datetime.fromisoformat(iso) + timedelta(seconds=seconds)).isoformat()
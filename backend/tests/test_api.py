@@ -1,3 +1,5 @@
+import json
+
 import pytest
 import pytest_asyncio
 from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
@@ -8,6 +10,7 @@ from jarvis.auth import create_access_token
 from jarvis.config import Settings
 from jarvis import db
 from jarvis.db import create_user, init_db
+from jarvis.tracing import configure_tracing, shutdown_tracing
 
 
 def _make_settings(**overrides) -> Settings:
@@ -172,6 +175,53 @@ class TestAuthEndpoints:
 
         assert resp.status_code == 401
 
+    @pytest.mark.asyncio
+    async def test_login_rate_limited_per_ip(self, setup_auth):
+        from httpx import ASGITransport, AsyncClient
+
+        from jarvis.ratelimit import LoginRateLimiter
+
+        app.state.login_limiter = LoginRateLimiter(2, 60)
+        try:
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                statuses = []
+                for _ in range(3):
+                    resp = await client.post(
+                        "/auth/login",
+                        json={"username": "testuser", "password": "wrong"},
+                    )
+                    statuses.append(resp.status_code)
+        finally:
+            del app.state.login_limiter
+
+        assert statuses == [401, 401, 429]
+        assert int(resp.headers["Retry-After"]) > 0
+
+    @pytest.mark.asyncio
+    async def test_successful_login_keeps_ip_attempts(self, setup_auth):
+        from httpx import ASGITransport, AsyncClient
+
+        from jarvis.ratelimit import LoginRateLimiter
+
+        app.state.login_limiter = LoginRateLimiter(3, 60)
+        try:
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                statuses = []
+                for password in ("wrong", "testpass", "wrong", "wrong"):
+                    resp = await client.post(
+                        "/auth/login",
+                        json={"username": "testuser", "password": password},
+                    )
+                    statuses.append(resp.status_code)
+        finally:
+            del app.state.login_limiter
+
+        assert statuses == [401, 200, 401, 429]
+
     @pytest.mark.asyncio
     async def test_refresh_token(self, setup_auth):
         from httpx import ASGITransport, AsyncClient
@@ -295,6 +345,180 @@ class TestChatEndpoint:
 
         assert resp.status_code == 422
 
+    @pytest.mark.asyncio
+    async def test_busy_thread_returns_409(self, setup_auth):
+        from httpx import ASGITransport, AsyncClient
+
+        from jarvis.thread_lock import ThreadLockManager
+
+        app.state.thread_locks = ThreadLockManager(policy="reject")
+        thread_id = f"{setup_auth['user']['id']}:custom-123"
+        try:
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                async with app.state.thread_locks.hold(thread_id):
+                    busy = await client.post(
+                        "/chat",
+                        json={"message": "Ola", "thread_id": "custom-123"},
+                        headers={"Authorization": f"Bearer {setup_auth['token']}"},
+                    )
+                free = await client.post(
+                    "/chat",
+                    json={"message": "Ola", "thread_id": "custom-123"},
+                    headers={"Authorization": f"Bearer {setup_auth['token']}"},
+                )
+        finally:
+            del app.state.thread_locks
+
+        assert busy.status_code == 409
+        assert free.status_code == 200
+
+
+class TestChatStreamEndpoint:
+    @pytest_asyncio.fixture()
+    async def sse_app(self, setup_auth_stream):
+        from jarvis.sse import SseStreamRegistry
+
+        app.state.sse_streams = SseStreamRegistry()
+        yield setup_auth_stream
+        await app.state.sse_streams.close()
+        del app.state.sse_streams
+
+    @pytest.mark.asyncio
+    async def test_streams_events_and_resumes(self, sse_app):
+        from httpx import ASGITransport, AsyncClient
+
+        headers = {"Authorization": f"Bearer {sse_app['token']}"}
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            resp = await client.post("/chat/stream", json={"message": "Ola"}, headers=headers)
+            assert resp.status_code == 200
+            assert resp.headers["content-type"].startswith("text/event-stream")
+            stream_id = resp.headers["x-stream-id"]
+            assert resp.text.count("event: token") == 2
+            assert resp.text.endswith(f'id: {stream_id}:2\nevent: end\ndata: {{"type":"end"}}\n\n')
+
+            resumed = await client.get(
+                f"/chat/stream/{stream_id}",
+                headers={**headers, "Last-Event-ID": f"{stream_id}:0"},
+            )
+            assert resumed.status_code == 200
+            assert resumed.text.startswith(f"id: {stream_id}:1\nevent: token\n")
+
+    @pytest.mark.asyncio
+    async def test_resume_other_users_stream_returns_404(self, sse_app):
+        from httpx import ASGITransport, AsyncClient
+
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            resp = await client.post(
+                "/chat/stream",
+                json={"message": "Ola"},
+                headers={"Authorization": f"Bearer {sse_app['token']}"},
+            )
+            resumed = await client.get(
+                f"/chat/stream/{resp.headers['x-stream-id']}",
+                headers={"Authorization": f"Bearer {sse_app['admin_token']}"},
+            )
+
+        assert resumed.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_too_many_running_streams_returns_429(self, sse_app):
+        import asyncio
+
+        from httpx import ASGITransport, AsyncClient
+
+        from jarvis.sse import SseStreamRegistry
+
+        async def pending():
+            await asyncio.Event().wait()
+            yield {"type": "token", "content": "x"}
+
+        app.state.sse_streams = SseStreamRegistry(max_streams_per_user=1)
+        app.state.sse_streams.start(sse_app["user"]["id"], pending())
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            resp = await client.post(
+                "/chat/stream",
+                json={"message": "Ola"},
+                headers={"Authorization": f"Bearer {sse_app['token']}"},
+            )
+
+        assert resp.status_code == 429
+
+
+class TestMetricsEndpoint:
+    @pytest.mark.asyncio
+    async def test_exposes_request_and_chat_metrics(self, setup_auth):
+        from httpx import ASGITransport, AsyncClient
+
+        from jarvis.metrics import CHAT_TURNS, HTTP_REQUESTS
+
+        labels = dict(method="POST", route="/chat", status="200")
+        requests_before = HTTP_REQUESTS.value(**labels)
+        turns_before = CHAT_TURNS.value(channel="chat", status="completed")
+
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            await client.post(
+                "/chat",
+                json={"message": "Ola"},
+                headers={"Authorization": f"Bearer {setup_auth['token']}"},
+            )
+            resp = await client.get(
+                "/metrics", headers={"Authorization": f"Bearer {setup_auth['admin_token']}"},
+            )
+
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert HTTP_REQUESTS.value(**labels) == requests_before + 1
+        assert CHAT_TURNS.value(channel="chat", status="completed") == turns_before + 1
+        assert "# TYPE jarvis_http_request_duration_seconds histogram" in resp.text
+        assert 'jarvis_agent_runs{status="queued"} 0' in resp.text
+
+    @pytest.mark.asyncio
+    async def test_token_and_disable(self, setup_auth):
+        from httpx import ASGITransport, AsyncClient
+
+        app.state.settings = _make_settings(metrics_token="scrape")
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            missing = await client.get("/metrics")
+            ok = await client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+            app.state.settings = _make_settings(metrics_enabled=False)
+            disabled = await client.get("/metrics")
+
+        assert missing.status_code == 401
+        assert ok.status_code == 200
+        assert disabled.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_requires_admin_unless_public(self, setup_auth):
+        from httpx import ASGITransport, AsyncClient
+
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            anonymous = await client.get("/metrics")
+            invalid = await client.get("/metrics", headers={"Authorization": "Bearer x"})
+            user = await client.get(
+                "/metrics", headers={"Authorization": f"Bearer {setup_auth['token']}"},
+            )
+            app.state.settings = _make_settings(metrics_public=True)
+            public = await client.get("/metrics")
+
+        assert anonymous.status_code == 401
+        assert invalid.status_code == 401
+        assert user.status_code == 403
+        assert public.status_code == 200
+
 
 class TestWebSocketEndpoint:
     @pytest.mark.asyncio
@@ -304,14 +528,32 @@ class TestWebSocketEndpoint:
         with client.websocket_connect(f"/ws?token={ctx['token']}") as ws:
             ws.send_json({"message": "Ola"})
 
+            # Tokens que chegam dentro da janela de flush saem num unico frame
             data1 = ws.receive_json()
-            assert data1 == {"type": "token", "content": "Ola"}
+            assert data1 == {"type": "token", "content": "Ola mundo"}
 
             data2 = ws.receive_json()
-            assert data2 == {"type": "token", "content": " mundo"}
+            assert data2 == {"type": "end"}
 
-            data3 = ws.receive_json()
-            assert data3 == {"type": "end"}
+    @pytest.mark.asyncio
+    async def test_end_frame_carries_trace_id(self, setup_auth_stream, tmp_path):
+        ctx = setup_auth_stream
+        path = tmp_path / "spans.jsonl"
+        configure_tracing(str(path))
+        try:
+            client = TestClient(app)
+            with client.websocket_connect(f"/ws?token={ctx['token']}") as ws:
+                ws.send_json({"message": "Ola"})
+                assert ws.receive_json()["type"] == "token"
+                end = ws.receive_json()
+        finally:
+            shutdown_tracing()
+
+        assert end["type"] == "end"
+        [root] = [json.loads(line) for line in path.read_text().splitlines()]
+        assert root["name"] == "chat.turn"
+        assert root["trace_id"] == end["trace_id"]
+        assert root["attributes"]["channel"] == "ws"
 
     @pytest.mark.asyncio
     async def test_ws_without_token_closes(self, setup_auth):
@@ -364,3 +606,76 @@ class TestWebSocketEndpoint:
             tool_end = next(e for e in events if e["type"] == "tool_end")
             assert tool_end["name"] == "calculator"
             assert tool_end["output"] == "4"
+
+    @pytest.mark.asyncio
+    async def test_multiplexed_requests_on_one_connection(self, setup_auth_stream):
+        ctx = setup_auth_stream
+        client = TestClient(app)
+        with client.websocket_connect(f"/ws?token={ctx['token']}") as ws:
+            ws.send_json({"message": "Ola", "thread_id": "t1", "request_id": "a"})
+            ws.send_json({"message": "Oi", "thread_id": "t2", "request_id": "b"})
+
+            ended = set()
+            content = {"a": "", "b": ""}
+            while ended != {"a", "b"}:
+                data = ws.receive_json()
+                if data["type"] == "end":
+                    ended.add(data["request_id"])
+                else:
+                    content[data["request_id"]] += data["content"]
+
+            assert content == {"a": "Ola mundo", "b": "Ola mundo"}
+
+    @pytest.mark.asyncio
+    async def test_cancel_unknown_request_returns_error(self, setup_auth_stream):
+        ctx = setup_auth_stream
+        client = TestClient(app)
+        with client.websocket_connect(f"/ws?token={ctx['token']}") as ws:
+            ws.send_json({"type": "cancel", "request_id": "nope"})
+
+            data = ws.receive_json()
+            assert data["type"] == "error"
+            assert data["request_id"] == "nope"
+
+
+class TestMultiWorkerGraphRefresh:
+    @pytest.mark.asyncio
+    async def test_rebuilds_graph_when_other_worker_changes_tools(self, monkeypatch):
+        import asyncio
+
+        from fastapi import FastAPI
+
+        from jarvis import api
+        from jarvis.config_cache import ConfigCache
+
+        conn = await init_db(":memory:")
+        worker_app = FastAPI()
+        worker_app.state.settings = _make_settings()
+        worker_app.state.checkpointer = None
+        worker_app.state.config_cache = ConfigCache(db, conn)
+        worker_app.state.graph = "inicial"
+        worker_app.state.graph_key = api.chat_graph_key(worker_app.state.settings, {})
+
+        builds = []
+        monkeypatch.setattr(
+            api, "build_chat_graph",
+            lambda settings, config, checkpointer, memory=None, semantic_cache=None: (
+                builds.append(config) or "novo"
+            ),
+        )
+        api._rebuild_graph_on_config_change(worker_app)
+        try:
+            # Mudanca sem efeito no grafo: nao reconstroi
+            await db.set_global_config(conn, {"max_tool_steps": 3})
+            worker_app.state.config_cache._on_remote_change("global")
+            await asyncio.sleep(0.05)
+            assert builds == []
+
+            await db.set_global_config(conn, {"disabled_tools": ["calculator"]})
+            worker_app.state.config_cache._on_remote_change("global")
+            await asyncio.sleep(0.05)
+        finally:
+            await conn.close()
+
+        assert worker_app.state.graph == "novo"
+        assert builds[0]["disabled_tools"] == ["calculator"]
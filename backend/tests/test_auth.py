@@ -11,7 +11,9 @@ from jarvis.auth import (
     create_refresh_token,
     decode_token,
     hash_password,
+    hash_password_async,
     verify_password,
+    verify_password_async,
 )
 
 SECRET = "test-secret"
@@ -34,6 +36,30 @@ class TestPasswordHashing:
         assert h1 != h2  # bcrypt salt diferente
 
 
+class TestPasswordHashingAsync:
+    @pytest.mark.asyncio
+    async def test_hash_and_verify_off_loop(self):
+        hashed = await hash_password_async("minha-senha-123")
+        assert await verify_password_async("minha-senha-123", hashed)
+        assert not await verify_password_async("errada", hashed)
+
+    @pytest.mark.asyncio
+    async def test_runs_in_hash_pool_thread(self):
+        import threading
+        from unittest.mock import patch
+
+        seen = []
+
+        def fake_checkpw(plain, hashed):
+            seen.append(threading.current_thread().name)
+            return True
+
+        with patch("jarvis.auth.bcrypt.checkpw", side_effect=fake_checkpw):
+            assert await verify_password_async("x", "y")
+
+        assert seen[0].startswith("jarvis-bcrypt")
+
+
 class TestAccessToken:
     def test_create_and_decode(self):
         token = create_access_token(1, "admin", SECRET, expiry_minutes=5)
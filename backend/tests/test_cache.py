@@ -3,6 +3,7 @@
 import json
 from unittest.mock import MagicMock, patch
 
+from jarvis import cache
 from jarvis.cache import cached_get
 
 
@@ -83,3 +84,11 @@ class TestCachedGet:
 
         assert result == data
         fetch_fn.assert_called_once()
+
+
+class TestForkSafety:
+    def test_child_after_fork_drops_inherited_client(self):
+        """Worker forkado (gunicorn --preload) nao reusa o cliente do pai."""
+        with patch.object(cache, "_client", MagicMock()):
+            cache._reset_after_fork()
+            assert cache._client is None
@@ -7,10 +7,29 @@ import pytest
 from jarvis.nodes.classifier import (
     CLASSIFIER_PROMPT,
     ISSUE_CATEGORIES,
+    classify_by_labels,
+    classify_by_rules,
     classify_issue,
+    clear_classification_cache,
 )
 
 
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    clear_classification_cache()
+    with patch("jarvis.nodes.classifier.cache.get_redis", return_value=None):
+        yield
+    clear_classification_cache()
+
+
+def _mock_model(content: str) -> AsyncMock:
+    model = AsyncMock()
+    response = AsyncMock()
+    response.content = content
+    model.ainvoke.return_value = response
+    return model
+
+
 class TestIssueCategories:
     def test_all_categories_present(self):
         assert ISSUE_CATEGORIES == ("BUG", "FEATURE", "DOCS", "QUESTION", "SECURITY")
@@ -154,3 +173,125 @@ class TestClassifyIssue:
         await classify_issue("Titulo", "Corpo", model_name="gpt-4o")
 
         mock_chat.assert_called_once_with(model="gpt-4o", temperature=0)
+
+    @pytest.mark.asyncio
+    @patch("jarvis.nodes.classifier.ChatOpenAI")
+    async def test_classify_reuses_given_model(self, mock_chat):
+        mock_model = AsyncMock()
+        mock_response = AsyncMock()
+        mock_response.content = "DOCS"
+        mock_model.ainvoke.return_value = mock_response
+
+        result = await classify_issue("Typo", "README", model=mock_model)
+
+        assert result == "DOCS"
+        mock_chat.assert_not_called()
+
+
+class TestClassifyByRules:
+    def test_cve_id_is_security(self):
+        assert classify_by_rules("Atualizar lib", "Afetada por CVE-2024-12345") == (
+            "SECURITY", 0.95,
+        )
+
+    def test_title_prefix(self):
+        assert classify_by_rules("docs: corrigir exemplo", "")[0] == "DOCS"
+        assert classify_by_rules("fix(auth): token expira", "")[0] == "BUG"
+        assert classify_by_rules("[feat] exportar CSV", "")[0] == "FEATURE"
+
+    def test_unknown_prefix_falls_back_to_keywords(self):
+        result = classify_by_rules("chore: limpar logs", "")
+        assert result is None
+
+    def test_keywords_give_partial_confidence(self):
+        category, confidence = classify_by_rules("Erro ao salvar", "")
+        assert category == "BUG"
+        assert confidence < 0.8
+
+    def test_no_signal_returns_none(self):
+        assert classify_by_rules("Titulo vago", "Corpo vago") is None
+
+    def test_keywords_match_whole_words(self):
+        assert classify_by_rules("Adicionar modo debug", "")[0] == "FEATURE"
+        assert classify_by_rules("Filme de terror", "Modo de debug") is None
+        assert classify_by_rules("Erros ao salvar", "")[0] == "BUG"
+
+    def test_question_mark_is_not_a_question_keyword(self):
+        assert classify_by_rules("Atualizar lib?", "Vale usar a versao 2?") is None
+
+    def test_labels(self):
+        assert classify_by_labels(["jarvis-agent", "Documentation"]) == "DOCS"
+        assert classify_by_labels(["jarvis-agent"]) is None
+        assert classify_by_labels(None) is None
+
+
+class TestTieredClassification:
+    @pytest.mark.asyncio
+    async def test_label_skips_llm(self):
+        model = _mock_model("BUG")
+        result = await classify_issue(
+            "Titulo vago", "Corpo vago", model=model, labels=["security"],
+        )
+        assert result == "SECURITY"
+        model.ainvoke.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_confident_rule_skips_llm(self):
+        model = _mock_model("FEATURE")
+        result = await classify_issue("bug: login quebra", "", model=model)
+        assert result == "BUG"
+        model.ainvoke.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_low_confidence_falls_back_to_llm(self):
+        model = _mock_model("FEATURE")
+        result = await classify_issue("Erro ao salvar", "", model=model)
+        assert result == "FEATURE"
+        model.ainvoke.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_unchanged_content_is_cached(self):
+        model = _mock_model("QUESTION")
+        first = await classify_issue("Titulo vago", "Corpo vago", model=model)
+        second = await classify_issue("Titulo vago", "Corpo vago", model=model)
+
+        assert first == second == "QUESTION"
+        model.ainvoke.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_changed_body_reclassifies(self):
+        model = _mock_model("QUESTION")
+        await classify_issue("Titulo vago", "Corpo vago", model=model)
+        await classify_issue("Titulo vago", "Corpo novo", model=model)
+        assert model.ainvoke.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_redis_cache_hit_skips_llm(self):
+        from unittest.mock import MagicMock
+
+        redis = MagicMock()
+        redis.get.return_value = '"DOCS"'
+        model = _mock_model("BUG")
+
+        with patch("jarvis.nodes.classifier.cache.get_redis", return_value=redis):
+            result = await classify_issue("Titulo vago", "Corpo vago", model=model)
+
+        assert result == "DOCS"
+        model.ainvoke.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_redis_calls_run_off_the_event_loop(self):
+        import threading
+
+        threads = []
+
+        def record(*args):
+            threads.append(threading.current_thread())
+
+        model = _mock_model("BUG")
+        with patch("jarvis.nodes.classifier.cache.get_json", side_effect=record), \
+                patch("jarvis.nodes.classifier.cache.set_json", side_effect=record):
+            await classify_issue("Titulo vago", "Corpo vago", model=model)
+
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
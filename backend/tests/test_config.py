@@ -51,6 +51,7 @@ class TestLoadSettings:
         monkeypatch.delenv("JARVIS_DB_PATH", raising=False)
         monkeypatch.delenv("DATABASE_URL", raising=False)
         monkeypatch.delenv("REDIS_URL", raising=False)
+        monkeypatch.delenv("JARVIS_WORKER_EMBEDDED", raising=False)
 
         settings = load_settings()
 
@@ -62,6 +63,7 @@ class TestLoadSettings:
         assert settings.persist_memory is True
         assert settings.database_url == ""
         assert settings.redis_url == ""
+        assert settings.worker_embedded is False
 
     def test_invalid_int_env(self, monkeypatch):
         monkeypatch.setattr("jarvis.config.load_dotenv", lambda: None)
@@ -87,6 +89,16 @@ class TestLoadSettings:
         with pytest.raises(RuntimeError, match="booleano"):
             load_settings()
 
+    def test_semantic_cache_threshold_range(self, monkeypatch):
+        monkeypatch.setattr("jarvis.config.load_dotenv", lambda: None)
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+        monkeypatch.setenv("JARVIS_SEMANTIC_CACHE_THRESHOLD", "0.85")
+        assert load_settings().semantic_cache_threshold == 0.85
+
+        monkeypatch.setenv("JARVIS_SEMANTIC_CACHE_THRESHOLD", "1.5")
+        with pytest.raises(RuntimeError, match="entre 0 e 1"):
+            load_settings()
+
 
 class TestApplyCliOverrides:
     def test_override_max_turns(self, base_settings):
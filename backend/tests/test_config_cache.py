@@ -0,0 +1,147 @@
+"""Testes para o cache de configs global/usuario."""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from jarvis import db
+from jarvis.config_cache import ConfigCache
+
+
+class CountingDb:
+    """Envolve o modulo db contando leituras de config."""
+
+    def __init__(self):
+        self.reads = 0
+
+    def __getattr__(self, name):
+        return getattr(db, name)
+
+    async def get_global_config(self, conn):
+        self.reads += 1
+        return await db.get_global_config(conn)
+
+    async def get_user_config(self, conn, user_id):
+        self.reads += 1
+        return await db.get_user_config(conn, user_id)
+
+
+@pytest_asyncio.fixture
+async def pool():
+    conn = await db.init_db(":memory:")
+    yield conn
+    await conn.close()
+
+
+class TestConfigCache:
+    @pytest.mark.asyncio
+    async def test_reads_hit_db_once(self, pool):
+        counting = CountingDb()
+        cache = ConfigCache(counting, pool)
+        await db.set_global_config(pool, {"model_name": "gpt-4o"})
+
+        for _ in range(3):
+            assert (await cache.get_global())["model_name"] == "gpt-4o"
+            assert await cache.get_user(1) == {}
+        assert counting.reads == 2
+
+    @pytest.mark.asyncio
+    async def test_returns_copy(self, pool):
+        cache = ConfigCache(db, pool)
+        await cache.set_global({"disabled_tools": ["a"]})
+        (await cache.get_global())["disabled_tools"].append("b")
+        assert (await cache.get_global())["disabled_tools"] == ["a"]
+
+    @pytest.mark.asyncio
+    async def test_set_updates_cache_without_reading(self, pool):
+        counting = CountingDb()
+        cache = ConfigCache(counting, pool)
+        user = await db.create_user(pool, "u", "u@t.com", "s")
+
+        await cache.set_global({"history_window": 5})
+        await cache.set_user(user["id"], {"max_tool_steps": 3})
+        assert await cache.get_global() == {"history_window": 5}
+        assert await cache.get_user(user["id"]) == {"max_tool_steps": 3}
+        assert counting.reads == 0
+
+    @pytest.mark.asyncio
+    async def test_invalidate_scopes(self, pool):
+        counting = CountingDb()
+        cache = ConfigCache(counting, pool)
+        await cache.get_global()
+        await cache.get_user(1)
+        await cache.get_user(2)
+
+        cache.invalidate("user:1")
+        await cache.get_global()
+        await cache.get_user(2)
+        assert counting.reads == 3
+        await cache.get_user(1)
+        assert counting.reads == 4
+
+        cache.invalidate()
+        await cache.get_global()
+        await cache.get_user(2)
+        assert counting.reads == 6
+
+    @pytest.mark.asyncio
+    async def test_stale_load_not_stored_after_invalidation(self, pool):
+        cache = ConfigCache(db, pool)
+        loading = asyncio.Event()
+        release = asyncio.Event()
+        original = db.get_global_config
+
+        class SlowDb(CountingDb):
+            async def get_global_config(self, conn):
+                config = await original(conn)
+                loading.set()
+                await release.wait()
+                return config
+
+        cache.db_module = SlowDb()
+        task = asyncio.create_task(cache.get_global())
+        await loading.wait()
+        await db.set_global_config(pool, {"model_name": "novo"})
+        cache.invalidate("global")
+        release.set()
+        assert await task == {}
+
+        cache.db_module = db
+        assert await cache.get_global() == {"model_name": "novo"}
+
+    @pytest.mark.asyncio
+    async def test_listeners_only_for_remote_changes(self, pool):
+        cache = ConfigCache(db, pool)
+        scopes = []
+        cache.add_listener(scopes.append)
+
+        await cache.set_global({"a": 1})
+        assert scopes == []
+
+        await cache.get_global()
+        cache._on_remote_change("global")
+        assert scopes == ["global"]
+        assert cache._global is None
+
+    @pytest.mark.asyncio
+    async def test_sees_changes_from_other_process(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(db, "CONFIG_VERSION_POLL_SECONDS", 0.01)
+        path = str(tmp_path / "auth.db")
+        ours = await db.init_db(path, readers=1)
+        theirs = await db.init_db(path, readers=1)
+        cache = ConfigCache(db, ours)
+        try:
+            await cache.start()
+            assert await cache.get_global() == {}
+
+            await db.set_global_config(theirs, {"model_name": "outro"})
+            for _ in range(100):
+                if cache._global is None:
+                    break
+                await asyncio.sleep(0.01)
+            assert await cache.get_global() == {"model_name": "outro"}
+        finally:
+            await cache.close()
+            await ours.close()
+            await theirs.close()
@@ -1,13 +1,23 @@
 """Testes para o modulo db (CRUD usuarios e config)."""
 
+import asyncio
+import importlib
+import os
+import sqlite3
+import uuid
+from datetime import datetime
+
 import pytest
 import pytest_asyncio
 
 from jarvis.db import (
+    create_agent_run,
     create_user,
     delete_user,
+    get_config_version,
     get_global_config,
     get_user_by_id,
+    get_agent_run,
     get_user_by_username,
     get_user_config,
     init_db,
@@ -28,6 +38,21 @@ async def db():
     await conn.close()
 
 
+@pytest_asyncio.fixture(params=["sqlite", "postgres"])
+async def backend(request):
+    """(modulo, pool) de cada backend; Postgres so com JARVIS_TEST_DATABASE_URL."""
+    if request.param == "sqlite":
+        module, target = importlib.import_module("jarvis.db"), ":memory:"
+    else:
+        target = os.environ.get("JARVIS_TEST_DATABASE_URL")
+        if not target:
+            pytest.skip("JARVIS_TEST_DATABASE_URL nao definido")
+        module = importlib.import_module("jarvis.db_postgres")
+    pool = await module.init_db(target)
+    yield module, pool
+    await pool.close()
+
+
 class TestUserCrud:
     @pytest.mark.asyncio
     async def test_create_and_get_user(self, db):
@@ -148,6 +173,63 @@ class TestConfig:
         config = await get_user_config(db, user["id"])
         assert config == {"a": 1, "b": 2}
 
+    @pytest.mark.asyncio
+    async def test_set_returns_merged_config(self, db):
+        await set_global_config(db, {"model_name": "gpt-4o"})
+        config = await set_global_config(db, {"history_window": 5})
+        assert config == {"model_name": "gpt-4o", "history_window": 5}
+
+    @pytest.mark.asyncio
+    async def test_none_removes_key(self, db):
+        user = await create_user(db, "u", "u@t.com", "s")
+        await set_user_config(db, user["id"], {"a": 1, "b": 2})
+        config = await set_user_config(db, user["id"], {"a": None})
+        assert config == {"b": 2}
+
+    @pytest.mark.asyncio
+    async def test_concurrent_merges_keep_all_keys(self, db):
+        await asyncio.gather(*(
+            set_global_config(db, {f"k{i}": i}) for i in range(10)
+        ))
+        config = await get_global_config(db)
+        assert config == {f"k{i}": i for i in range(10)}
+
+    @pytest.mark.asyncio
+    async def test_set_bumps_config_version(self, db):
+        user = await create_user(db, "u", "u@t.com", "s")
+        before = await get_config_version(db)
+        await set_global_config(db, {"a": 1})
+        await set_user_config(db, user["id"], {"b": 2})
+        assert await get_config_version(db) == before + 2
+
+
+class TestConfigMergeParity:
+    """Merge raso (``||`` do jsonb) nos dois backends."""
+
+    @pytest.mark.asyncio
+    async def test_nested_user_config_is_replaced(self, backend):
+        module, pool = backend
+        name = f"u-{uuid.uuid4().hex[:8]}"
+        user = await module.create_user(pool, name, f"{name}@t.com", "s")
+        try:
+            await module.set_user_config(pool, user["id"], {"limits": {"a": 1, "b": 2}, "c": 1})
+            config = await module.set_user_config(pool, user["id"], {"limits": {"a": 3}})
+            assert config == {"limits": {"a": 3}, "c": 1}
+            assert await module.get_user_config(pool, user["id"]) == config
+        finally:
+            await module.delete_user(pool, user["id"])
+
+    @pytest.mark.asyncio
+    async def test_nested_global_config_is_replaced(self, backend):
+        module, pool = backend
+        try:
+            await module.set_global_config(pool, {"nested_test": {"a": 1, "b": None}})
+            config = await module.set_global_config(pool, {"nested_test": {"b": 2}})
+            assert config["nested_test"] == {"b": 2}
+        finally:
+            await module.set_global_config(pool, {"nested_test": None})
+        assert "nested_test" not in await module.get_global_config(pool)
+
 
 class TestSeedAdmin:
     @pytest.mark.asyncio
@@ -158,6 +240,20 @@ class TestSeedAdmin:
         assert users[0]["role"] == "admin"
         assert users[0]["username"] == "root"
 
+    @pytest.mark.asyncio
+    async def test_concurrent_seed_from_workers(self, tmp_path):
+        path = str(tmp_path / "auth.db")
+        pools = [await init_db(path, readers=1) for _ in range(2)]
+        try:
+            await asyncio.gather(*(
+                seed_admin_if_needed(p, "root", "root@t.com", "pass") for p in pools
+            ))
+            users = await list_users(pools[0])
+        finally:
+            for p in pools:
+                await p.close()
+        assert [u["username"] for u in users] == ["root"]
+
     @pytest.mark.asyncio
     async def test_seed_skips_if_admin_exists(self, db):
         await create_user(db, "existing", "ex@t.com", "s", role="admin")
@@ -165,3 +261,81 @@ class TestSeedAdmin:
         users = await list_users(db)
         assert len(users) == 1
         assert users[0]["username"] == "existing"
+
+
+class TestEpochColumns:
+    @pytest.mark.asyncio
+    async def test_timestamps_stored_as_epoch_ms(self, tmp_path):
+        path = str(tmp_path / "auth.db")
+        pool = await init_db(path)
+        user = await create_user(pool, "alice", "a@t.com", "s")
+        await pool.close()
+
+        raw = sqlite3.connect(path)
+        created_at, kind = raw.execute(
+            "SELECT created_at, typeof(created_at) FROM users"
+        ).fetchone()
+        raw.close()
+        assert kind == "integer"
+        assert created_at == round(
+            datetime.fromisoformat(user["created_at"]).timestamp() * 1000
+        )
+
+    @pytest.mark.asyncio
+    async def test_migrates_legacy_text_columns(self, tmp_path):
+        path = str(tmp_path / "legacy.db")
+        raw = sqlite3.connect(path)
+        raw.executescript("""
+            CREATE TABLE users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                hashed_password TEXT NOT NULL,
+                role TEXT NOT NULL DEFAULT 'user',
+                is_active INTEGER NOT NULL DEFAULT 1,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE TABLE agent_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                repo TEXT NOT NULL,
+                issue_number INTEGER NOT NULL,
+                issue_title TEXT NOT NULL,
+                action TEXT NOT NULL,
+                category TEXT,
+                status TEXT NOT NULL DEFAULT 'processing',
+                tool_steps INTEGER NOT NULL DEFAULT 0,
+                error_message TEXT,
+                started_at TEXT NOT NULL,
+                finished_at TEXT
+            );
+            INSERT INTO users (username, email, hashed_password, created_at, updated_at)
+            VALUES ('bob', 'b@t.com', 'x', '2026-03-05T12:00:00+00:00',
+                    '2026-03-05T12:00:00.250000+00:00');
+            INSERT INTO agent_runs (repo, issue_number, issue_title, action, status,
+                                    started_at, finished_at)
+            VALUES ('o/r', 1, 't', 'opened', 'completed',
+                    '2026-03-05T12:00:00+00:00', '2026-03-05T12:00:30+00:00');
+        """)
+        raw.close()
+
+        pool = await init_db(path)
+        try:
+            user = await get_user_by_username(pool, "bob")
+            assert user["created_at"] == "2026-03-05T12:00:00+00:00"
+            assert user["updated_at"] == "2026-03-05T12:00:00.250000+00:00"
+            run = await get_agent_run(pool, 1)
+            assert run["finished_at"] == "2026-03-05T12:00:30+00:00"
+            assert run["attempts"] == 0
+
+            # tabela recriada continua aceitando inserts
+            new_run = await create_agent_run(pool, "o/r", 2, "t", "opened")
+            assert new_run["id"] == 2
+        finally:
+            await pool.close()
+
+        raw = sqlite3.connect(path)
+        types = {row[1]: row[2] for row in raw.execute("PRAGMA table_info(agent_runs)")}
+        raw.close()
+        assert types["started_at"] == "INTEGER"
+        assert types["locked_at"] == "INTEGER"
@@ -107,6 +107,32 @@ class TestGetCurrentUser:
         await conn.close()
 
 
+class TestGetCurrentUserCache:
+    @pytest.mark.asyncio
+    async def test_cached_user_skips_db_lookup(self):
+        from unittest.mock import AsyncMock
+
+        from jarvis import db
+        from jarvis.db import create_user, init_db
+        from jarvis.user_cache import UserCache
+
+        conn = await init_db(":memory:")
+        user = await create_user(conn, "dave", "dave@t.com", "s")
+        token = create_access_token(user["id"], "user", SECRET)
+
+        state = FakeAppState(_fake_settings(), conn)
+        state.user_cache = UserCache(ttl_seconds=60)
+        state.db_module = AsyncMock(wraps=db)
+        request = FakeRequest(state)
+
+        for _ in range(3):
+            result = await get_current_user(request, FakeCredentials(token))
+            assert result["username"] == "dave"
+
+        state.db_module.get_user_by_id.assert_awaited_once()
+        await conn.close()
+
+
 class TestGetCurrentActiveUser:
     @pytest.mark.asyncio
     async def test_active_user_passes(self):
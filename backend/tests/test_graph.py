@@ -49,6 +49,41 @@ class TestTrimAndPrependSystem:
         assert result[2].content == "r3"
         assert result[3].content == "4"
 
+    def test_block_trimming_keeps_prefix_stable(self):
+        def turns(n):
+            messages = []
+            for i in range(1, n + 1):
+                messages += [HumanMessage(content=str(i)), AIMessage(content=f"r{i}")]
+            return messages[:-1]
+
+        def first_turn(n):
+            result = _trim_and_prepend_system(
+                turns(n), "sys", history_window=2, history_block=3,
+            )
+            return result[1].content
+
+        # O inicio da janela so avanca a cada 3 turnos
+        assert [first_turn(n) for n in range(1, 11)] == [
+            "1", "1", "1", "1", "1", "4", "4", "4", "7", "7",
+        ]
+        result = _trim_and_prepend_system(
+            turns(6), "sys", history_window=2, history_block=3,
+        )
+        assert result[-1].content == "6"
+
+    def test_memories_go_before_last_human_message(self):
+        messages = [
+            HumanMessage(content="1"), AIMessage(content="r1"),
+            HumanMessage(content="2"),
+        ]
+        result = _trim_and_prepend_system(
+            messages, "sys", history_window=3, memories=["Usuario: x\nAssistente: y"],
+        )
+        assert [m.content for m in result[:3]] == ["sys", "1", "r1"]
+        assert isinstance(result[3], SystemMessage)
+        assert "- Usuario: x\nAssistente: y" in result[3].content
+        assert result[4].content == "2"
+
     def test_fewer_than_window(self):
         messages = [
             HumanMessage(content="1"), AIMessage(content="r1"),
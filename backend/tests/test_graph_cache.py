@@ -4,7 +4,12 @@ import os
 
 import pytest
 
-from jarvis.graph_cache import cache_clear, cache_info, get_or_build_graph
+from jarvis.graph_cache import (
+    cache_clear,
+    cache_info,
+    get_github_graph,
+    get_or_build_graph,
+)
 
 
 @pytest.fixture(autouse=True)
@@ -50,3 +55,20 @@ class TestGraphCache:
         cache_clear()
         info = cache_info()
         assert info.currsize == 0
+
+
+class TestGitHubGraphCache:
+    def test_github_graph_built_once_per_config(self):
+        g1 = get_github_graph("gpt-test", "prompt", 15)
+        g2 = get_github_graph("gpt-test", "prompt", 15)
+        assert g1 is g2
+
+    def test_github_graph_per_model(self):
+        g1 = get_github_graph("gpt-test", "prompt", 15)
+        g2 = get_github_graph("gpt-other", "prompt", 15)
+        assert g1 is not g2
+
+    def test_cache_clear_resets_github_graph(self):
+        g1 = get_github_graph("gpt-test", "prompt", 15)
+        cache_clear()
+        assert get_github_graph("gpt-test", "prompt", 15) is not g1
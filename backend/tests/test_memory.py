@@ -0,0 +1,242 @@
+"""Testes para a memoria de longo prazo do chat."""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from jarvis.chat import stream_chat
+from jarvis.memory import LongTermMemory, memory_user
+from jarvis.vector import HashingEmbedder, SqliteVectorStore
+
+
+async def _memory(path, **kwargs):
+    store = await SqliteVectorStore.open(str(path))
+    return LongTermMemory(store, HashingEmbedder(), **kwargs)
+
+
+def test_memory_user():
+    assert memory_user("42:abc") == "42"
+    assert memory_user("cli-thread") is None
+    assert memory_user(None) is None
+
+
+class TestSqliteVectorStore:
+    @pytest.mark.asyncio
+    async def test_roundtrip_by_namespace(self, tmp_path):
+        store = await SqliteVectorStore.open(str(tmp_path / "m.db"))
+        try:
+            first = await store.add("1", [0.5, 0.25], {"text": "a"})
+            await store.add("2", [1.0, 0.0], {"text": "b"})
+            second = await store.add("1", [0.0, 1.0], {"text": "c"})
+
+            rows = await store.load("1")
+            assert [(r[0], r[1], r[2]["text"]) for r in rows] == [
+                (first, [0.5, 0.25], "a"), (second, [0.0, 1.0], "c"),
+            ]
+            assert [r[0] for r in await store.load("1", after_id=first)] == [second]
+        finally:
+            await store.close()
+
+
+class TestLongTermMemory:
+    @pytest.mark.asyncio
+    async def test_recall_relevant_turn(self, tmp_path):
+        memory = await _memory(tmp_path / "m.db")
+        try:
+            await memory.remember("1", "1:a", "Qual meu time do Cartola?", "Seu time e o Fla FC.")
+            await memory.remember("1", "1:a", "Quanto e 2+2?", "4.")
+
+            snippets = await memory.recall("1", "qual e o meu time no cartola")
+            assert snippets[0].startswith("Usuario: Qual meu time do Cartola?")
+            assert "Fla FC" in snippets[0]
+            # Outros usuarios nao veem
+            assert await memory.recall("2", "qual e o meu time no cartola") == []
+        finally:
+            await memory.close()
+
+    @pytest.mark.asyncio
+    async def test_excludes_questions_already_in_window(self, tmp_path):
+        memory = await _memory(tmp_path / "m.db")
+        try:
+            await memory.remember("1", "1:a", "Qual meu time do Cartola?", "Fla FC.")
+            snippets = await memory.recall(
+                "1", "qual e o meu time no cartola",
+                exclude_questions=["Qual meu time do Cartola?"],
+            )
+            assert snippets == []
+        finally:
+            await memory.close()
+
+    @pytest.mark.asyncio
+    async def test_sees_rows_written_by_other_worker(self, tmp_path):
+        path = tmp_path / "m.db"
+        reader = await _memory(path)
+        writer = await _memory(path)
+        try:
+            assert await reader.recall("1", "qual meu time") == []
+            await writer.remember("1", "1:a", "Qual meu time?", "Fla FC.")
+            assert len(await reader.recall("1", "qual meu time")) == 1
+        finally:
+            await reader.close()
+            await writer.close()
+
+    @pytest.mark.asyncio
+    async def test_slow_user_load_does_not_block_other_users(self, tmp_path):
+        import asyncio
+
+        memory = await _memory(tmp_path / "m.db")
+        await memory.remember("2", "2:a", "Qual meu time?", "Fla FC.")
+        gate = asyncio.Event()
+        load = memory.store.load
+
+        async def slow_load(namespace, *args):
+            if namespace == "1":
+                await gate.wait()
+            return await load(namespace, *args)
+
+        memory.store.load = slow_load
+        try:
+            stuck = asyncio.create_task(memory.recall("1", "qual meu time"))
+            await asyncio.sleep(0)
+            snippets = await asyncio.wait_for(memory.recall("2", "qual meu time"), 1)
+            assert len(snippets) == 1
+            gate.set()
+            assert await stuck == []
+        finally:
+            await memory.close()
+
+
+class RecordingModel:
+    def __init__(self):
+        self.prompts = []
+
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages)
+        return AIMessage(content=f"Resposta {len(self.prompts)}.")
+
+
+@pytest.mark.asyncio
+async def test_graph_injects_memory_from_other_thread(tmp_path, monkeypatch):
+    from jarvis import graph as graph_module
+
+    model = RecordingModel()
+    monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: model)
+    memory = await _memory(tmp_path / "m.db")
+    try:
+        graph = graph_module.build_graph(
+            "gpt", "system", 3, checkpointer=MemorySaver(), tools=[], memory=memory,
+        )
+        [e async for e in stream_chat(graph, "Qual meu time do Cartola?", 5, "7:a")]
+        [e async for e in stream_chat(graph, "qual e o meu time no cartola", 5, "7:b")]
+
+        first, second = model.prompts
+        assert not any(
+            isinstance(m, SystemMessage) and "Usuario:" in m.content for m in first
+        )
+        memory_block = second[-2]
+        assert isinstance(memory_block, SystemMessage)
+        assert "Usuario: Qual meu time do Cartola?\nAssistente: Resposta 1." in (
+            memory_block.content
+        )
+        assert isinstance(second[-1], HumanMessage)
+    finally:
+        await memory.close()
+
+
+@pytest.mark.asyncio
+async def test_answers_with_memories_stay_out_of_shared_semantic_cache(
+    tmp_path, monkeypatch,
+):
+    from jarvis import graph as graph_module
+    from jarvis.semantic_cache import SemanticCache
+
+    model = RecordingModel()
+    monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: model)
+    memory = await _memory(tmp_path / "m.db")
+    try:
+        graph = graph_module.build_graph(
+            "gpt", "system", 3, checkpointer=MemorySaver(), tools=[], memory=memory,
+            semantic_cache=SemanticCache(HashingEmbedder(), threshold=0.99),
+        )
+        question = "qual e o meu time no cartola"
+        [e async for e in stream_chat(graph, "Qual meu time do Cartola?", 5, "7:a")]
+        [e async for e in stream_chat(graph, question, 5, "7:b")]
+        # Outro usuario, mesma pergunta: a resposta do usuario 7 (feita com
+        # as memorias dele) nao pode voltar do cache
+        events = [e async for e in stream_chat(graph, question, 5, "8:a")]
+
+        assert len(model.prompts) == 3
+        assert events[-1]["content"] == "Resposta 3."
+    finally:
+        await memory.close()
+
+
+class BrokenMemory:
+    async def recall(self, user, query, exclude_questions=()):
+        raise ConnectionError("embeddings fora do ar")
+
+    async def remember(self, user, thread_id, question, answer):
+        raise ConnectionError("embeddings fora do ar")
+
+
+@pytest.mark.asyncio
+async def test_memory_failure_does_not_fail_the_turn(monkeypatch):
+    from jarvis import graph as graph_module
+
+    model = RecordingModel()
+    monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: model)
+    graph = graph_module.build_graph(
+        "gpt", "system", 3, checkpointer=MemorySaver(), tools=[], memory=BrokenMemory(),
+    )
+
+    events = [e async for e in stream_chat(graph, "Qual meu time?", 5, "7:a")]
+
+    assert events[-1] == {"type": "token", "content": "Resposta 1."}
+
+
+@pytest.mark.asyncio
+async def test_recall_runs_once_per_turn(tmp_path, monkeypatch):
+    from langchain_core.messages import ToolMessage
+
+    from jarvis import graph as graph_module
+    from jarvis.tools import calculator
+
+    class ToolThenAnswer(RecordingModel):
+        async def ainvoke(self, messages):
+            self.prompts.append(messages)
+            if isinstance(messages[-1], ToolMessage):
+                return AIMessage(content="Da 4.")
+            call = {"name": "calculator", "args": {"expression": "2+2"}, "id": "c1"}
+            return AIMessage(content="", tool_calls=[call])
+
+    model = ToolThenAnswer()
+    monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: model)
+    memory = await _memory(tmp_path / "m.db")
+    await memory.remember("7", "7:a", "Quanto e 2+2 na conta?", "Deu 4.")
+    recalls = 0
+    original_recall = memory.recall
+
+    async def counting_recall(*args, **kwargs):
+        nonlocal recalls
+        recalls += 1
+        return await original_recall(*args, **kwargs)
+
+    memory.recall = counting_recall
+    try:
+        graph = graph_module.build_graph(
+            "gpt", "system", 3, checkpointer=MemorySaver(), tools=[calculator],
+            memory=memory,
+        )
+        [e async for e in stream_chat(graph, "quanto e 2+2 na conta", 5, "7:b")]
+
+        assert recalls == 1
+        # O passo apos a tool mantem as memorias do primeiro passo
+        first, second = model.prompts
+        memory_block = [m for m in first if isinstance(m, SystemMessage)][-1]
+        assert "Deu 4." in memory_block.content
+        assert memory_block in second
+    finally:
+        await memory.close()
@@ -0,0 +1,130 @@
+"""Testes para o registro de metricas do Prometheus."""
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from jarvis import cache
+from jarvis.chat import stream_chat
+from jarvis.metrics import (
+    CACHE_REQUESTS,
+    TOOL_CALLS,
+    TOOL_DURATION,
+    Collected,
+    Counter,
+    Histogram,
+    Registry,
+    register_db_pool,
+    REGISTRY,
+)
+from jarvis.sqlite_pool import open_sqlite_pool
+from jarvis.tools import calculator
+
+
+class TestRendering:
+    def test_counter_and_histogram_text_format(self):
+        registry = Registry()
+        requests = registry.register(Counter("x_total", "Requests.", ("route",)))
+        latency = registry.register(Histogram("x_seconds", "Latencia.", (), buckets=(0.1, 1.0)))
+
+        requests.inc(route="/chat")
+        requests.inc(2, route='/a"b')
+        for value in (0.05, 0.5, 3.0):
+            latency.observe(value)
+
+        assert registry.render() == (
+            "# HELP x_seconds Latencia.\n"
+            "# TYPE x_seconds histogram\n"
+            'x_seconds_bucket{le="0.1"} 1\n'
+            'x_seconds_bucket{le="1"} 2\n'
+            'x_seconds_bucket{le="+Inf"} 3\n'
+            "x_seconds_sum 3.55\n"
+            "x_seconds_count 3\n"
+            "# HELP x_total Requests.\n"
+            "# TYPE x_total counter\n"
+            'x_total{route="/a\\"b"} 2\n'
+            'x_total{route="/chat"} 1\n'
+        )
+
+    def test_wrong_labels_raise(self):
+        with pytest.raises(ValueError):
+            Counter("y_total", "y", ("route",)).inc(status="200")
+
+    def test_failing_collector_is_skipped(self):
+        def broken():
+            raise RuntimeError("pool fechado")
+
+        registry = Registry()
+        registry.register(Collected("z", "z", (), broken))
+        registry.register(Counter("w_total", "w"))
+        assert "# TYPE w_total counter" in registry.render()
+        assert "# TYPE z" not in registry.render()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pool_usage(tmp_path):
+    pool = await open_sqlite_pool(str(tmp_path / "auth.db"), readers=2)
+    try:
+        register_db_pool(pool)
+        async with pool.read():
+            text = REGISTRY.render()
+            assert 'jarvis_db_pool_connections{state="idle"} 1' in text
+            assert 'jarvis_db_pool_connections{state="in_use"} 1' in text
+    finally:
+        await pool.close()
+        REGISTRY.unregister("jarvis_db_pool_connections")
+
+
+def test_cached_get_counts_hits_and_misses(monkeypatch):
+    class FakeRedis:
+        def __init__(self):
+            self.data = {}
+
+        def get(self, key):
+            return self.data.get(key)
+
+        def setex(self, key, ttl, value):
+            self.data[key] = value
+
+    monkeypatch.setattr(cache, "_client", FakeRedis())
+    hits = CACHE_REQUESTS.value(cache="cached_get", result="hit")
+    misses = CACHE_REQUESTS.value(cache="cached_get", result="miss")
+
+    assert cache.cached_get("k", 60, lambda: {"v": 1}) == {"v": 1}
+    assert cache.cached_get("k", 60, lambda: {"v": 2}) == {"v": 1}
+
+    assert CACHE_REQUESTS.value(cache="cached_get", result="miss") == misses + 1
+    assert CACHE_REQUESTS.value(cache="cached_get", result="hit") == hits + 1
+
+
+class ToolModel:
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages):
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(content="Pronto.")
+        calls = [
+            {"name": "calculator", "args": {"expression": "2+2"}, "id": "c1"},
+            {"name": "inexistente", "args": {}, "id": "c2"},
+        ]
+        return AIMessage(content="", tool_calls=calls)
+
+
+@pytest.mark.asyncio
+async def test_graph_observes_each_tool_call(monkeypatch):
+    from jarvis import graph as graph_module
+
+    monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: ToolModel())
+    graph = graph_module.build_graph(
+        "gpt", "system", 3, checkpointer=MemorySaver(), tools=[calculator],
+    )
+    ok = TOOL_CALLS.value(tool="calculator", status="success")
+    errors = TOOL_CALLS.value(tool="unknown", status="error")
+    observed = TOOL_DURATION.count(tool="calculator")
+
+    [e async for e in stream_chat(graph, "Quanto e 2+2?", 5, "1:a")]
+
+    assert TOOL_CALLS.value(tool="calculator", status="success") == ok + 1
+    assert TOOL_CALLS.value(tool="unknown", status="error") == errors + 1
+    assert TOOL_DURATION.count(tool="calculator") == observed + 1
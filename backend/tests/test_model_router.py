@@ -0,0 +1,136 @@
+"""Testes para o roteamento entre modelo rapido e principal."""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from jarvis.chat import stream_chat
+from jarvis.model_router import RouteStats, choose_route
+from jarvis.tools import calculator
+
+
+def _route(question, *extra, tool_steps=0):
+    messages = [SystemMessage(content="sys"), HumanMessage(content=question), *extra]
+    return choose_route(messages, tool_steps)[0]
+
+
+class TestChooseRoute:
+    def test_simple_question_is_fast(self):
+        assert _route("Qual a rodada atual?") == "fast"
+
+    def test_complex_requests_are_strong(self):
+        assert _route("Monte uma escalação com 100 cartoletas") == "strong"
+        assert _route("Compare o Pedro com o Hulk") == "strong"
+        assert _route("Quem joga hoje? E amanha?") == "strong"
+        assert _route("x" * 400) == "strong"
+
+    def test_tool_chain_and_large_output_are_strong(self):
+        call = AIMessage(
+            content="", tool_calls=[{"name": "t", "args": {}, "id": "1"}],
+        )
+        small = ToolMessage(content="ok", name="t", tool_call_id="1")
+        large = ToolMessage(content="x" * 7000, name="t", tool_call_id="1")
+        assert _route("Qual a rodada?", call, small, tool_steps=1) == "fast"
+        assert _route("Qual a rodada?", call, small, tool_steps=2) == "strong"
+        assert _route("Qual a rodada?", call, large, tool_steps=1) == "strong"
+
+
+def test_route_stats_snapshot():
+    stats = RouteStats()
+    for seconds in (0.1, 0.2, 0.3):
+        stats.record("fast", "nano", seconds, {"input_tokens": 5, "output_tokens": 1})
+    stats.record("strong", "mini", 1.0, error=True)
+    stats.record(
+        "strong", "mini", 1.0,
+        {"input_tokens": 2048, "output_tokens": 10, "input_token_details": {"cache_read": 1024}},
+    )
+
+    fast, strong = stats.snapshot()
+    assert fast["calls"] == 3
+    assert fast["input_tokens"] == 15
+    assert fast["cached_input_tokens"] == 0
+    assert strong["cached_input_tokens"] == 1024
+    assert fast["p50_latency_seconds"] == 0.2
+    assert strong["errors"] == 1
+
+
+class NamedModel:
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages):
+        self.calls.append(self.name)
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(
+                content=f"Da {messages[-1].content}.",
+                usage_metadata={"input_tokens": 8, "output_tokens": 3, "total_tokens": 11},
+            )
+        call = {"name": "calculator", "args": {"expression": "2+2"}, "id": "c1"}
+        return AIMessage(content="", tool_calls=[call])
+
+
+@pytest.mark.asyncio
+async def test_graph_routes_by_question(monkeypatch):
+    from jarvis import graph as graph_module
+    from jarvis.model_router import route_stats
+
+    calls = []
+    monkeypatch.setattr(
+        graph_module, "ChatOpenAI", lambda **kwargs: NamedModel(kwargs["model"], calls),
+    )
+    graph = graph_module.build_graph(
+        "mini", "system", 3, checkpointer=MemorySaver(),
+        tools=[calculator], fast_model_name="nano",
+    )
+    route_stats.clear()
+    try:
+        events = [e async for e in stream_chat(graph, "Quanto e 2+2?", 5, "u:1")]
+        assert calls == ["nano", "nano"]
+        assert events[-1] == {"type": "token", "content": "Da 4."}
+
+        [e async for e in stream_chat(graph, "Explique como 2+2 funciona", 5, "u:2")]
+        assert calls[2:] == ["mini", "mini"]
+
+        by_route = {r["route"]: r for r in route_stats.snapshot()}
+        assert by_route["fast"]["model_name"] == "nano"
+        assert by_route["fast"]["calls"] == 2
+        assert by_route["fast"]["output_tokens"] == 3
+        assert by_route["strong"]["calls"] == 2
+    finally:
+        route_stats.clear()
+
+
+@pytest.mark.asyncio
+async def test_same_model_disables_routing(monkeypatch):
+    from jarvis import graph as graph_module
+
+    calls = []
+    monkeypatch.setattr(
+        graph_module, "ChatOpenAI", lambda **kwargs: NamedModel(kwargs["model"], calls),
+    )
+    graph = graph_module.build_graph(
+        "mini", "system", 3, checkpointer=MemorySaver(),
+        tools=[calculator], fast_model_name="mini",
+    )
+    [e async for e in stream_chat(graph, "Quanto e 2+2?", 5, "u:1")]
+    assert calls == ["mini", "mini"]
+
+
+def test_tools_are_bound_in_name_order(monkeypatch):
+    from jarvis import graph as graph_module
+    from jarvis.tools import ALL_TOOLS
+
+    bound = []
+
+    class Model:
+        def bind_tools(self, tools):
+            bound.append([t.name for t in tools])
+            return self
+
+    monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: Model())
+    graph_module.build_graph("mini", "system", 3, tools=list(reversed(ALL_TOOLS)))
+    assert bound == [sorted(t.name for t in ALL_TOOLS)]
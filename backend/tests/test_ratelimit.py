@@ -0,0 +1,127 @@
+"""Testes para o rate limiter de login."""
+
+import pytest
+import redis
+
+from jarvis.ratelimit import LoginRateLimiter, RedisLoginRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLoginRateLimiter:
+    @pytest.mark.asyncio
+    async def test_allows_up_to_limit(self):
+        limiter = LoginRateLimiter(3, 60, clock=FakeClock())
+        assert [await limiter.hit("1.2.3.4") for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert await limiter.hit("1.2.3.4") == 60.0
+
+    @pytest.mark.asyncio
+    async def test_window_slides(self):
+        clock = FakeClock()
+        limiter = LoginRateLimiter(2, 60, clock=clock)
+        await limiter.hit("ip")
+        clock.now += 30
+        await limiter.hit("ip")
+        assert await limiter.hit("ip") == 30.0
+
+        clock.now += 30
+        assert await limiter.hit("ip") == 0.0
+
+    @pytest.mark.asyncio
+    async def test_keys_are_independent(self):
+        limiter = LoginRateLimiter(1, 60, clock=FakeClock())
+        assert await limiter.hit("a") == 0.0
+        assert await limiter.hit("b") == 0.0
+        assert await limiter.hit("a") > 0
+
+    @pytest.mark.asyncio
+    async def test_zero_disables_limit(self):
+        limiter = LoginRateLimiter(0, 60, clock=FakeClock())
+        assert all([await limiter.hit("a") == 0.0 for _ in range(100)])
+
+    @pytest.mark.asyncio
+    async def test_prunes_expired_keys_when_full(self, monkeypatch):
+        monkeypatch.setattr("jarvis.ratelimit.MAX_TRACKED_KEYS", 2)
+        clock = FakeClock()
+        limiter = LoginRateLimiter(1, 60, clock=clock)
+        await limiter.hit("a")
+        await limiter.hit("b")
+        clock.now += 61
+        await limiter.hit("c")
+        assert set(limiter._attempts) == {"c"}
+
+
+class FakeRedis:
+    """Contadores com TTL (so o necessario para o pipeline do limiter)."""
+
+    def __init__(self):
+        self.values = {}
+        self.ttl_ms = {}
+        self.down = False
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    def set(self, key, value, px=None, nx=False):
+        self.ops.append(("set", key, value, px, nx))
+
+    def incr(self, key):
+        self.ops.append(("incr", key))
+
+    def pttl(self, key):
+        self.ops.append(("pttl", key))
+
+    def execute(self):
+        client = self.client
+        if client.down:
+            raise redis.ConnectionError("down")
+        results = []
+        for op, key, *args in self.ops:
+            if op == "set":
+                value, px, nx = args
+                created = not (nx and key in client.values)
+                if created:
+                    client.values[key] = value
+                    client.ttl_ms[key] = px
+                results.append(created or None)
+            elif op == "incr":
+                client.values[key] += 1
+                results.append(client.values[key])
+            else:
+                results.append(client.ttl_ms[key])
+        return results
+
+
+class TestRedisLoginRateLimiter:
+    @pytest.mark.asyncio
+    async def test_workers_share_the_limit(self):
+        client = FakeRedis()
+        worker_a = RedisLoginRateLimiter(client, LoginRateLimiter(3, 60))
+        worker_b = RedisLoginRateLimiter(client, LoginRateLimiter(3, 60))
+
+        assert await worker_a.hit("ip") == 0.0
+        assert await worker_b.hit("ip") == 0.0
+        assert await worker_a.hit("ip") == 0.0
+        assert await worker_b.hit("ip") == 60.0
+        assert await worker_a.hit("other-ip") == 0.0
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_local_limit_when_redis_fails(self):
+        client = FakeRedis()
+        client.down = True
+        limiter = RedisLoginRateLimiter(client, LoginRateLimiter(1, 60, clock=FakeClock()))
+
+        assert await limiter.hit("ip") == 0.0
+        assert await limiter.hit("ip") == 60.0
@@ -0,0 +1,145 @@
+"""Testes para o cache de respostas do modelo no grafo de chat."""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from jarvis import cache
+from jarvis.chat import stream_chat
+from jarvis.response_cache import ResponseCache
+from jarvis.tools import calculator
+
+
+@pytest.fixture()
+def redis_store(monkeypatch):
+    """Substitui get_json/set_json do modulo cache por um dict."""
+    store = {}
+    monkeypatch.setattr(cache, "get_json", lambda key: store.get(key))
+    monkeypatch.setattr(cache, "set_json", lambda key, ttl, value: store.__setitem__(key, value))
+    return store
+
+
+def _tool_call(call_id="call_1"):
+    return AIMessage(
+        content="",
+        tool_calls=[{"name": "calculator", "args": {"expression": "2+2"}, "id": call_id}],
+    )
+
+
+class TestResponseCacheKey:
+    def test_normalizes_user_text(self):
+        rc = ResponseCache("gpt", ["calculator"])
+        a = rc.key([SystemMessage(content="s"), HumanMessage(content="Qual a  rodada atual?")])
+        b = rc.key([SystemMessage(content="s"), HumanMessage(content=" qual a rodada ATUAL? ")])
+        assert a == b
+
+    def test_system_prompt_model_and_tools_change_key(self):
+        messages = [SystemMessage(content="s"), HumanMessage(content="oi")]
+        base = ResponseCache("gpt", ["calculator"]).key(messages)
+        assert ResponseCache("outro", ["calculator"]).key(messages) != base
+        assert ResponseCache("gpt", ["current_time"]).key(messages) != base
+        other_prompt = [SystemMessage(content="t"), HumanMessage(content="oi")]
+        assert ResponseCache("gpt", ["calculator"]).key(other_prompt) != base
+
+    def test_ignores_tool_call_ids_but_not_tool_results(self):
+        rc = ResponseCache("gpt", ["calculator"])
+
+        def turn(call_id, output):
+            return [
+                HumanMessage(content="2+2?"),
+                _tool_call(call_id),
+                ToolMessage(content=output, name="calculator", tool_call_id=call_id),
+            ]
+
+        assert rc.key(turn("call_a", "4")) == rc.key(turn("call_b", "4"))
+        assert rc.key(turn("call_a", "4")) != rc.key(turn("call_a", "5"))
+
+
+class TestCacheable:
+    def test_rules(self):
+        assert ResponseCache.cacheable(AIMessage(content="resposta"))
+        assert ResponseCache.cacheable(_tool_call())
+        assert not ResponseCache.cacheable(AIMessage(content="  "))
+        side_effect = AIMessage(
+            content="",
+            tool_calls=[{"name": "github_create_pr", "args": {}, "id": "c1"}],
+        )
+        assert not ResponseCache.cacheable(side_effect)
+
+    @pytest.mark.asyncio
+    async def test_hit_gets_fresh_tool_call_ids(self, redis_store):
+        rc = ResponseCache("gpt", ["calculator"])
+        messages = [HumanMessage(content="2+2?")]
+        await rc.put(messages, _tool_call("call_original"))
+
+        first = await rc.get(messages)
+        second = await rc.get(messages)
+
+        assert first.tool_calls[0]["args"] == {"expression": "2+2"}
+        assert first.tool_calls[0]["id"] != "call_original"
+        assert first.tool_calls[0]["id"] != second.tool_calls[0]["id"]
+
+    @pytest.mark.asyncio
+    async def test_miss_without_redis(self, monkeypatch):
+        monkeypatch.setattr(cache, "get_redis", lambda *a: None)
+        rc = ResponseCache("gpt", ["calculator"])
+        await rc.put([HumanMessage(content="oi")], AIMessage(content="ola"))
+        assert await rc.get([HumanMessage(content="oi")]) is None
+
+
+class FakeModel:
+    """Pede a calculadora e depois responde com o resultado."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(content=f"O resultado e {messages[-1].content}.")
+        return _tool_call(f"call_{self.calls}")
+
+
+class TestGraphResponseCache:
+    @pytest.mark.asyncio
+    async def test_repeated_question_skips_model(self, monkeypatch, redis_store):
+        from jarvis import graph as graph_module
+
+        model = FakeModel()
+        monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: model)
+        graph = graph_module.build_graph(
+            "gpt", "system", 3, checkpointer=MemorySaver(),
+            tools=[calculator], response_cache_ttl=300,
+        )
+
+        async def ask(thread_id):
+            return [e async for e in stream_chat(graph, "Quanto e 2+2?", 5, thread_id)]
+
+        first = await ask("u:1")
+        assert model.calls == 2
+        second = await ask("u:2")
+        assert model.calls == 2
+
+        types = [e["type"] for e in second]
+        assert types == ["tool_start", "tool_end", "token"]
+        assert second[-1]["content"] == "O resultado e 4."
+        assert [e["type"] for e in first] == types
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self, monkeypatch, redis_store):
+        from jarvis import graph as graph_module
+
+        model = FakeModel()
+        monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: model)
+        graph = graph_module.build_graph(
+            "gpt", "system", 3, checkpointer=MemorySaver(), tools=[calculator],
+        )
+
+        for thread_id in ("u:1", "u:2"):
+            [e async for e in stream_chat(graph, "Quanto e 2+2?", 5, thread_id)]
+
+        assert model.calls == 4
+        assert redis_store == {}
@@ -0,0 +1,154 @@
+"""Testes para o cache semantico de respostas do chat."""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from jarvis.chat import stream_chat
+from jarvis.semantic_cache import SemanticCache, standalone_question, turn_tool_names
+from jarvis.tools import calculator
+from jarvis.vector import HashingEmbedder
+
+
+def _cache(**kwargs):
+    return SemanticCache(HashingEmbedder(), **kwargs)
+
+
+class TestSemanticCache:
+    @pytest.mark.asyncio
+    async def test_paraphrase_hits(self):
+        cache = _cache()
+        assert await cache.store("Qual a rodada atual?", "Rodada 12.", [])
+
+        assert await cache.lookup("qual e a rodada atual") == "Rodada 12."
+        assert await cache.lookup("quem e o artilheiro?") is None
+
+    @pytest.mark.asyncio
+    async def test_numbers_must_match(self):
+        cache = _cache()
+        await cache.store("melhores atacantes da rodada 10", "Fulano.", [])
+
+        assert await cache.lookup("melhores atacantes da rodada 11") is None
+        assert await cache.lookup("melhores atacantes da Rodada 10") == "Fulano."
+
+    def test_ttl_follows_tool_freshness(self):
+        cache = _cache(ttl_seconds=3600)
+        assert cache.ttl_for([]) == 3600
+        assert cache.ttl_for(["calculator"]) == 3600
+        assert cache.ttl_for(["cartola_matches", "cartola_market_status"]) == 300
+        assert cache.ttl_for(["current_time"]) == 0
+        assert cache.ttl_for(["github_create_pr"]) == 0
+
+    @pytest.mark.asyncio
+    async def test_uncacheable_tools_are_not_stored(self):
+        cache = _cache()
+        assert not await cache.store("que horas sao?", "10h", ["current_time"])
+        assert await cache.lookup("que horas sao?") is None
+
+
+class TestTurnHelpers:
+    def test_standalone_question(self):
+        single = [SystemMessage(content="s"), HumanMessage(content=" oi ")]
+        assert standalone_question(single) == "oi"
+        history = [
+            HumanMessage(content="quem e o Pedro?"),
+            AIMessage(content="Atacante."),
+            HumanMessage(content="e o preco dele?"),
+        ]
+        assert standalone_question(history) is None
+
+    def test_turn_tool_names(self):
+        messages = [
+            HumanMessage(content="a"),
+            ToolMessage(content="x", name="calculator", tool_call_id="1"),
+            HumanMessage(content="b"),
+            AIMessage(content="", tool_calls=[{"name": "cartola_matches", "args": {}, "id": "2"}]),
+            ToolMessage(content="y", name="cartola_matches", tool_call_id="2"),
+        ]
+        assert turn_tool_names(messages) == ["cartola_matches"]
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = 0
+
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(content=f"Da {messages[-1].content}.")
+        call = {"name": "calculator", "args": {"expression": "2+2"}, "id": f"c{self.calls}"}
+        return AIMessage(content="", tool_calls=[call])
+
+
+class TestGraphSemanticCache:
+    @pytest.mark.asyncio
+    async def test_paraphrase_in_new_thread_skips_model(self, monkeypatch):
+        from jarvis import graph as graph_module
+
+        model = FakeModel()
+        monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: model)
+        graph = graph_module.build_graph(
+            "gpt", "system", 3, checkpointer=MemorySaver(),
+            tools=[calculator], semantic_cache=_cache(),
+        )
+
+        first = [e async for e in stream_chat(graph, "Quanto e 2+2?", 5, "u:1")]
+        assert model.calls == 2
+        second = [e async for e in stream_chat(graph, "quanto é 2 + 2", 5, "u:2")]
+
+        assert model.calls == 2
+        assert second == [{"type": "token", "content": "Da 4."}]
+        assert first[-1] == second[-1]
+
+    @pytest.mark.asyncio
+    async def test_follow_up_turn_is_not_served_from_cache(self, monkeypatch):
+        from jarvis import graph as graph_module
+
+        model = FakeModel()
+        monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: model)
+        graph = graph_module.build_graph(
+            "gpt", "system", 3, checkpointer=MemorySaver(),
+            tools=[calculator], semantic_cache=_cache(),
+        )
+
+        [e async for e in stream_chat(graph, "Quanto e 2+2?", 5, "u:1")]
+        [e async for e in stream_chat(graph, "Quanto e 2+2?", 5, "u:1")]
+
+        # Segundo turno do mesmo thread tem historico: vai ao modelo
+        assert model.calls == 4
+
+    @pytest.mark.asyncio
+    async def test_embedder_failure_falls_through_to_model(self, monkeypatch):
+        from jarvis import graph as graph_module
+
+        class BrokenEmbedder(HashingEmbedder):
+            async def embed(self, text):
+                raise ConnectionError("embeddings fora do ar")
+
+        model = FakeModel()
+        monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: model)
+        graph = graph_module.build_graph(
+            "gpt", "system", 3, checkpointer=MemorySaver(),
+            tools=[calculator], semantic_cache=SemanticCache(BrokenEmbedder()),
+        )
+
+        events = [e async for e in stream_chat(graph, "Quanto e 2+2?", 5, "u:1")]
+
+        assert model.calls == 2
+        assert events[-1] == {"type": "token", "content": "Da 4."}
+
+    def test_chat_graph_rebuild_reuses_startup_cache(self, monkeypatch, test_settings):
+        from jarvis import graph_cache
+
+        built = []
+        monkeypatch.setattr(graph_cache, "build_graph", lambda **kwargs: built.append(kwargs))
+        cache = _cache()
+        graph_cache.build_chat_graph(test_settings, {}, semantic_cache=cache)
+        graph_cache.build_chat_graph(
+            test_settings, {"disabled_tools": ["calculator"]}, semantic_cache=cache,
+        )
+
+        assert [kwargs["semantic_cache"] for kwargs in built] == [cache, cache]
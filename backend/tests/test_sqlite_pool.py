@@ -0,0 +1,66 @@
+"""Testes para o pool SQLite (WAL, writer + readers)."""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from jarvis.db import create_user, get_user_by_id, init_db, list_users
+
+
+@pytest_asyncio.fixture
+async def pool(tmp_path):
+    pool = await init_db(str(tmp_path / "auth.db"), readers=2)
+    yield pool
+    await pool.close()
+
+
+class TestSqlitePool:
+    @pytest.mark.asyncio
+    async def test_file_db_uses_wal(self, pool):
+        async with pool.read() as conn:
+            cursor = await conn.execute("PRAGMA journal_mode")
+            row = await cursor.fetchone()
+        assert row[0] == "wal"
+
+    @pytest.mark.asyncio
+    async def test_pragmas_applied(self, pool):
+        async with pool.read() as conn:
+            cursor = await conn.execute("PRAGMA synchronous")
+            synchronous = (await cursor.fetchone())[0]
+        assert synchronous == 1  # NORMAL
+
+    @pytest.mark.asyncio
+    async def test_readers_are_query_only(self, pool):
+        async with pool.read() as conn:
+            with pytest.raises(Exception):
+                await conn.execute("DELETE FROM users")
+
+    @pytest.mark.asyncio
+    async def test_readers_see_committed_writes(self, pool):
+        user = await create_user(pool, "alice", "alice@test.com", "s")
+        results = await asyncio.gather(
+            *(get_user_by_id(pool, user["id"]) for _ in range(5))
+        )
+        assert all(r["username"] == "alice" for r in results)
+
+    @pytest.mark.asyncio
+    async def test_write_block_rolls_back_on_error(self, pool):
+        with pytest.raises(RuntimeError):
+            async with pool.write() as conn:
+                await conn.execute(
+                    "INSERT INTO users (username, email, hashed_password, created_at, updated_at)"
+                    " VALUES ('x', 'x@t', 'h', 'now', 'now')"
+                )
+                raise RuntimeError("falha")
+        assert await list_users(pool) == []
+
+    @pytest.mark.asyncio
+    async def test_memory_db_shares_single_connection(self):
+        pool = await init_db(":memory:")
+        try:
+            user = await create_user(pool, "bob", "bob@test.com", "s")
+            assert (await get_user_by_id(pool, user["id"]))["username"] == "bob"
+            assert pool.size == 1
+        finally:
+            await pool.close()
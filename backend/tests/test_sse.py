@@ -0,0 +1,193 @@
+"""Testes para o streaming SSE com buffer de replay."""
+
+import asyncio
+import json
+
+import pytest
+
+from jarvis.sse import (
+    ReplayUnavailable,
+    SseStreamRegistry,
+    parse_last_event_id,
+    sse_response_body,
+)
+
+
+def _events(*texts, gate: asyncio.Event | None = None):
+    async def gen():
+        for i, text in enumerate(texts):
+            if gate is not None and i == 1:
+                await gate.wait()
+            yield {"type": "token", "content": text}
+    return gen()
+
+
+def _parse(body: str) -> list[dict]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = [line for line in block.splitlines() if not line.startswith(":")]
+        fields = dict(line.split(": ", 1) for line in lines)
+        if fields:
+            events.append({
+                "id": fields.get("id"),
+                "event": fields["event"],
+                "data": json.loads(fields["data"]),
+            })
+    return events
+
+
+async def _collect(stream, last_seq=-1, heartbeat=15) -> list[dict]:
+    chunks = [chunk async for chunk in sse_response_body(stream, last_seq, heartbeat)]
+    return _parse("".join(chunks))
+
+
+class TestSseStreamRegistry:
+    @pytest.mark.asyncio
+    async def test_streams_typed_events_with_ids(self):
+        registry = SseStreamRegistry()
+        stream = registry.start(1, _events("Ola", " mundo"))
+
+        events = await _collect(stream)
+
+        assert [e["event"] for e in events] == ["token", "token", "end"]
+        assert [e["id"] for e in events] == [f"{stream.stream_id}:{i}" for i in range(3)]
+        assert events[1]["data"] == {"type": "token", "content": " mundo"}
+
+    @pytest.mark.asyncio
+    async def test_resume_after_last_event_id(self):
+        registry = SseStreamRegistry()
+        gate = asyncio.Event()
+        stream = registry.start(1, _events("a", "b", "c", gate=gate))
+
+        # Cliente recebe o primeiro evento e cai; o run continua sem ele
+        first = await anext(sse_response_body(stream))
+        assert first.startswith(f"id: {stream.stream_id}:0\n")
+        gate.set()
+        await stream.task
+
+        last_seq = parse_last_event_id(f"{stream.stream_id}:0")
+        resumed = await _collect(registry.get(stream.stream_id, 1), last_seq)
+        assert [e["data"].get("content") for e in resumed] == ["b", "c", None]
+        assert resumed[-1]["event"] == "end"
+
+    @pytest.mark.asyncio
+    async def test_live_subscriber_waits_for_new_events(self):
+        registry = SseStreamRegistry()
+        gate = asyncio.Event()
+        stream = registry.start(1, _events("a", "b", gate=gate))
+
+        collector = asyncio.create_task(_collect(stream))
+        await asyncio.sleep(0.01)
+        assert not collector.done()
+        gate.set()
+
+        events = await asyncio.wait_for(collector, 1)
+        assert [e["event"] for e in events] == ["token", "token", "end"]
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_while_idle(self):
+        registry = SseStreamRegistry()
+        gate = asyncio.Event()
+        stream = registry.start(1, _events("a", "b", gate=gate))
+        body = sse_response_body(stream, heartbeat=0.01)
+
+        assert (await anext(body)).startswith("id:")
+        assert await anext(body) == ": keepalive\n\n"
+        gate.set()
+        await body.aclose()
+
+    @pytest.mark.asyncio
+    async def test_evicted_events_report_error(self):
+        registry = SseStreamRegistry(max_events=2)
+        stream = registry.start(1, _events("a", "b", "c"))
+        await stream.task
+
+        with pytest.raises(ReplayUnavailable):
+            stream.since(-1)
+        events = await _collect(stream)
+        assert len(events) == 1
+        assert events[0]["event"] == "error"
+        assert events[0]["id"] is None
+
+    @pytest.mark.asyncio
+    async def test_run_waits_for_slow_live_subscriber(self):
+        registry = SseStreamRegistry(max_events=2)
+        stream = registry.start(1, _events("a", "b", "c", "d", "e"))
+        body = sse_response_body(stream)
+
+        first = await anext(body)
+        await asyncio.sleep(0.01)
+        # Buffer cheio com eventos que o cliente ainda nao leu: o run espera
+        assert not stream.done
+
+        rest = _parse(first + "".join([chunk async for chunk in body]))
+        assert [e["data"].get("content") for e in rest] == ["a", "b", "c", "d", "e", None]
+        assert rest[-1]["event"] == "end"
+
+    @pytest.mark.asyncio
+    async def test_stuck_subscriber_is_disconnected(self):
+        registry = SseStreamRegistry(max_events=2, slow_subscriber_seconds=0.01)
+        stream = registry.start(1, _events("a", "b", "c", "d", "e"))
+        body = sse_response_body(stream)
+
+        first = await anext(body)
+        await asyncio.wait_for(stream.task, 1)
+
+        events = _parse(first + "".join([chunk async for chunk in body]))
+        assert events[-1]["event"] == "error"
+        assert events[-1]["id"] is None
+        assert "end" not in [e["event"] for e in events]
+
+    @pytest.mark.asyncio
+    async def test_limits_running_streams_per_user(self):
+        registry = SseStreamRegistry(max_streams_per_user=1)
+        gate = asyncio.Event()
+        first = registry.start(1, _events("a", "b", gate=gate))
+
+        assert registry.start(1, _events("x")) is None
+        assert registry.start(2, _events("x")) is not None
+
+        gate.set()
+        await first.task
+        assert registry.start(1, _events("x")) is not None
+
+    @pytest.mark.asyncio
+    async def test_run_error_becomes_error_event(self):
+        async def failing():
+            yield {"type": "token", "content": "x"}
+            raise RuntimeError("falhou")
+
+        registry = SseStreamRegistry()
+        stream = registry.start(1, failing())
+
+        events = await _collect(stream)
+        assert events[-1]["data"] == {"type": "error", "content": "falhou"}
+
+    @pytest.mark.asyncio
+    async def test_get_checks_owner_and_ttl(self):
+        registry = SseStreamRegistry(ttl_seconds=0)
+        stream = registry.start(1, _events("a"))
+
+        assert registry.get(stream.stream_id, 2) is None
+        assert registry.get(stream.stream_id, 1) is stream
+        await stream.task
+        assert registry.get(stream.stream_id, 1) is None
+
+    @pytest.mark.asyncio
+    async def test_close_cancels_running_streams(self):
+        registry = SseStreamRegistry()
+        stream = registry.start(1, _events("a", "b", gate=asyncio.Event()))
+        await asyncio.sleep(0)
+
+        await registry.close()
+
+        assert stream.task.cancelled()
+        assert stream.done
+
+
+class TestParseLastEventId:
+    def test_formats(self):
+        assert parse_last_event_id(None) == -1
+        assert parse_last_event_id("abc:7") == 7
+        assert parse_last_event_id("3") == 3
+        assert parse_last_event_id("lixo") == -1
@@ -0,0 +1,195 @@
+"""Testes para a serializacao de turnos por thread."""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+import redis
+
+from jarvis.thread_lock import (
+    RedisThreadLock,
+    ThreadBusy,
+    ThreadLockManager,
+    locked_events,
+)
+
+
+class FakeDistributedLock:
+    """Lock compartilhado entre "processos" (gerenciadores) do teste."""
+
+    def __init__(self):
+        self.held: set[str] = set()
+        self.attempts = 0
+
+    async def try_acquire(self, thread_id):
+        self.attempts += 1
+        if thread_id in self.held:
+            return False
+        self.held.add(thread_id)
+        return True
+
+    async def release(self, thread_id):
+        self.held.discard(thread_id)
+
+    async def close(self):
+        pass
+
+
+class TestThreadLockManager:
+    @pytest.mark.asyncio
+    async def test_queue_serializes_same_thread(self):
+        locks = ThreadLockManager()
+        running = 0
+        peak = 0
+
+        async def turn():
+            nonlocal running, peak
+            async with locks.hold("u:t"):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(turn() for _ in range(5)))
+
+        assert peak == 1
+        assert not locks.is_busy("u:t")
+
+    @pytest.mark.asyncio
+    async def test_different_threads_run_concurrently(self):
+        locks = ThreadLockManager(policy="reject")
+        async with locks.hold("u:a"):
+            async with locks.hold("u:b"):
+                assert locks.is_busy("u:a") and locks.is_busy("u:b")
+
+    @pytest.mark.asyncio
+    async def test_reject_policy_fails_fast(self):
+        locks = ThreadLockManager(policy="reject")
+        async with locks.hold("u:t"):
+            with pytest.raises(ThreadBusy):
+                async with locks.hold("u:t"):
+                    pass
+        async with locks.hold("u:t"):
+            pass
+
+    @pytest.mark.asyncio
+    async def test_queue_gives_up_after_wait(self):
+        locks = ThreadLockManager(wait_seconds=0.02)
+        async with locks.hold("u:t"):
+            with pytest.raises(ThreadBusy):
+                async with locks.hold("u:t"):
+                    pass
+
+    def test_invalid_policy(self):
+        with pytest.raises(ValueError):
+            ThreadLockManager(policy="lifo")
+
+    @pytest.mark.asyncio
+    async def test_distributed_lock_excludes_other_process(self):
+        shared = FakeDistributedLock()
+        worker_a = ThreadLockManager(policy="reject", distributed=shared)
+        worker_b = ThreadLockManager(policy="reject", distributed=shared)
+
+        async with worker_a.hold("u:t"):
+            with pytest.raises(ThreadBusy):
+                async with worker_b.hold("u:t"):
+                    pass
+            # O lock local de B foi liberado apesar da falha
+            assert not worker_b.is_busy("u:t")
+        assert shared.held == set()
+
+    @pytest.mark.asyncio
+    async def test_distributed_queue_polls_until_released(self):
+        shared = FakeDistributedLock()
+        worker_a = ThreadLockManager(distributed=shared)
+        worker_b = ThreadLockManager(wait_seconds=2, distributed=shared)
+        order = []
+
+        async def first():
+            async with worker_a.hold("u:t"):
+                order.append("a")
+                await asyncio.sleep(0.1)
+
+        async def second():
+            await asyncio.sleep(0.01)
+            async with worker_b.hold("u:t"):
+                order.append("b")
+
+        await asyncio.gather(first(), second())
+
+        assert order == ["a", "b"]
+        assert shared.attempts > 2
+
+
+class TestRedisThreadLock:
+    @pytest.mark.asyncio
+    async def test_acquire_and_release_with_token(self):
+        client = MagicMock()
+        client.set.return_value = True
+        lock = RedisThreadLock(client, ttl_seconds=60)
+
+        assert await lock.try_acquire("u:t")
+        key, token = client.set.call_args.args
+        assert key == "jarvis:thread-lock:u:t"
+        assert client.set.call_args.kwargs == {"nx": True, "px": 60_000}
+
+        await lock.release("u:t")
+        assert client.eval.call_args.args[-2:] == (key, token)
+
+    @pytest.mark.asyncio
+    async def test_busy_key(self):
+        client = MagicMock()
+        client.set.return_value = None
+        lock = RedisThreadLock(client)
+
+        assert not await lock.try_acquire("u:t")
+        await lock.release("u:t")
+        client.eval.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_redis_error_falls_back_to_local_lock(self):
+        client = MagicMock()
+        client.set.side_effect = redis.ConnectionError("down")
+        lock = RedisThreadLock(client)
+
+        assert await lock.try_acquire("u:t")
+
+
+class TestLockedEvents:
+    @pytest.mark.asyncio
+    async def test_busy_thread_fails_before_graph_runs(self):
+        state = MagicMock()
+        state.thread_locks = ThreadLockManager(policy="reject")
+        started = False
+
+        async def events():
+            nonlocal started
+            started = True
+            yield {"type": "token", "content": "x"}
+
+        async with state.thread_locks.hold("u:t"):
+            with pytest.raises(ThreadBusy):
+                await anext(locked_events(state, "u:t", events()))
+        assert not started
+
+    @pytest.mark.asyncio
+    async def test_holds_lock_for_whole_stream(self):
+        state = MagicMock()
+        state.thread_locks = ThreadLockManager()
+        closed = False
+
+        async def events():
+            nonlocal closed
+            try:
+                yield {"type": "token", "content": "a"}
+                yield {"type": "token", "content": "b"}
+            finally:
+                closed = True
+
+        stream = locked_events(state, "u:t", events())
+        await anext(stream)
+        assert state.thread_locks.is_busy("u:t")
+        await stream.aclose()
+
+        assert closed
+        assert not state.thread_locks.is_busy("u:t")
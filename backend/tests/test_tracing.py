@@ -0,0 +1,167 @@
+"""Testes para os spans exportados em JSONL."""
+
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from jarvis.chat import stream_chat
+from jarvis.checkpoint import TracedCheckpointer, traced_checkpointer
+from jarvis.sqlite_pool import open_sqlite_pool
+from jarvis.tools import calculator
+from jarvis.tracing import (
+    STATUS_ERROR,
+    configure_tracing,
+    current_trace_id,
+    shutdown_tracing,
+    span,
+    start_trace,
+    trace,
+    traced_events,
+    traced_iter,
+)
+
+
+@pytest.fixture
+def spans_file(tmp_path):
+    """Liga o tracing; ``read()`` fecha o exporter e devolve os spans."""
+    path = tmp_path / "spans.jsonl"
+    configure_tracing(str(path))
+
+    def read():
+        shutdown_tracing()
+        return [json.loads(line) for line in path.read_text().splitlines()]
+
+    yield read
+    shutdown_tracing()
+
+
+class ToolThenAnswerModel:
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages):
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(content="Da 4.")
+        call = {"name": "calculator", "args": {"expression": "2+2"}, "id": "c1"}
+        return AIMessage(content="", tool_calls=[call])
+
+
+class TestSpans:
+    def test_disabled_records_nothing(self):
+        assert start_trace() is None
+        with trace("root", None) as root, span("child") as child:
+            assert root is None and child is None
+
+    def test_child_links_to_parent_and_records_error(self, spans_file):
+        trace_id = start_trace()
+        with trace("root", trace_id, user="a"):
+            assert current_trace_id() == trace_id
+            with pytest.raises(ZeroDivisionError):
+                with span("child"):
+                    1 / 0
+        assert current_trace_id() is None
+
+        child, root = spans_file()
+        assert root["parent_span_id"] is None
+        assert root["attributes"] == {"user": "a"}
+        assert child["parent_span_id"] == root["span_id"]
+        assert child["trace_id"] == trace_id
+        assert child["status"] == STATUS_ERROR
+        assert child["error"].startswith("ZeroDivisionError")
+        assert root["duration_ms"] >= child["duration_ms"]
+
+    def test_sample_rate_zero_skips_traces(self, tmp_path):
+        configure_tracing(str(tmp_path / "spans.jsonl"), sample_rate=0.0)
+        try:
+            assert start_trace() is None
+        finally:
+            shutdown_tracing()
+
+    def test_span_without_trace_is_not_recorded(self, spans_file):
+        with span("orphan") as orphan:
+            assert orphan is None
+        assert spans_file() == []
+
+
+@pytest.mark.asyncio
+async def test_graph_turn_span_tree(monkeypatch, spans_file):
+    from jarvis import graph as graph_module
+
+    monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kwargs: ToolThenAnswerModel())
+    graph = graph_module.build_graph(
+        "gpt", "system", 3, checkpointer=traced_checkpointer(MemorySaver()),
+        tools=[calculator],
+    )
+    assert isinstance(graph.checkpointer, TracedCheckpointer)
+
+    trace_id = start_trace()
+    events = traced_events(
+        "chat.turn", trace_id, stream_chat(graph, "Quanto e 2+2?", 5, "1:a"), channel="ws",
+    )
+    assert [e async for e in events][-1] == {"type": "token", "content": "Da 4."}
+
+    spans = spans_file()
+    assert {s["trace_id"] for s in spans} == {trace_id}
+    by_id = {s["span_id"]: s for s in spans}
+    [root] = [s for s in spans if s["parent_span_id"] is None]
+    assert root["name"] == "chat.turn"
+
+    def parent_name(s):
+        return by_id[s["parent_span_id"]]["name"]
+
+    names = [s["name"] for s in spans]
+    assert names.count("graph.assistant") == 2
+    assert names.count("model.invoke") == 2
+    assert {parent_name(s) for s in spans if s["name"] == "model.invoke"} == {"graph.assistant"}
+    [tool] = [s for s in spans if s["name"] == "tool.calculator"]
+    assert parent_name(tool) == "graph.tools"
+    assert tool["attributes"]["status"] == "success"
+    assert "checkpoint.get" in names
+    assert "checkpoint.put" in names
+
+
+@pytest.mark.asyncio
+async def test_stream_span_is_not_active_while_consumer_runs(spans_file):
+    async def items():
+        with span("produce"):
+            yield 1
+        yield 2
+
+    trace_id = start_trace()
+    async for _ in traced_events("chat.turn", trace_id, items()):
+        # Entre eventos o consumidor nao esta dentro do span do stream
+        assert current_trace_id() is None
+    with trace("request", start_trace()):
+        async for _ in traced_iter("checkpoint.list", items()):
+            with span("consumer"):
+                pass
+
+    spans = spans_file()
+    by_name = {}
+    for s in spans:
+        by_name.setdefault(s["name"], []).append(s)
+    [stream_root] = by_name["chat.turn"]
+    [request] = by_name["request"]
+    [listing] = by_name["checkpoint.list"]
+    assert by_name["produce"][0]["parent_span_id"] == stream_root["span_id"]
+    assert by_name["produce"][1]["parent_span_id"] == listing["span_id"]
+    assert {s["parent_span_id"] for s in by_name["consumer"]} == {request["span_id"]}
+    assert listing["parent_span_id"] == request["span_id"]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pool_blocks_are_spans(tmp_path, spans_file):
+    pool = await open_sqlite_pool(str(tmp_path / "auth.db"), readers=1)
+    try:
+        with trace("root", start_trace()):
+            async with pool.write() as conn:
+                await conn.execute("CREATE TABLE t (x INTEGER)")
+            async with pool.read() as conn:
+                await conn.execute("SELECT * FROM t")
+    finally:
+        await pool.close()
+
+    names = [s["name"] for s in spans_file()]
+    assert names == ["db.write", "db.read", "root"]
@@ -0,0 +1,221 @@
+"""Testes para a contabilidade de tokens e latencia por turno."""
+
+import pytest
+import pytest_asyncio
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from jarvis import cache
+from jarvis import db as db_module
+from jarvis.chat import invoke_chat, stream_chat
+from jarvis.db import chat_turn_stats, init_db, insert_chat_turns, list_chat_turns
+from jarvis.tools import calculator
+from jarvis.turn_metrics import (
+    CHANNEL_STREAM,
+    STATUS_CANCELLED,
+    STATUS_COMPLETED,
+    TurnMetrics,
+    record_turn,
+    recorded_events,
+)
+from jarvis.write_buffer import ChatTurnBuffer
+
+
+@pytest_asyncio.fixture
+async def db():
+    conn = await init_db(":memory:")
+    yield conn
+    await conn.close()
+
+
+class ToolThenAnswerModel:
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages):
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(
+                content="Da 4.",
+                usage_metadata={
+                    "input_tokens": 1200, "output_tokens": 5, "total_tokens": 1205,
+                    "input_token_details": {"cache_read": 1024},
+                },
+            )
+        call = {"name": "calculator", "args": {"expression": "2+2"}, "id": "c1"}
+        return AIMessage(
+            content="", tool_calls=[call],
+            usage_metadata={"input_tokens": 1100, "output_tokens": 12, "total_tokens": 1112},
+        )
+
+
+def _graph(monkeypatch, **kwargs):
+    from jarvis import graph as graph_module
+
+    monkeypatch.setattr(graph_module, "ChatOpenAI", lambda **kw: ToolThenAnswerModel())
+    return graph_module.build_graph(
+        "gpt", "system", 3, checkpointer=MemorySaver(), tools=[calculator], **kwargs,
+    )
+
+
+class TestGraphAccounting:
+    @pytest.mark.asyncio
+    async def test_stream_counts_calls_tokens_and_first_token(self, monkeypatch):
+        graph = _graph(monkeypatch)
+        metrics = TurnMetrics()
+
+        events = [
+            e async for e in stream_chat(graph, "Quanto e 2+2?", 5, "1:a", metrics=metrics)
+        ]
+        metrics.finish()
+
+        assert events[-1] == {"type": "token", "content": "Da 4."}
+        assert metrics.model_calls == 2
+        assert metrics.tool_calls == 1
+        assert metrics.input_tokens == 2300
+        assert metrics.cached_input_tokens == 1024
+        assert metrics.output_tokens == 17
+        assert metrics.ttft_ms is not None
+        assert metrics.duration_ms >= metrics.ttft_ms
+
+    @pytest.mark.asyncio
+    async def test_invoke_counts_response_cache_hit(self, monkeypatch):
+        store = {}
+        monkeypatch.setattr(cache, "get_json", lambda key: store.get(key))
+        monkeypatch.setattr(
+            cache, "set_json", lambda key, ttl, value: store.__setitem__(key, value),
+        )
+        graph = _graph(monkeypatch, response_cache_ttl=60)
+        await invoke_chat(graph, "Quanto e 2+2?", 5, "1:a")
+
+        metrics = TurnMetrics()
+        await invoke_chat(graph, "Quanto e 2+2?", 5, "1:b", metrics=metrics)
+
+        assert metrics.cache_hits == 2
+        assert metrics.model_calls == 0
+        assert metrics.input_tokens == 0
+
+
+class FakeBuffer:
+    def __init__(self):
+        self.turns = []
+
+    def submit(self, turn):
+        self.turns.append(turn)
+
+
+class FakeState:
+    def __init__(self):
+        self.turn_buffer = FakeBuffer()
+
+
+class TestRecordTurn:
+    def test_without_buffer_is_noop(self):
+        record_turn(object(), "1:a", 1, CHANNEL_STREAM, STATUS_COMPLETED, TurnMetrics())
+
+    @pytest.mark.asyncio
+    async def test_recorded_events_marks_cancelled_stream(self):
+        async def events():
+            yield {"type": "token", "content": "a"}
+            yield {"type": "token", "content": "b"}
+
+        state = FakeState()
+        stream = recorded_events(state, "1:a", 1, CHANNEL_STREAM, TurnMetrics(), events())
+        assert (await stream.__anext__())["content"] == "a"
+        await stream.aclose()
+
+        [turn] = state.turn_buffer.turns
+        assert turn["status"] == STATUS_CANCELLED
+        assert turn["channel"] == CHANNEL_STREAM
+        assert turn["duration_ms"] is not None
+
+    @pytest.mark.asyncio
+    async def test_recorded_events_marks_completed_stream(self):
+        async def events():
+            yield {"type": "token", "content": "a"}
+
+        state = FakeState()
+        stream = recorded_events(state, "1:a", 1, CHANNEL_STREAM, TurnMetrics(), events())
+        assert [e async for e in stream] == [{"type": "token", "content": "a"}]
+        assert state.turn_buffer.turns[0]["status"] == STATUS_COMPLETED
+
+
+def _turn(thread_id="1:a", user_id=1, channel="sse", status="completed", **fields):
+    metrics = TurnMetrics()
+    turn = {
+        "thread_id": thread_id, "user_id": user_id, "channel": channel,
+        "status": status, **metrics.as_fields(),
+    }
+    turn.update(fields)
+    return turn
+
+
+class TestChatTurnStorage:
+    @pytest.mark.asyncio
+    async def test_insert_and_list(self, db):
+        await insert_chat_turns(db, [
+            _turn(duration_ms=300, input_tokens=50),
+            _turn(thread_id="2:b", user_id=2, duration_ms=900),
+            _turn(duration_ms=100),
+        ])
+
+        turns, total = await list_chat_turns(db)
+        assert total == 3
+        assert [t["duration_ms"] for t in turns] == [100, 900, 300]
+        assert turns[2]["input_tokens"] == 50
+        assert turns[0]["created_at"] is not None
+
+        slowest, _ = await list_chat_turns(db, slowest=True, limit=1)
+        assert slowest[0]["duration_ms"] == 900
+
+        mine, total = await list_chat_turns(db, user_id=1)
+        assert total == 2
+        assert {t["thread_id"] for t in mine} == {"1:a"}
+
+        second_page, total = await list_chat_turns(db, limit=2, offset=2)
+        assert total is None
+        assert [t["duration_ms"] for t in second_page] == [300]
+
+    @pytest.mark.asyncio
+    async def test_stats_by_channel_and_status(self, db):
+        await insert_chat_turns(db, [
+            _turn(duration_ms=ms, ttft_ms=ms // 10, output_tokens=10, model_calls=1)
+            for ms in (100, 200, 300, 400)
+        ] + [_turn(channel="ws", status="cancelled", duration_ms=50)])
+
+        stats = {(s["channel"], s["status"]): s for s in await chat_turn_stats(db)}
+        sse = stats[("sse", "completed")]
+        assert sse["count"] == 4
+        assert sse["avg_duration_ms"] == 250
+        assert sse["p50_duration_ms"] == 200
+        assert sse["p95_duration_ms"] == 400
+        assert sse["p50_ttft_ms"] == 20
+        assert sse["avg_model_calls"] == 1
+        assert sse["output_tokens"] == 40
+        assert stats[("ws", "cancelled")]["count"] == 1
+        assert stats[("ws", "cancelled")]["p50_ttft_ms"] is None
+
+    @pytest.mark.asyncio
+    async def test_buffer_writes_on_flush(self, db):
+        buffer = ChatTurnBuffer(db_module, db, flush_interval=60)
+        buffer.submit(_turn(duration_ms=10))
+        buffer.submit(_turn(duration_ms=20))
+
+        assert (await list_chat_turns(db))[1] == 0
+        assert await buffer.flush() == 2
+        assert (await list_chat_turns(db))[1] == 2
+
+    @pytest.mark.asyncio
+    async def test_buffer_stays_bounded_while_writes_fail(self):
+        from unittest.mock import AsyncMock
+
+        failing = AsyncMock()
+        failing.insert_chat_turns.side_effect = RuntimeError("db fora")
+        buffer = ChatTurnBuffer(failing, None, flush_interval=60, max_pending=3)
+        for ms in range(5):
+            buffer.submit(_turn(duration_ms=ms))
+
+        assert buffer.pending == 3
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        buffer.submit(_turn(duration_ms=99))
+        assert buffer.pending == 3
@@ -0,0 +1,193 @@
+"""Testes para o cache de usuarios autenticados."""
+
+import asyncio
+
+import pytest
+import redis
+
+from jarvis.user_cache import RedisUserCache, UserCache, get_user_cached, invalidate_user
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+USER = {"id": 1, "username": "alice", "role": "user", "is_active": True}
+
+
+class TestUserCache:
+    @pytest.mark.asyncio
+    async def test_get_after_set(self):
+        cache = UserCache(30, clock=FakeClock())
+        await cache.set(1, USER)
+        assert await cache.get(1) == USER
+
+    @pytest.mark.asyncio
+    async def test_returns_copy(self):
+        cache = UserCache(30, clock=FakeClock())
+        await cache.set(1, USER)
+        (await cache.get(1))["role"] = "admin"
+        assert (await cache.get(1))["role"] == "user"
+
+    @pytest.mark.asyncio
+    async def test_entry_expires(self):
+        clock = FakeClock()
+        cache = UserCache(30, clock=clock)
+        await cache.set(1, USER)
+        clock.now += 30
+        assert await cache.get(1) is None
+
+    @pytest.mark.asyncio
+    async def test_invalidate(self):
+        cache = UserCache(30, clock=FakeClock())
+        await cache.set(1, USER)
+        await cache.invalidate(1)
+        assert await cache.get(1) is None
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used(self):
+        cache = UserCache(30, max_entries=2, clock=FakeClock())
+        await cache.set(1, USER)
+        await cache.set(2, USER)
+        await cache.get(1)
+        await cache.set(3, USER)
+        assert await cache.get(2) is None
+        assert await cache.get(1) is not None
+
+    @pytest.mark.asyncio
+    async def test_password_hash_is_not_cached(self):
+        cache = UserCache(30, clock=FakeClock())
+        await cache.set(1, {**USER, "hashed_password": "$2b$hash"})
+        assert "hashed_password" not in await cache.get(1)
+
+    @pytest.mark.asyncio
+    async def test_invalidate_user_without_cache_is_noop(self):
+        state = type("State", (), {})()
+        await invalidate_user(state, 1)
+
+
+class FakePubSub:
+    def __init__(self, client):
+        self.client = client
+
+    def subscribe(self, **handlers):
+        self.client._check()
+        self.client.handlers.extend(handlers.values())
+
+    def run_in_thread(self, sleep_time, daemon):
+        return self
+
+    def stop(self):
+        self.client.stopped += 1
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.down = False
+        self.gets = 0
+        self.handlers = []
+        self.stopped = 0
+
+    def _check(self):
+        if self.down:
+            raise redis.ConnectionError("down")
+
+    def get(self, key):
+        self._check()
+        self.gets += 1
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self._check()
+        self.data[key] = value
+
+    def delete(self, key):
+        self._check()
+        self.data.pop(key, None)
+
+    def publish(self, channel, message):
+        self._check()
+        for handler in self.handlers:
+            handler({"channel": channel, "data": message})
+
+    def pubsub(self, ignore_subscribe_messages):
+        return FakePubSub(self)
+
+
+class FakeDb:
+    def __init__(self):
+        self.lookups = 0
+
+    async def get_user_by_id(self, conn, user_id):
+        self.lookups += 1
+        return {**USER, "id": user_id, "hashed_password": "$2b$hash"}
+
+
+def _worker_state(client):
+    state = type("State", (), {})()
+    state.user_cache = RedisUserCache(client, 30, clock=FakeClock())
+    state.user_cache.listen()
+    state.db_module = FakeDb()
+    state.auth_db = None
+    return state
+
+
+class TestRedisUserCache:
+    @pytest.mark.asyncio
+    async def test_invalidation_reaches_other_workers(self):
+        client = FakeRedis()
+        worker_a, worker_b = _worker_state(client), _worker_state(client)
+
+        user = await get_user_cached(worker_a, 1)
+        assert "hashed_password" not in user
+        assert "hashed_password" not in client.data["jarvis:user:1"]
+        assert await get_user_cached(worker_b, 1) == user
+        assert worker_b.db_module.lookups == 0
+
+        await invalidate_user(worker_a, 1)
+        await asyncio.sleep(0)
+        await get_user_cached(worker_b, 1)
+        assert worker_b.db_module.lookups == 1
+
+    @pytest.mark.asyncio
+    async def test_local_hit_skips_redis(self):
+        client = FakeRedis()
+        state = _worker_state(client)
+
+        await get_user_cached(state, 1)
+        await get_user_cached(state, 1)
+        await get_user_cached(state, 1)
+        assert client.gets == 1
+        assert state.db_module.lookups == 1
+
+    @pytest.mark.asyncio
+    async def test_local_entries_expire_quickly(self):
+        client = FakeRedis()
+        clock = FakeClock()
+        cache = RedisUserCache(client, 30, local_ttl_seconds=5, clock=clock)
+        await cache.set(1, USER)
+        clock.now += 5
+        assert await cache.get(1) == USER
+        assert client.gets == 1
+
+    @pytest.mark.asyncio
+    async def test_close_stops_listener(self):
+        client = FakeRedis()
+        state = _worker_state(client)
+        state.user_cache.close()
+        assert client.stopped == 1
+
+    @pytest.mark.asyncio
+    async def test_redis_errors_fall_back_to_db(self):
+        client = FakeRedis()
+        client.down = True
+        state = _worker_state(client)
+
+        assert (await get_user_cached(state, 1))["username"] == "alice"
+        await invalidate_user(state, 1)
+        assert state.db_module.lookups == 1
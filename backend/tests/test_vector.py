@@ -0,0 +1,90 @@
+"""Testes para embeddings locais e o indice vetorial em memoria."""
+
+import math
+import time
+
+import pytest
+
+from jarvis.vector import HashingEmbedder, VectorIndex
+from jarvis.vector import index as index_module
+
+
+def _cos(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+class TestHashingEmbedder:
+    def test_normalized_and_deterministic(self):
+        embedder = HashingEmbedder(dim=64)
+        vector = embedder.embed_sync("Qual a rodada atual?")
+        assert len(vector) == 64
+        assert math.isclose(_cos(vector, vector), 1.0, rel_tol=1e-9)
+        assert vector == HashingEmbedder(dim=64).embed_sync("Qual a rodada atual?")
+
+    def test_ignores_case_and_accents(self):
+        embedder = HashingEmbedder()
+        a = embedder.embed_sync("Qual é a rodada ATUAL?")
+        b = embedder.embed_sync("qual e a rodada atual")
+        assert _cos(a, b) > 0.999
+
+    def test_paraphrase_closer_than_unrelated(self):
+        embedder = HashingEmbedder()
+        question = embedder.embed_sync("qual a rodada atual?")
+        paraphrase = embedder.embed_sync("qual e a rodada atual agora")
+        unrelated = embedder.embed_sync("quem e o artilheiro do campeonato?")
+        assert _cos(question, paraphrase) > 0.8
+        assert _cos(question, unrelated) < 0.3
+
+    def test_empty_text(self):
+        assert HashingEmbedder(dim=8).embed_sync("") == [0.0] * 8
+
+
+@pytest.fixture(params=["numpy", "python"])
+def make_index(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(index_module, "np", None)
+    return VectorIndex
+
+
+class TestVectorIndex:
+    def test_returns_best_match_above_threshold(self, make_index):
+        index = make_index(dim=2, max_entries=4)
+        index.add([1.0, 0.0], "x", ttl_seconds=60)
+        index.add([0.0, 1.0], "y", ttl_seconds=60)
+
+        assert [p for _, p in index.search([0.6, 0.8], k=2)] == ["y", "x"]
+        assert [p for _, p in index.search([0.6, 0.8], min_score=0.7)] == ["y"]
+        assert index.search([-1.0, 0.0], min_score=0.5) == []
+
+    def test_expired_entries_are_ignored(self, make_index, monkeypatch):
+        index = make_index(dim=2)
+        index.add([1.0, 0.0], "velho", ttl_seconds=1)
+        now = time.monotonic()
+        monkeypatch.setattr(index_module.time, "monotonic", lambda: now + 5)
+
+        assert index.search([1.0, 0.0]) == []
+
+    def test_ring_buffer_drops_oldest(self, make_index):
+        index = make_index(dim=2, max_entries=2)
+        index.add([1.0, 0.0], "a", ttl_seconds=60)
+        index.add([0.0, 1.0], "b", ttl_seconds=60)
+        index.add([1.0, 0.0], "c", ttl_seconds=60)
+
+        assert len(index) == 2
+        assert [p for _, p in index.search([1.0, 0.0], k=2)] == ["c", "b"]
+
+    def test_empty_index(self, make_index):
+        assert make_index(dim=2).search([1.0, 0.0]) == []
+
+    def test_grows_on_demand_up_to_max_entries(self, make_index, monkeypatch):
+        monkeypatch.setattr(index_module, "INITIAL_CAPACITY", 2)
+        index = make_index(dim=2, max_entries=5)
+        for i in range(7):
+            index.add([1.0, 0.0] if i % 2 else [0.0, 1.0], i, ttl_seconds=60)
+
+        assert len(index) == 5
+        assert sorted(p for _, p in index.search([1.0, 0.0], k=5, min_score=0.5)) == [3, 5]
+        if index_module.np is not None:
+            assert index._matrix.shape == (5, 2)
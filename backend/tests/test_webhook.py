@@ -6,6 +6,7 @@ import json
 from unittest.mock import AsyncMock, patch
 
 import pytest
+import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
 
 from jarvis.webhook import verify_signature
@@ -319,3 +320,189 @@ class TestWebhookEndpoint:
         assert resp.status_code == 200
         assert resp.json()["status"] == "ignored"
         mock_handle.assert_not_called()
+
+
+@pytest_asyncio.fixture
+async def queue_app(app):
+    """App com banco em memoria para enfileirar agent runs."""
+    from unittest.mock import MagicMock
+
+    from jarvis import db as db_module
+    from jarvis.db import init_db
+
+    conn = await init_db(":memory:")
+    app.state.settings.webhook_debounce_seconds = 0
+    app.state.db_module = db_module
+    app.state.auth_db = conn
+    app.state.agent_worker = MagicMock()
+
+    yield app
+
+    await conn.close()
+    for attr in ("db_module", "auth_db", "agent_worker"):
+        delattr(app.state, attr)
+
+
+async def _post_issue_event(app, payload_dict: dict, delivery_id: str = ""):
+    payload = json.dumps(payload_dict).encode()
+    headers = {
+        "X-GitHub-Event": "issues",
+        "X-Hub-Signature-256": _make_signature(payload, "test-secret"),
+        "Content-Type": "application/json",
+    }
+    if delivery_id:
+        headers["X-GitHub-Delivery"] = delivery_id
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        return await client.post("/webhook/github", content=payload, headers=headers)
+
+
+class TestWebhookQueue:
+    @pytest.mark.asyncio
+    @patch("jarvis.webhook._handle_issue_event")
+    async def test_issue_enqueued_when_db_available(self, mock_handle, queue_app):
+        from jarvis.db import get_agent_run
+
+        resp = await _post_issue_event(queue_app, _issue_payload("opened"))
+
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["status"] == "accepted"
+        assert data["coalesced"] is False
+
+        run = await get_agent_run(queue_app.state.auth_db, data["run_id"])
+        assert run["status"] == "queued"
+        assert run["issue_number"] == 42
+        assert run["payload"]["body"] == "O login falha com senha correta"
+        mock_handle.assert_not_called()
+        queue_app.state.agent_worker.notify.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_repeated_events_coalesce_into_one_run(self, queue_app):
+        first = await _post_issue_event(queue_app, _issue_payload("opened"), "d-1")
+        second = await _post_issue_event(queue_app, _issue_payload("edited"), "d-2")
+        third = await _post_issue_event(queue_app, _issue_payload("labeled"), "d-3")
+
+        run_ids = {r.json()["run_id"] for r in (first, second, third)}
+        assert len(run_ids) == 1
+        assert second.json()["coalesced"] is True
+        assert third.json()["coalesced"] is True
+
+    @pytest.mark.asyncio
+    async def test_duplicate_delivery_ignored(self, queue_app):
+        first = await _post_issue_event(queue_app, _issue_payload("opened"), "d-1")
+        retry = await _post_issue_event(queue_app, _issue_payload("opened"), "d-1")
+
+        assert first.json()["status"] == "accepted"
+        assert retry.json()["status"] == "ignored"
+        assert "duplicada" in retry.json()["reason"]
+
+    @pytest.mark.asyncio
+    async def test_redelivery_accepted_after_failed_enqueue(self, queue_app):
+        conn = queue_app.state.auth_db
+        async with conn.write() as writer:
+            await writer.execute(
+                """CREATE TRIGGER fail_enqueue BEFORE INSERT ON agent_runs
+                   BEGIN SELECT RAISE(ABORT, 'disco cheio'); END"""
+            )
+        with pytest.raises(Exception, match="disco cheio"):
+            await _post_issue_event(queue_app, _issue_payload("opened"), "d-1")
+
+        async with conn.write() as writer:
+            await writer.execute("DROP TRIGGER fail_enqueue")
+        retry = await _post_issue_event(queue_app, _issue_payload("opened"), "d-1")
+
+        assert retry.json()["status"] == "accepted"
+        assert retry.json()["run_id"] is not None
+
+
+def _flaky_graph(calls: dict, checkpointer):
+    """Grafo classify -> work com checkpointer; 'work' falha na primeira vez."""
+    from typing import TypedDict
+
+    from langgraph.graph import END, START, StateGraph
+
+    class State(TypedDict, total=False):
+        issue_title: str
+        issue_category: str
+        tool_steps: int
+
+    def classify(state):
+        calls["classify"] += 1
+        return {"issue_category": "BUG"}
+
+    def work(state):
+        calls["work"] += 1
+        if calls["work"] == 1:
+            raise RuntimeError("falha transitoria")
+        return {"tool_steps": 3}
+
+    builder = StateGraph(State)
+    builder.add_node("classify", classify)
+    builder.add_node("work", work)
+    builder.add_edge(START, "classify")
+    builder.add_edge("classify", "work")
+    builder.add_edge("work", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+class TestRunIssueAgentResume:
+    @pytest.mark.asyncio
+    async def test_retry_resumes_from_last_completed_node(self):
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        from jarvis.webhook import run_issue_agent
+
+        calls = {"classify": 0, "work": 0}
+        graph = _flaky_graph(calls, InMemorySaver())
+        kwargs = dict(
+            issue_number=42, title="Bug", body="", repo_full_name="o/r",
+            settings=None, graph=graph, run_id=7,
+        )
+
+        with pytest.raises(RuntimeError):
+            await run_issue_agent(**kwargs)
+        result = await run_issue_agent(**kwargs)
+
+        assert result["category"] == "BUG"
+        assert result["tool_steps"] == 3
+        # Grafo sem modelo: contadores zerados, mas presentes para o worker
+        assert result["model_calls"] == 0
+        assert calls == {"classify": 1, "work": 2}
+
+    @pytest.mark.asyncio
+    async def test_finished_run_is_not_executed_again(self):
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        from jarvis.webhook import run_issue_agent
+
+        calls = {"classify": 0, "work": 1}
+        graph = _flaky_graph(calls, InMemorySaver())
+        kwargs = dict(
+            issue_number=42, title="Bug", body="", repo_full_name="o/r",
+            settings=None, graph=graph, run_id=8,
+        )
+
+        await run_issue_agent(**kwargs)
+        result = await run_issue_agent(**kwargs)
+
+        assert result["category"] == "BUG"
+        assert calls == {"classify": 1, "work": 2}
+
+    @pytest.mark.asyncio
+    async def test_runs_use_separate_threads(self):
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        from jarvis.webhook import run_issue_agent
+
+        calls = {"classify": 0, "work": 1}
+        graph = _flaky_graph(calls, InMemorySaver())
+        for run_id in (1, 2):
+            await run_issue_agent(
+                issue_number=42, title="Bug", body="", repo_full_name="o/r",
+                settings=None, graph=graph, run_id=run_id,
+            )
+
+        assert calls["classify"] == 2
@@ -0,0 +1,331 @@
+"""Testes para o worker da fila de agent runs."""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from jarvis import db as db_module
+from jarvis.db import enqueue_agent_run, get_agent_run, init_db
+from jarvis.worker import AgentRunWorker, backoff_delay
+from jarvis.write_buffer import AgentRunUpdateBuffer
+
+
+@pytest_asyncio.fixture
+async def db():
+    conn = await init_db(":memory:")
+    yield conn
+    await conn.close()
+
+
+def _worker(db, handler, **kwargs) -> AgentRunWorker:
+    return AgentRunWorker(db_module, db, handler, **kwargs)
+
+
+class TestBackoffDelay:
+    def test_grows_exponentially(self):
+        assert backoff_delay(1) == 30
+        assert backoff_delay(2) == 60
+        assert backoff_delay(3) == 120
+
+    def test_is_capped(self):
+        assert backoff_delay(20) == 1800
+
+
+class TestAgentRunWorker:
+    @pytest.mark.asyncio
+    async def test_successful_run_is_completed(self, db):
+        async def handler(run):
+            assert run["payload"] == {"body": "corpo"}
+            return {"category": "BUG", "tool_steps": 3}
+
+        run = await enqueue_agent_run(
+            db, "repo/test", 1, "Title", "opened", payload={"body": "corpo"},
+        )
+        worker = _worker(db, handler)
+
+        assert await worker.run_once() is True
+        await worker.drain()
+
+        stored = await get_agent_run(db, run["id"])
+        assert stored["status"] == "completed"
+        assert stored["category"] == "BUG"
+        assert stored["tool_steps"] == 3
+        assert stored["finished_at"] is not None
+
+    @pytest.mark.asyncio
+    async def test_usage_counters_are_stored(self, db):
+        async def handler(run):
+            return {
+                "category": "BUG", "tool_steps": 1, "model_calls": 2,
+                "input_tokens": 900, "cached_input_tokens": 512, "output_tokens": 40,
+                "assistant_ms": 1200, "tools_ms": 300,
+            }
+
+        run = await enqueue_agent_run(db, "repo/test", 1, "Title", "opened")
+        worker = _worker(db, handler)
+
+        await worker.run_once()
+        await worker.drain()
+
+        stored = await get_agent_run(db, run["id"])
+        assert stored["model_calls"] == 2
+        assert stored["input_tokens"] == 900
+        assert stored["cached_input_tokens"] == 512
+        assert stored["output_tokens"] == 40
+        assert stored["assistant_ms"] == 1200
+        assert stored["tools_ms"] == 300
+
+    @pytest.mark.asyncio
+    async def test_empty_queue_returns_false(self, db):
+        async def handler(run):
+            raise AssertionError("nao deveria ser chamado")
+
+        worker = _worker(db, handler)
+        assert await worker.run_once() is False
+
+    @pytest.mark.asyncio
+    async def test_failure_is_rescheduled_with_backoff(self, db):
+        async def handler(run):
+            raise RuntimeError("timeout")
+
+        run = await enqueue_agent_run(db, "repo/test", 1, "Title", "opened")
+        worker = _worker(db, handler, max_attempts=3)
+
+        await worker.run_once()
+        await worker.drain()
+
+        stored = await get_agent_run(db, run["id"])
+        assert stored["status"] == "queued"
+        assert stored["attempts"] == 1
+        assert "timeout" in stored["error_message"]
+        assert stored["next_attempt_at"] > stored["started_at"]
+
+    @pytest.mark.asyncio
+    async def test_last_attempt_marks_failed(self, db):
+        async def handler(run):
+            raise RuntimeError("timeout")
+
+        run = await enqueue_agent_run(db, "repo/test", 1, "Title", "opened")
+        worker = _worker(db, handler, max_attempts=1)
+
+        await worker.run_once()
+        await worker.drain()
+
+        stored = await get_agent_run(db, run["id"])
+        assert stored["status"] == "failed"
+        assert stored["finished_at"] is not None
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self, db):
+        running = 0
+        peak = 0
+        release = asyncio.Event()
+
+        async def handler(run):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await release.wait()
+            running -= 1
+            return {"category": "BUG", "tool_steps": 0}
+
+        for i in range(4):
+            await enqueue_agent_run(db, "repo/test", i, f"Issue {i}", "opened")
+
+        worker = _worker(db, handler, concurrency=2, poll_interval=0.01)
+        loop_task = asyncio.create_task(worker.run())
+        await asyncio.sleep(0.05)
+        assert peak == 2
+
+        release.set()
+        await asyncio.sleep(0.05)
+        worker.stop()
+        await loop_task
+
+        assert peak == 2
+        runs, _ = await db_module.list_agent_runs(db, status="completed")
+        assert len(runs) == 4
+
+    @pytest.mark.asyncio
+    async def test_run_recovers_stale_processing_runs(self, db):
+        handled = []
+
+        async def handler(run):
+            handled.append(run["id"])
+            return {"category": "DOCS", "tool_steps": 0}
+
+        run = await enqueue_agent_run(db, "repo/test", 1, "Title", "opened")
+        await db_module.claim_agent_run(db)  # worker anterior morreu aqui
+        await db_module.update_agent_run(
+            db, run["id"], locked_at="2000-01-01T00:00:00+00:00",
+        )
+
+        worker = _worker(db, handler, stale_seconds=60, poll_interval=0.01)
+        loop_task = asyncio.create_task(worker.run())
+        await asyncio.sleep(0.05)
+        worker.stop()
+        await loop_task
+
+        assert handled == [run["id"]]
+        stored = await get_agent_run(db, run["id"])
+        assert stored["status"] == "completed"
+        assert stored["attempts"] == 2
+
+    @pytest.mark.asyncio
+    async def test_superseded_run_is_cancelled(self, db):
+        started = asyncio.Event()
+        cancelled = False
+
+        async def handler(run):
+            nonlocal cancelled
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            return {"category": "BUG", "tool_steps": 0}
+
+        first = await enqueue_agent_run(db, "repo/test", 1, "Title", "opened")
+        worker = _worker(db, handler)
+        await worker.run_once()
+        await started.wait()
+
+        await enqueue_agent_run(db, "repo/test", 1, "Title", "edited", debounce_seconds=60)
+        assert await worker.cancel_superseded() == 1
+        await worker.drain()
+
+        assert cancelled is True
+        assert (await get_agent_run(db, first["id"]))["status"] == "cancelled"
+
+    @pytest.mark.asyncio
+    async def test_saturated_slots_do_not_block_the_loop(self, db):
+        started = asyncio.Event()
+        cancelled = False
+
+        async def handler(run):
+            nonlocal cancelled
+            if run["issue_number"] == 1:
+                started.set()
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled = True
+                    raise
+            return {"category": "BUG", "tool_steps": 0}
+
+        await enqueue_agent_run(db, "repo/test", 1, "Title", "opened")
+        await enqueue_agent_run(db, "repo/test", 2, "Backlog", "opened")
+        worker = _worker(db, handler, concurrency=1, poll_interval=0.01)
+        loop_task = asyncio.create_task(worker.run())
+        await asyncio.wait_for(started.wait(), 1)
+
+        # Slot ocupado e fila com backlog: o loop ainda cancela e para
+        await enqueue_agent_run(db, "repo/test", 1, "Title", "edited", debounce_seconds=60)
+        await asyncio.sleep(0.05)
+        assert cancelled is True
+        worker.stop()
+        await asyncio.wait_for(loop_task, 1)
+
+        runs, _ = await db_module.list_agent_runs(db, status="completed")
+        assert [r["issue_number"] for r in runs] == [2]
+
+
+class TestAgentRunUpdateBuffer:
+    @pytest.mark.asyncio
+    async def test_buffered_completions_are_written_on_flush(self, db):
+        async def handler(run):
+            return {"category": "BUG", "tool_steps": 1}
+
+        runs = [
+            await enqueue_agent_run(db, "repo/test", i, "T", "opened")
+            for i in range(3)
+        ]
+        buffer = AgentRunUpdateBuffer(db_module, db, flush_interval=60)
+        worker = _worker(db, handler, concurrency=3, update_buffer=buffer)
+
+        while await worker.run_once():
+            pass
+        await asyncio.gather(*worker._tasks.values())
+
+        assert buffer.pending == 3
+        assert (await get_agent_run(db, runs[0]["id"]))["status"] == "processing"
+
+        assert await buffer.flush() == 3
+        for run in runs:
+            assert (await get_agent_run(db, run["id"]))["status"] == "completed"
+
+    @pytest.mark.asyncio
+    async def test_drain_flushes_pending_updates(self, db):
+        async def handler(run):
+            return {"category": "BUG", "tool_steps": 1}
+
+        run = await enqueue_agent_run(db, "repo/test", 1, "T", "opened")
+        buffer = AgentRunUpdateBuffer(db_module, db, flush_interval=60)
+        worker = _worker(db, handler, update_buffer=buffer)
+
+        await worker.run_once()
+        await worker.drain()
+
+        assert buffer.pending == 0
+        assert (await get_agent_run(db, run["id"]))["status"] == "completed"
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_updates(self, db):
+        from unittest.mock import AsyncMock
+
+        failing = AsyncMock()
+        failing.update_agent_runs.side_effect = RuntimeError("db fora")
+        buffer = AgentRunUpdateBuffer(failing, db, flush_interval=60)
+        buffer.submit(1, status="completed")
+
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        assert buffer.pending == 1
+
+    @pytest.mark.asyncio
+    async def test_update_that_always_fails_does_not_block_others(self, db):
+        runs = [
+            await enqueue_agent_run(db, "repo/test", i, "T", "opened")
+            for i in range(3)
+        ]
+        bad_id = runs[1]["id"]
+
+        class RejectingDb:
+            async def update_agent_runs(self, conn, updates):
+                if any(run_id == bad_id for run_id, _, _ in updates):
+                    raise RuntimeError("violacao de constraint")
+                return await db_module.update_agent_runs(conn, updates)
+
+        buffer = AgentRunUpdateBuffer(RejectingDb(), db, flush_interval=60, max_attempts=2)
+        for run in runs:
+            buffer.submit(run["id"], status="completed")
+
+        assert await buffer.flush() == 2
+        assert buffer.pending == 1
+        assert (await get_agent_run(db, runs[2]["id"]))["status"] == "completed"
+
+        # Updates que chegam depois nao ficam presos atras do item ruim
+        late = await enqueue_agent_run(db, "repo/test", 9, "T", "opened")
+        buffer.submit(late["id"], status="completed")
+        assert await buffer.flush() == 1
+        assert buffer.pending == 0
+        assert (await get_agent_run(db, late["id"]))["status"] == "completed"
+        assert (await get_agent_run(db, bad_id))["status"] == "queued"
+
+    @pytest.mark.asyncio
+    async def test_max_batch_triggers_background_flush(self, db):
+        run = await enqueue_agent_run(db, "repo/test", 1, "T", "opened")
+        buffer = AgentRunUpdateBuffer(db_module, db, flush_interval=60, max_batch=1)
+        buffer.start()
+        try:
+            buffer.submit(run["id"], status="completed")
+            for _ in range(50):
+                if buffer.pending == 0:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await buffer.close()
+
+        assert (await get_agent_run(db, run["id"]))["status"] == "completed"
@@ -0,0 +1,191 @@
+"""Testes para o envio de stream no WebSocket (coalescing e backpressure)."""
+
+import asyncio
+import json
+
+import pytest
+
+from jarvis.ws_stream import StreamMultiplexer, stream_to_websocket
+
+
+class FakeWebSocket:
+    def __init__(self, send_delay: float = 0.0):
+        self.frames: list[dict] = []
+        self.send_delay = send_delay
+        self.close_code = None
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        self.close_code = code
+
+    async def send_text(self, text: str) -> None:
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self.frames.append(json.loads(text))
+
+
+def _tokens(*texts, delay: float = 0.0):
+    async def gen():
+        for text in texts:
+            if delay:
+                await asyncio.sleep(delay)
+            yield {"type": "token", "content": text}
+    return gen()
+
+
+class TestStreamToWebsocket:
+    @pytest.mark.asyncio
+    async def test_coalesces_tokens_up_to_char_budget(self):
+        ws = FakeWebSocket()
+        ok = await stream_to_websocket(
+            ws, _tokens("ab", "cd", "ef", "gh", "ij"), flush_ms=50, flush_chars=4,
+        )
+        assert ok
+        assert ws.frames == [
+            {"type": "token", "content": "abcd"},
+            {"type": "token", "content": "efgh"},
+            {"type": "token", "content": "ij"},
+            {"type": "end"},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_time_budget_flushes_slow_tokens(self):
+        ws = FakeWebSocket()
+        await stream_to_websocket(
+            ws, _tokens("a", "b", delay=0.05), flush_ms=5, flush_chars=64,
+        )
+        assert [f.get("content") for f in ws.frames] == ["a", "b", None]
+
+    @pytest.mark.asyncio
+    async def test_keeps_order_around_tool_events(self):
+        async def events():
+            yield {"type": "token", "content": "Vou "}
+            yield {"type": "token", "content": "calcular"}
+            yield {"type": "tool_start", "name": "calculator", "call_id": "c1"}
+            yield {"type": "tool_end", "name": "calculator", "call_id": "c1", "output": "4"}
+            yield {"type": "token", "content": "4"}
+
+        ws = FakeWebSocket()
+        await stream_to_websocket(ws, events(), flush_ms=50, flush_chars=64)
+        assert [f["type"] for f in ws.frames] == [
+            "token", "tool_start", "tool_end", "token", "end",
+        ]
+        assert ws.frames[0]["content"] == "Vou calcular"
+
+    @pytest.mark.asyncio
+    async def test_error_frame_instead_of_end(self):
+        async def events():
+            yield {"type": "token", "content": "x"}
+            raise RuntimeError("falhou")
+
+        ws = FakeWebSocket()
+        assert await stream_to_websocket(ws, events(), flush_ms=0)
+        assert ws.frames[-1] == {"type": "error", "content": "falhou"}
+
+    @pytest.mark.asyncio
+    async def test_slow_client_stops_graph_stream(self):
+        closed = asyncio.Event()
+        produced = 0
+
+        async def events():
+            nonlocal produced
+            try:
+                while True:
+                    produced += 1
+                    yield {"type": "tool_end", "name": "t", "call_id": "c", "output": "x"}
+                    await asyncio.sleep(0)
+            finally:
+                closed.set()
+
+        ws = FakeWebSocket(send_delay=0.05)
+        ok = await asyncio.wait_for(
+            stream_to_websocket(ws, events(), max_pending=10), timeout=2,
+        )
+        assert not ok
+        assert closed.is_set()
+        assert len(ws.frames) < produced
+
+
+def _endless(closed: asyncio.Event, event_type: str = "token", delay: float = 0.01):
+    async def gen():
+        try:
+            while True:
+                yield {"type": event_type, "content": "x"}
+                await asyncio.sleep(delay)
+        finally:
+            closed.set()
+    return gen()
+
+
+class TestStreamMultiplexer:
+    @pytest.mark.asyncio
+    async def test_concurrent_streams_tag_frames_with_request_id(self):
+        ws = FakeWebSocket()
+        streams = StreamMultiplexer(ws, flush_ms=0)
+        assert streams.start("a", _tokens("a1", "a2", delay=0.01))
+        assert streams.start("b", _tokens("b1", "b2", delay=0.01))
+        assert streams.active == 2
+        await streams.wait("a")
+        await streams.wait("b")
+
+        assert streams.active == 0
+        for request_id in ("a", "b"):
+            frames = [f for f in ws.frames if f["request_id"] == request_id]
+            assert "".join(f.get("content", "") for f in frames) == f"{request_id}1{request_id}2"
+            assert frames[-1]["type"] == "end"
+        # Os dois streams andaram juntos, nao um depois do outro
+        order = [f["request_id"] for f in ws.frames]
+        assert order != sorted(order)
+
+    @pytest.mark.asyncio
+    async def test_cancel_stops_graph_stream(self):
+        ws = FakeWebSocket()
+        streams = StreamMultiplexer(ws, flush_ms=0)
+        closed = asyncio.Event()
+        streams.start("r1", _endless(closed))
+        await asyncio.sleep(0.03)
+
+        assert streams.cancel("r1")
+        await streams.wait("r1")
+
+        assert closed.is_set()
+        assert ws.frames[-1] == {"type": "cancelled", "request_id": "r1"}
+        assert not streams.is_running("r1")
+        assert not streams.cancel("r1")
+
+    @pytest.mark.asyncio
+    async def test_limit_of_concurrent_streams(self):
+        ws = FakeWebSocket()
+        streams = StreamMultiplexer(ws, max_streams=1, flush_ms=0)
+        closed = asyncio.Event()
+        assert streams.start("r1", _endless(closed))
+        assert not streams.start("r2", _tokens("x"))
+        await asyncio.sleep(0.02)
+        await streams.close()
+        assert closed.is_set()
+
+    @pytest.mark.asyncio
+    async def test_close_cancels_all_without_frames(self):
+        ws = FakeWebSocket()
+        streams = StreamMultiplexer(ws, flush_ms=0)
+        closed = [asyncio.Event(), asyncio.Event()]
+        streams.start("r1", _endless(closed[0]))
+        streams.start("r2", _endless(closed[1]))
+        await asyncio.sleep(0.02)
+
+        await streams.close()
+
+        assert all(event.is_set() for event in closed)
+        assert streams.active == 0
+        assert not any(f["type"] == "cancelled" for f in ws.frames)
+
+    @pytest.mark.asyncio
+    async def test_slow_client_closes_connection(self):
+        ws = FakeWebSocket(send_delay=0.05)
+        streams = StreamMultiplexer(ws, max_pending=5)
+        closed = asyncio.Event()
+        streams.start("r1", _endless(closed, event_type="tool_end", delay=0))
+        await asyncio.wait_for(streams.wait("r1"), timeout=2)
+
+        assert closed.is_set()
+        assert ws.close_code == 1013
+        assert not streams.start("r2", _tokens("x"))
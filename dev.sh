@@ -4,6 +4,8 @@ set -e
 read -p "Porta do backend [8000]: " port
 port=${port:-8000}
 export JARVIS_PORT="$port"
+# Em dev a fila de agent runs roda dentro da API (sem jarvis-worker separado)
+export JARVIS_WORKER_EMBEDDED="${JARVIS_WORKER_EMBEDDED:-true}"
 
 echo "Backend na porta $port | Frontend em http://localhost:5173"
 
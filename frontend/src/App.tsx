@@ -7,7 +7,7 @@ import Sidebar from './components/Sidebar'
 
 function App() {
   const { user, logout } = useAuth()
-  const { messages, status, isStreaming, threadId, sendMessage, reconnect, loadThread, newThread } = useChat()
+  const { messages, status, isStreaming, threadId, sendMessage, cancel, reconnect, loadThread, newThread } = useChat()
   const [input, setInput] = useState('')
   const [sidebarOpen, setSidebarOpen] = useState(false)
   const messagesEndRef = useRef<HTMLDivElement>(null)
@@ -193,6 +193,18 @@ function App() {
               disabled={!isConnected}
               className="flex-1 bg-transparent text-[14px] text-text-primary placeholder:text-text-muted outline-none font-body disabled:opacity-40"
             />
+            {isStreaming && (
+              <button
+                type="button"
+                onClick={cancel}
+                title="Parar resposta"
+                className="w-8 h-8 rounded-lg bg-accent/10 border border-accent/20 flex items-center justify-center text-accent hover:bg-accent/20 hover:border-accent/30 transition-all duration-200 shrink-0 cursor-pointer"
+              >
+                <svg width="12" height="12" viewBox="0 0 24 24" fill="currentColor">
+                  <rect x="5" y="5" width="14" height="14" rx="2" />
+                </svg>
+              </button>
+            )}
             <button
               type="submit"
               disabled={!isConnected || isStreaming || !input.trim()}
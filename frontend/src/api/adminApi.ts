@@ -3,6 +3,7 @@ import type {
   AdminUser,
   AgentRun,
   AgentRunListResponse,
+  AgentRunStatsResponse,
   ConfigData,
   ThreadListResponse,
   ThreadMessage,
@@ -124,17 +125,30 @@ export async function getThreadMessages(threadId: string): Promise<ThreadMessage
 // --- Agent Runs ---
 
 export async function listAgentRuns(
-  params?: { status?: string; limit?: number; offset?: number },
+  params?: {
+    status?: string
+    repo?: string
+    limit?: number
+    offset?: number
+    before_id?: number
+  },
 ): Promise<AgentRunListResponse> {
   const qs = new URLSearchParams()
   if (params?.status) qs.set('status', params.status)
+  if (params?.repo) qs.set('repo', params.repo)
   if (params?.limit != null) qs.set('limit', String(params.limit))
   if (params?.offset != null) qs.set('offset', String(params.offset))
+  if (params?.before_id != null) qs.set('before_id', String(params.before_id))
   const query = qs.toString()
   const resp = await authFetch(`${BASE}/agent-runs${query ? `?${query}` : ''}`)
   return json<AgentRunListResponse>(resp)
 }
 
+export async function getAgentRunStats(): Promise<AgentRunStatsResponse> {
+  const resp = await authFetch(`${BASE}/agent-runs/stats`)
+  return json<AgentRunStatsResponse>(resp)
+}
+
 export async function getAgentRun(id: number): Promise<AgentRun> {
   const resp = await authFetch(`${BASE}/agent-runs/${id}`)
   return json<AgentRun>(resp)
@@ -5,9 +5,11 @@ import * as api from '../../api/adminApi'
 const PAGE_SIZE = 20
 
 const STATUS_COLORS: Record<string, string> = {
+  queued: 'text-sky-400 bg-sky-400/10 border-sky-400/20',
   processing: 'text-yellow-400 bg-yellow-400/10 border-yellow-400/20',
   completed: 'text-emerald-400 bg-emerald-400/10 border-emerald-400/20',
   failed: 'text-red-400 bg-red-400/10 border-red-400/20',
+  cancelled: 'text-text-muted bg-surface border-border',
 }
 
 function StatusBadge({ status }: { status: string }) {
@@ -29,33 +31,40 @@ function formatDate(iso: string | null): string {
 export default function AgentRunsPage() {
   const [runs, setRuns] = useState<AgentRun[]>([])
   const [total, setTotal] = useState(0)
-  const [offset, setOffset] = useState(0)
+  // Paginacao keyset: cursors[i] e o before_id da pagina i (undefined = primeira)
+  const [cursors, setCursors] = useState<(number | undefined)[]>([undefined])
+  const [nextCursor, setNextCursor] = useState<number | null>(null)
   const [loading, setLoading] = useState(true)
   const [statusFilter, setStatusFilter] = useState('')
   const [selected, setSelected] = useState<AgentRun | null>(null)
 
+  const page = cursors.length - 1
+  const beforeId = cursors[page]
+
   const load = useCallback(async () => {
     try {
       setLoading(true)
-      const params: { limit: number; offset: number; status?: string } = {
+      const params: { limit: number; status?: string; before_id?: number } = {
         limit: PAGE_SIZE,
-        offset,
       }
       if (statusFilter) params.status = statusFilter
+      if (beforeId != null) params.before_id = beforeId
       const data = await api.listAgentRuns(params)
       setRuns(data.runs)
-      setTotal(data.total)
+      // O total so vem na primeira pagina; as seguintes mantem o valor
+      if (data.total != null) setTotal(data.total)
+      setNextCursor(data.next_before_id)
     } catch {
       // silently fail
     } finally {
       setLoading(false)
     }
-  }, [offset, statusFilter])
+  }, [beforeId, statusFilter])
 
   useEffect(() => { load() }, [load])
 
   const totalPages = Math.ceil(total / PAGE_SIZE)
-  const currentPage = Math.floor(offset / PAGE_SIZE) + 1
+  const currentPage = page + 1
 
   if (selected) {
     return (
@@ -106,13 +115,15 @@ export default function AgentRunsPage() {
         <label className="text-[11px] font-mono text-text-muted tracking-wide uppercase">Status:</label>
         <select
           value={statusFilter}
-          onChange={(e) => { setStatusFilter(e.target.value); setOffset(0) }}
+          onChange={(e) => { setStatusFilter(e.target.value); setCursors([undefined]) }}
           className="bg-surface border border-border rounded-lg px-3 py-1.5 text-[13px] text-text-primary outline-none focus:border-accent/30 font-mono"
         >
           <option value="">Todos</option>
+          <option value="queued">queued</option>
           <option value="processing">processing</option>
           <option value="completed">completed</option>
           <option value="failed">failed</option>
+          <option value="cancelled">cancelled</option>
         </select>
         <span className="text-[11px] text-text-muted font-mono">
           {total} run{total !== 1 ? 's' : ''}
@@ -181,8 +192,8 @@ export default function AgentRunsPage() {
       {totalPages > 1 && (
         <div className="flex items-center justify-between mt-4">
           <button
-            onClick={() => setOffset(Math.max(0, offset - PAGE_SIZE))}
-            disabled={offset === 0}
+            onClick={() => setCursors(cursors.slice(0, -1))}
+            disabled={page === 0}
             className="px-3 py-1.5 rounded-lg border border-border text-[11px] font-mono text-text-secondary hover:text-text-primary disabled:opacity-30 transition-colors cursor-pointer disabled:cursor-not-allowed"
           >
             &larr; Anterior
@@ -191,8 +202,8 @@ export default function AgentRunsPage() {
             Pagina {currentPage} de {totalPages}
           </span>
           <button
-            onClick={() => setOffset(offset + PAGE_SIZE)}
-            disabled={offset + PAGE_SIZE >= total}
+            onClick={() => nextCursor != null && setCursors([...cursors, nextCursor])}
+            disabled={nextCursor == null}
             className="px-3 py-1.5 rounded-lg border border-border text-[11px] font-mono text-text-secondary hover:text-text-primary disabled:opacity-30 transition-colors cursor-pointer disabled:cursor-not-allowed"
           >
             Proxima &rarr;
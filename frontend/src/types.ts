@@ -90,16 +90,33 @@ export interface AgentRun {
   issue_title: string
   action: string
   category: string | null
-  status: 'processing' | 'completed' | 'failed'
+  status: 'queued' | 'processing' | 'completed' | 'failed' | 'cancelled'
   tool_steps: number
+  attempts: number
   error_message: string | null
   started_at: string
+  claimed_at: string | null
   finished_at: string | null
 }
 
 export interface AgentRunListResponse {
   runs: AgentRun[]
-  total: number
+  // So vem na primeira pagina (null nas paginas com before_id)
+  total: number | null
+  next_before_id: number | null
+}
+
+export interface AgentRunStats {
+  category: string | null
+  status: AgentRun['status']
+  count: number
+  avg_duration_seconds: number | null
+  p50_duration_seconds: number | null
+  p95_duration_seconds: number | null
+}
+
+export interface AgentRunStatsResponse {
+  stats: AgentRunStats[]
 }
 
 // --- Tools ---
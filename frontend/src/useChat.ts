@@ -36,6 +36,7 @@ function setupMessageHandler(
   ws: WebSocket,
   wsRef: React.RefObject<WebSocket | null>,
   assistantIdRef: React.RefObject<string | null>,
+  requestIdRef: React.RefObject<string | null>,
   setMessages: React.Dispatch<React.SetStateAction<ChatMessage[]>>,
   setStatus: React.Dispatch<React.SetStateAction<ConnectionStatus>>,
   setIsStreaming: React.Dispatch<React.SetStateAction<boolean>>,
@@ -53,6 +54,8 @@ function setupMessageHandler(
 
   ws.addEventListener('message', (event) => {
     const data = JSON.parse(event.data)
+    // Frames de uma requisicao ja encerrada (ex.: cancelada) sao ignorados
+    if (data.request_id && data.request_id !== requestIdRef.current) return
 
     if (data.type === 'token') {
       const id = assistantIdRef.current
@@ -90,9 +93,10 @@ function setupMessageHandler(
             : m,
         ),
       )
-    } else if (data.type === 'end') {
+    } else if (data.type === 'end' || data.type === 'cancelled') {
       setIsStreaming(false)
       assistantIdRef.current = null
+      requestIdRef.current = null
     } else if (data.type === 'error') {
       setIsStreaming(false)
       const id = assistantIdRef.current
@@ -104,6 +108,7 @@ function setupMessageHandler(
         )
       }
       assistantIdRef.current = null
+      requestIdRef.current = null
     }
   })
 }
@@ -117,6 +122,7 @@ export function useChat() {
   const wsRef = useRef<WebSocket | null>(null)
   const threadIdRef = useRef(threadId)
   const assistantIdRef = useRef<string | null>(null)
+  const requestIdRef = useRef<string | null>(null)
 
   // Keep ref in sync with state
   useEffect(() => {
@@ -133,7 +139,7 @@ export function useChat() {
 
       setStatus('connecting')
       const ws = new WebSocket(buildWsUrl(token))
-      setupMessageHandler(ws, wsRef, assistantIdRef, setMessages, setStatus, setIsStreaming)
+      setupMessageHandler(ws, wsRef, assistantIdRef, requestIdRef, setMessages, setStatus, setIsStreaming)
       wsRef.current = ws
     }
 
@@ -159,7 +165,7 @@ export function useChat() {
 
     setStatus('connecting')
     const newWs = new WebSocket(buildWsUrl(token))
-    setupMessageHandler(newWs, wsRef, assistantIdRef, setMessages, setStatus, setIsStreaming)
+    setupMessageHandler(newWs, wsRef, assistantIdRef, requestIdRef, setMessages, setStatus, setIsStreaming)
     wsRef.current = newWs
   }, [])
 
@@ -180,7 +186,9 @@ export function useChat() {
         content: '',
       }
 
+      const requestId = crypto.randomUUID()
       assistantIdRef.current = assistantMsg.id
+      requestIdRef.current = requestId
       setMessages((prev) => [...prev, userMsg, assistantMsg])
       setIsStreaming(true)
 
@@ -188,12 +196,20 @@ export function useChat() {
         JSON.stringify({
           message: text,
           thread_id: threadIdRef.current,
+          request_id: requestId,
         }),
       )
     },
     [isStreaming],
   )
 
+  const cancel = useCallback(() => {
+    const requestId = requestIdRef.current
+    const ws = wsRef.current
+    if (!requestId || !ws || ws.readyState !== WebSocket.OPEN) return
+    ws.send(JSON.stringify({ type: 'cancel', request_id: requestId }))
+  }, [])
+
   const loadThread = useCallback(async (id: string) => {
     if (isStreaming) return
     setThreadId(id)
@@ -213,5 +229,5 @@ export function useChat() {
     setMessages([])
   }, [isStreaming])
 
-  return { messages, status, isStreaming, threadId, sendMessage, reconnect, loadThread, newThread }
+  return { messages, status, isStreaming, threadId, sendMessage, cancel, reconnect, loadThread, newThread }
 }
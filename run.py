@@ -202,7 +202,8 @@ def parse_port(raw: str, default: int = 8000) -> int:
 
 def start_services(port: int) -> None:
     """Sobe backend (uvicorn --reload) e frontend como subprocessos."""
-    env = {**os.environ, "JARVIS_PORT": str(port)}
+    # Em dev a fila de agent runs roda dentro da API (sem jarvis-worker separado)
+    env = {"JARVIS_WORKER_EMBEDDED": "true", **os.environ, "JARVIS_PORT": str(port)}
 
     backend_proc = subprocess.Popen(
         [